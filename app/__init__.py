@@ -49,12 +49,18 @@ mock_db = {
 }
 
 
-def create_app(config_name: str | None = None) -> Flask:
+def create_app(config_name: str | None = None, config_extra: dict | None = None) -> Flask:
 	app = Flask(__name__, template_folder="../templates", static_folder="../static")
 
 	env_name = config_name or os.getenv('APP_ENV') or os.getenv('FLASK_ENV')
 	config_class = get_config(env_name)
 	app.config.from_object(config_class)
+	# Sobrescritas pontuais (ex.: banco dos benchmarks e do teste de carga)
+	app.config.update(config_extra or {})
+
+	# JSON via orjson quando instalado (datas ISO, Decimal, Row do SQLAlchemy)
+	from .json_provider import JSONProviderRapido
+	app.json = JSONProviderRapido(app)
 
 	# Garantir defaults críticos
 	app.config.setdefault('SECRET_KEY', 'dev-secret-key')
@@ -90,6 +96,20 @@ def create_app(config_name: str | None = None) -> Flask:
 	except ImportError:
 		app.logger.warning("Flask-Limiter não instalado. Rate limiting desabilitado.")
 
+	# Compressão gzip/brotli e estáticos versionados (registrado antes dos
+	# demais after_request para ser o último a rodar)
+	from .services.compressao_service import CompressaoService
+	CompressaoService.iniciar(app)
+
+	# Contagem de SQL por requisição e avisos de N+1 (antes dos demais
+	# before_request para contar também as consultas de login/identidade)
+	from .services.instrumentacao_service import InstrumentacaoService
+	InstrumentacaoService.iniciar(app)
+
+	# /metrics no formato do Prometheus (depois da instrumentação SQL)
+	from .services.metricas_service import MetricasService
+	MetricasService.iniciar(app)
+
 	# Configuração de logging
 	import logging
 	from logging.handlers import RotatingFileHandler
@@ -184,6 +204,7 @@ def create_app(config_name: str | None = None) -> Flask:
 	from .blueprints.sistema_completo_tarefas import bp as sistema_completo_tarefas_bp
 	from .blueprints.search import bp as search_bp
 	from .blueprints.search_simple import bp as search_simple_bp
+	from .blueprints.jobs import bp as jobs_bp
 
 	app.register_blueprint(auth_bp)
 	app.register_blueprint(dashboard_bp)
@@ -202,6 +223,27 @@ def create_app(config_name: str | None = None) -> Flask:
 	app.register_blueprint(sistema_completo_tarefas_bp)
 	app.register_blueprint(search_bp)
 	app.register_blueprint(search_simple_bp)
+	app.register_blueprint(jobs_bp)
+
+	# Índice de autocomplete em memória (empresas, tarefas, usuários)
+	from .services.autocomplete_service import AutocompleteService
+	AutocompleteService.iniciar(app)
+
+	# Setores e tributações em cache por processo (também nos templates)
+	from .services.referencia_service import ReferenciaService
+	ReferenciaService.iniciar(app)
+
+	# Usuário logado resolvido uma vez por requisição (g.current_user)
+	from .services.identidade_service import IdentidadeService, usuario_atual
+	IdentidadeService.iniciar(app)
+
+	# Cache da API v1 com invalidação por tags (contadores de acerto/falha)
+	from .services.cache_service import CacheService
+	CacheService.iniciar(app)
+
+	# Comandos CLI (flask --app run <grupo> <comando>)
+	from .commands import register_commands
+	register_commands(app)
 
 	# Health check endpoint
 	@app.route('/health')
@@ -216,7 +258,7 @@ def create_app(config_name: str | None = None) -> Flask:
 			return {'status': 'unhealthy', 'error': str(e)}, 500
 
 	# Proteção simples de rotas (respeita flag AUTH_ENABLED)
-	PUBLIC_PATHS = {"/login", "/health", "/api/search/empresas", "/api/search/tarefas", "/api/search/colaboradores", "/api/search/setores", "/api/search/busca-simples", "/api/search-simple/empresas", "/api/search-simple/tarefas", "/api/search-simple/colaboradores", "/api/search-simple/setores", "/api/search-simple/demo"}
+	PUBLIC_PATHS = {"/login", "/health", "/metrics", "/api/search/empresas", "/api/search/tarefas", "/api/search/colaboradores", "/api/search/setores", "/api/search/busca-simples", "/api/search-simple/empresas", "/api/search-simple/tarefas", "/api/search-simple/colaboradores", "/api/search-simple/setores", "/api/search-simple/demo"}
 
 	@app.before_request
 	def _require_login():
@@ -229,6 +271,10 @@ def create_app(config_name: str | None = None) -> Flask:
 			return None
 		if not session.get('user_id'):
 			return redirect(url_for('auth.login_page'))
+		if usuario_atual() is None:
+			# Usuário removido ou desativado depois do login
+			session.clear()
+			return redirect(url_for('auth.login_page'))
 		return None
 
 	# Error handlers
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from app.db import db
 from app.models import Setor, Tributacao, Empresa, Usuario, Tarefa, RelacionamentoTarefa
+from app.services.resumo_service import ResumoService
+from app.services.vinculo_service import VinculoService
 
 bp = Blueprint('accounts', __name__, url_prefix='/tarefas')
 
@@ -33,11 +35,16 @@ def edit_task():
 	tid = request.form.get('id', type=int)
 	t = Tarefa.query.get(tid)
 	if t:
+		chave_anterior = (t.tipo, t.setor_id)
 		t.nome = request.form.get('nome')
 		t.tipo = request.form.get('tipo')
 		t.descricao = request.form.get('descricao')
 		t.setor_id = request.form.get('setor_id', type=int)
 		t.tributacao_id = request.form.get('tributacao_id', type=int)
+		if (t.tipo, t.setor_id) != chave_anterior:
+			# O resumo do painel é agrupado por setor e filtrado pelo tipo da tarefa
+			empresa_ids = [eid for (eid,) in db.session.query(RelacionamentoTarefa.empresa_id).filter_by(tarefa_id=t.id).distinct()]
+			ResumoService.reconstruir(empresa_ids=empresa_ids, commit=False)
 		db.session.commit()
 		flash('Tarefa atualizada!')
 	return redirect(url_for('accounts.return_page'))
@@ -79,6 +86,7 @@ def edit_link():
 		r.responsavel_id = request.form.get('responsavel_id', type=int)
 		r.dia_vencimento = request.form.get('dia_vencimento', type=int)
 		r.prazo_especifico = request.form.get('prazo_especifico') or None
+		ResumoService.reconstruir(empresa_ids=[r.empresa_id], commit=False)
 		db.session.commit()
 		flash('Vínculo atualizado!')
 	return redirect(url_for('accounts.return_page'))
@@ -87,10 +95,7 @@ def edit_link():
 @bp.post('/delete-link')
 def delete_link():
 	rid = request.form.get('id', type=int)
-	r = RelacionamentoTarefa.query.get(rid)
-	if r:
-		db.session.delete(r)
-		db.session.commit()
+	if rid and VinculoService.remover([rid]):
 		flash('Vínculo excluído!')
 	return redirect(url_for('accounts.return_page'))
 
@@ -126,33 +131,20 @@ def bulk_link_tasks():
 	
 	# Se nenhuma empresa foi selecionada, usar todas as empresas ativas
 	if not empresa_ids:
-		empresas_ativas = Empresa.query.filter_by(ativo=True).all()
-		empresa_ids = [empresa.id for empresa in empresas_ativas]
+		empresa_ids = [eid for (eid,) in db.session.query(Empresa.id).filter_by(ativo=True)]
 	
 	if not tarefa_ids:
 		flash('Selecione pelo menos uma tarefa!')
 		return redirect(url_for('accounts.return_page'))
 	
-	vinculos_criados = 0
-	for empresa_id in empresa_ids:
-		for tarefa_id in tarefa_ids:
-			# Verifica se já existe o vínculo
-			existing = RelacionamentoTarefa.query.filter_by(
-				empresa_id=empresa_id, 
-				tarefa_id=tarefa_id
-			).first()
-			
-			if not existing:
-				rel = RelacionamentoTarefa(
-					empresa_id=empresa_id,
-					tarefa_id=tarefa_id,
-					responsavel_id=responsavel_id,
-					status='ativa',
-					dia_vencimento=dia_vencimento
-				)
-				db.session.add(rel)
-				vinculos_criados += 1
-	
+	resultado = VinculoService.vincular(
+		empresa_ids,
+		tarefa_ids,
+		valores={'responsavel_id': responsavel_id, 'dia_vencimento': dia_vencimento},
+		commit=False
+	)
+	vinculos_criados = len(resultado['criados'])
+
 	db.session.commit()
 	flash(f'Criados {vinculos_criados} vínculos com sucesso!')
 	return redirect(url_for('accounts.return_page'))
@@ -171,36 +163,24 @@ def sector_link_tasks():
 		return redirect(url_for('accounts.return_page'))
 	
 	# Busca tarefas do setor
-	tarefas = Tarefa.query.filter_by(setor_id=setor_id).all()
+	tarefa_ids = [tid for (tid,) in db.session.query(Tarefa.id).filter_by(setor_id=setor_id)]
 	# Busca empresas da tributação
-	empresas = Empresa.query.filter_by(tributacao_id=tributacao_id).all()
-	
-	if not tarefas or not empresas:
+	empresa_ids = [eid for (eid,) in db.session.query(Empresa.id).filter_by(tributacao_id=tributacao_id)]
+
+	if not tarefa_ids or not empresa_ids:
 		flash('Nenhuma tarefa encontrada para o setor ou nenhuma empresa para a tributação!')
 		return redirect(url_for('accounts.return_page'))
-	
-	vinculos_criados = 0
-	for empresa in empresas:
-		for tarefa in tarefas:
-			# Verifica se já existe o vínculo
-			existing = RelacionamentoTarefa.query.filter_by(
-				empresa_id=empresa.id, 
-				tarefa_id=tarefa.id
-			).first()
-			
-			if not existing:
-				rel = RelacionamentoTarefa(
-					empresa_id=empresa.id,
-					tarefa_id=tarefa.id,
-					responsavel_id=responsavel_id,
-					status='ativa',
-					dia_vencimento=dia_vencimento
-				)
-				db.session.add(rel)
-				vinculos_criados += 1
-	
+
+	resultado = VinculoService.vincular(
+		empresa_ids,
+		tarefa_ids,
+		valores={'responsavel_id': responsavel_id, 'dia_vencimento': dia_vencimento},
+		commit=False
+	)
+	vinculos_criados = len(resultado['criados'])
+
 	db.session.commit()
-	flash(f'Criados {vinculos_criados} vínculos entre {len(tarefas)} tarefas e {len(empresas)} empresas!')
+	flash(f'Criados {vinculos_criados} vínculos entre {len(tarefa_ids)} tarefas e {len(empresa_ids)} empresas!')
 	return redirect(url_for('accounts.return_page'))
 
 
@@ -213,14 +193,8 @@ def bulk_delete_links():
 		flash('Selecione pelo menos um vínculo para remover!')
 		return redirect(url_for('accounts.return_page'))
 	
-	deleted_count = 0
-	for link_id in link_ids:
-		r = RelacionamentoTarefa.query.get(int(link_id))
-		if r:
-			db.session.delete(r)
-			deleted_count += 1
-	
-	db.session.commit()
+	ids = [int(link_id) for link_id in link_ids if str(link_id).strip()]
+	deleted_count = VinculoService.remover(ids)
 	flash(f'Removidos {deleted_count} vínculos!')
 	return redirect(url_for('accounts.return_page'))
 
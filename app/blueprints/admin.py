@@ -1,10 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, session, send_file, jsonify
 from app.db import db
 from app.models import (
     Usuario, Setor, Empresa, Tributacao, Tarefa, RelacionamentoTarefa, 
     VinculacaoEmpresaTributacao, TarefaTributacao, MudancaTributacaoPendente,
     HistoricoMudancaTributacao
 )
+from app.services.tributacao_service import TributacaoService, MODO_SUBSTITUIR
+from app.services.referencia_service import ReferenciaService
+from app.services.identidade_service import requer_perfil
+from app.services.importacao_service import ImportacaoService, PlanilhaInvalida
+from app.services.instrumentacao_service import InstrumentacaoService
+from app.services.job_service import JobService
+from app.blueprints.jobs import pedido_assincrono, resposta_job_enfileirado
 from datetime import date
 import pandas as pd
 import io
@@ -12,32 +19,23 @@ import io
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 
-def require_admin():
-	if session.get('user_tipo') != 'admin':
-		return redirect(url_for('dashboard.return_dashboard'))
-	return None
+admin_requerido = requer_perfil('admin', destino='dashboard.return_dashboard')
 
 
 @bp.get('')
 @bp.get('/')
-
+@admin_requerido
 def admin_page():
-	guard = require_admin()
-	if guard:
-		return guard
-	setores = Setor.query.all()
-	tributacoes = Tributacao.query.all()
+	setores = ReferenciaService.setores()
+	tributacoes = ReferenciaService.tributacoes()
 	usuarios = Usuario.query.order_by(Usuario.nome).all()
 	empresas = Empresa.query.order_by(Empresa.nome).all()
 	return render_template('admin.html', aba='admin', setores=setores, tributacoes=tributacoes, usuarios=usuarios, empresas=empresas)
 
 
 @bp.post('/usuarios')
-
+@admin_requerido
 def create_user():
-	guard = require_admin()
-	if guard:
-		return guard
 	u = Usuario(
 		nome=request.form.get('nome'),
 		login=request.form.get('login'),
@@ -53,11 +51,8 @@ def create_user():
 
 
 @bp.post('/empresas')
-
+@admin_requerido
 def create_company():
-	guard = require_admin()
-	if guard:
-		return guard
 	e = Empresa(
 		codigo=request.form.get('codigo'),
 		nome=request.form.get('nome'),
@@ -71,11 +66,8 @@ def create_company():
 
 
 @bp.post('/usuarios/<int:user_id>/toggle')
-
+@admin_requerido
 def toggle_user(user_id: int):
-	guard = require_admin()
-	if guard:
-		return guard
 	u = Usuario.query.get(user_id)
 	if not u:
 		flash('Usuário não encontrado')
@@ -87,11 +79,8 @@ def toggle_user(user_id: int):
 
 
 @bp.post('/empresas/<int:empresa_id>/toggle')
-
+@admin_requerido
 def toggle_company(empresa_id: int):
-	guard = require_admin()
-	if guard:
-		return guard
 	e = Empresa.query.get(empresa_id)
 	if not e:
 		flash('Empresa não encontrada')
@@ -107,118 +96,72 @@ def toggle_company(empresa_id: int):
 # =====================
 
 @bp.post('/import/usuarios')
-
+@admin_requerido
 def import_usuarios():
-	guard = require_admin()
-	if guard:
-		return guard
-	file = request.files.get('arquivo')
-	if not file:
-		flash('Selecione um arquivo de usuários (.xlsx)')
-		return redirect(url_for('admin.admin_page'))
-	df = pd.read_excel(file)
-	# Espera colunas: nome, login, senha, tipo, setor (nome do setor)
-	for _, row in df.iterrows():
-		setor = None
-		if pd.notna(row.get('setor')):
-			setor = Setor.query.filter_by(nome=str(row.get('setor')).strip()).first()
-			if not setor:
-				setor = Setor(nome=str(row.get('setor')).strip())
-				db.session.add(setor)
-				db.session.flush()
-		u = Usuario(
-			nome=str(row.get('nome')).strip(),
-			login=str(row.get('login')).strip(),
-			senha=str(row.get('senha')).strip(),
-			tipo=str(row.get('tipo')).strip().lower(),
-			setor_id=(setor.id if setor else None),
-			ativo=True
-		)
-		db.session.add(u)
-	db.session.commit()
-	flash('Importação de usuários concluída!')
-	return redirect(url_for('admin.admin_page'))
+	return _importar_planilha(ImportacaoService.importar_usuarios, 'usuários', 'importacao.usuarios')
 
 
 @bp.post('/import/empresas')
-
+@admin_requerido
 def import_empresas():
-	guard = require_admin()
-	if guard:
-		return guard
-	file = request.files.get('arquivo')
-	if not file:
-		flash('Selecione um arquivo de empresas (.xlsx)')
-		return redirect(url_for('admin.admin_page'))
-	df = pd.read_excel(file)
-	# Espera colunas: codigo, nome, tributacao (nome da tributacao)
-	for _, row in df.iterrows():
-		trib = None
-		if pd.notna(row.get('tributacao')):
-			trib = Tributacao.query.filter_by(nome=str(row.get('tributacao')).strip()).first()
-			if not trib:
-				trib = Tributacao(nome=str(row.get('tributacao')).strip())
-				db.session.add(trib)
-				db.session.flush()
-		e = Empresa(
-			codigo=str(row.get('codigo')).strip(),
-			nome=str(row.get('nome')).strip(),
-			tributacao_id=(trib.id if trib else None),
-			ativo=True
-		)
-		db.session.add(e)
-	db.session.commit()
-	flash('Importação de empresas concluída!')
-	return redirect(url_for('admin.admin_page'))
+	return _importar_planilha(ImportacaoService.importar_empresas, 'empresas', 'importacao.empresas')
 
 
 @bp.post('/import/tarefas')
-
+@admin_requerido
 def import_tarefas():
-	guard = require_admin()
-	if guard:
-		return guard
+	return _importar_planilha(ImportacaoService.importar_tarefas, 'tarefas', 'importacao.tarefas')
+
+
+# Linhas com erro listadas na mensagem (o restante é resumido)
+MAX_ERROS_EXIBIDOS = 10
+
+
+def _importar_planilha(importar, descricao, tipo_job):
+	"""Executa uma importação e resume o relatório por flash (ou JSON, se pedido)"""
 	file = request.files.get('arquivo')
 	if not file:
-		flash('Selecione um arquivo de tarefas (.xlsx)')
+		flash(f'Selecione um arquivo de {descricao} (.xlsx)')
 		return redirect(url_for('admin.admin_page'))
-	df = pd.read_excel(file)
-	# Espera colunas: nome, tipo, descricao, tributacao (nome), setor (nome)
-	for _, row in df.iterrows():
-		setor = None
-		if pd.notna(row.get('setor')):
-			setor = Setor.query.filter_by(nome=str(row.get('setor')).strip()).first()
-			if not setor:
-				setor = Setor(nome=str(row.get('setor')).strip())
-				db.session.add(setor)
-				db.session.flush()
-		trib = None
-		if pd.notna(row.get('tributacao')):
-			trib = Tributacao.query.filter_by(nome=str(row.get('tributacao')).strip()).first()
-			if not trib:
-				trib = Tributacao(nome=str(row.get('tributacao')).strip())
-				db.session.add(trib)
-				db.session.flush()
-		t = Tarefa(
-			nome=str(row.get('nome')).strip(),
-			tipo=str(row.get('tipo')).strip(),
-			descricao=(str(row.get('descricao')).strip() if pd.notna(row.get('descricao')) else None),
-			tributacao_id=(trib.id if trib else None),
-			setor_id=(setor.id if setor else None)
+	dry_run = request.form.get('dry_run') in ('1', 'true', 'on')
+	
+	if pedido_assincrono(request.form.get('async')):
+		job = JobService.enfileirar(
+			tipo_job, {'dry_run': dry_run}, session.get('user_id'),
+			entrada=file.stream, nome_entrada='planilha.xlsx'
 		)
-		db.session.add(t)
-	db.session.commit()
-	flash('Importação de tarefas concluída!')
+		if request.accept_mimetypes.best == 'application/json':
+			return resposta_job_enfileirado(job)
+		flash(f'Importação de {descricao} agendada (job {job.id}).')
+		return redirect(url_for('admin.admin_page'))
+	
+	try:
+		relatorio = importar(file.stream, dry_run=dry_run)
+	except PlanilhaInvalida as e:
+		if request.accept_mimetypes.best == 'application/json':
+			return jsonify({'success': False, 'message': str(e)}), 400
+		flash(str(e))
+		return redirect(url_for('admin.admin_page'))
+	
+	if request.accept_mimetypes.best == 'application/json':
+		return jsonify(dict(relatorio, success=True))
+	
+	prefixo = 'Simulação da importação' if dry_run else 'Importação'
+	flash(
+		f"{prefixo} de {descricao} concluída: {relatorio['criados']} novos, "
+		f"{relatorio['atualizados']} atualizados, {len(relatorio['erros'])} linhas com erro."
+	)
+	for erro in relatorio['erros'][:MAX_ERROS_EXIBIDOS]:
+		flash(f"Linha {erro['linha']}: {'; '.join(erro['erros'])}")
+	if len(relatorio['erros']) > MAX_ERROS_EXIBIDOS:
+		flash(f"... e mais {len(relatorio['erros']) - MAX_ERROS_EXIBIDOS} linhas com erro.")
 	return redirect(url_for('admin.admin_page'))
 
 
 @bp.post('/change-password')
+@admin_requerido
 def change_password():
 	"""Altera a senha de um usuário"""
-	guard = require_admin()
-	if guard:
-		return guard
-	
 	user_id = request.form.get('user_id', type=int)
 	new_password = request.form.get('new_password')
 	confirm_password = request.form.get('confirm_password')
@@ -249,12 +192,9 @@ def change_password():
 
 
 @bp.post('/change-tributacao')
+@admin_requerido
 def change_tributacao():
 	"""Altera a tributação de uma empresa - Nova lógica com controle de tarefas"""
-	guard = require_admin()
-	if guard:
-		return guard
-	
 	empresa_id = request.form.get('empresa_id', type=int)
 	nova_tributacao_id = request.form.get('nova_tributacao_id', type=int)
 	confirmar_alteracao = request.form.get('confirmar_alteracao')
@@ -273,7 +213,7 @@ def change_tributacao():
 		flash('Empresa não encontrada!')
 		return redirect(url_for('admin.admin_page'))
 	
-	nova_tributacao = Tributacao.query.get(nova_tributacao_id)
+	nova_tributacao = ReferenciaService.tributacao(nova_tributacao_id)
 	if not nova_tributacao:
 		flash('Tributação não encontrada!')
 		return redirect(url_for('admin.admin_page'))
@@ -284,92 +224,18 @@ def change_tributacao():
 		return redirect(url_for('admin.admin_page'))
 	
 	# Armazenar tributação anterior
-	tributacao_anterior = Tributacao.query.get(empresa.tributacao_id)
-	tributacao_anterior_nome = tributacao_anterior.nome if tributacao_anterior else 'N/A'
+	tributacao_anterior_nome = ReferenciaService.nome_tributacao(empresa.tributacao_id, 'N/A')
 	
 	try:
-		# 1. Criar registro de mudança pendente
-		mudanca_pendente = MudancaTributacaoPendente(
-			empresa_id=empresa_id,
-			tributacao_anterior_id=empresa.tributacao_id,
-			tributacao_nova_id=nova_tributacao_id,
-			data_mudanca=date.today(),
+		# Desativa os relacionamentos atuais, troca a vinculação, reaproveita/cria
+		# os relacionamentos da nova tributação e registra a mudança pendente
+		TributacaoService.alterar_tributacao(
+			empresa_id,
+			nova_tributacao_id,
+			session.get('user_id'),
 			motivo=motivo,
-			criado_por=session.get('user_id')
+			modo=MODO_SUBSTITUIR
 		)
-		db.session.add(mudanca_pendente)
-		db.session.flush()  # Para obter o ID
-		
-		# 2. Desativar vinculação atual
-		vinculacao_atual = VinculacaoEmpresaTributacao.query.filter_by(
-			empresa_id=empresa_id, ativo=True
-		).first()
-		
-		if vinculacao_atual:
-			vinculacao_atual.ativo = False
-			vinculacao_atual.data_fim = date.today()
-		
-		# 3. Criar nova vinculação
-		nova_vinculacao = VinculacaoEmpresaTributacao(
-			empresa_id=empresa_id,
-			tributacao_id=nova_tributacao_id,
-			data_inicio=date.today(),
-			ativo=True
-		)
-		db.session.add(nova_vinculacao)
-		db.session.flush()  # Para obter o ID
-		
-		# 4. Desativar relacionamentos atuais (tarefas antigas)
-		relacionamentos_atuais = RelacionamentoTarefa.query.filter_by(
-			empresa_id=empresa_id,
-			versao_atual=True
-		).all()
-		
-		for rel in relacionamentos_atuais:
-			rel.versao_atual = False
-			rel.data_fim = date.today()
-			rel.motivo_desativacao = f"Mudança de tributação: {tributacao_anterior_nome} -> {nova_tributacao.nome}"
-		
-		# 5. Atualizar empresa
-		empresa.tributacao_id = nova_tributacao_id
-		
-		# 6. Buscar tarefas da nova tributação
-		tarefas_nova_tributacao = TarefaTributacao.query.filter_by(
-			tributacao_id=nova_tributacao_id,
-			ativo=True
-		).all()
-		
-		# 7. Criar relacionamentos para tarefas da nova tributação (sem responsável - será definido pelo gerente)
-		for tt in tarefas_nova_tributacao:
-			# Verificar se já existe relacionamento (para tarefas comuns)
-			rel_existente = RelacionamentoTarefa.query.filter_by(
-				empresa_id=empresa_id,
-				tarefa_id=tt.tarefa_id,
-				versao_atual=False
-			).first()
-			
-			if rel_existente:
-				# Reativar relacionamento existente
-				rel_existente.versao_atual = True
-				rel_existente.vinculacao_id = nova_vinculacao.id
-				rel_existente.data_inicio = date.today()
-				rel_existente.data_fim = None
-				rel_existente.motivo_desativacao = None
-				# Responsável será definido pelo gerente
-			else:
-				# Criar novo relacionamento (sem responsável)
-				novo_rel = RelacionamentoTarefa(
-					empresa_id=empresa_id,
-					tarefa_id=tt.tarefa_id,
-					responsavel_id=None,  # Será definido pelo gerente
-					vinculacao_id=nova_vinculacao.id,
-					status='ativa',
-					data_inicio=date.today(),
-					versao_atual=True
-				)
-				db.session.add(novo_rel)
-		
-		db.session.commit()
 		
 		flash(f'✅ Tributação alterada com sucesso para {empresa.nome}! De {tributacao_anterior_nome} para {nova_tributacao.nome}. As tarefas antigas foram desativadas e as novas tarefas precisam ser vinculadas aos responsáveis no painel do gerente.')
 		
@@ -380,13 +246,49 @@ def change_tributacao():
 	return redirect(url_for('admin.admin_page'))
 
 
+@bp.get('/change-tributacao/preview')
+@requer_perfil('admin', api=True)
+def preview_change_tributacao():
+	"""Retorna o plano da mudança de tributação sem gravar (dry-run)"""
+	empresa_id = request.args.get('empresa_id', type=int)
+	nova_tributacao_id = request.args.get('nova_tributacao_id', type=int)
+	if not empresa_id or not nova_tributacao_id:
+		return jsonify({'success': False, 'message': 'empresa_id e nova_tributacao_id são obrigatórios'}), 400
+	
+	plano = TributacaoService.planejar_mudanca(empresa_id, nova_tributacao_id, MODO_SUBSTITUIR)
+	if not plano:
+		return jsonify({'success': False, 'message': 'Empresa não encontrada'}), 404
+	
+	return jsonify({'success': True, 'dry_run': True, 'plano': plano})
+
+
+@bp.get('/consultas-lentas')
+@admin_requerido
+def consultas_lentas():
+	"""Consultas acima de SQL_LENTA_MS por tempo total, com plano e uso dos índices"""
+	consultas = InstrumentacaoService.consultas_lentas(limite=request.args.get('limite', 50, type=int))
+	return render_template(
+		'admin_consultas_lentas.html',
+		aba='admin',
+		consultas=consultas,
+		indices=InstrumentacaoService.uso_indices(consultas),
+		limite_ms=current_app.config.get('SQL_LENTA_MS'),
+		descartadas=current_app.extensions['consultas_lentas'].descartadas,
+	)
+
+
+@bp.post('/consultas-lentas/zerar')
+@admin_requerido
+def zerar_consultas_lentas():
+	InstrumentacaoService.zerar_consultas_lentas()
+	flash('Consultas lentas zeradas!')
+	return redirect(url_for('admin.consultas_lentas'))
+
+
 @bp.get('/download-template/<tipo>')
+@admin_requerido
 def download_template(tipo):
 	"""Download de template Excel para importação"""
-	guard = require_admin()
-	if guard:
-		return guard
-	
 	if tipo == 'usuarios':
 		# Template para usuários
 		data = {
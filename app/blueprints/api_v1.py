@@ -1,17 +1,20 @@
-from flask import Blueprint, request, jsonify, session, current_app
+from flask import Blueprint, request, jsonify
+from app.services.busca_service import BuscaService
+from app.services.cache_service import (
+	CacheService, TAG_EMPRESAS, TAG_TAREFAS, resposta_json_condicional,
+	tag_empresa, tag_tarefa, tag_setor_tarefas, tag_usuario, tag_tabela,
+)
 from app.services.empresa_service import EmpresaService
+from app.services.identidade_service import requer_perfil, usuario_atual
+from app.services.instrumentacao_service import InstrumentacaoService
 from app.services.tarefa_service import TarefaService
-from app.models import Usuario, Tarefa, Empresa
+from app.models import Usuario, Tarefa, Empresa, RelacionamentoTarefa
 from app.db import db
 from app.api_response import success_response
 
 bp = Blueprint('api_v1', __name__, url_prefix='/api/v1')
 
 
-def _get_cache():
-	return getattr(current_app, 'cache', None)
-
-
 def _cache_key(prefix: str, user_id: int, args: dict) -> str:
 	parts = [prefix, f"u:{user_id}"]
 	for k in sorted(args.keys()):
@@ -19,16 +22,21 @@ def _cache_key(prefix: str, user_id: int, args: dict) -> str:
 	return '|'.join(parts)
 
 
+def _tags_escopo_gerente(user_id):
+	"""Tags do escopo de um gerente: seus vínculos e seu cadastro (setor)"""
+	return (
+		tag_usuario(user_id),
+		tag_tabela(RelacionamentoTarefa.__tablename__),
+		tag_tabela(Usuario.__tablename__),
+	)
+
+
 @bp.get('/empresas')
+@requer_perfil(api=True)
 def list_empresas():
 	"""Unificado: lista/busca empresas com filtros e paginação (centralizado via service)."""
-	user_id = session.get('user_id')
-	if not user_id:
-		return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-
-	usuario = Usuario.query.get(user_id)
-	if not usuario:
-		return jsonify({'success': False, 'message': 'Usuário inválido'}), 403
+	usuario = usuario_atual()
+	user_id = usuario.id
 
 	search = request.args.get('q', '').strip()
 	page = max(int(request.args.get('page', 1) or 1), 1)
@@ -38,13 +46,19 @@ def list_empresas():
 	ativo_bool = None if ativo is None else (str(ativo).lower() in ['1', 'true', 't', 'yes', 'sim'])
 
 	# Cache
-	cache = _get_cache()
 	args_for_key = dict(request.args)
 	cache_key = _cache_key('empresas', user_id, args_for_key)
-	if cache:
-		cached = cache.get(cache_key)
-		if cached is not None:
-			return jsonify(cached)
+	cached = CacheService.obter_entrada('empresas', cache_key)
+	if cached is not None:
+		return resposta_json_condicional(cached['valor'], cached['tags'])
+
+	# Tags lidas antes das consultas (ver CacheService.versoes)
+	tags = [TAG_EMPRESAS, tag_tabela(Empresa.__tablename__)]
+	if usuario.tipo == 'gerente':
+		tags.extend(_tags_escopo_gerente(user_id))
+		if setor_id or usuario.setor_id:
+			tags.extend((tag_setor_tarefas(setor_id or usuario.setor_id), tag_tabela(Tarefa.__tablename__)))
+	versoes = CacheService.versoes(*tags)
 
 	# Escopo por papel usando service
 	ids_escopo = None
@@ -65,16 +79,15 @@ def list_empresas():
 				'total_pages': 0,
 			}
 			response = success_response(data=[], pagination=pagination)
-			if cache:
-				cache.set(cache_key, response)
-			return jsonify(response)
+			CacheService.gravar(cache_key, response, versoes)
+			return resposta_json_condicional(response, versoes)
 		query = query.filter(Empresa.id.in_(ids_escopo))
 
 	# Filtros
 	if ativo_bool is not None:
 		query = query.filter(Empresa.ativo == ativo_bool)
 	if search:
-		query = query.filter(Empresa.nome.ilike(f'%{search}%'))
+		query = BuscaService.filtrar_nome(query, Empresa, search)
 
 	# Paginação
 	total = query.count()
@@ -84,6 +97,8 @@ def list_empresas():
 		'nome': e.nome,
 		'codigo': getattr(e, 'codigo', None)
 	} for e in items]
+	if versoes:
+		versoes.update(CacheService.versoes(*(tag_empresa(e.id) for e in items)))
 
 	response = success_response(
 		data=data,
@@ -94,21 +109,16 @@ def list_empresas():
 			'total_pages': (total + limit - 1) // limit,
 		}
 	)
-	if cache:
-		cache.set(cache_key, response)
-	return jsonify(response)
+	CacheService.gravar(cache_key, response, versoes)
+	return resposta_json_condicional(response, versoes)
 
 
 @bp.get('/tarefas')
+@requer_perfil(api=True)
 def list_tarefas():
 	"""Unificado: lista/busca tarefas com filtros e paginação (centralizado via service)."""
-	user_id = session.get('user_id')
-	if not user_id:
-		return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-
-	usuario = Usuario.query.get(user_id)
-	if not usuario:
-		return jsonify({'success': False, 'message': 'Usuário inválido'}), 403
+	usuario = usuario_atual()
+	user_id = usuario.id
 
 	search = request.args.get('q', '').strip()
 	page = max(int(request.args.get('page', 1) or 1), 1)
@@ -117,13 +127,18 @@ def list_tarefas():
 	tipo = request.args.get('tipo')  # Mensal, Anual, etc.
 
 	# Cache
-	cache = _get_cache()
 	args_for_key = dict(request.args)
 	cache_key = _cache_key('tarefas', user_id, args_for_key)
-	if cache:
-		cached = cache.get(cache_key)
-		if cached is not None:
-			return jsonify(cached)
+	cached = CacheService.obter_entrada('tarefas', cache_key)
+	if cached is not None:
+		return resposta_json_condicional(cached['valor'], cached['tags'])
+
+	# Com setor (filtro ou escopo do gerente) só as tarefas do setor importam
+	setor_lista = setor_id or (usuario.setor_id if usuario.tipo == 'gerente' else None)
+	tags = [tag_setor_tarefas(setor_lista) if setor_lista else TAG_TAREFAS, tag_tabela(Tarefa.__tablename__)]
+	if usuario.tipo == 'gerente':
+		tags.extend(_tags_escopo_gerente(user_id))
+	versoes = CacheService.versoes(*tags)
 
 	# Escopo via service para gerente
 	ids_escopo = None
@@ -142,14 +157,13 @@ def list_tarefas():
 				'total_pages': 0,
 			}
 			response = success_response(data=[], pagination=pagination)
-			if cache:
-				cache.set(cache_key, response)
-			return jsonify(response)
+			CacheService.gravar(cache_key, response, versoes)
+			return resposta_json_condicional(response, versoes)
 		query = query.filter(Tarefa.id.in_(ids_escopo))
 
 	# Filtros
 	if search:
-		query = query.filter(Tarefa.nome.ilike(f'%{search}%'))
+		query = BuscaService.filtrar_nome(query, Tarefa, search)
 	if setor_id:
 		query = query.filter(Tarefa.setor_id == setor_id)
 	if tipo:
@@ -165,6 +179,8 @@ def list_tarefas():
 		'setor_id': t.setor_id,
 		'tributacao_id': getattr(t, 'tributacao_id', None)
 	} for t in items]
+	if versoes:
+		versoes.update(CacheService.versoes(*(tag_tarefa(t.id) for t in items)))
 
 	response = success_response(
 		data=data,
@@ -175,28 +191,38 @@ def list_tarefas():
 			'total_pages': (total + limit - 1) // limit,
 		}
 	)
-	if cache:
-		cache.set(cache_key, response)
-	return jsonify(response)
-
-
-# Helpers de invalidação (serão usados por endpoints de mutação futuramente)
-
-def invalidate_empresas_cache():
-	cache = _get_cache()
-	if not cache:
-		return
-	try:
-		cache.clear()
-	except Exception:
-		pass
-
-
-def invalidate_tarefas_cache():
-	cache = _get_cache()
-	if not cache:
-		return
-	try:
-		cache.clear()
-	except Exception:
-		pass
+	CacheService.gravar(cache_key, response, versoes)
+	return resposta_json_condicional(response, versoes)
+
+
+@bp.get('/cache/estatisticas')
+@requer_perfil('admin', api=True)
+def cache_estatisticas():
+	"""Acertos e falhas do cache por prefixo (contadores deste processo)."""
+	return jsonify(success_response(data=CacheService.estatisticas()))
+
+
+@bp.get('/sql/estatisticas')
+@requer_perfil('admin', api=True)
+def sql_estatisticas():
+	"""Consultas, tempo de banco e N+1 por endpoint (contadores deste processo)."""
+	return jsonify(success_response(data=InstrumentacaoService.estatisticas()))
+
+
+# Helpers de invalidação manual; commits de Empresa/Tarefa/vínculos já
+# invalidam as tags afetadas automaticamente (app/services/cache_service.py)
+
+def invalidate_empresas_cache(*empresa_ids):
+	"""Invalida as empresas informadas (ou todas as listagens de empresas)."""
+	if empresa_ids:
+		CacheService.invalidar(*(tag_empresa(i) for i in empresa_ids))
+	else:
+		CacheService.invalidar(TAG_EMPRESAS, tag_tabela(Empresa.__tablename__))
+
+
+def invalidate_tarefas_cache(*tarefa_ids):
+	"""Invalida as tarefas informadas (ou todas as listagens de tarefas)."""
+	if tarefa_ids:
+		CacheService.invalidar(*(tag_tarefa(i) for i in tarefa_ids))
+	else:
+		CacheService.invalidar(TAG_TAREFAS, tag_tabela(Tarefa.__tablename__))
@@ -1,6 +1,7 @@
-from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify
 from app.db import db
 from app.models import Usuario, Checklist, ChecklistItem, ChecklistItemConclusao, Empresa
+from app.services.identidade_service import requer_perfil, usuario_atual
 from datetime import datetime
 
 bp = Blueprint('checklist', __name__, url_prefix='/checklist')
@@ -8,17 +9,11 @@ bp = Blueprint('checklist', __name__, url_prefix='/checklist')
 
 @bp.get('')
 @bp.get('/')
+@requer_perfil()
 def index():
     """Página principal do painel de checklists do usuário"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
-            return redirect(url_for('auth.login'))
+        user_id = usuario_atual().id
         
         # Buscar checklists do usuário
         checklists = db.session.query(Checklist, Empresa).join(
@@ -69,17 +64,11 @@ def index():
 
 
 @bp.get('/<int:checklist_id>')
+@requer_perfil()
 def visualizar_checklist(checklist_id):
     """Visualizar checklist específico"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
-            return redirect(url_for('auth.login'))
+        user_id = usuario_atual().id
         
         # Buscar checklist
         checklist = Checklist.query.get(checklist_id)
@@ -118,17 +107,11 @@ def visualizar_checklist(checklist_id):
 
 
 @bp.post('/item/<int:item_id>/concluir')
+@requer_perfil(api=True)
 def concluir_item(item_id):
     """Concluir item do checklist"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
-            return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
+        user_id = usuario_atual().id
         
         # Buscar item
         item = ChecklistItem.query.get(item_id)
@@ -177,17 +160,11 @@ def concluir_item(item_id):
 
 
 @bp.get('/api/meus-checklists')
+@requer_perfil(api=True)
 def api_meus_checklists():
     """API para buscar checklists do usuário"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
-            return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
+        user_id = usuario_atual().id
         
         # Buscar checklists do usuário
         checklists = db.session.query(Checklist, Empresa).join(
@@ -240,17 +217,11 @@ def api_meus_checklists():
 
 
 @bp.get('/api/checklists-pendentes')
+@requer_perfil(api=True)
 def api_checklists_pendentes():
     """API para buscar número de checklists pendentes do usuário"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
-            return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
+        user_id = usuario_atual().id
         
         # Buscar checklists do usuário
         checklists = db.session.query(Checklist, Empresa).join(
@@ -299,17 +270,11 @@ def api_checklists_pendentes():
 
 
 @bp.get('/api/checklist/<int:checklist_id>/itens')
+@requer_perfil(api=True)
 def api_checklist_itens(checklist_id):
     """API para buscar itens de um checklist específico"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
-            return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
+        user_id = usuario_atual().id
         
         # Buscar checklist
         checklist = Checklist.query.get(checklist_id)
@@ -3,15 +3,17 @@ from app.db import db
 from app.models import Empresa, RelacionamentoTarefa, Periodo, Tarefa, Usuario, Retificacao
 from app.utils import (
     get_previous_period, get_previous_period_label, convert_period_to_label, 
-    validate_period_format, should_show_task_by_type
+    validate_period_format, task_visibility_filter
 )
 from sqlalchemy.orm import joinedload
 from datetime import datetime
 import re
 from app.utils import get_current_period_label, gerar_periodo_label
 from app.services.tarefa_service import TarefaService
+from app.services.resumo_service import ResumoService
+from app.services.cache_service import resposta_condicional, tags_resumo_periodo
 from app.services.empresa_service import EmpresaService
-from app.blueprints.api_v1 import invalidate_tarefas_cache, invalidate_empresas_cache
+from app.services.identidade_service import requer_perfil, usuario_atual
 
 bp = Blueprint('dashboard', __name__, url_prefix='')
 
@@ -96,6 +98,10 @@ def _build_periodos_multiplas(empresa_filter, periodo_label, user_id, tarefa_fil
         # Para períodos futuros, mostrar apenas tarefas ativas (versao_atual = True)
         query = query.filter(RelacionamentoTarefa.versao_atual == True)
     
+    # Anuais ficam de fora (tratadas separadamente), trimestrais só no mês
+    # final do trimestre e mensais pelo label do período
+    query = query.filter(task_visibility_filter(periodo_label, Periodo.periodo_label, Tarefa.tipo))
+    
     # Carregar relacionamentos de uma vez
     periodos = query.options(
         joinedload(Periodo.relacionamento_tarefa).joinedload(RelacionamentoTarefa.tarefa),
@@ -108,21 +114,6 @@ def _build_periodos_multiplas(empresa_filter, periodo_label, user_id, tarefa_fil
         tar = rel.tarefa
         emp = rel.empresa
         
-        # Excluir tarefas anuais (são tratadas separadamente)
-        if tar.tipo == 'Anual':
-            continue
-        
-        # Para tarefas trimestrais, não filtrar por período_label diretamente
-        # A filtragem será feita pela lógica de tipo de tarefa
-        if tar.tipo == 'Trimestral':
-            # Aplicar filtragem inteligente por tipo de tarefa
-            if not should_show_task_by_type(tar.tipo, periodo_label, p.periodo_label):
-                continue
-        else:
-            # Para tarefas mensais, aplicar filtro de período normalmente
-            if periodo_label and p.periodo_label != periodo_label:
-                continue
-        
         # Determinar se é tarefa antiga (desativada)
         is_tarefa_antiga = not rel.versao_atual
         
@@ -180,7 +171,7 @@ def return_dashboard():
         periodo_atual = convert_period_to_label(periodo_input)
         
         # Buscar dados do usuário para filtrar por setor
-        usuario = Usuario.query.get(user_id) if user_id else None
+        usuario = usuario_atual()
         user_tipo = usuario.tipo if usuario else 'normal'
         user_setor_id = usuario.setor_id if usuario else None
         
@@ -240,7 +231,7 @@ def return_dashboard():
             resumo=resumo,
             taxa_conclusao=taxa_conclusao,
             total_tarefas=total_tarefas,
-            user_setor_nome=usuario.setor.nome if usuario and usuario.setor else 'Todos os Setores',
+            user_setor_nome=(usuario.setor_nome if usuario else None) or 'Todos os Setores',
         )
         
     except Exception as e:
@@ -260,17 +251,14 @@ def return_dashboard():
 
 
 @bp.get('/api/dashboard/empresas')
+@requer_perfil(api=True)
 def get_empresas_dashboard():
     """API para buscar empresas do dashboard"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar dados do usuário
-        usuario = Usuario.query.get(user_id)
-        user_tipo = usuario.tipo if usuario else 'normal'
-        user_setor_id = usuario.setor_id if usuario else None
+        usuario = usuario_atual()
+        user_id = usuario.id
+        user_tipo = usuario.tipo
+        user_setor_id = usuario.setor_id
         
         # Buscar empresas que têm tarefas relacionadas ao usuário - OTIMIZADA
         empresas_query = db.session.query(Empresa).join(
@@ -300,17 +288,14 @@ def get_empresas_dashboard():
 
 
 @bp.get('/api/dashboard/tarefas')
+@requer_perfil(api=True)
 def get_tarefas_dashboard():
     """API para buscar tarefas do dashboard"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar dados do usuário
-        usuario = Usuario.query.get(user_id)
-        user_tipo = usuario.tipo if usuario else 'normal'
-        user_setor_id = usuario.setor_id if usuario else None
+        usuario = usuario_atual()
+        user_id = usuario.id
+        user_tipo = usuario.tipo
+        user_setor_id = usuario.setor_id
         
         # Buscar tarefas relacionadas ao usuário - OTIMIZADA
         tarefas_query = db.session.query(Tarefa).join(
@@ -339,17 +324,14 @@ def get_tarefas_dashboard():
 
 
 @bp.get('/api/dashboard/tarefas-anuais')
+@requer_perfil(api=True)
 def get_tarefas_anuais():
     """API para buscar tarefas anuais do dashboard"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar dados do usuário
-        usuario = Usuario.query.get(user_id)
-        user_tipo = usuario.tipo if usuario else 'normal'
-        user_setor_id = usuario.setor_id if usuario else None
+        usuario = usuario_atual()
+        user_id = usuario.id
+        user_tipo = usuario.tipo
+        user_setor_id = usuario.setor_id
         
         # Buscar tarefas anuais relacionadas ao usuário
         query = db.session.query(Periodo, RelacionamentoTarefa, Tarefa, Empresa).join(
@@ -388,7 +370,13 @@ def get_tarefas_anuais():
         return jsonify({'success': False, 'message': f'Erro ao buscar tarefas anuais: {str(e)}'}), 500
 
 
+def _tags_resumo():
+    """Tags do resumo do período pedido (ETag do GET condicional)"""
+    return tags_resumo_periodo(convert_period_to_label(request.args.get('periodo', '08/2025')))
+
+
 @bp.get('/api/dashboard/resumo')
+@resposta_condicional(_tags_resumo)
 def api_resumo():
     """API para buscar resumo de tarefas do dashboard"""
     try:
@@ -490,16 +478,14 @@ def concluir_tarefa():
             return jsonify({'success': False, 'message': 'Período não encontrado'}), 404
         
         # Atualizar status
+        status_anterior = periodo.status
         periodo.status = 'concluida'
         periodo.data_conclusao = datetime.now()
         periodo.atualizado_em = datetime.now()
+        ResumoService.mudar_status(periodo, status_anterior)
         
         db.session.commit()
         
-        # Invalidar cache relacionado
-        invalidate_tarefas_cache()
-        invalidate_empresas_cache()
-        
         return jsonify({'success': True, 'message': 'Tarefa concluída com sucesso!'})
         
     except Exception as e:
@@ -524,6 +510,7 @@ def retificar_tarefa():
             return jsonify({'success': False, 'message': 'Período não encontrado'}), 404
         
         # Atualizar status e contador
+        status_anterior = periodo.status
         periodo.status = 'retificada'
         periodo.data_retificacao = datetime.now()
         periodo.contador_retificacoes = (periodo.contador_retificacoes or 0) + 1
@@ -537,13 +524,10 @@ def retificar_tarefa():
             criado_em=datetime.now()
         )
         db.session.add(retificacao)
+        ResumoService.mudar_status(periodo, status_anterior)
         
         db.session.commit()
         
-        # Invalidar cache relacionado
-        invalidate_tarefas_cache()
-        invalidate_empresas_cache()
-        
         return jsonify({'success': True, 'message': 'Tarefa retificada com sucesso!'})
         
     except Exception as e:
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, session, jsonify
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from app.db import db
 from app.models import (
     Setor, Empresa, Usuario, Tarefa, RelacionamentoTarefa, Periodo, Tributacao, 
@@ -7,9 +7,16 @@ from app.models import (
 )
 from app.utils import (
     get_previous_period, get_previous_period_label, convert_period_to_label, 
-    validate_period_format, should_show_task_by_type
+    validate_period_format
 )
+from app.services.autocomplete_service import AutocompleteService
+from app.services.cache_service import resposta_condicional, tags_resumo_periodo
+from app.services.identidade_service import requer_perfil, usuario_atual
+from app.services.referencia_service import ReferenciaService
+from app.services.resumo_service import ResumoService
+from app.services.vinculo_service import VinculoService
 from datetime import datetime, date
+from sqlalchemy import or_
 import re
 
 bp = Blueprint('gerenciamento', __name__, url_prefix='/gerenciamento')
@@ -38,7 +45,6 @@ def return_page():
         tarefa_id = request.args.get('tarefa_id')
         if tarefa_id:
             tarefa_id = int(tarefa_id)
-        user_id = session.get('user_id')
         
         # Processar múltiplas empresas
         empresa_ids_list = []
@@ -55,15 +61,14 @@ def return_page():
         periodo_atual = convert_period_to_label(periodo_input)
         
         # Buscar dados do usuário
-        usuario = Usuario.query.get(user_id) if user_id else None
+        usuario = usuario_atual()
         user_setor_id = usuario.setor_id if usuario else None
         user_setor_nome = None
         if usuario and user_setor_id:
-            setor = Setor.query.get(user_setor_id)
-            user_setor_nome = setor.nome if setor else 'N/A'
+            user_setor_nome = ReferenciaService.nome_setor(user_setor_id, 'N/A')
         
         # Buscar todas as empresas que têm tarefas
-        empresas_query = db.session.query(Empresa).join(
+        empresas_query = db.session.query(Empresa.id, Empresa.nome, Empresa.codigo).join(
             RelacionamentoTarefa, RelacionamentoTarefa.empresa_id == Empresa.id
         ).join(
             Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
@@ -89,107 +94,29 @@ def return_page():
                 'codigo': empresa.codigo
             })
         
-        # Buscar períodos para o período selecionado
-        q = db.session.query(Periodo, RelacionamentoTarefa, Tarefa, Empresa, Usuario).join(
-            RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id
-        ).join(
-            Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
-        ).join(
-            Empresa, RelacionamentoTarefa.empresa_id == Empresa.id
-        ).outerjoin(
-            Usuario, RelacionamentoTarefa.responsavel_id == Usuario.id
-        ).filter(
-            Periodo.periodo_label == periodo_atual,
-            Empresa.ativo == True,
-            RelacionamentoTarefa.status == 'ativa'
-        )
-        
         # Filtrar por setor do gerente (se for gerente)
-        if usuario and usuario.tipo == 'gerente' and usuario.setor_id:
-            q = q.filter(Tarefa.setor_id == usuario.setor_id)
-        
-        # Filtrar por empresa se selecionada
-        if empresa_atual:
-            q = q.filter(Empresa.id == empresa_atual)
-        
-        # Executar query e processar resultados
-        resultados_brutos = q.all()
-        
-        # Aplicar filtragem inteligente por tipo de tarefa
-        resultados = []
-        for p, rel, tar, emp, usu in resultados_brutos:
-            # Excluir tarefas anuais (são tratadas separadamente)
-            if tar.tipo == 'Anual':
-                continue
-            
-            # Para tarefas trimestrais, aplicar filtragem inteligente
-            if tar.tipo == 'Trimestral':
-                if not _should_show_task_by_type(tar.tipo, periodo_atual, p.periodo_label):
-                    continue
-            else:
-                # Para tarefas mensais, aplicar filtro de período normalmente
-                if p.periodo_label != periodo_atual:
-                    continue
-            
-            resultados.append((p, rel, tar, emp, usu))
-        
-        # Inicializar estruturas de dados
-        resumo = {"pendentes": 0, "fazendo": 0, "concluidas": 0}
-        empresas_resumo_map = {}
-        responsaveis_tarefas = []
-        
-        # Processar cada resultado
-        for p, rel, tar, emp, usu in resultados:
-            status = p.status or 'pendente'
-            
-            # Contar para resumo geral
-            if status == 'pendente':
-                resumo['pendentes'] += 1
-            elif status in ['concluida', 'retificada']:
-                resumo['concluidas'] += 1
-            else:
-                resumo['fazendo'] += 1
-
-            # Contar para resumo por empresa
-            key = emp.id
-            if key not in empresas_resumo_map:
-                empresas_resumo_map[key] = {
-                    "nome": emp.nome, 
-                    "pendentes": 0, 
-                    "fazendo": 0, 
-                    "concluidas": 0
-                }
-            
-            if status == 'pendente':
-                empresas_resumo_map[key]['pendentes'] += 1
-            elif status in ['concluida', 'retificada']:
-                empresas_resumo_map[key]['concluidas'] += 1
-            else:
-                empresas_resumo_map[key]['fazendo'] += 1
-            
-            # Adicionar à lista de responsáveis
-            responsaveis_tarefas.append({
-                "usuario_nome": (usu.nome if usu else 'Não atribuído'),
-                "empresa_nome": emp.nome,
-                "tarefa_nome": tar.nome,
-                "status": status,
-                "periodo_label": p.periodo_label
-            })
-        
-        # Converter map para lista
-        empresas_resumo = list(empresas_resumo_map.values())
-
-        # Ordenar por nome da empresa
-        empresas_resumo.sort(key=lambda x: x['nome'])
-        responsaveis_tarefas.sort(key=lambda x: (x['empresa_nome'], x['tarefa_nome']))
-        
-        # Calcular taxa de conclusão
-        total_tarefas = resumo['pendentes'] + resumo['fazendo'] + resumo['concluidas']
-        taxa_conclusao = (resumo['concluidas'] / total_tarefas * 100) if total_tarefas > 0 else 0
+        setor_filtro = usuario.setor_id if usuario and usuario.tipo == 'gerente' and usuario.setor_id else None
+        empresa_filtro = [empresa_atual] if empresa_atual else None
+        
+        # Cards e tabela por empresa vêm do resumo (uma consulta agregada)
+        dados_resumo = ResumoService.resumo(periodo_atual, setor_id=setor_filtro, empresa_ids=empresa_filtro)
+        resumo = dados_resumo['resumo']
+        empresas_resumo = dados_resumo['empresas_resumo']
+        taxa_conclusao = dados_resumo['taxa_conclusao']
+        
+        # Visão por responsável (apenas as colunas exibidas)
+        responsaveis_tarefas = [{
+            "usuario_nome": tarefa.usuario_nome,
+            "empresa_nome": tarefa.empresa_nome,
+            "tarefa_nome": tarefa.tarefa_nome,
+            "status": tarefa.status,
+            "periodo_label": tarefa.periodo_label,
+            "contador_retificacoes": tarefa.contador_retificacoes
+        } for tarefa in ResumoService.listar_tarefas(periodo_atual, setor_id=setor_filtro, empresa_ids=empresa_filtro)]
         
         # Debug: Log dos dados encontrados
         print(f"DEBUG GERENCIAMENTO - Período: {periodo_atual}, Empresa: {empresa_atual}")
-        print(f"DEBUG GERENCIAMENTO - Resultados encontrados: {len(resultados)}")
+        print(f"DEBUG GERENCIAMENTO - Resultados encontrados: {len(responsaveis_tarefas)}")
         print(f"DEBUG GERENCIAMENTO - Resumo: {resumo}")
         print(f"DEBUG GERENCIAMENTO - Empresas resumo: {len(empresas_resumo)}")
         print(f"DEBUG GERENCIAMENTO - Responsáveis: {len(responsaveis_tarefas)}")
@@ -250,39 +177,22 @@ def api_empresas():
     """API para buscar empresas para o painel do gerente"""
     try:
         search = request.args.get('search', '').strip()
-        user_id = session.get('user_id')
-        usuario = Usuario.query.get(user_id) if user_id else None
-        
-        # Buscar empresas que têm tarefas ativas
-        query = db.session.query(Empresa).join(
-            RelacionamentoTarefa, RelacionamentoTarefa.empresa_id == Empresa.id
-        ).join(
-            Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
-        ).filter(
-            Empresa.ativo == True,
-            RelacionamentoTarefa.status == 'ativa'
+        usuario = usuario_atual()
+        
+        # Empresas com tarefas ativas, do índice de autocomplete; gerente vê só
+        # as que têm tarefa ativa do seu setor
+        setor_id = usuario.setor_id if usuario and usuario.tipo == 'gerente' and usuario.setor_id else None
+        empresas = AutocompleteService.buscar(
+            'empresas', search, limite=50, setor_id=setor_id,
+            filtro=lambda empresa: empresa['tem_tarefas_ativas']
         )
         
-        # Filtrar por setor do gerente (se for gerente)
-        if usuario and usuario.tipo == 'gerente' and usuario.setor_id:
-            query = query.filter(Tarefa.setor_id == usuario.setor_id)
-        
-        query = query.distinct()
-        
-        if search:
-            query = query.filter(
-                (Empresa.nome.contains(search)) | 
-                (Empresa.codigo.contains(search))
-            )
-        
-        empresas = query.order_by(Empresa.nome).limit(50).all()
-        
         empresas_data = []
         for empresa in empresas:
             empresas_data.append({
-                'id': empresa.id,
-                'nome': empresa.nome,
-                'codigo': empresa.codigo
+                'id': empresa['id'],
+                'nome': empresa['nome'],
+                'codigo': empresa['codigo']
             })
         
         return jsonify({
@@ -341,8 +251,7 @@ def api_tarefas():
     """API para buscar tarefas para o painel do gerente"""
     try:
         search = request.args.get('search', '').strip()
-        user_id = session.get('user_id')
-        usuario = Usuario.query.get(user_id) if user_id else None
+        usuario = usuario_atual()
         
         # Buscar tarefas
         query = db.session.query(Tarefa)
@@ -380,7 +289,13 @@ def api_tarefas():
         }), 500
 
 
+def _tags_resumo():
+    """Tags do resumo do período pedido (ETag do GET condicional)"""
+    return tags_resumo_periodo(convert_period_to_label(request.args.get('periodo', '08/2025')))
+
+
 @bp.get('/api/resumo')
+@resposta_condicional(_tags_resumo)
 def api_resumo():
     """API para buscar resumo de dados por período e empresa"""
     try:
@@ -405,128 +320,58 @@ def api_resumo():
         
         periodo_atual = convert_period_to_label(periodo_input)
         
-        # Buscar dados
-        q = db.session.query(Periodo, RelacionamentoTarefa, Tarefa, Empresa, Usuario).join(
-            RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id
-        ).join(
-            Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
-        ).join(
-            Empresa, RelacionamentoTarefa.empresa_id == Empresa.id
-        ).outerjoin(
-            Usuario, RelacionamentoTarefa.responsavel_id == Usuario.id
-        ).filter(
-            Empresa.ativo == True,
-            RelacionamentoTarefa.status == 'ativa'
-        )
-        
         # Filtrar por empresa(s) se especificada(s)
+        empresa_id_list = None
         if empresa_ids:
-            empresa_id_list = [int(id.strip()) for id in empresa_ids.split(',') if id.strip()]
-            if empresa_id_list:
-                q = q.filter(Empresa.id.in_(empresa_id_list))
+            empresa_id_list = [int(id.strip()) for id in empresa_ids.split(',') if id.strip()] or None
         elif empresa_id:
-            q = q.filter(Empresa.id == empresa_id)
-        
-        # Filtrar por colaborador se especificado
-        if colaborador_id:
-            q = q.filter(Usuario.id == colaborador_id)
-        
-        # Filtrar por tarefa se especificada
-        if tarefa_id:
-            q = q.filter(Tarefa.id == tarefa_id)
+            empresa_id_list = [empresa_id]
         
         # Filtrar por setor do gerente (se for gerente)
-        user_id = session.get('user_id')
-        usuario = Usuario.query.get(user_id) if user_id else None
-        if usuario and usuario.tipo == 'gerente' and usuario.setor_id:
-            q = q.filter(Tarefa.setor_id == usuario.setor_id)
-        
-        # Executar query
-        resultados_brutos = q.all()
+        usuario = usuario_atual()
+        setor_filtro = usuario.setor_id if usuario and usuario.tipo == 'gerente' and usuario.setor_id else None
+        
+        tarefas = ResumoService.listar_tarefas(
+            periodo_atual,
+            setor_id=setor_filtro,
+            empresa_ids=empresa_id_list,
+            responsavel_id=colaborador_id,
+            tarefa_id=tarefa_id
+        )
         
-        # Aplicar filtragem inteligente por tipo de tarefa
-        resultados = []
-        for p, rel, tar, emp, usu in resultados_brutos:
-            # Excluir tarefas anuais (são tratadas separadamente)
-            if tar.tipo == 'Anual':
-                continue
-            
-            # Para tarefas trimestrais, aplicar filtragem inteligente
-            if tar.tipo == 'Trimestral':
-                if not _should_show_task_by_type(tar.tipo, periodo_atual, p.periodo_label):
-                    continue
-            else:
-                # Para tarefas mensais, aplicar filtro de período normalmente
-                if p.periodo_label != periodo_atual:
-                    continue
-            
-            resultados.append((p, rel, tar, emp, usu))
+        # O resumo não tem a dimensão tarefa: nesse filtro, agregar a lista detalhada
+        if tarefa_id:
+            dados_resumo = ResumoService.resumo_de_tarefas(tarefas)
+        else:
+            dados_resumo = ResumoService.resumo(
+                periodo_atual,
+                setor_id=setor_filtro,
+                empresa_ids=empresa_id_list,
+                responsavel_id=colaborador_id
+            )
+        resumo = dados_resumo['resumo']
+        empresas_resumo = dados_resumo['empresas_resumo']
+        taxa_conclusao = dados_resumo['taxa_conclusao']
         
-        # Processar resultados
-        resumo = {"pendentes": 0, "fazendo": 0, "concluidas": 0}
-        empresas_resumo_map = {}
         responsaveis_tarefas = []
-        
-        for p, rel, tar, emp, usu in resultados:
-            status = p.status or 'pendente'
-            
-            if status == 'pendente':
-                resumo['pendentes'] += 1
-            elif status in ['concluida', 'retificada']:
-                resumo['concluidas'] += 1
-            else:
-                resumo['fazendo'] += 1
-            
-            # Resumo por empresa
-            key = emp.id
-            if key not in empresas_resumo_map:
-                empresas_resumo_map[key] = {
-                    "nome": emp.nome, 
-                    "pendentes": 0, 
-                    "fazendo": 0, 
-                    "concluidas": 0
-                }
-            
-            if status == 'pendente':
-                empresas_resumo_map[key]['pendentes'] += 1
-            elif status in ['concluida', 'retificada']:
-                empresas_resumo_map[key]['concluidas'] += 1
-            else:
-                empresas_resumo_map[key]['fazendo'] += 1
-            
-            # Lista de responsáveis
-            contador_retificacoes = getattr(p, 'contador_retificacoes', 0) if hasattr(p, 'contador_retificacoes') else 0
-            
+        for tarefa in tarefas:
             # Converter período de AAAA-MM para MM/AAAA
-            if p.periodo_label and len(p.periodo_label) >= 7:
-                ano = p.periodo_label[:4]  # AAAA
-                mes = p.periodo_label[5:7]  # MM
+            if tarefa.periodo_label and len(tarefa.periodo_label) >= 7:
+                ano = tarefa.periodo_label[:4]  # AAAA
+                mes = tarefa.periodo_label[5:7]  # MM
                 periodo_brasileiro = f"{mes}/{ano}"
             else:
-                periodo_brasileiro = p.periodo_label or ''
+                periodo_brasileiro = tarefa.periodo_label or ''
             
             responsaveis_tarefas.append({
-                "usuario_nome": (usu.nome if usu else 'Não atribuído'),
-                "empresa_nome": emp.nome,
-                "tarefa_nome": tar.nome,
-                "status": status,
+                "usuario_nome": tarefa.usuario_nome,
+                "empresa_nome": tarefa.empresa_nome,
+                "tarefa_nome": tarefa.tarefa_nome,
+                "status": tarefa.status,
                 "periodo_label": periodo_brasileiro,
-                "contador_retificacoes": contador_retificacoes
+                "contador_retificacoes": tarefa.contador_retificacoes
             })
         
-        # Calcular taxa de conclusão para cada empresa
-        for empresa in empresas_resumo_map.values():
-            total = empresa['pendentes'] + empresa['fazendo'] + empresa['concluidas']
-            empresa['taxa_conclusao'] = (empresa['concluidas'] / total * 100) if total > 0 else 0
-        
-        empresas_resumo = list(empresas_resumo_map.values())
-        empresas_resumo.sort(key=lambda x: x['nome'])
-        responsaveis_tarefas.sort(key=lambda x: (x['empresa_nome'], x['tarefa_nome']))
-        
-        # Calcular taxa de conclusão
-        total_tarefas = len(resultados)
-        taxa_conclusao = (resumo['concluidas'] / total_tarefas * 100) if total_tarefas > 0 else 0
-        
         return jsonify({
             'success': True,
             'resumo': resumo,
@@ -534,7 +379,7 @@ def api_resumo():
             'empresas_resumo': empresas_resumo,
             'responsaveis_tarefas': responsaveis_tarefas,
             'periodo': periodo_atual,
-            'total_encontrados': len(resultados)
+            'total_encontrados': dados_resumo['total']
         })
         
     except Exception as e:
@@ -545,17 +390,13 @@ def api_resumo():
 
 
 @bp.get('/api/tarefas-anuais')
+@requer_perfil(api=True)
 def api_tarefas_anuais():
     """API para buscar tarefas anuais do painel do gerente"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Buscar dados do usuário
-        usuario = Usuario.query.get(user_id)
-        user_tipo = usuario.tipo if usuario else 'normal'
-        user_setor_id = usuario.setor_id if usuario else None
+        usuario = usuario_atual()
+        user_tipo = usuario.tipo
+        user_setor_id = usuario.setor_id
         
         # Buscar tarefas anuais relacionadas ao setor do gerente
         query = db.session.query(Periodo, RelacionamentoTarefa, Tarefa, Empresa, Usuario).join(
@@ -600,10 +441,9 @@ def api_tarefas_anuais():
 def api_setores():
     """API para buscar setores"""
     try:
-        setores = Setor.query.all()
         return jsonify({
             'success': True,
-            'setores': [{'id': s.id, 'nome': s.nome} for s in setores]
+            'setores': ReferenciaService.como_dicts(ReferenciaService.setores())
         })
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erro ao buscar setores: {str(e)}'}), 500
@@ -613,27 +453,19 @@ def api_setores():
 def api_tributacoes():
     """API para buscar tributações"""
     try:
-        tributacoes = Tributacao.query.all()
         return jsonify({
             'success': True,
-            'tributacoes': [{'id': t.id, 'nome': t.nome} for t in tributacoes]
+            'tributacoes': ReferenciaService.como_dicts(ReferenciaService.tributacoes())
         })
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erro ao buscar tributações: {str(e)}'}), 500
 
 
 @bp.post('/api/tarefas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_criar_tarefa():
     """API para criar nova tarefa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         nome = data.get('nome')
         tipo = data.get('tipo')
@@ -670,17 +502,10 @@ def api_criar_tarefa():
 
 
 @bp.post('/api/periodos')
+@requer_perfil('admin', 'gerente', api=True)
 def api_criar_periodo():
     """API para criar período mensal"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         empresa_id = data.get('empresa_id')
         ano = data.get('ano')
@@ -731,17 +556,10 @@ def api_criar_periodo():
 
 
 @bp.post('/api/vincular-responsavel')
+@requer_perfil('admin', 'gerente', api=True)
 def api_vincular_responsavel():
     """API para vincular responsável a tarefas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         empresa_id = data.get('empresa_id')
         responsavel_id = data.get('responsavel_id')
@@ -788,17 +606,10 @@ def api_vincular_responsavel():
 # ===== APIs PARA GERENCIAMENTO DE TRIBUTAÇÃO =====
 
 @bp.get('/api/empresas-tributacao')
+@requer_perfil('admin', 'gerente', api=True)
 def api_empresas_tributacao():
     """API para buscar empresas com mudança de tributação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         # Por enquanto, retornar lista vazia pois não há mudanças de tributação pendentes
         # Quando houver mudanças reais, implementar a busca abaixo:
         empresas_data = []
@@ -822,17 +633,10 @@ def api_empresas_tributacao():
 
 
 @bp.get('/api/tarefas-empresa/<int:empresa_id>')
+@requer_perfil('admin', 'gerente', api=True)
 def api_tarefas_empresa(empresa_id):
     """API para buscar tarefas de uma empresa específica"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         # Buscar tarefas vinculadas à empresa
         tarefas = db.session.query(Tarefa, RelacionamentoTarefa).join(
             RelacionamentoTarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
@@ -846,7 +650,7 @@ def api_tarefas_empresa(empresa_id):
             # Buscar informação da tributação
             tributacao_nome = 'Sem tributação específica'
             if tarefa.tributacao_id:
-                tributacao = Tributacao.query.get(tarefa.tributacao_id)
+                tributacao = ReferenciaService.tributacao(tarefa.tributacao_id)
                 if tributacao:
                     tributacao_nome = tributacao.nome
             
@@ -868,17 +672,10 @@ def api_tarefas_empresa(empresa_id):
 
 
 @bp.post('/api/reconfigurar-tributacao')
+@requer_perfil('admin', 'gerente', api=True)
 def api_reconfigurar_tributacao():
     """API para reconfigurar tarefas após mudança de tributação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         empresa_id = data.get('empresa_id')
         tarefa_ids = data.get('tarefa_ids', [])
@@ -928,6 +725,7 @@ def api_reconfigurar_tributacao():
         # Marcar histórico como processado
         historico.status = 'processada'
         historico.data_processamento = datetime.now()
+        ResumoService.reconstruir(empresa_ids=[empresa_id], commit=False)
         
         db.session.commit()
         
@@ -943,16 +741,11 @@ def api_reconfigurar_tributacao():
 
 
 @bp.get('/api/usuarios-busca')
+@requer_perfil('admin', 'gerente', api=True)
 def api_usuarios_busca():
     """API para busca avançada de usuários"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         search = request.args.get('search', '').strip()
         
@@ -997,17 +790,11 @@ def api_usuarios_busca():
 # ===== PAINEL DE MUDANÇAS DE TRIBUTAÇÃO =====
 
 @bp.get('/mudancas-tributacao')
+@requer_perfil('admin', 'gerente')
 def mudancas_tributacao():
     """Painel do gerente para revisar mudanças de tributação pendentes"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login_page'))
+        usuario = usuario_atual()
         
         # Buscar mudanças pendentes - usar SQL puro para evitar conflito de JOINs
         from sqlalchemy import text
@@ -1067,10 +854,10 @@ def mudancas_tributacao():
             trib_nova = None
             
             if mudanca.tributacao_anterior_id:
-                trib_anterior = Tributacao.query.get(mudanca.tributacao_anterior_id)
+                trib_anterior = ReferenciaService.tributacao(mudanca.tributacao_anterior_id)
             
             if mudanca.tributacao_nova_id:
-                trib_nova = Tributacao.query.get(mudanca.tributacao_nova_id)
+                trib_nova = ReferenciaService.tributacao(mudanca.tributacao_nova_id)
             # Buscar tarefas sem responsável da nova tributação
             tarefas_query = db.session.query(RelacionamentoTarefa, Tarefa).join(
                 Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
@@ -1106,17 +893,11 @@ def mudancas_tributacao():
 
 
 @bp.get('/api/mudancas-tributacao')
+@requer_perfil('admin', 'gerente', api=True)
 def api_mudancas_tributacao():
     """API para buscar mudanças de tributação pendentes"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         # Filtrar mudanças baseado no tipo de usuário
         if usuario.tipo == 'gerente' and usuario.setor_id:
@@ -1166,17 +947,11 @@ def api_mudancas_tributacao():
 
 
 @bp.get('/api/mudanca-tributacao/<int:mudanca_id>/tarefas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_tarefas_mudanca_tributacao(mudanca_id):
     """API para buscar tarefas sem responsável de uma mudança de tributação (filtradas por setor do gerente)"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         mudanca = MudancaTributacaoPendente.query.get(mudanca_id)
         if not mudanca:
@@ -1234,17 +1009,11 @@ def api_tarefas_mudanca_tributacao(mudanca_id):
 
 
 @bp.post('/api/atualizar-responsavel-relacionamentos')
+@requer_perfil('admin', 'gerente', api=True)
 def api_atualizar_responsavel_relacionamentos():
     """API para atualizar responsável de múltiplos relacionamentos (mudanças de tributação)"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         dados = request.get_json()
         relacionamentos = dados.get('relacionamentos', [])
@@ -1256,6 +1025,7 @@ def api_atualizar_responsavel_relacionamentos():
             return jsonify({'success': False, 'message': 'Nenhum relacionamento fornecido'}), 400
         
         atualizados = 0
+        empresas_afetadas = set()
         empresa_id = None
         erros = []
         
@@ -1290,6 +1060,7 @@ def api_atualizar_responsavel_relacionamentos():
             
             # Atualizar responsável
             rel.responsavel_id = responsavel_id
+            empresas_afetadas.add(rel.empresa_id)
             if not empresa_id:
                 empresa_id = rel.empresa_id
             atualizados += 1
@@ -1317,6 +1088,7 @@ def api_atualizar_responsavel_relacionamentos():
                     mudanca.data_revisao = datetime.now()
                     mudanca_concluida = True
         
+        ResumoService.reconstruir(empresa_ids=empresas_afetadas, commit=False)
         db.session.commit()
         
         return jsonify({
@@ -1332,17 +1104,11 @@ def api_atualizar_responsavel_relacionamentos():
 
 
 @bp.post('/api/desativar-tarefas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_desativar_tarefas():
     """API para desativar tarefas (marcar como não vinculadas)"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         dados = request.get_json()
         relacionamentos_ids = dados.get('relacionamentos_ids', [])
@@ -1397,17 +1163,11 @@ def api_desativar_tarefas():
 
 
 @bp.post('/api/vincular-responsavel-mudanca')
+@requer_perfil('admin', 'gerente', api=True)
 def api_vincular_responsavel_mudanca():
     """API para vincular responsável às tarefas de uma mudança de tributação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         data = request.get_json()
         mudanca_id = data.get('mudanca_id')
@@ -1427,6 +1187,7 @@ def api_vincular_responsavel_mudanca():
             return jsonify({'success': False, 'message': 'Responsável não encontrado'}), 404
         
         vinculacoes_criadas = 0
+        empresas_afetadas = set()
         
         for tarefa_data in tarefas:
             relacionamento_id = tarefa_data.get('relacionamento_id')
@@ -1440,6 +1201,7 @@ def api_vincular_responsavel_mudanca():
             
             # Vincular responsável
             rel.responsavel_id = responsavel_id
+            empresas_afetadas.add(rel.empresa_id)
             vinculacoes_criadas += 1
         
         # Marcar mudança como em revisão se ainda estiver pendente
@@ -1448,6 +1210,7 @@ def api_vincular_responsavel_mudanca():
             mudanca.revisado_por = user_id
             mudanca.data_revisao = datetime.now()
         
+        ResumoService.reconstruir(empresa_ids=empresas_afetadas, commit=False)
         db.session.commit()
         
         return jsonify({
@@ -1461,17 +1224,11 @@ def api_vincular_responsavel_mudanca():
 
 
 @bp.post('/api/verificar-concluir-mudanca')
+@requer_perfil('admin', 'gerente', api=True)
 def api_verificar_concluir_mudanca():
     """API para verificar e concluir mudança de tributação se todas as tarefas foram processadas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         data = request.get_json()
         mudanca_id = data.get('mudanca_id')
@@ -1516,17 +1273,11 @@ def api_verificar_concluir_mudanca():
 
 
 @bp.post('/api/concluir-mudanca-tributacao')
+@requer_perfil('admin', 'gerente', api=True)
 def api_concluir_mudanca_tributacao():
     """API para concluir uma mudança de tributação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é gerente ou admin
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         data = request.get_json()
         mudanca_id = data.get('mudanca_id')
@@ -1584,16 +1335,11 @@ def api_concluir_mudanca_tributacao():
 # ===== GESTÃO DE TAREFAS ANUAIS =====
 
 @bp.get('/tarefas-anuais')
+@requer_perfil('admin', 'gerente')
 def painel_tarefas_anuais():
     """Painel específico para gerenciar tarefas anuais"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login_page'))
+        usuario = usuario_atual()
         
         print(f"✅ [Tarefas Anuais] Renderizando painel para {usuario.nome}")
         return render_template('gerenciamento_tarefas_anuais.html', usuario=usuario)
@@ -1604,16 +1350,11 @@ def painel_tarefas_anuais():
 
 
 @bp.get('/api/tarefas-anuais-disponiveis')
+@requer_perfil('admin', 'gerente', api=True)
 def api_tarefas_anuais_disponiveis():
     """API para buscar tarefas anuais disponíveis para vinculação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         # Buscar tarefas anuais
         query = Tarefa.query.filter(Tarefa.tipo == 'Anual')
@@ -1642,16 +1383,11 @@ def api_tarefas_anuais_disponiveis():
 
 
 @bp.post('/api/vincular-tarefa-anual')
+@requer_perfil('admin', 'gerente', api=True)
 def api_vincular_tarefa_anual():
     """API para vincular uma tarefa anual a um usuário e empresas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         data = request.get_json()
         tarefa_id = data.get('tarefa_id')
@@ -1679,56 +1415,30 @@ def api_vincular_tarefa_anual():
             if tarefa.setor_id != usuario.setor_id:
                 return jsonify({'success': False, 'message': 'Tarefa não pertence ao seu setor'}), 403
         
-        criados = 0
-        duplicados = 0
-        erros = []
+        try:
+            ano = int(ano)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Ano inválido'}), 400
+        
+        inicio_ano = date(ano, 1, 1)
+        fim_ano = date(ano, 12, 31)
+        
+        # Vinculação ativa cuja vigência cobre algum dia do ano conta como duplicada
+        resultado = VinculoService.vincular_tarefa(
+            tarefa,
+            empresas_ids,
+            funcionario.id,
+            valores={'data_inicio': inicio_ano, 'data_fim': fim_ano},
+            criterios=[
+                or_(RelacionamentoTarefa.data_inicio.is_(None), RelacionamentoTarefa.data_inicio <= fim_ano),
+                or_(RelacionamentoTarefa.data_fim.is_(None), RelacionamentoTarefa.data_fim >= inicio_ano)
+            ]
+        )
         
-        for empresa_id in empresas_ids:
-            try:
-                empresa = Empresa.query.get(empresa_id)
-                if not empresa or not empresa.ativo:
-                    erros.append(f'Empresa ID {empresa_id} não encontrada ou inativa')
-                    continue
-                
-                # Verificar compatibilidade de tributação
-                if not tarefa.tarefa_comum:
-                    if tarefa.tributacao_id and empresa.tributacao_id != tarefa.tributacao_id:
-                        erros.append(f'{empresa.nome}: tributação incompatível')
-                        continue
-                
-                # Verificar se já existe vinculação ativa para esta tarefa+empresa no ano
-                vinculacao_existente = RelacionamentoTarefa.query.filter_by(
-                    empresa_id=empresa_id,
-                    tarefa_id=tarefa_id,
-                    versao_atual=True,
-                    status='ativa'
-                ).filter(
-                    RelacionamentoTarefa.periodo.like(f'{ano}%')
-                ).first()
-                
-                if vinculacao_existente:
-                    duplicados += 1
-                    continue
-                
-                # Criar vinculação para o ano todo (usar período como YYYY)
-                novo_rel = RelacionamentoTarefa(
-                    empresa_id=empresa_id,
-                    tarefa_id=tarefa_id,
-                    responsavel_id=funcionario_id,
-                    periodo=str(ano),  # Armazenar só o ano
-                    versao_atual=True,
-                    status='ativa',
-                    data_inicio=date(ano, 1, 1),
-                    data_fim=date(ano, 12, 31)
-                )
-                
-                db.session.add(novo_rel)
-                criados += 1
-                print(f"✅ [Tarefa Anual] Criada: {empresa.nome} → {tarefa.nome} → {funcionario.nome} (Ano: {ano})")
-                
-            except Exception as e:
-                erros.append(f'Empresa ID {empresa_id}: {str(e)}')
-                continue
+        erros = [f'Empresa ID {empresa_id} não encontrada ou inativa' for empresa_id in resultado['invalidas']]
+        erros.extend(f'{empresa.nome}: tributação incompatível' for empresa in resultado['incompativeis'])
+        criados = len(resultado['criados'])
+        duplicados = len(resultado['duplicados'])
         
         # Commit
         try:
@@ -0,0 +1,66 @@
+from flask import Blueprint, jsonify, send_file, url_for
+from app.db import db
+from app.models import Job
+from app.services.identidade_service import usuario_atual
+from app.services.job_service import JobService
+import os
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+
+def pedido_assincrono(valor):
+    """Interpreta o parâmetro `async` de query string, formulário ou JSON"""
+    return valor in (True, 1, '1', 'true', 'on')
+
+
+def resposta_job_enfileirado(job):
+    """Resposta padrão (202) dos endpoints em modo assíncrono"""
+    return jsonify({
+        'success': True,
+        'message': 'Processamento agendado',
+        'job_id': job.id,
+        'status_url': url_for('jobs.status_job', job_id=job.id)
+    }), 202
+
+
+def _buscar_job(job_id):
+    """Carrega o job verificando se o usuário logado pode vê-lo (dono ou admin; sem dono, só admin)"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return None, (jsonify({'success': False, 'message': 'Job não encontrado'}), 404)
+    usuario = usuario_atual()
+    if usuario is None:
+        return None, (jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401)
+    if usuario.tipo != 'admin' and job.criado_por != usuario.id:
+        return None, (jsonify({'success': False, 'message': 'Acesso negado'}), 403)
+    return job, None
+
+
+@bp.get('/<int:job_id>')
+def status_job(job_id):
+    """Andamento de um job (para polling)"""
+    job, erro = _buscar_job(job_id)
+    if erro:
+        return erro
+
+    dados = JobService.status(job)
+    if job.arquivo:
+        dados['arquivo_url'] = url_for('jobs.arquivo_job', job_id=job.id)
+    return jsonify({'success': True, 'job': dados})
+
+
+@bp.get('/<int:job_id>/arquivo')
+def arquivo_job(job_id):
+    """Download do artefato gerado por um job concluído"""
+    job, erro = _buscar_job(job_id)
+    if erro:
+        return erro
+    if job.status != 'concluida' or not job.arquivo or not os.path.exists(job.arquivo):
+        return jsonify({'success': False, 'message': 'Arquivo não disponível'}), 404
+
+    return send_file(
+        job.arquivo,
+        mimetype=job.mimetype or 'application/octet-stream',
+        as_attachment=True,
+        download_name=job.nome_arquivo or os.path.basename(job.arquivo)
+    )
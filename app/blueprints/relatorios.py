@@ -1,26 +1,24 @@
-from flask import Blueprint, render_template, request, jsonify, make_response, session
+from flask import Blueprint, current_app, render_template, request, jsonify, send_file, session, Response, stream_with_context
 from app.models import Empresa, Tarefa, RelacionamentoTarefa, Periodo, Usuario
 from app.db import db
+from app.services.relatorio_service import RelatorioService, CursorInvalido, formatar_linha
+from app.services.job_service import JobService
+from app.services.identidade_service import usuario_atual
+from app.blueprints.jobs import pedido_assincrono, resposta_job_enfileirado
 from datetime import datetime, timedelta
-import json
-import io
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.pdfgen import canvas
+import tempfile
 
 bp = Blueprint('relatorios', __name__, url_prefix='/relatorios')
 
+# Acima disso o XLSX em montagem vai para disco
+TAMANHO_MAXIMO_XLSX_EM_MEMORIA = 5 * 1024 * 1024
+
 
 @bp.get('/anuais')
 def relatorio_anuais():
 	"""Página de relatório de tarefas anuais"""
 	# Buscar dados do usuário logado
-	user_id = session.get('user_id')
-	usuario_logado = Usuario.query.get(user_id) if user_id else None
+	usuario_logado = usuario_atual()
 	
 	# Filtrar empresas baseado no setor do gerente
 	if usuario_logado and usuario_logado.tipo == 'gerente' and usuario_logado.setor_id:
@@ -79,8 +77,7 @@ def relatorio_anuais():
 def return_page():
 	"""Página principal de relatórios"""
 	# Buscar dados do usuário logado
-	user_id = session.get('user_id')
-	usuario_logado = Usuario.query.get(user_id) if user_id else None
+	usuario_logado = usuario_atual()
 	
 	# Filtrar empresas baseado no setor do gerente
 	if usuario_logado and usuario_logado.tipo == 'gerente' and usuario_logado.setor_id:
@@ -114,8 +111,7 @@ def api_dados_relatorio_anuais():
 		ano = request.args.get('ano', '2025')
 		
 		# Buscar dados do usuário logado
-		user_id = session.get('user_id')
-		usuario_logado = Usuario.query.get(user_id) if user_id else None
+		usuario_logado = usuario_atual()
 		
 		# Query base para tarefas anuais
 		query = db.session.query(Periodo, RelacionamentoTarefa, Tarefa, Empresa, Usuario).join(
@@ -189,93 +185,42 @@ def api_dados_relatorio_anuais():
 
 @bp.get('/api/dados')
 def api_dados_relatorio():
-	"""API para buscar dados do relatório baseado nos filtros"""
+	"""
+	API para buscar dados do relatório baseado nos filtros
+
+	Com `limite` ou `cursor` responde uma página (ordenada por empresa,
+	início desc e id) e o `proximo_cursor` para a seguinte; as estatísticas
+	vêm de um GROUP BY e só são calculadas na primeira página.
+	"""
 	try:
-		# Parâmetros da requisição
-		empresa_id = request.args.get('empresa_id', type=int)
-		funcionario_id = request.args.get('funcionario_id', type=int)
-		tarefa_id = request.args.get('tarefa_id', type=int)
-		data_inicial = request.args.get('data_inicial')
-		data_final = request.args.get('data_final')
-		status = request.args.get('status', 'todos')
-		
-		# Buscar dados do usuário logado
-		user_id = session.get('user_id')
-		usuario_logado = Usuario.query.get(user_id) if user_id else None
-		
-		# Construir query base
-		query = db.session.query(
-			Periodo.id,
-			Empresa.nome.label('empresa_nome'),
-			Tarefa.nome.label('tarefa_nome'),
-			Tarefa.tipo.label('tarefa_tipo'),
-			Periodo.periodo_label,
-			Periodo.status,
-			Periodo.data_conclusao,
-			Periodo.data_retificacao,
-			RelacionamentoTarefa.prazo_especifico,
-			Usuario.nome.label('responsavel_nome')
-		).join(RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id)\
-		 .join(Empresa, RelacionamentoTarefa.empresa_id == Empresa.id)\
-		 .join(Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id)\
-		 .outerjoin(Usuario, RelacionamentoTarefa.responsavel_id == Usuario.id)
-		
-		# Filtrar por setor do gerente (se for gerente)
-		if usuario_logado and usuario_logado.tipo == 'gerente' and usuario_logado.setor_id:
-			query = query.filter(Tarefa.setor_id == usuario_logado.setor_id)
-		
-		# Aplicar filtros
-		if empresa_id:
-			query = query.filter(RelacionamentoTarefa.empresa_id == empresa_id)
-		
-		if funcionario_id:
-			query = query.filter(RelacionamentoTarefa.responsavel_id == funcionario_id)
-		
-		if tarefa_id:
-			query = query.filter(RelacionamentoTarefa.tarefa_id == tarefa_id)
-		
-		if status != 'todos':
-			query = query.filter(Periodo.status == status)
-		
-		# Aplicar filtros de período
-		if data_inicial and data_final:
-			from datetime import datetime
-			data_inicio = datetime.strptime(data_inicial, '%Y-%m-%d').date()
-			data_fim = datetime.strptime(data_final, '%Y-%m-%d').date()
-			query = query.filter(Periodo.inicio.between(data_inicio, data_fim))
-		
-		# Executar query
-		resultados = query.order_by(Empresa.nome, Periodo.inicio.desc()).all()
-		
-		# Converter para dicionários
-		dados = []
-		for r in resultados:
-			# Usar data de retificação se houver, senão usar data de conclusão
-			data_final = r.data_retificacao if r.data_retificacao else r.data_conclusao
-			label_data = 'Retificação' if r.data_retificacao else 'Conclusão'
+		filtros = _filtros_relatorio()
+		cursor = request.args.get('cursor')
+		limite = request.args.get('limite', type=int)
+		
+		if cursor or limite:
+			try:
+				pagina = RelatorioService.pagina(filtros, cursor=cursor, limite=limite)
+			except CursorInvalido as e:
+				return jsonify({'success': False, 'error': str(e)}), 400
 			
-			dados.append({
-				'id': r.id,
-				'empresa_nome': r.empresa_nome,
-				'tarefa_nome': r.tarefa_nome,
-				'tarefa_tipo': r.tarefa_tipo,
-				'periodo': r.periodo_label,
-				'periodo_formatado': r.periodo_label,
-				'status': r.status,
-				'status_texto': _get_status_texto(r.status),
-				'data_conclusao': data_final.strftime('%d/%m/%Y') if data_final else '',
-				'label_data': label_data,
-				'prazo_especifico': r.prazo_especifico.strftime('%d/%m/%Y') if r.prazo_especifico else '',
-				'responsavel_nome': r.responsavel_nome or 'Não atribuído'
-			})
-		
-		# Calcular estatísticas
-		stats = _calcular_estatisticas(dados)
+			resposta = {
+				'success': True,
+				'dados': pagina['dados'],
+				'proximo_cursor': pagina['proximo_cursor'],
+				'tem_mais': pagina['tem_mais']
+			}
+			if not cursor:
+				stats = RelatorioService.estatisticas(filtros)
+				resposta['stats'] = stats
+				resposta['total_registros'] = stats['total']
+			return jsonify(resposta)
+		
+		dados = [formatar_linha(r) for r in RelatorioService.ordenada(filtros)]
 		
 		return jsonify({
 			'success': True,
 			'dados': dados,
-			'stats': stats,
+			'stats': RelatorioService.estatisticas(filtros),
 			'total_registros': len(dados)
 		})
 		
@@ -288,118 +233,96 @@ def api_dados_relatorio():
 
 @bp.get('/pdf')
 def gerar_pdf():
-	"""Gerar relatório em PDF"""
+	"""
+	Gerar relatório em PDF
+
+	O PDF é montado a partir de lotes lidos do banco em um arquivo temporário
+	e enviado ao cliente em streaming; o arquivo some ao fechar a resposta.
+	Com `async=1`, ou sem `async` quando o relatório passa de
+	RELATORIO_PDF_SINCRONO_MAX linhas, a geração vai para um job (202) e o
+	PDF fica disponível em /api/jobs/<id>/arquivo; `async=0` força a geração
+	na requisição.
+	"""
 	try:
-		# Parâmetros da requisição
-		empresa_id = request.args.get('empresa_id', type=int)
-		funcionario_id = request.args.get('funcionario_id', type=int)
-		tarefa_id = request.args.get('tarefa_id', type=int)
-		data_inicial = request.args.get('data_inicial')
-		data_final = request.args.get('data_final')
-		status = request.args.get('status', 'todos')
-		
-		# Buscar dados (a função api_dados_relatorio já aplica o filtro de setor)
-		response = api_dados_relatorio()
-		if response[1] != 200:  # Se houve erro
-			return response
-		
-		data = response[0].get_json()
-		if not data['success']:
-			return jsonify({'error': data['error']}), 500
-		
-		# Criar PDF
-		buffer = io.BytesIO()
-		doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-		
-		# Estilos
-		styles = getSampleStyleSheet()
-		title_style = ParagraphStyle(
-			'CustomTitle',
-			parent=styles['Heading1'],
-			fontSize=16,
-			spaceAfter=30,
-			alignment=TA_CENTER,
-			textColor=colors.darkblue
+		filtros = _filtros_relatorio()
+		filtros_texto = _gerar_texto_filtros(
+			filtros['empresa_id'], filtros['funcionario_id'], filtros['tarefa_id'],
+			request.args.get('data_inicial'), request.args.get('data_final'), filtros['status']
 		)
+		nome_arquivo = f'relatorio_tarefas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
 		
-		# Conteúdo do PDF
-		story = []
-		
-		# Título
-		story.append(Paragraph("Relatório de Tarefas", title_style))
-		story.append(Spacer(1, 12))
-		
-		# Informações do filtro
-		filtros_texto = _gerar_texto_filtros(empresa_id, funcionario_id, tarefa_id, data_inicial, data_final, status)
-		story.append(Paragraph(f"<b>Filtros aplicados:</b> {filtros_texto}", styles['Normal']))
-		story.append(Spacer(1, 12))
-		
-		# Estatísticas
-		stats = data['stats']
-		story.append(Paragraph("<b>Resumo:</b>", styles['Heading2']))
-		stats_texto = f"""
-		• Total de registros: {data['total_registros']}<br/>
-		• Pendentes: {stats['pendentes']}<br/>
-		• Em andamento: {stats['em_andamento']}<br/>
-		• Concluídas: {stats['concluidas']}<br/>
-		• Taxa de conclusão: {stats['taxa_conclusao']:.1f}%
-		"""
-		story.append(Paragraph(stats_texto, styles['Normal']))
-		story.append(Spacer(1, 20))
-		
-		# Tabela de dados
-		if data['dados']:
-			story.append(Paragraph("<b>Detalhamento:</b>", styles['Heading2']))
-			story.append(Spacer(1, 12))
-			
-			# Cabeçalho da tabela
-			headers = ['Empresa', 'Tarefa', 'Tipo', 'Período', 'Status', 'Responsável', 'Conclusão']
-			data_table = [headers]
-			
-			# Dados da tabela
-			for item in data['dados']:
-				data_table.append([
-					item['empresa_nome'],
-					item['tarefa_nome'],
-					item['tarefa_tipo'],
-					item['periodo_formatado'],
-					item['status_texto'],
-					item['responsavel_nome'],
-					item['data_conclusao']
-				])
-			
-			# Criar tabela
-			table = Table(data_table, repeatRows=1)
-			table.setStyle(TableStyle([
-				('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-				('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-				('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-				('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-				('FONTSIZE', (0, 0), (-1, 0), 10),
-				('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-				('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-				('GRID', (0, 0), (-1, -1), 1, colors.black),
-				('FONTSIZE', (0, 1), (-1, -1), 8),
-			]))
-			
-			story.append(table)
+		modo = request.args.get('async')
+		if modo is None:
+			assincrono = RelatorioService.estatisticas(filtros)['total'] > current_app.config['RELATORIO_PDF_SINCRONO_MAX']
 		else:
-			story.append(Paragraph("Nenhum registro encontrado com os filtros aplicados.", styles['Normal']))
-		
-		# Rodapé
-		story.append(Spacer(1, 20))
-		story.append(Paragraph(f"Relatório gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}", styles['Normal']))
-		
-		# Construir PDF
-		doc.build(story)
-		
-		# Preparar resposta
-		buffer.seek(0)
-		response = make_response(buffer.getvalue())
-		response.headers['Content-Type'] = 'application/pdf'
-		response.headers['Content-Disposition'] = f'attachment; filename=relatorio_tarefas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+			assincrono = pedido_assincrono(modo)
+		if assincrono:
+			job = JobService.enfileirar('relatorios.pdf', {
+				'filtros': filtros,
+				'filtros_texto': filtros_texto,
+				'nome_arquivo': nome_arquivo
+			}, session.get('user_id'))
+			return resposta_job_enfileirado(job)
+		
+		arquivo = tempfile.TemporaryFile()
+		try:
+			RelatorioService.escrever_pdf(arquivo, filtros, filtros_texto)
+			arquivo.seek(0)
+		except Exception:
+			arquivo.close()
+			raise
+		
+		return send_file(
+			arquivo,
+			mimetype='application/pdf',
+			as_attachment=True,
+			download_name=nome_arquivo
+		)
 		
-		return response
+	except Exception as e:
+		return jsonify({'error': str(e)}), 500
+
+
+@bp.get('/csv')
+def exportar_csv():
+	"""Exportar o relatório em CSV, gerado em streaming a partir do banco"""
+	try:
+		filtros = _filtros_relatorio()
+	except ValueError as e:
+		return jsonify({'error': str(e)}), 400
+	
+	return Response(
+		stream_with_context(RelatorioService.linhas_csv(filtros)),
+		mimetype='text/csv',
+		headers={
+			'Content-Disposition': f'attachment; filename=relatorio_tarefas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+		}
+	)
+
+
+@bp.get('/xlsx')
+def exportar_xlsx():
+	"""Exportar o relatório em XLSX (openpyxl write-only em arquivo temporário)"""
+	try:
+		filtros = _filtros_relatorio()
+	except ValueError as e:
+		return jsonify({'error': str(e)}), 400
+	
+	try:
+		arquivo = tempfile.SpooledTemporaryFile(max_size=TAMANHO_MAXIMO_XLSX_EM_MEMORIA)
+		try:
+			RelatorioService.escrever_xlsx(arquivo, filtros)
+			arquivo.seek(0)
+		except Exception:
+			arquivo.close()
+			raise
+		
+		return send_file(
+			arquivo,
+			mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+			as_attachment=True,
+			download_name=f'relatorio_tarefas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+		)
 		
 	except Exception as e:
 		return jsonify({'error': str(e)}), 500
@@ -449,33 +372,30 @@ def _calcular_periodo(periodo, ano=None, mes=None):
 	return data_inicio, data_fim
 
 
-def _get_status_texto(status):
-	"""Converte status para texto legível"""
-	status_map = {
-		'pendente': 'Pendente',
-		'em_andamento': 'Em Andamento',
-		'concluida': 'Concluída',
-		'atrasada': 'Atrasada'
+def _filtros_relatorio():
+	"""Lê os filtros do relatório da query string (com o setor do gerente logado)"""
+	data_inicial = request.args.get('data_inicial')
+	data_final = request.args.get('data_final')
+	
+	filtros = {
+		'empresa_id': request.args.get('empresa_id', type=int),
+		'funcionario_id': request.args.get('funcionario_id', type=int),
+		'tarefa_id': request.args.get('tarefa_id', type=int),
+		'status': request.args.get('status', 'todos'),
+		'data_inicio': None,
+		'data_fim': None,
+		'setor_id': None
 	}
-	return status_map.get(status, status)
-
-
-def _calcular_estatisticas(dados):
-	"""Calcula estatísticas dos dados"""
-	total = len(dados)
-	pendentes = len([d for d in dados if d['status'] == 'pendente'])
-	em_andamento = len([d for d in dados if d['status'] == 'em_andamento'])
-	concluidas = len([d for d in dados if d['status'] == 'concluida'])
+	if data_inicial and data_final:
+		filtros['data_inicio'] = datetime.strptime(data_inicial, '%Y-%m-%d').date()
+		filtros['data_fim'] = datetime.strptime(data_final, '%Y-%m-%d').date()
 	
-	taxa_conclusao = (concluidas / total * 100) if total > 0 else 0
+	# Filtrar por setor do gerente (se for gerente)
+	usuario_logado = usuario_atual()
+	if usuario_logado and usuario_logado.tipo == 'gerente' and usuario_logado.setor_id:
+		filtros['setor_id'] = usuario_logado.setor_id
 	
-	return {
-		'total': total,
-		'pendentes': pendentes,
-		'em_andamento': em_andamento,
-		'concluidas': concluidas,
-		'taxa_conclusao': taxa_conclusao
-	}
+	return filtros
 
 
 def _gerar_texto_filtros(empresa_id, funcionario_id, tarefa_id, data_inicial, data_final, status):
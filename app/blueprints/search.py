@@ -3,11 +3,15 @@ Blueprint para API de Busca Unificada
 Sistema centralizado para busca de empresas, tarefas, colaboradores e setores
 """
 
-from flask import Blueprint, request, jsonify, session, render_template
+from flask import Blueprint, request, jsonify, render_template
 from app.db import db
 from app.models import (
     Empresa, Tarefa, Usuario, Setor, Tributacao, RelacionamentoTarefa
 )
+from app.services.autocomplete_service import AutocompleteService
+from app.services.busca_service import BuscaService
+from app.services.referencia_service import ReferenciaService
+from app.services.identidade_service import requer_perfil, usuario_atual
 from sqlalchemy import or_, and_, func
 from datetime import datetime
 import re
@@ -31,19 +35,6 @@ def busca_simples_page():
     return render_template('busca_simples.html')
 
 
-def require_auth():
-    """Verifica se o usuário está autenticado"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None, jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-    
-    usuario = Usuario.query.get(user_id)
-    if not usuario:
-        return None, jsonify({'success': False, 'message': 'Usuário não encontrado'}), 401
-    
-    return usuario, None, None
-
-
 def build_search_query(model, search_term, filters=None):
     """Constrói query de busca genérica"""
     try:
@@ -55,19 +46,9 @@ def build_search_query(model, search_term, filters=None):
             search_term = search_term.strip()
             search_pattern = f"%{search_term}%"
             
-            # Campos de busca baseados no modelo
-            if model == Empresa:
-                query = model.query.filter(
-                    or_(Empresa.nome.ilike(search_pattern), Empresa.codigo.ilike(search_pattern))
-                )
-            elif model == Tarefa:
-                query = model.query.filter(
-                    or_(Tarefa.nome.ilike(search_pattern), Tarefa.descricao.ilike(search_pattern))
-                )
-            elif model == Usuario:
-                query = model.query.filter(
-                    or_(Usuario.nome.ilike(search_pattern), Usuario.login.ilike(search_pattern))
-                )
+            # Empresa, Tarefa e Usuario: índice full-text ranqueado por relevância
+            if BuscaService.suportado(model):
+                query = BuscaService.consulta(model, search_term)
             elif model == Setor:
                 query = model.query.filter(Setor.nome.ilike(search_pattern))
             else:
@@ -255,7 +236,7 @@ def search_tarefas():
         query = build_search_query(Tarefa, search_term, filters)
         
         # Aplicar filtros específicos do usuário
-        if usuario.tipo == 'gerente' and usuario.setor_id:
+        if usuario and usuario.tipo == 'gerente' and usuario.setor_id:
             # Gerentes só veem tarefas do seu setor
             query = query.filter(Tarefa.setor_id == usuario.setor_id)
         
@@ -314,7 +295,7 @@ def search_colaboradores():
         query = build_search_query(Usuario, search_term, filters)
         
         # Aplicar filtros específicos do usuário
-        if usuario.tipo == 'gerente' and usuario.setor_id:
+        if usuario and usuario.tipo == 'gerente' and usuario.setor_id:
             # Gerentes só veem usuários do seu setor
             query = query.filter(Usuario.setor_id == usuario.setor_id)
         
@@ -396,40 +377,35 @@ def search_setores():
 
 
 @bp.get('/suggestions')
+@requer_perfil(api=True)
 def get_suggestions():
     """Retorna sugestões baseadas no histórico de buscas"""
-    usuario, error_response, status_code = require_auth()
-    if error_response:
-        return error_response, status_code
+    usuario = usuario_atual()
     
     try:
         search_type = request.args.get('type', 'empresa')
+        search_term = request.args.get('q', '').strip()
         limit = min(int(request.args.get('limit', 10)), 20)
         
-        # Por enquanto, retorna itens mais comuns
-        # Futuramente pode implementar histórico de buscas
+        # Empresas, tarefas e colaboradores vêm do índice de autocomplete em memória;
+        # gerentes ficam restritos ao próprio setor
+        setor_id = usuario.setor_id if usuario.tipo == 'gerente' and usuario.setor_id else None
         suggestions = []
         
         if search_type == 'empresa':
-            empresas = Empresa.query.filter(Empresa.ativo == True)\
-                                   .order_by(Empresa.nome)\
-                                   .limit(limit).all()
-            suggestions = [{'id': e.id, 'nome': e.nome} for e in empresas]
+            empresas = AutocompleteService.buscar('empresas', search_term, limit, setor_id=setor_id)
+            suggestions = [{'id': e['id'], 'nome': e['nome']} for e in empresas]
         
         elif search_type == 'tarefa':
-            tarefas = Tarefa.query.order_by(Tarefa.nome)\
-                                 .limit(limit).all()
-            suggestions = [{'id': t.id, 'nome': t.nome} for t in tarefas]
+            tarefas = AutocompleteService.buscar('tarefas', search_term, limit, setor_id=setor_id)
+            suggestions = [{'id': t['id'], 'nome': t['nome']} for t in tarefas]
         
         elif search_type == 'colaborador':
-            colaboradores = Usuario.query.filter(Usuario.ativo == True)\
-                                        .order_by(Usuario.nome)\
-                                        .limit(limit).all()
-            suggestions = [{'id': c.id, 'nome': c.nome} for c in colaboradores]
+            colaboradores = AutocompleteService.buscar('usuarios', search_term, limit, setor_id=setor_id)
+            suggestions = [{'id': c['id'], 'nome': c['nome']} for c in colaboradores]
         
         elif search_type == 'setor':
-            setores = Setor.query.order_by(Setor.nome)\
-                                .limit(limit).all()
+            setores = ReferenciaService.setores()[:limit]
             suggestions = [{'id': s.id, 'nome': s.nome} for s in setores]
         
         return jsonify({
@@ -445,11 +421,10 @@ def get_suggestions():
 
 
 @bp.get('/stats')
+@requer_perfil(api=True)
 def get_search_stats():
     """Retorna estatísticas de busca para o usuário"""
-    usuario, error_response, status_code = require_auth()
-    if error_response:
-        return error_response, status_code
+    usuario = usuario_atual()
     
     try:
         stats = {
@@ -466,7 +441,7 @@ def get_search_stats():
                 'acessivel': 0
             },
             'setores': {
-                'total': Setor.query.count(),
+                'total': len(ReferenciaService.setores()),
                 'acessivel': 0
             }
         }
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify, render_template
 from app.db import db
 from app.models import Empresa, Tarefa, Usuario, Setor
+from app.services.busca_service import BuscaService
+from app.services.referencia_service import ReferenciaService
+from app.utils import normalizar_texto
 
 bp = Blueprint('search_simple', __name__, url_prefix='/api/search-simple')
 
@@ -11,9 +14,7 @@ def search_empresas():
         search_term = request.args.get('q', '').strip()
         
         if search_term:
-            empresas = Empresa.query.filter(
-                Empresa.nome.ilike(f'%{search_term}%')
-            ).limit(20).all()
+            empresas = BuscaService.consulta(Empresa, search_term).limit(20).all()
         else:
             empresas = Empresa.query.limit(20).all()
         
@@ -47,9 +48,7 @@ def search_tarefas():
         search_term = request.args.get('q', '').strip()
         
         if search_term:
-            tarefas = Tarefa.query.filter(
-                Tarefa.nome.ilike(f'%{search_term}%')
-            ).limit(20).all()
+            tarefas = BuscaService.consulta(Tarefa, search_term).limit(20).all()
         else:
             tarefas = Tarefa.query.limit(20).all()
         
@@ -81,9 +80,7 @@ def search_colaboradores():
         search_term = request.args.get('q', '').strip()
         
         if search_term:
-            usuarios = Usuario.query.filter(
-                Usuario.nome.ilike(f'%{search_term}%')
-            ).limit(20).all()
+            usuarios = BuscaService.consulta(Usuario, search_term).limit(20).all()
         else:
             usuarios = Usuario.query.limit(20).all()
         
@@ -115,12 +112,8 @@ def search_setores():
     try:
         search_term = request.args.get('q', '').strip()
         
-        if search_term:
-            setores = Setor.query.filter(
-                Setor.nome.ilike(f'%{search_term}%')
-            ).limit(20).all()
-        else:
-            setores = Setor.query.limit(20).all()
+        chave = normalizar_texto(search_term)
+        setores = [s for s in ReferenciaService.setores() if chave in normalizar_texto(s.nome)][:20]
         
         results = []
         for setor in setores:
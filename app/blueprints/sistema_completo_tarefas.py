@@ -5,13 +5,15 @@ Blueprint para o Sistema Completo de Tarefas
 Implementa a lógica completa: Empresa + Tributação + Tarefa + Responsável + Período
 """
 
-from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from app.db import db
 from app.models import (
     Empresa, Tributacao, Usuario, Tarefa, Setor, VinculacaoEmpresaTributacao,
     PeriodoExecucao, AtribuicaoTarefa, ExecucaoTarefa, ResponsavelPadraoTarefa,
     HistoricoMudancaTributacao, ChecklistEmpresa
 )
+from app.services.identidade_service import requer_perfil, usuario_atual
+from app.services.referencia_service import ReferenciaService
 from datetime import datetime, date, timedelta
 import json
 
@@ -19,17 +21,12 @@ bp = Blueprint('sistema_completo_tarefas', __name__, url_prefix='/sistema-comple
 
 
 @bp.get('/')
+@requer_perfil()
 def dashboard():
     """Dashboard principal do sistema completo de tarefas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        # Verificar tipo de usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario:
-            return redirect(url_for('auth.login'))
+        usuario = usuario_atual()
+        user_id = usuario.id
         
         # Buscar dados baseados no tipo de usuário
         if usuario.tipo == 'admin':
@@ -79,19 +76,14 @@ def dashboard():
 
 
 @bp.get('/empresas')
+@requer_perfil('admin', 'supervisor')
 def gerenciar_empresas():
     """Gerenciar empresas e suas tributações"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'supervisor']:
-            return redirect(url_for('auth.login'))
+        usuario = usuario_atual()
         
         empresas = Empresa.query.filter_by(ativo=True).order_by(Empresa.nome).all()
-        tributacoes = Tributacao.query.all()
+        tributacoes = ReferenciaService.tributacoes()
         
         return render_template('sistema_completo_empresas.html',
                              usuario=usuario,
@@ -104,19 +96,14 @@ def gerenciar_empresas():
 
 
 @bp.get('/responsaveis-padrao')
+@requer_perfil('admin', 'gerente')
 def gerenciar_responsaveis_padrao():
     """Gerenciar responsáveis padrão por setor/tributação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
+        usuario = usuario_atual()
         
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login'))
-        
-        setores = Setor.query.all()
-        tributacoes = Tributacao.query.all()
+        setores = ReferenciaService.setores()
+        tributacoes = ReferenciaService.tributacoes()
         tarefas = Tarefa.query.all()
         
         # Filtrar tarefas por setor se for gerente
@@ -138,16 +125,11 @@ def gerenciar_responsaveis_padrao():
 
 
 @bp.get('/atribuicoes')
+@requer_perfil('admin', 'gerente')
 def gerenciar_atribuicoes():
     """Gerenciar atribuições de tarefas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login'))
+        usuario = usuario_atual()
         
         empresas = Empresa.query.filter_by(ativo=True).order_by(Empresa.nome).all()
         periodos = PeriodoExecucao.query.filter_by(status='ativo').order_by(
@@ -176,16 +158,12 @@ def gerenciar_atribuicoes():
 
 
 @bp.get('/minhas-tarefas')
+@requer_perfil('normal')
 def minhas_tarefas():
     """Tarefas do funcionário logado"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'normal':
-            return redirect(url_for('auth.login'))
+        usuario = usuario_atual()
+        user_id = usuario.id
         
         # Buscar atribuições do funcionário
         atribuicoes = AtribuicaoTarefa.query.filter_by(
@@ -215,17 +193,10 @@ def minhas_tarefas():
 # ========================================
 
 @bp.post('/api/criar-periodo')
+@requer_perfil('admin', 'supervisor', api=True)
 def api_criar_periodo():
     """API para criar período mensal para uma empresa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'supervisor']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         empresa_id = data.get('empresa_id')
         ano = data.get('ano')
@@ -275,17 +246,10 @@ def api_criar_periodo():
 
 
 @bp.post('/api/criar-responsavel-padrao')
+@requer_perfil('admin', 'gerente', api=True)
 def api_criar_responsavel_padrao():
     """API para criar responsável padrão"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         setor_id = data.get('setor_id')
         tributacao_id = data.get('tributacao_id')
@@ -329,17 +293,10 @@ def api_criar_responsavel_padrao():
 
 
 @bp.post('/api/criar-atribuicoes-automaticas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_criar_atribuicoes_automaticas():
     """API para criar atribuições automaticamente baseadas nos responsáveis padrão"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         empresa_id = data.get('empresa_id')
         periodo_id = data.get('periodo_id')
@@ -394,16 +351,11 @@ def api_criar_atribuicoes_automaticas():
 
 
 @bp.post('/api/executar-tarefa')
+@requer_perfil('normal', api=True)
 def api_executar_tarefa():
     """API para funcionário executar uma tarefa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'normal':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         data = request.get_json()
         atribuicao_id = data.get('atribuicao_id')
@@ -454,17 +406,10 @@ def api_executar_tarefa():
 
 
 @bp.get('/api/relatorio-execucao')
+@requer_perfil('admin', 'gerente', api=True)
 def api_relatorio_execucao():
     """API para relatório de execução"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         # Buscar estatísticas
         total_atribuicoes = AtribuicaoTarefa.query.count()
         atribuicoes_concluidas = AtribuicaoTarefa.query.filter_by(status='concluida').count()
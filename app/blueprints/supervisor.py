@@ -1,6 +1,8 @@
-from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify
 from app.db import db
 from app.models import Empresa, Tributacao, Usuario, Checklist, ChecklistItem, ChecklistItemConclusao, ChecklistTemplate, ChecklistTemplateItem
+from app.services.identidade_service import requer_perfil, usuario_atual
+from app.services.referencia_service import ReferenciaService
 from datetime import datetime
 import re
 
@@ -23,18 +25,10 @@ def convert_period_to_label(period):
 
 @bp.get('')
 @bp.get('/')
+@requer_perfil('supervisor')
 def index():
     """Página principal do painel do supervisor"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         # Buscar estatísticas
         total_empresas = Empresa.query.filter_by(ativo=True).count()
         total_checklists = Checklist.query.filter_by(ativo=True).count()
@@ -58,23 +52,15 @@ def index():
 
 
 @bp.get('/empresas')
+@requer_perfil('supervisor')
 def empresas():
     """Página de gerenciamento de empresas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         # Buscar empresas
         empresas = Empresa.query.filter_by(ativo=True).order_by(Empresa.nome).all()
         
         # Buscar tributações
-        tributacoes = Tributacao.query.all()
+        tributacoes = ReferenciaService.tributacoes()
         
         return render_template('supervisor_empresas.html',
                              empresas=empresas,
@@ -85,18 +71,10 @@ def empresas():
 
 
 @bp.post('/empresas/criar')
+@requer_perfil('supervisor', api=True)
 def criar_empresa():
     """Criar nova empresa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         codigo = data.get('codigo', '').strip()
         nome = data.get('nome', '').strip()
@@ -137,217 +115,53 @@ def criar_empresa():
 
 
 @bp.post('/empresas/<int:empresa_id>/tributacao')
+@requer_perfil('supervisor', api=True)
 def alterar_tributacao(empresa_id):
-    """Alterar tributação de uma empresa"""
+    """Alterar tributação de uma empresa (envie "dry_run": true para apenas visualizar o plano)"""
     try:
-        from app.models import RelacionamentoTarefa, Periodo, Tarefa, TarefaTributacao, VinculacaoEmpresaTributacao, MudancaTributacaoPendente
-        from datetime import date
-        from app.utils import gerar_periodo_label
-        
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
+        from app.services.tributacao_service import TributacaoService, MODO_PRESERVAR, normalizar_tributacao_id
         
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
-        data = request.get_json()
-        tributacao_id = data.get('tributacao_id')
+        data = request.get_json() or {}
+        try:
+            tributacao_id = normalizar_tributacao_id(data.get('tributacao_id'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         motivo = data.get('motivo', 'Mudança de tributação pelo supervisor')
+        dry_run = bool(data.get('dry_run', False))
         
         # Buscar empresa
         empresa = Empresa.query.get(empresa_id)
         if not empresa:
             return jsonify({'success': False, 'message': 'Empresa não encontrada'}), 404
         
-        tributacao_anterior_id = empresa.tributacao_id
-        
         # Verificar se a tributação está realmente mudando
-        if tributacao_anterior_id == tributacao_id:
+        if empresa.tributacao_id == tributacao_id:
             return jsonify({'success': False, 'message': 'A empresa já possui esta tributação'}), 400
         
-        # Identificar período atual
-        hoje = date.today()
-        periodo_atual_label = gerar_periodo_label(hoje.year, hoje.month)
-        
-        # Buscar todos os relacionamentos ativos da empresa
-        relacionamentos_ativos = RelacionamentoTarefa.query.filter_by(
-            empresa_id=empresa_id,
-            versao_atual=True,
-            status='ativa'
-        ).all()
-        
-        # Separar relacionamentos: período atual vs futuros e tarefas comuns vs específicas
-        relacionamentos_periodo_atual = []
-        relacionamentos_futuros_com_tributacao = []
-        
-        for rel in relacionamentos_ativos:
-            tarefa = Tarefa.query.get(rel.tarefa_id)
-            if not tarefa:
-                continue
-            
-            # Verificar se é tarefa comum (sem tributação específica)
-            is_tarefa_comum = tarefa.tarefa_comum or (tarefa.tributacao_id is None and not TarefaTributacao.query.filter_by(tarefa_id=tarefa.id).first())
-            
-            # Se é tarefa comum, não desativar
-            if is_tarefa_comum:
-                continue
-            
-            # Verificar se tem período no período atual
-            periodo_atual = Periodo.query.filter_by(
-                relacionamento_tarefa_id=rel.id,
-                periodo_label=periodo_atual_label
-            ).first()
-            
-            if periodo_atual and periodo_atual.status not in ['concluida', 'cancelada']:
-                # Tem período ativo, não desativar
-                relacionamentos_periodo_atual.append(rel)
-            else:
-                # Não tem período ativo ou já concluído, pode desativar para próximos períodos
-                # Verificar se a tarefa é da tributação anterior
-                if tributacao_anterior_id:
-                    # Verificar se tarefa pertence à tributação anterior
-                    tarefa_trib = TarefaTributacao.query.filter_by(
-                        tarefa_id=tarefa.id,
-                        tributacao_id=tributacao_anterior_id
-                    ).first()
-                    
-                    if tarefa_trib or tarefa.tributacao_id == tributacao_anterior_id:
-                        relacionamentos_futuros_com_tributacao.append(rel)
-        
-        # Desativar relacionamentos de tarefas da tributação antiga (apenas para próximos períodos)
-        for rel in relacionamentos_futuros_com_tributacao:
-            rel.versao_atual = False
-            rel.data_fim = date.today()
-            rel.motivo_desativacao = f"Mudança de tributação: próximos períodos desativados (período atual preservado)"
-        
-        # Criar ou atualizar vinculação empresa-tributação
-        if tributacao_id:
-            # Desativar vinculação atual se existir
-            vinculacao_atual = VinculacaoEmpresaTributacao.query.filter_by(
-                empresa_id=empresa_id,
-                ativo=True
-            ).first()
-            
-            if vinculacao_atual:
-                vinculacao_atual.ativo = False
-                vinculacao_atual.data_fim = date.today()
-            
-            # Criar nova vinculação
-            nova_vinculacao = VinculacaoEmpresaTributacao(
-                empresa_id=empresa_id,
-                tributacao_id=tributacao_id,
-                data_inicio=date.today(),
-                ativo=True
-            )
-            db.session.add(nova_vinculacao)
-            db.session.flush()  # Para obter o ID
-            
-            # Buscar tarefas da nova tributação
-            tarefas_nova_tributacao = TarefaTributacao.query.filter_by(
-                tributacao_id=tributacao_id,
-                ativo=True
-            ).all()
-            
-            # Buscar também tarefas com tributacao_id direto
-            tarefas_diretas = Tarefa.query.filter_by(
-                tributacao_id=tributacao_id
-            ).all()
-            
-            # Criar relacionamentos para novas tarefas (sem responsável - será definido pelo gerente)
-            tarefas_ids_processadas = set()
-            
-            for tt in tarefas_nova_tributacao:
-                if tt.tarefa_id in tarefas_ids_processadas:
-                    continue
-                tarefas_ids_processadas.add(tt.tarefa_id)
-                
-                # Verificar se já existe relacionamento desativado (para reativar)
-                rel_existente = RelacionamentoTarefa.query.filter_by(
-                    empresa_id=empresa_id,
-                    tarefa_id=tt.tarefa_id,
-                    versao_atual=False
-                ).order_by(RelacionamentoTarefa.criado_em.desc()).first()
-                
-                if rel_existente:
-                    # Reativar relacionamento existente
-                    rel_existente.versao_atual = True
-                    rel_existente.vinculacao_id = nova_vinculacao.id
-                    rel_existente.data_inicio = date.today()
-                    rel_existente.data_fim = None
-                    rel_existente.motivo_desativacao = None
-                    rel_existente.responsavel_id = None  # Será definido pelo gerente
-                    rel_existente.status = 'ativa'
-                else:
-                    # Criar novo relacionamento (sem responsável)
-                    novo_rel = RelacionamentoTarefa(
-                        empresa_id=empresa_id,
-                        tarefa_id=tt.tarefa_id,
-                        responsavel_id=None,  # Será definido pelo gerente
-                        vinculacao_id=nova_vinculacao.id,
-                        status='ativa',
-                        data_inicio=date.today(),
-                        versao_atual=True
-                    )
-                    db.session.add(novo_rel)
-            
-            # Processar tarefas com tributacao_id direto
-            for tarefa in tarefas_diretas:
-                if tarefa.id in tarefas_ids_processadas:
-                    continue
-                tarefas_ids_processadas.add(tarefa.id)
-                
-                # Verificar se já existe relacionamento desativado
-                rel_existente = RelacionamentoTarefa.query.filter_by(
-                    empresa_id=empresa_id,
-                    tarefa_id=tarefa.id,
-                    versao_atual=False
-                ).order_by(RelacionamentoTarefa.criado_em.desc()).first()
-                
-                if rel_existente:
-                    rel_existente.versao_atual = True
-                    rel_existente.vinculacao_id = nova_vinculacao.id
-                    rel_existente.data_inicio = date.today()
-                    rel_existente.data_fim = None
-                    rel_existente.motivo_desativacao = None
-                    rel_existente.responsavel_id = None
-                    rel_existente.status = 'ativa'
-                else:
-                    novo_rel = RelacionamentoTarefa(
-                        empresa_id=empresa_id,
-                        tarefa_id=tarefa.id,
-                        responsavel_id=None,
-                        vinculacao_id=nova_vinculacao.id,
-                        status='ativa',
-                        data_inicio=date.today(),
-                        versao_atual=True
-                    )
-                    db.session.add(novo_rel)
-            
-            # Criar registro de mudança pendente para notificação dos gerentes
-            mudanca_pendente = MudancaTributacaoPendente(
-                empresa_id=empresa_id,
-                tributacao_anterior_id=tributacao_anterior_id,
-                tributacao_nova_id=tributacao_id,
-                data_mudanca=date.today(),
-                motivo=motivo,
-                status='pendente',
-                criado_por=user_id
-            )
-            db.session.add(mudanca_pendente)
-        
-        # Atualizar empresa
-        empresa.tributacao_id = tributacao_id if tributacao_id else None
-        empresa.atualizado_em = datetime.now()
+        # Tarefas comuns e tarefas com período atual em aberto são preservadas;
+        # relacionamentos da nova tributação ficam sem responsável (definido pelo gerente)
+        mudanca = TributacaoService.alterar_tributacao(
+            empresa_id,
+            tributacao_id,
+            user_id,
+            motivo=motivo,
+            modo=MODO_PRESERVAR,
+            dry_run=dry_run
+        )
         
-        db.session.commit()
+        if dry_run:
+            return jsonify({
+                'success': True,
+                'dry_run': True,
+                'plano': mudanca['plano']
+            })
         
         return jsonify({
             'success': True,
             'message': 'Tributação alterada com sucesso! Tarefas do período atual foram preservadas. As novas tarefas aparecerão para vinculação no painel do gerente.',
-            'mudanca_id': mudanca_pendente.id if tributacao_id else None
+            'mudanca_id': mudanca['resultado']['mudancas'].get(empresa_id)
         })
         
     except Exception as e:
@@ -355,19 +169,120 @@ def alterar_tributacao(empresa_id):
         return jsonify({'success': False, 'message': f'Erro ao alterar tributação: {str(e)}'}), 500
 
 
+@bp.post('/empresas/tributacao/lote')
+@requer_perfil('supervisor', api=True)
+def migrar_tributacao_lote():
+    """Migra a tributação de várias empresas em lotes (empresa_ids ou filtro)"""
+    try:
+        from app.services.tributacao_service import (
+            TributacaoService, MODO_PRESERVAR, TAMANHO_LOTE_MIGRACAO, normalizar_tributacao_id
+        )
+        
+        user_id = usuario_atual().id
+        
+        data = request.get_json() or {}
+        try:
+            tributacao_id = normalizar_tributacao_id(data.get('tributacao_id'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        if not tributacao_id:
+            return jsonify({'success': False, 'message': 'Tributação é obrigatória'}), 400
+        
+        try:
+            empresa_ids = TributacaoService.selecionar_empresas(data.get('empresa_ids'), data.get('filtro'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        if data.get('dry_run'):
+            planos = TributacaoService.planejar_mudancas(empresa_ids, tributacao_id, MODO_PRESERVAR)
+            return jsonify({
+                'success': True,
+                'dry_run': True,
+                'total': len(planos),
+                'planos': [{
+                    'empresa_id': plano['empresa_id'],
+                    'empresa_nome': plano['empresa_nome'],
+                    'ignorada': plano['tributacao_anterior_id'] == tributacao_id,
+                    'desativar': len(plano['desativar']),
+                    'reativar': len(plano['reativar']),
+                    'criar': len(plano['criar']),
+                    'preservados': len(plano['preservados'])
+                } for plano in planos]
+            })
+        
+        migracao = TributacaoService.criar_migracao(
+            empresa_ids,
+            tributacao_id,
+            user_id,
+            motivo=data.get('motivo', 'Mudança de tributação em massa pelo supervisor'),
+            modo=MODO_PRESERVAR,
+            tamanho_lote=data.get('tamanho_lote', TAMANHO_LOTE_MIGRACAO)
+        )
+        migracao_id = migracao.id
+        
+        if data.get('async'):
+            from app.services.job_service import JobService
+            from app.blueprints.jobs import resposta_job_enfileirado
+            job = JobService.enfileirar('tributacao.migrar', {'migracao_id': migracao_id}, user_id)
+            return resposta_job_enfileirado(job)
+        
+        try:
+            status = TributacaoService.executar_migracao(migracao_id)
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'message': f'Migração interrompida: {str(e)}. Use a retomada para continuar do último lote confirmado.',
+                'migracao_id': migracao_id
+            }), 500
+        
+        return jsonify({'success': True, 'migracao': status})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro na migração de tributação: {str(e)}'}), 500
+
+
+@bp.get('/empresas/tributacao/lote/<int:migracao_id>')
+@requer_perfil('supervisor', api=True)
+def status_migracao_tributacao(migracao_id):
+    """Andamento de uma migração de tributação em massa"""
+    from app.models import MigracaoTributacaoLote
+    from app.services.tributacao_service import TributacaoService
+    
+    migracao = MigracaoTributacaoLote.query.get(migracao_id)
+    if not migracao:
+        return jsonify({'success': False, 'message': 'Migração não encontrada'}), 404
+    
+    return jsonify({'success': True, 'migracao': TributacaoService.status_migracao(migracao)})
+
+
+@bp.post('/empresas/tributacao/lote/<int:migracao_id>/retomar')
+@requer_perfil('supervisor', api=True)
+def retomar_migracao_tributacao(migracao_id):
+    """Retoma uma migração interrompida a partir do último lote confirmado"""
+    from app.services.tributacao_service import TributacaoService, MigracaoEmAndamento
+    
+    try:
+        status = TributacaoService.executar_migracao(migracao_id)
+    except MigracaoEmAndamento as e:
+        return jsonify({'success': False, 'message': str(e), 'migracao_id': migracao_id}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Migração interrompida: {str(e)}',
+            'migracao_id': migracao_id
+        }), 500
+    
+    return jsonify({'success': True, 'migracao': status})
+
+
 @bp.get('/checklists')
+@requer_perfil('supervisor')
 def checklists():
     """Página de gerenciamento de checklists"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         # Buscar checklists
         checklists = Checklist.query.filter_by(ativo=True).order_by(Checklist.criado_em.desc()).all()
         
@@ -378,18 +293,10 @@ def checklists():
 
 
 @bp.get('/checklists/criar')
+@requer_perfil('supervisor')
 def criar_checklist_page():
     """Página para criar checklist"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         # Buscar empresas
         empresas = Empresa.query.filter_by(ativo=True).order_by(Empresa.nome).all()
         
@@ -405,17 +312,11 @@ def criar_checklist_page():
 
 
 @bp.post('/checklists/criar')
+@requer_perfil('supervisor', api=True)
 def criar_checklist():
     """Criar novo checklist"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         data = request.get_json()
         empresa_id = data.get('empresa_id')
@@ -475,18 +376,10 @@ def criar_checklist():
 
 
 @bp.get('/checklists/<int:checklist_id>')
+@requer_perfil('supervisor')
 def visualizar_checklist(checklist_id):
     """Visualizar checklist específico"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         # Buscar checklist
         checklist = Checklist.query.get(checklist_id)
         if not checklist:
@@ -500,18 +393,10 @@ def visualizar_checklist(checklist_id):
 
 # APIs para o painel de usuários
 @bp.get('/api/usuarios')
+@requer_perfil('supervisor', api=True)
 def api_usuarios():
     """API para buscar usuários"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         # Buscar usuários
         usuarios = Usuario.query.filter_by(ativo=True, tipo='normal').order_by(Usuario.nome).all()
         
@@ -531,18 +416,10 @@ def api_usuarios():
 
 
 @bp.get('/api/empresas')
+@requer_perfil('supervisor', api=True)
 def api_empresas_search():
     """API para buscar empresas com filtro de texto"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         # Parâmetro de busca
         query = request.args.get('q', '').strip()
         
@@ -575,18 +452,10 @@ def api_empresas_search():
 # ===== ROTAS PARA TEMPLATES DE CHECKLIST =====
 
 @bp.get('/templates')
+@requer_perfil('supervisor')
 def templates():
     """Página de gerenciamento de templates de checklist"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         # Buscar templates
         templates = ChecklistTemplate.query.filter_by(ativo=True).order_by(ChecklistTemplate.criado_em.desc()).all()
         
@@ -597,18 +466,10 @@ def templates():
 
 
 @bp.get('/templates/criar')
+@requer_perfil('supervisor')
 def criar_template():
     """Página para criar novo template"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         return render_template('supervisor_criar_template.html')
         
     except Exception as e:
@@ -616,17 +477,11 @@ def criar_template():
 
 
 @bp.post('/templates/criar')
+@requer_perfil('supervisor', api=True)
 def criar_template_post():
     """Criar novo template de checklist"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         # Dados do formulário
         nome = request.form.get('nome', '').strip()
@@ -680,18 +535,10 @@ def criar_template_post():
 
 
 @bp.get('/templates/<int:template_id>')
+@requer_perfil('supervisor')
 def visualizar_template(template_id):
     """Visualizar template específico"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login'))
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return redirect(url_for('auth.login'))
-        
         # Buscar template
         template = ChecklistTemplate.query.get_or_404(template_id)
         
@@ -702,17 +549,11 @@ def visualizar_template(template_id):
 
 
 @bp.post('/templates/<int:template_id>/aplicar')
+@requer_perfil('supervisor', api=True)
 def aplicar_template(template_id):
     """Aplicar template a uma empresa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        user_id = usuario_atual().id
         
         # Buscar template
         template = ChecklistTemplate.query.get_or_404(template_id)
@@ -781,18 +622,10 @@ def aplicar_template(template_id):
 
 
 @bp.get('/api/templates')
+@requer_perfil('supervisor', api=True)
 def api_templates():
     """API para buscar templates"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         # Buscar templates
         templates = ChecklistTemplate.query.filter_by(ativo=True).order_by(ChecklistTemplate.nome).all()
         
@@ -814,18 +647,10 @@ def api_templates():
 
 
 @bp.get('/api/templates/<int:template_id>')
+@requer_perfil('supervisor', api=True)
 def api_template_detalhes(template_id):
     """API para buscar detalhes de um template"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         # Buscar template
         template = ChecklistTemplate.query.get_or_404(template_id)
         
@@ -869,17 +694,12 @@ def api_template_detalhes(template_id):
 
 
 @bp.delete('/templates/<int:template_id>')
+@requer_perfil('supervisor', api=True)
 def excluir_template(template_id):
     """Excluir template de checklist"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar se é supervisor
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo != 'supervisor':
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
+        user_id = usuario.id
         
         # Buscar template
         template = ChecklistTemplate.query.get_or_404(template_id)
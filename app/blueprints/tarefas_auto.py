@@ -1,41 +1,19 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, session
 from app.db import db
 from app.models import Usuario, Empresa, Tarefa, RelacionamentoTarefa, Periodo, Retificacao
+from app.services.periodo_service import PeriodoService
+from app.services.resumo_service import ResumoService
+from app.services.job_service import JobService
+from app.blueprints.jobs import pedido_assincrono, resposta_job_enfileirado
+from app.utils import gerar_periodo_label, calcular_datas_periodo
 from datetime import datetime, date, timedelta
-import calendar
 
 bp = Blueprint('tarefas_auto', __name__, url_prefix='/api/tarefas-auto')
 
 
-def gerar_periodo_label(ano, mes):
-    """Gera o label do período no formato YYYY-MM"""
-    return f"{ano}-{mes:02d}"
-
-
-def calcular_datas_periodo(ano, mes, tipo_tarefa):
-    """Calcula as datas de início e fim baseado no tipo da tarefa"""
-    if tipo_tarefa == 'Mensal':
-        inicio = date(ano, mes, 1)
-        fim = date(ano, mes, calendar.monthrange(ano, mes)[1])
-    elif tipo_tarefa == 'Trimestral':
-        # Determina o trimestre
-        trimestre = (mes - 1) // 3 + 1
-        mes_inicio = (trimestre - 1) * 3 + 1
-        mes_fim = trimestre * 3
-        inicio = date(ano, mes_inicio, 1)
-        fim = date(ano, mes_fim, calendar.monthrange(ano, mes_fim)[1])
-        return inicio, fim, f"{ano}-T{trimestre}"
-    elif tipo_tarefa == 'Anual':
-        inicio = date(ano, 1, 1)
-        fim = date(ano, 12, 31)
-        return inicio, fim, f"{ano}-Anual"
-    
-    return inicio, fim, gerar_periodo_label(ano, mes)
-
-
 @bp.post('/gerar-mes')
 def gerar_tarefas_mes():
-    """Gera tarefas para o mês atual ou especificado"""
+    """Gera tarefas para o mês atual ou especificado (com "async": true, em um job)"""
     try:
         # Obter parâmetros
         ano = request.json.get('ano', datetime.now().year)
@@ -43,7 +21,7 @@ def gerar_tarefas_mes():
         
         # Verificar se já existem tarefas para este período
         periodo_label = gerar_periodo_label(ano, mes)
-        periodos_existentes = Periodo.query.filter_by(periodo_label=periodo_label).count()
+        periodos_existentes = PeriodoService.contar_periodos(periodo_label)
         
         if periodos_existentes > 0:
             return jsonify({
@@ -52,56 +30,18 @@ def gerar_tarefas_mes():
                 'periodos_existentes': periodos_existentes
             })
         
-        # Buscar todos os relacionamentos ativos (versão atual e status ativa)
-        relacionamentos = RelacionamentoTarefa.query.filter_by(
-            status='ativa',
-            versao_atual=True
-        ).all()
+        if pedido_assincrono(request.json.get('async')):
+            job = JobService.enfileirar('periodos.gerar', {'ano': ano, 'mes': mes}, session.get('user_id'))
+            return resposta_job_enfileirado(job)
         
-        tarefas_criadas = 0
-        
-        for rel in relacionamentos:
-            tarefa = Tarefa.query.get(rel.tarefa_id)
-            if not tarefa:
-                continue
-            
-            # IGNORAR TAREFAS ANUAIS - elas são gerenciadas separadamente
-            if tarefa.tipo == 'Anual':
-                continue
-            
-            # Calcular datas do período
-            inicio, fim, periodo_label_tarefa = calcular_datas_periodo(ano, mes, tarefa.tipo)
-            
-            # Verificar se já existe período para este relacionamento
-            periodo_existente = Periodo.query.filter_by(
-                relacionamento_tarefa_id=rel.id,
-                periodo_label=periodo_label_tarefa
-            ).first()
-            
-            if periodo_existente:
-                continue
-            
-            # Criar novo período
-            novo_periodo = Periodo(
-                relacionamento_tarefa_id=rel.id,
-                inicio=inicio,
-                fim=fim,
-                periodo_label=periodo_label_tarefa,
-                status='pendente',
-                contador_retificacoes=0,
-                atualizado_em=datetime.now()
-            )
-            
-            db.session.add(novo_periodo)
-            tarefas_criadas += 1
-        
-        db.session.commit()
+        resultado = PeriodoService.gerar_periodos(ano, mes)
         
         return jsonify({
             'success': True,
             'message': f'Tarefas geradas com sucesso para {periodo_label}',
-            'tarefas_criadas': tarefas_criadas,
-            'periodo': periodo_label
+            'tarefas_criadas': resultado['tarefas_criadas'],
+            'periodo': periodo_label,
+            'tempos': resultado['tempos']
         })
         
     except Exception as e:
@@ -134,6 +74,7 @@ def concluir_tarefa():
             }), 404
         
         hoje = date.today()
+        status_anterior = periodo.status
         
         if periodo.status == 'pendente':
             # Primeira conclusão
@@ -157,6 +98,7 @@ def concluir_tarefa():
             db.session.add(retificacao)
         
         periodo.atualizado_em = datetime.now()
+        ResumoService.mudar_status(periodo, status_anterior)
         db.session.commit()
         
         return jsonify({
@@ -195,8 +137,10 @@ def reabrir_tarefa():
                 'message': 'Período não encontrado'
             }), 404
         
+        status_anterior = periodo.status
         periodo.status = 'pendente'
         periodo.atualizado_em = datetime.now()
+        ResumoService.mudar_status(periodo, status_anterior)
         
         db.session.commit()
         
@@ -262,60 +206,16 @@ def gerar_tarefas_periodo():
         # Calcular período
         periodo_label = gerar_periodo_label(ano, mes)
         
-        # Buscar todos os relacionamentos ativos (versão atual e status ativa)
-        relacionamentos = RelacionamentoTarefa.query.filter_by(
-            status='ativa',
-            versao_atual=True
-        ).all()
-        
-        tarefas_criadas = 0
-        tarefas_existentes = 0
-        
-        for rel in relacionamentos:
-            tarefa = Tarefa.query.get(rel.tarefa_id)
-            if not tarefa:
-                continue
-            
-            # IGNORAR TAREFAS ANUAIS - elas são gerenciadas separadamente
-            if tarefa.tipo == 'Anual':
-                continue
-            
-            # Calcular datas do período baseado no tipo da tarefa
-            inicio, fim, periodo_label_tarefa = calcular_datas_periodo(ano, mes, tarefa.tipo)
-            
-            # Verificar se já existe período para este relacionamento
-            periodo_existente = Periodo.query.filter_by(
-                relacionamento_tarefa_id=rel.id,
-                periodo_label=periodo_label_tarefa
-            ).first()
-            
-            if periodo_existente:
-                tarefas_existentes += 1
-                continue
-            
-            # Criar novo período apenas se não existir
-            novo_periodo = Periodo(
-                relacionamento_tarefa_id=rel.id,
-                inicio=inicio,
-                fim=fim,
-                periodo_label=periodo_label_tarefa,
-                status='pendente',
-                contador_retificacoes=0,
-                atualizado_em=datetime.now()
-            )
-            
-            db.session.add(novo_periodo)
-            tarefas_criadas += 1
-        
-        db.session.commit()
+        resultado = PeriodoService.gerar_periodos(ano, mes)
         
         return jsonify({
             'success': True,
             'message': f'Verificação concluída para {periodo_label}',
-            'tarefas_criadas': tarefas_criadas,
-            'tarefas_existentes': tarefas_existentes,
+            'tarefas_criadas': resultado['tarefas_criadas'],
+            'tarefas_existentes': resultado['tarefas_existentes'],
             'periodo': periodo_label,
-            'total_relacionamentos': len(relacionamentos)
+            'total_relacionamentos': resultado['total_relacionamentos'],
+            'tempos': resultado['tempos']
         })
         
     except Exception as e:
@@ -378,64 +278,15 @@ def verificar_e_criar_tarefas_periodo_atual():
         periodo_label = gerar_periodo_label(ano, mes)
         
         # Verificar se já existem tarefas para este período
-        periodos_existentes = Periodo.query.filter_by(periodo_label=periodo_label).count()
+        periodos_existentes = PeriodoService.contar_periodos(periodo_label)
         
         # Se já existem tarefas, não precisa criar
         if periodos_existentes > 0:
             return (0, periodos_existentes, periodo_label)
         
-        # Buscar todos os relacionamentos ativos (versão atual e status ativa)
-        relacionamentos = RelacionamentoTarefa.query.filter_by(
-            status='ativa',
-            versao_atual=True
-        ).all()
-        
-        if not relacionamentos:
-            return (0, 0, periodo_label)
-        
-        tarefas_criadas = 0
-        tarefas_existentes = 0
-        
-        for rel in relacionamentos:
-            tarefa = Tarefa.query.get(rel.tarefa_id)
-            if not tarefa:
-                continue
-            
-            # IGNORAR TAREFAS ANUAIS - elas são gerenciadas separadamente
-            if tarefa.tipo == 'Anual':
-                continue
-            
-            # Calcular datas do período baseado no tipo da tarefa
-            inicio, fim, periodo_label_tarefa = calcular_datas_periodo(ano, mes, tarefa.tipo)
-            
-            # Verificar se já existe período para este relacionamento
-            periodo_existente = Periodo.query.filter_by(
-                relacionamento_tarefa_id=rel.id,
-                periodo_label=periodo_label_tarefa
-            ).first()
-            
-            if periodo_existente:
-                tarefas_existentes += 1
-                continue
-            
-            # Criar novo período apenas se não existir
-            novo_periodo = Periodo(
-                relacionamento_tarefa_id=rel.id,
-                inicio=inicio,
-                fim=fim,
-                periodo_label=periodo_label_tarefa,
-                status='pendente',
-                contador_retificacoes=0,
-                atualizado_em=datetime.now()
-            )
-            
-            db.session.add(novo_periodo)
-            tarefas_criadas += 1
-        
-        if tarefas_criadas > 0:
-            db.session.commit()
+        resultado = PeriodoService.gerar_periodos(ano, mes)
         
-        return (tarefas_criadas, tarefas_existentes, periodo_label)
+        return (resultado['tarefas_criadas'], resultado['tarefas_existentes'], periodo_label)
         
     except Exception as e:
         db.session.rollback()
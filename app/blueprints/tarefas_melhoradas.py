@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, session, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for
 from sqlalchemy import or_
 from datetime import datetime, date
 import json
@@ -8,25 +8,23 @@ from app.models import (
     Empresa, Tributacao, Usuario, Tarefa, RelacionamentoTarefa, Setor,
     VinculacaoEmpresaTributacao, TarefaTributacao, ConfiguracaoResponsavelPadrao
 )
+from app.services.autocomplete_service import AutocompleteService
+from app.services.identidade_service import requer_perfil, usuario_atual
+from app.services.referencia_service import ReferenciaService
+from app.services.resumo_service import ResumoService
 
 bp = Blueprint('tarefas_melhoradas', __name__, url_prefix='/tarefas-melhoradas')
 
 
 @bp.get('/standalone')
+@requer_perfil('admin', 'gerente')
 def gerente_tarefas_standalone():
     """Página standalone moderna do gerente (sem layout global)"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
+        usuario = usuario_atual()
         
-        # Verificar tipo de usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login_page'))
-        
-        setores = Setor.query.all()
-        tributacoes = Tributacao.query.order_by(Tributacao.nome).all()
+        setores = ReferenciaService.setores()
+        tributacoes = ReferenciaService.tributacoes()
         
         print(f"✅ Renderizando página standalone para {usuario.nome}")
         
@@ -43,19 +41,14 @@ def gerente_tarefas_standalone():
 
 
 @bp.get('/nova')
+@requer_perfil('admin', 'gerente')
 def gerente_tarefas():
     """Mantido para compatibilidade; redireciona à versão standalone"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login_page'))
+        usuario = usuario_atual()
         
-        setores = Setor.query.all()
-        tributacoes = Tributacao.query.order_by(Tributacao.nome).all()
+        setores = ReferenciaService.setores()
+        tributacoes = ReferenciaService.tributacoes()
         
         return render_template(
             'gerente_tarefas_standalone.html',
@@ -70,22 +63,16 @@ def gerente_tarefas():
 
 
 @bp.get('/')
+@requer_perfil('admin', 'gerente')
 def dashboard():
     """Dashboard principal do sistema melhorado de tarefas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        # Verificar se é admin ou gerente
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login_page'))
+        usuario = usuario_atual()
         
         # Buscar dados para o dashboard
         empresas = Empresa.query.filter_by(ativo=True).order_by(Empresa.nome).all()
-        tributacoes = Tributacao.query.all()
-        setores = Setor.query.all()
+        tributacoes = ReferenciaService.tributacoes()
+        setores = ReferenciaService.setores()
         
         # Filtrar tarefas por setor se for gerente
         tarefas_filtradas = []
@@ -116,13 +103,10 @@ def dashboard():
 
 
 @bp.get('/api/empresa/<int:empresa_id>')
+@requer_perfil(api=True)
 def api_empresa_detalhes(empresa_id):
     """API para obter detalhes de uma empresa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
         empresa = Empresa.query.get(empresa_id)
         if not empresa:
             return jsonify({'success': False, 'message': 'Empresa não encontrada'}), 404
@@ -165,16 +149,11 @@ def api_empresa_detalhes(empresa_id):
 
 
 @bp.post('/api/vincular-responsavel')
+@requer_perfil('admin', 'gerente', api=True)
 def api_vincular_responsavel():
     """API para vincular tarefas de uma empresa a um responsável específico"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         data = request.get_json() or {}
         empresa_id = data.get('empresa_id')
@@ -242,6 +221,7 @@ def api_vincular_responsavel():
                 db.session.add(novo_rel)
                 criados += 1
         
+        ResumoService.reconstruir(empresa_ids=[empresa.id], commit=False)
         db.session.commit()
         
         return jsonify({
@@ -257,13 +237,10 @@ def api_vincular_responsavel():
 
 
 @bp.get('/api/empresa/<int:empresa_id>/tarefas')
+@requer_perfil(api=True)
 def api_empresa_tarefas(empresa_id):
     """API para obter tarefas de uma empresa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
         # Buscar tarefas ativas
         tarefas_ativas = db.session.query(RelacionamentoTarefa, Tarefa, Usuario).join(
             Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
@@ -331,17 +308,11 @@ def api_empresa_tarefas(empresa_id):
 
 
 @bp.get('/api/tarefas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_tarefas():
     """API para obter todas as tarefas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar tipo de usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         # Buscar tarefas
         query = Tarefa.query
@@ -387,18 +358,10 @@ def api_tarefas():
 
 
 @bp.post('/api/tarefas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_criar_tarefa():
     """API para criar nova tarefa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar tipo de usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         data = request.get_json()
         print(f"📝 Dados recebidos para criar tarefa: {data}")
         
@@ -472,18 +435,10 @@ def api_criar_tarefa():
 
 
 @bp.delete('/api/tarefas/<int:tarefa_id>')
+@requer_perfil('admin', 'gerente', api=True)
 def api_excluir_tarefa(tarefa_id):
     """API para excluir tarefa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar tipo de usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         tarefa = Tarefa.query.get(tarefa_id)
         if not tarefa:
             return jsonify({'success': False, 'message': 'Tarefa não encontrada'}), 404
@@ -499,17 +454,11 @@ def api_excluir_tarefa(tarefa_id):
 
 
 @bp.get('/api/tarefas/buscar')
+@requer_perfil('admin', 'gerente', api=True)
 def api_buscar_tarefas():
     """API para buscar tarefas por nome com filtro opcional por empresa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar tipo de usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         query_param = request.args.get('q', '').strip()
         empresa_id = request.args.get('empresa_id', type=int)
@@ -517,35 +466,34 @@ def api_buscar_tarefas():
         if len(query_param) < 2:
             return jsonify({'success': True, 'tarefas': []})
         
-        # Buscar tarefas
-        search_query = Tarefa.query.filter(Tarefa.nome.ilike(f'%{query_param}%'))
-        
-        # Filtrar por setor se for gerente
-        if usuario.tipo == 'gerente':
-            search_query = search_query.filter(Tarefa.setor_id == usuario.setor_id)
-        
-        # Se empresa_id for fornecido, filtrar tarefas já vinculadas para essa empresa
+        # Se empresa_id for fornecido, excluir tarefas já vinculadas para essa empresa
+        vinculadas = set()
         if empresa_id:
-            # Buscar tarefas já vinculadas para esta empresa
-            tarefas_vinculadas = db.session.query(RelacionamentoTarefa.tarefa_id).filter(
-                RelacionamentoTarefa.empresa_id == empresa_id,
-                RelacionamentoTarefa.ativo == True
-            ).subquery()
-            
-            # Excluir tarefas já vinculadas
-            search_query = search_query.filter(~Tarefa.id.in_(
-                db.session.query(tarefas_vinculadas.c.tarefa_id)
-            ))
+            vinculadas = {
+                tarefa_id for (tarefa_id,) in db.session.query(RelacionamentoTarefa.tarefa_id).filter(
+                    RelacionamentoTarefa.empresa_id == empresa_id,
+                    RelacionamentoTarefa.status == 'ativa'
+                )
+            }
         
-        tarefas = search_query.limit(10).all()
+        # Gerente sem setor não tem escopo: nada a listar
+        if usuario.tipo == 'gerente' and not usuario.setor_id:
+            return jsonify({'success': True, 'tarefas': []})
+        
+        # Buscar tarefas no índice de autocomplete (gerente: só as do seu setor)
+        tarefas = AutocompleteService.buscar(
+            'tarefas', query_param, limite=10,
+            setor_id=usuario.setor_id if usuario.tipo == 'gerente' and usuario.setor_id else None,
+            filtro=lambda tarefa: tarefa['id'] not in vinculadas
+        )
         
         tarefas_data = []
         for tarefa in tarefas:
             tarefas_data.append({
-                'id': tarefa.id,
-                'nome': tarefa.nome,
-                'tipo': tarefa.tipo,
-                'setor_nome': tarefa.setor.nome if tarefa.setor else 'N/A'
+                'id': tarefa['id'],
+                'nome': tarefa['nome'],
+                'tipo': tarefa['tipo'],
+                'setor_nome': tarefa['setor_nome']
             })
         
         return jsonify({'success': True, 'tarefas': tarefas_data})
@@ -555,17 +503,10 @@ def api_buscar_tarefas():
 
 
 @bp.get('/api/empresas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_empresas():
     """API para buscar empresas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         search = request.args.get('search', '').strip()
         limit = request.args.get('limit', type=int) or 30
         limit = max(5, min(limit, 200))
@@ -597,20 +538,12 @@ def api_empresas():
 
 
 @bp.get('/api/empresas/<int:empresa_id>/tarefas-disponiveis')
+@requer_perfil('admin', 'gerente', api=True)
 def api_tarefas_disponiveis_empresa(empresa_id):
     """Retorna tarefas disponíveis (não vinculadas) para uma empresa específica"""
     try:
         print(f"[INFO] API tarefas-disponiveis chamada para empresa_id: {empresa_id}")
-        user_id = session.get('user_id')
-        if not user_id:
-            print(f"[ERROR] Usuario nao autenticado")
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            print(f"[ERROR] Acesso negado para usuario {user_id} (tipo: {usuario.tipo if usuario else 'None'})")
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
+        usuario = usuario_atual()
         print(f"[OK] Usuario autenticado: {usuario.nome} (tipo: {usuario.tipo})")
         empresa = Empresa.query.get(empresa_id)
         if not empresa:
@@ -717,20 +650,12 @@ def api_tarefas_disponiveis_empresa(empresa_id):
 
 
 @bp.get('/api/responsaveis')
+@requer_perfil('admin', 'gerente', api=True)
 def api_responsaveis():
     """Busca responsáveis disponíveis para vinculação"""
     try:
         print(f"[INFO] API responsaveis chamada")
-        user_id = session.get('user_id')
-        if not user_id:
-            print(f"[ERROR] Usuario nao autenticado")
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            print(f"[ERROR] Acesso negado para usuario {user_id} (tipo: {usuario.tipo if usuario else 'None'})")
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
+        usuario = usuario_atual()
         print(f"[OK] Usuario autenticado: {usuario.nome} (tipo: {usuario.tipo})")
         search = request.args.get('q', '').strip()
         limit = request.args.get('limit', type=int) or 20
@@ -783,17 +708,11 @@ def api_responsaveis():
 
 
 @bp.get('/api/tributacao/<int:tributacao_id>/tarefas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_tributacao_tarefas(tributacao_id):
     """API para obter tarefas de uma tributação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
-        # Verificar tipo de usuário
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         # Buscar tarefas da tributação
         query = db.session.query(TarefaTributacao, Tarefa).join(
@@ -831,13 +750,10 @@ def api_tributacao_tarefas(tributacao_id):
 
 
 @bp.post('/api/empresa/<int:empresa_id>/alterar-tributacao')
+@requer_perfil(api=True)
 def api_alterar_tributacao(empresa_id):
     """API para alterar tributação de uma empresa"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
         data = request.get_json()
         nova_tributacao_id = data.get('tributacao_id')
         responsaveis = data.get('responsaveis', {})
@@ -852,7 +768,7 @@ def api_alterar_tributacao(empresa_id):
             return jsonify({'success': False, 'message': 'Empresa não encontrada'}), 404
         
         # Verificar se a nova tributação existe
-        nova_tributacao = Tributacao.query.get(nova_tributacao_id)
+        nova_tributacao = ReferenciaService.tributacao(nova_tributacao_id)
         if not nova_tributacao:
             return jsonify({'success': False, 'message': 'Tributação não encontrada'}), 404
         
@@ -942,6 +858,7 @@ def api_alterar_tributacao(empresa_id):
             
             # 6. Atualizar empresa
             empresa.tributacao_id = nova_tributacao_id
+            ResumoService.reconstruir(empresa_ids=[empresa.id], commit=False)
             
             db.session.commit()
             
@@ -964,13 +881,10 @@ def api_alterar_tributacao(empresa_id):
 
 
 @bp.get('/api/responsaveis-padrao')
+@requer_perfil(api=True)
 def api_responsaveis_padrao():
     """API para obter responsáveis padrão por setor e tributação"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
         responsaveis = db.session.query(
             ConfiguracaoResponsavelPadrao, Setor, Tributacao, Usuario
         ).join(
@@ -1011,13 +925,10 @@ def api_responsaveis_padrao():
 
 
 @bp.post('/api/responsaveis-padrao')
+@requer_perfil(api=True)
 def api_criar_responsavel_padrao():
     """API para criar responsável padrão"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
-        
         data = request.get_json()
         setor_id = data.get('setor_id')
         tributacao_id = data.get('tributacao_id')
@@ -2,32 +2,29 @@
 Blueprint V2 para o novo fluxo de vinculação de tarefas
 Fluxo: Funcionário → Tarefa → Empresas
 """
-from flask import Blueprint, request, session, jsonify, render_template, redirect, url_for
+from flask import Blueprint, current_app, request, jsonify, render_template, redirect, url_for
 from sqlalchemy import or_
 from datetime import datetime
 
 from app.db import db
 from app.models import Empresa, Usuario, Tarefa, RelacionamentoTarefa
+from app.services.identidade_service import requer_perfil, usuario_atual
+from app.services.referencia_service import ReferenciaService
+from app.services.vinculo_service import VinculoService
 
 bp = Blueprint('tarefas_v2', __name__, url_prefix='/tarefas-v2')
 
 
 @bp.get('/')
+@requer_perfil('admin', 'gerente')
 def pagina_atribuir():
     """Página principal do novo fluxo de atribuição de tarefas"""
     try:
-        user_id = session.get('user_id')
-        if not user_id:
-            return redirect(url_for('auth.login_page'))
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return redirect(url_for('auth.login_page'))
+        usuario = usuario_atual()
         
         # Buscar setores e tributações para o modal de criar tarefa
-        from app.models import Setor, Tributacao
-        setores = Setor.query.order_by(Setor.nome).all()
-        tributacoes = Tributacao.query.order_by(Tributacao.nome).all()
+        setores = ReferenciaService.setores()
+        tributacoes = ReferenciaService.tributacoes()
         
         print(f"[V2] Renderizando pagina de atribuicao para {usuario.nome}")
         return render_template(
@@ -43,17 +40,12 @@ def pagina_atribuir():
 
 
 @bp.get('/api/funcionarios')
+@requer_perfil('admin', 'gerente', api=True)
 def api_funcionarios():
     """API V2: Busca funcionários do setor do gerente"""
     try:
         print(f"[V2] API funcionarios chamada")
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuario nao autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         search = request.args.get('q', '').strip()
         limit = request.args.get('limit', type=int) or 50
@@ -89,17 +81,12 @@ def api_funcionarios():
 
 
 @bp.get('/api/tarefas')
+@requer_perfil('admin', 'gerente', api=True)
 def api_tarefas():
     """API V2: Busca tarefas do setor do gerente (exceto anuais)"""
     try:
         print(f"[V2] API tarefas chamada")
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuario nao autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         search = request.args.get('q', '').strip()
         tributacao_id = request.args.get('tributacao_id', type=int)
@@ -155,18 +142,11 @@ def api_tarefas():
 
 
 @bp.get('/api/empresas-disponiveis')
+@requer_perfil('admin', 'gerente', api=True)
 def api_empresas_disponiveis():
     """API V2: Busca empresas que ainda não têm a tarefa vinculada"""
     try:
         print(f"[V2] API empresas-disponiveis chamada")
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuario nao autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
-        
         tarefa_id = request.args.get('tarefa_id', type=int)
         search = request.args.get('q', '').strip()
         
@@ -228,17 +208,12 @@ def api_empresas_disponiveis():
 
 
 @bp.post('/api/vincular')
+@requer_perfil('admin', 'gerente', api=True)
 def api_vincular():
     """API V2: Vincula uma tarefa a múltiplas empresas para um funcionário específico"""
     try:
         print(f"[V2] API vincular chamada")
-        user_id = session.get('user_id')
-        if not user_id:
-            return jsonify({'success': False, 'message': 'Usuario nao autenticado'}), 401
-        
-        usuario = Usuario.query.get(user_id)
-        if not usuario or usuario.tipo not in ['admin', 'gerente']:
-            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        usuario = usuario_atual()
         
         data = request.get_json() or {}
         funcionario_id = data.get('funcionario_id')
@@ -277,57 +252,24 @@ def api_vincular():
         if tarefa.tipo == 'Anual':
             return jsonify({'success': False, 'message': 'Tarefas anuais nao podem ser vinculadas via este processo'}), 400
         
-        criados = 0
+        agora = datetime.utcnow()
+        resultado = VinculoService.vincular_tarefa(
+            tarefa,
+            empresas_ids,
+            funcionario.id,
+            valores={'criado_em': agora, 'atualizado_em': agora}
+        )
+        
+        erros = [f'Empresa ID {empresa_id} nao encontrada ou inativa' for empresa_id in resultado['invalidas']]
+        erros.extend(f'Empresa {empresa.nome} tem tributacao incompativel' for empresa in resultado['incompativeis'])
+        for duplicado in resultado['duplicados']:
+            if duplicado['responsavel_id'] != funcionario.id:
+                erros.append(f"{duplicado['empresa'].nome}: tarefa ja vinculada a {duplicado['responsavel_nome']}")
+        
+        criados = len(resultado['criados'])
         atualizados = 0
-        duplicados = 0
-        erros = []
-        
-        for empresa_id in empresas_ids:
-            try:
-                empresa = Empresa.query.get(empresa_id)
-                if not empresa or not empresa.ativo:
-                    erros.append(f'Empresa ID {empresa_id} nao encontrada ou inativa')
-                    continue
-                
-                if not tarefa.tarefa_comum:
-                    if tarefa.tributacao_id and empresa.tributacao_id != tarefa.tributacao_id:
-                        erros.append(f'Empresa {empresa.nome} tem tributacao incompativel')
-                        continue
-                
-                vinculacao_existente = RelacionamentoTarefa.query.filter_by(
-                    empresa_id=empresa_id,
-                    tarefa_id=tarefa_id,
-                    versao_atual=True,
-                    status='ativa'
-                ).first()
-                
-                if vinculacao_existente:
-                    if vinculacao_existente.responsavel_id != funcionario_id:
-                        responsavel_nome = vinculacao_existente.responsavel.nome if vinculacao_existente.responsavel else 'Desconhecido'
-                        print(f"[V2] Duplicata detectada: Empresa {empresa.nome} ja tem tarefa vinculada")
-                        erros.append(f'{empresa.nome}: tarefa ja vinculada a {responsavel_nome}')
-                        duplicados += 1
-                        continue
-                    else:
-                        duplicados += 1
-                        continue
-                
-                novo_rel = RelacionamentoTarefa(
-                    empresa_id=empresa_id,
-                    tarefa_id=tarefa_id,
-                    responsavel_id=funcionario_id,
-                    status='ativa',
-                    versao_atual=True,
-                    criado_em=datetime.utcnow(),
-                    atualizado_em=datetime.utcnow()
-                )
-                db.session.add(novo_rel)
-                criados += 1
-                print(f"[V2] Vinculacao criada: {empresa.nome} -> {tarefa.nome} -> {funcionario.nome}")
-                
-            except Exception as e:
-                erros.append(f'Empresa ID {empresa_id}: {str(e)}')
-                continue
+        duplicados = len(resultado['duplicados'])
+        current_app.logger.info(f"[V2] {criados} vinculacao(oes) criada(s): {tarefa.nome} -> {funcionario.nome}")
         
         try:
             db.session.commit()
@@ -0,0 +1,204 @@
+"""
+Comandos de linha de comando (flask CLI)
+
+Uso:
+    flask --app run periodos gerar --ano 2025 --mes 10
+    flask --app run tributacao migrar --tributacao 2 --filtro-tributacao 1 --usuario 1
+    flask --app run tributacao retomar 7
+    flask --app run resumo reconstruir --periodo 2025-10
+    flask --app run jobs worker --concorrencia 4 --modo processo
+    flask --app run busca reindexar
+    flask --app run estaticos compilar
+"""
+
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.db import db
+
+
+periodos_cli = AppGroup('periodos', help='Geração de períodos das tarefas.')
+tributacao_cli = AppGroup('tributacao', help='Mudança de tributação em massa.')
+resumo_cli = AppGroup('resumo', help='Resumo de status do painel do gerente.')
+jobs_cli = AppGroup('jobs', help='Fila de jobs em segundo plano.')
+busca_cli = AppGroup('busca', help='Índices full-text da busca.')
+estaticos_cli = AppGroup('estaticos', help='Arquivos estáticos versionados e pré-comprimidos.')
+
+
+@periodos_cli.command('gerar')
+@click.option('--ano', type=int, default=None, help='Ano de referência (padrão: ano atual).')
+@click.option('--mes', type=int, default=None, help='Mês de referência (padrão: mês atual).')
+@click.option('--lote', type=int, default=1000, show_default=True, help='Linhas por INSERT.')
+def gerar_periodos_command(ano, mes, lote):
+    """Gera os períodos faltantes de todos os relacionamentos ativos."""
+    from app.services.periodo_service import PeriodoService
+
+    hoje = datetime.now()
+    ano = ano or hoje.year
+    mes = mes or hoje.month
+    if not 1 <= mes <= 12:
+        raise click.BadParameter('Mês deve estar entre 1 e 12', param_hint='--mes')
+
+    try:
+        resultado = PeriodoService.gerar_periodos(ano, mes, tamanho_lote=lote)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    click.echo(f"Período {resultado['periodo']}: "
+               f"{resultado['tarefas_criadas']} criadas, "
+               f"{resultado['tarefas_existentes']} já existentes, "
+               f"{resultado['total_relacionamentos']} relacionamentos ativos")
+    for etapa, ms in resultado['tempos'].items():
+        click.echo(f"  {etapa}: {ms} ms")
+
+
+def _echo_progresso_migracao(status):
+    click.echo(f"  [{status['percentual']:5.1f}%] {status['processadas']}/{status['total']} empresas "
+               f"({status['migradas']} migradas, {status['ignoradas']} ignoradas) "
+               f"- {status.get('segundos', 0)} s")
+
+
+@tributacao_cli.command('migrar')
+@click.option('--tributacao', 'tributacao_id', type=int, required=True, help='ID da nova tributação.')
+@click.option('--usuario', 'usuario_id', type=int, required=True, help='ID do usuário responsável.')
+@click.option('--empresa', 'empresa_ids', type=int, multiple=True, help='ID de empresa (repetível).')
+@click.option('--filtro-tributacao', type=int, default=None, help='Seleciona empresas da tributação atual informada.')
+@click.option('--apenas-ativas/--todas', default=True, show_default=True, help='Considera apenas empresas ativas.')
+@click.option('--motivo', default='Mudança de tributação em massa', show_default=True)
+@click.option('--modo', type=click.Choice(['preservar', 'substituir']), default='preservar', show_default=True)
+@click.option('--lote', type=int, default=100, show_default=True, help='Empresas por transação.')
+@click.option('--dry-run', is_flag=True, help='Apenas mostra o plano, sem gravar.')
+def migrar_tributacao_command(tributacao_id, usuario_id, empresa_ids, filtro_tributacao, apenas_ativas,
+                              motivo, modo, lote, dry_run):
+    """Migra a tributação de várias empresas em lotes com checkpoint."""
+    from app.services.tributacao_service import TributacaoService
+
+    filtro = {'ativo': True if apenas_ativas else None}
+    if filtro_tributacao:
+        filtro['tributacao_id'] = filtro_tributacao
+    if not empresa_ids and not filtro_tributacao:
+        raise click.UsageError('Informe --empresa ou --filtro-tributacao')
+
+    ids = TributacaoService.selecionar_empresas(list(empresa_ids), filtro)
+    if dry_run:
+        planos = TributacaoService.planejar_mudancas(ids, tributacao_id, modo)
+        for plano in planos:
+            click.echo(f"{plano['empresa_id']:>6} {plano['empresa_nome'][:40]:<40} "
+                       f"desativar={len(plano['desativar'])} reativar={len(plano['reativar'])} "
+                       f"criar={len(plano['criar'])} preservados={len(plano['preservados'])}")
+        click.echo(f"{len(planos)} empresas (dry-run, nada foi gravado)")
+        return
+
+    migracao = TributacaoService.criar_migracao(ids, tributacao_id, usuario_id, motivo, modo, lote)
+    click.echo(f"Migração {migracao.id}: {migracao.total} empresas em lotes de {migracao.tamanho_lote}")
+    _executar_migracao(migracao.id)
+
+
+@tributacao_cli.command('retomar')
+@click.argument('migracao_id', type=int)
+def retomar_migracao_command(migracao_id):
+    """Retoma uma migração a partir do último lote confirmado."""
+    _executar_migracao(migracao_id)
+
+
+def _executar_migracao(migracao_id):
+    from app.services.tributacao_service import TributacaoService
+
+    try:
+        status = TributacaoService.executar_migracao(migracao_id, progresso=_echo_progresso_migracao)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except Exception as e:
+        raise click.ClickException(
+            f"Migração {migracao_id} interrompida: {e}. "
+            f"Execute 'flask tributacao retomar {migracao_id}' para continuar."
+        )
+    click.echo(f"Migração {status['id']} concluída em {status['segundos']} s: "
+               f"{status['migradas']} migradas, {status['ignoradas']} ignoradas")
+
+
+@resumo_cli.command('reconstruir')
+@click.option('--periodo', 'periodos', multiple=True, help='Label do período (YYYY-MM ou YYYY-TQ, repetível).')
+@click.option('--empresa', 'empresa_ids', type=int, multiple=True, help='ID de empresa (repetível).')
+def reconstruir_resumo_command(periodos, empresa_ids):
+    """Recalcula os contadores de status a partir dos períodos."""
+    from app.services.resumo_service import ResumoService
+
+    try:
+        linhas = ResumoService.reconstruir(
+            periodo_labels=list(periodos) or None,
+            empresa_ids=list(empresa_ids) or None
+        )
+    except Exception:
+        db.session.rollback()
+        raise
+    click.echo(f"Resumo reconstruído: {linhas} linhas")
+
+
+@jobs_cli.command('worker')
+@click.option('--concorrencia', type=int, default=2, show_default=True, help='Jobs simultâneos.')
+@click.option('--modo', type=click.Choice(['thread', 'processo']), default='thread', show_default=True,
+              help='Pool de threads ou de processos.')
+@click.option('--intervalo', type=float, default=2.0, show_default=True, help='Espera (s) com a fila vazia.')
+@click.option('--uma-vez', is_flag=True, help='Executa os jobs prontos no próprio processo e encerra.')
+def worker_jobs_command(concorrencia, modo, intervalo, uma_vez):
+    """Executa os jobs pendentes (periodos, importações, PDFs, migrações)."""
+    from app.services.job_service import JobService, executar_worker, nome_worker
+
+    if uma_vez:
+        executados = JobService.processar_pendentes(nome_worker())
+        click.echo(f"{executados} jobs executados")
+        return
+
+    click.echo(f"Worker iniciado: {concorrencia} x {modo} (Ctrl+C para encerrar)")
+    try:
+        executar_worker(current_app._get_current_object(), concorrencia, modo, intervalo)
+    except KeyboardInterrupt:
+        click.echo("Worker encerrado")
+
+
+@jobs_cli.command('limpar')
+@click.option('--dias', type=int, default=7, show_default=True, help='Idade mínima dos jobs finalizados.')
+def limpar_jobs_command(dias):
+    """Remove jobs finalizados antigos e seus arquivos."""
+    from app.services.job_service import JobService
+
+    click.echo(f"{JobService.limpar(dias)} jobs removidos")
+
+
+@busca_cli.command('reindexar')
+def reindexar_busca_command():
+    """Recalcula os nomes normalizados e reconstrói os índices full-text da busca."""
+    from app.services.busca_service import BuscaService
+
+    try:
+        tabelas = BuscaService.reindexar()
+    except Exception:
+        db.session.rollback()
+        raise
+    click.echo(f"Índices reconstruídos ({BuscaService.backend().nome}): {', '.join(tabelas)}")
+
+
+@estaticos_cli.command('compilar')
+@click.option('--minimo', type=int, default=1024, show_default=True, help='Tamanho mínimo (bytes) para comprimir.')
+def compilar_estaticos_command(minimo):
+    """Gera static/dist com hash no nome, versões .gz/.br e o manifesto."""
+    from app.services.compressao_service import CompressaoService, brotli
+
+    manifesto = CompressaoService.compilar_estaticos(current_app.static_folder, minimo)
+    formatos = 'gzip e brotli' if brotli is not None else 'gzip'
+    click.echo(f"{len(manifesto)} arquivos versionados em static/dist ({formatos})")
+
+
+def register_commands(app):
+    """Registra os grupos de comandos na aplicação"""
+    app.cli.add_command(periodos_cli)
+    app.cli.add_command(tributacao_cli)
+    app.cli.add_command(resumo_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(busca_cli)
+    app.cli.add_command(estaticos_cli)
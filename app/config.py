@@ -43,6 +43,26 @@ class BaseConfig:
 	RATELIMIT_ENABLED = True
 	RATELIMIT_STORAGE_URL = REDIS_URL or 'memory://'
 	WTF_CSRF_ENABLED = True
+	JOBS_DIR = os.getenv('JOBS_DIR')  # Artefatos dos jobs (padrão: <instance>/jobs)
+	BUSCA_BACKEND = os.getenv('BUSCA_BACKEND')  # mysql | fts5 | like (padrão: pelo dialeto do banco)
+	AUTOCOMPLETE_TTL = int(os.getenv('AUTOCOMPLETE_TTL', 300))  # Recarga completa do índice de autocomplete (s)
+	IDENTIDADE_TTL = int(os.getenv('IDENTIDADE_TTL', 30))  # Validade (s) do usuário logado em cache por processo
+	CACHE_CONTROL_PADRAO = os.getenv('CACHE_CONTROL_PADRAO', 'private, no-cache')  # Respostas com ETag (revalidar sempre)
+	CACHE_CONTROL_ENDPOINTS = {}  # Por endpoint, ex.: {'api_v1.list_empresas': 'private, max-age=30'}
+	COMPRESSAO_ATIVA = os.getenv('COMPRESSAO_ATIVA', '1') == '1'  # gzip/brotli de HTML/JSON
+	COMPRESSAO_MINIMO = int(os.getenv('COMPRESSAO_MINIMO', 1024))  # Bytes; respostas menores vão sem compressão
+	COMPRESSAO_NIVEL_GZIP = 6
+	COMPRESSAO_NIVEL_BROTLI = 5
+	ESTATICOS_VERSIONADOS = os.getenv('ESTATICOS_VERSIONADOS', '1') == '1'  # Usa static/dist/manifest.json se existir
+	JSON_BACKEND = os.getenv('JSON_BACKEND')  # orjson | stdlib (padrão: orjson se instalado)
+	SQL_INSTRUMENTACAO = os.getenv('SQL_INSTRUMENTACAO', '1') == '1'  # Contagem de SQL por requisição/endpoint
+	SQL_N1_LIMITE = int(os.getenv('SQL_N1_LIMITE', 10))  # Execuções da mesma instrução numa requisição antes do aviso de N+1
+	SQL_CABECALHOS = False  # Cabeçalhos X-SQL-* e Server-Timing nas respostas
+	SQL_LENTA_MS = float(os.getenv('SQL_LENTA_MS', 500))  # Instruções acima disso vão ao log de consultas lentas (0 desliga)
+	METRICAS_ATIVAS = os.getenv('METRICAS_ATIVAS', '1') == '1'  # Coleta por requisição e rota /metrics
+	METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')  # Se definido, /metrics exige Authorization: Bearer <token>
+	METRICAS_REDES = os.getenv('METRICAS_REDES', '127.0.0.1/32,::1/128')  # Sem token, clientes aceitos em /metrics
+	RELATORIO_PDF_SINCRONO_MAX = int(os.getenv('RELATORIO_PDF_SINCRONO_MAX', 2000))  # Linhas; acima disso /relatorios/pdf vira job
 	DEBUG = False
 	TESTING = False
 
@@ -51,6 +71,8 @@ class DevelopmentConfig(BaseConfig):
 	"""Configuration for local development."""
 
 	DEBUG = True
+	ESTATICOS_VERSIONADOS = False
+	SQL_CABECALHOS = True
 
 
 class TestingConfig(BaseConfig):
@@ -64,6 +86,8 @@ class TestingConfig(BaseConfig):
 	RATELIMIT_ENABLED = False
 	RATELIMIT_STORAGE_URL = 'memory://'
 	WTF_CSRF_ENABLED = False
+	ESTATICOS_VERSIONADOS = False
+	SQL_CABECALHOS = True
 
 
 class ProductionConfig(BaseConfig):
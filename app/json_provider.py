@@ -0,0 +1,119 @@
+"""Provider JSON da aplicação: orjson quando instalado, json da stdlib caso contrário.
+
+Os dois caminhos produzem o mesmo JSON (a menos do escape de não-ASCII):
+
+- ``date``/``datetime``/``time`` em ISO 8601 (``2025-08-31``, ``2025-08-31T14:05:00``);
+- ``Decimal`` e ``UUID`` como string;
+- ``Row`` do SQLAlchemy como objeto (``row._asdict()``) e ``RowMapping`` como dict,
+  para que consultas com colunas nomeadas possam ir direto para o ``jsonify``;
+- namedtuples como lista, como faz o json da stdlib.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider, _default as _default_flask
+from sqlalchemy.engine import Row, RowMapping
+
+try:
+	import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+	orjson = None
+
+
+BACKENDS = ('orjson', 'stdlib')
+
+
+# (metadados do resultado, nomes das colunas) da última Row convertida: as
+# linhas de uma mesma consulta compartilham os metadados e ``Row._fields``
+# é caro para chamar a cada linha
+_ultimas_colunas: tuple[Any, tuple[str, ...]] = (None, ())
+
+
+def _row_para_dict(row: Row) -> dict[str, Any]:
+	global _ultimas_colunas
+	metadados = getattr(row, '_parent', None)
+	if metadados is None:
+		return row._asdict()
+	ultimo, colunas = _ultimas_colunas
+	if ultimo is not metadados:
+		colunas = tuple(row._fields)
+		_ultimas_colunas = (metadados, colunas)
+	return dict(zip(colunas, row))
+
+
+def padrao_json(obj: Any) -> Any:
+	"""Converte tipos que o serializador não conhece (parâmetro ``default``)."""
+	if isinstance(obj, Row):
+		return _row_para_dict(obj)
+	if isinstance(obj, RowMapping):
+		return dict(obj)
+	if isinstance(obj, (datetime, date, time)):
+		return obj.isoformat()
+	if isinstance(obj, tuple):
+		return list(obj)
+	return _default_flask(obj)
+
+
+class JSONProviderRapido(DefaultJSONProvider):
+	"""DefaultJSONProvider com serialização via orjson e tipos extras.
+
+	``JSON_BACKEND`` escolhe o serializador (``orjson`` ou ``stdlib``); sem
+	configuração usa orjson se estiver instalado. Chamadas de ``dumps`` com
+	argumentos que o orjson não suporta (``cls``, ``separators`` não
+	compactos...) usam a stdlib.
+	"""
+
+	default = staticmethod(padrao_json)
+
+	def __init__(self, app) -> None:
+		super().__init__(app)
+		backend = app.config.get('JSON_BACKEND') or ('orjson' if orjson is not None else 'stdlib')
+		if backend not in BACKENDS:
+			raise ValueError(f"JSON_BACKEND inválido: {backend} (use {', '.join(BACKENDS)})")
+		if backend == 'orjson' and orjson is None:
+			app.logger.warning("orjson não instalado. JSON_BACKEND=stdlib.")
+			backend = 'stdlib'
+		self.backend = backend
+
+	def _opcoes_orjson(self, kwargs: dict[str, Any]) -> int | None:
+		"""Opções do orjson equivalentes aos kwargs, ou None se não houver."""
+		kwargs = dict(kwargs)
+		opcoes = orjson.OPT_NON_STR_KEYS
+		if kwargs.pop('sort_keys', self.sort_keys):
+			opcoes |= orjson.OPT_SORT_KEYS
+		indent = kwargs.pop('indent', None)
+		if indent:
+			if indent != 2:
+				return None
+			opcoes |= orjson.OPT_INDENT_2
+		separadores = kwargs.pop('separators', None)
+		if separadores is not None and tuple(separadores) != (',', ':'):
+			return None
+		kwargs.pop('ensure_ascii', None)
+		kwargs.pop('default', None)
+		return None if kwargs else opcoes
+
+	def dumps_bytes(self, obj: Any, **kwargs: Any) -> bytes:
+		"""Serializa para bytes UTF-8 (sem a volta por str do orjson)."""
+		if self.backend == 'orjson':
+			opcoes = self._opcoes_orjson(kwargs)
+			if opcoes is not None:
+				return orjson.dumps(obj, default=kwargs.get('default', self.default), option=opcoes)
+		return super().dumps(obj, **kwargs).encode('utf-8')
+
+	def dumps(self, obj: Any, **kwargs: Any) -> str:
+		if self.backend == 'orjson' and self._opcoes_orjson(kwargs) is not None:
+			return self.dumps_bytes(obj, **kwargs).decode('utf-8')
+		return super().dumps(obj, **kwargs)
+
+	def response(self, *args: Any, **kwargs: Any):
+		obj = self._prepare_response_obj(args, kwargs)
+		dump_args: dict[str, Any] = {}
+		if (self.compact is None and self._app.debug) or self.compact is False:
+			dump_args['indent'] = 2
+		else:
+			dump_args['separators'] = (',', ':')
+		return self._app.response_class(self.dumps_bytes(obj, **dump_args) + b'\n', mimetype=self.mimetype)
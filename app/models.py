@@ -1,4 +1,23 @@
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+
 from app.db import db
+from app.utils import normalizar_texto
+
+
+def _default_nome_normalizado(context):
+	"""Preenche nome_normalizado em INSERTs sem o campo (ex.: insert() em massa)"""
+	return normalizar_texto(context.get_current_parameters().get('nome'))
+
+
+def _coluna_nome_normalizado():
+	"""Cópia de `nome` minúscula e sem acentos para busca por prefixo
+
+	No MySQL a collation é binária: os valores já são normalizados e a
+	comparação byte a byte permite a busca por faixa no índice.
+	"""
+	tipo = db.String(255).with_variant(mysql.VARCHAR(255, collation='utf8mb4_bin'), 'mysql', 'mariadb')
+	return db.Column(tipo, default=_default_nome_normalizado)
 
 
 class Setor(db.Model):
@@ -13,8 +32,14 @@ class Setor(db.Model):
 
 class Usuario(db.Model):
 	__tablename__ = 'usuarios'
+	__table_args__ = (
+		# Busca textual (BuscaService); no SQLite o índice é uma tabela FTS5
+		db.Index('ft_usuarios_busca', 'nome', 'login', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+		db.Index('idx_usuario_nome_normalizado', 'nome_normalizado'),
+	)
 	id = db.Column(db.Integer, primary_key=True)
 	nome = db.Column(db.String(255), nullable=False)
+	nome_normalizado = _coluna_nome_normalizado()
 	login = db.Column(db.String(150), unique=True, nullable=False)
 	senha = db.Column(db.String(255), nullable=False)
 	tipo = db.Column(db.String(50), nullable=False)
@@ -36,9 +61,14 @@ class Tributacao(db.Model):
 
 class Empresa(db.Model):
 	__tablename__ = 'empresas'
+	__table_args__ = (
+		db.Index('ft_empresas_busca', 'nome', 'codigo', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+		db.Index('idx_empresa_nome_normalizado', 'nome_normalizado'),
+	)
 	id = db.Column(db.Integer, primary_key=True)
 	codigo = db.Column(db.String(100), unique=True, nullable=False)
 	nome = db.Column(db.String(255), nullable=False)
+	nome_normalizado = _coluna_nome_normalizado()
 	tributacao_id = db.Column(db.Integer, db.ForeignKey('tributacoes.id'))
 	criado_em = db.Column(db.TIMESTAMP)
 	atualizado_em = db.Column(db.TIMESTAMP)
@@ -47,8 +77,13 @@ class Empresa(db.Model):
 
 class Tarefa(db.Model):
 	__tablename__ = 'tarefas'
+	__table_args__ = (
+		db.Index('ft_tarefas_busca', 'nome', 'descricao', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+		db.Index('idx_tarefa_nome_normalizado', 'nome_normalizado'),
+	)
 	id = db.Column(db.Integer, primary_key=True)
 	nome = db.Column(db.String(255), nullable=False)
+	nome_normalizado = _coluna_nome_normalizado()
 	tipo = db.Column(db.String(50), nullable=False)
 	descricao = db.Column(db.Text)
 	tributacao_id = db.Column(db.Integer, db.ForeignKey('tributacoes.id'))
@@ -113,6 +148,30 @@ class Retificacao(db.Model):
 	criado_em = db.Column(db.TIMESTAMP)
 
 
+class ResumoStatusPeriodo(db.Model):
+	"""Contadores de status dos períodos por (período, empresa, setor, responsável)
+
+	Mantido por app.services.resumo_service.ResumoService. setor_id e
+	responsavel_id usam 0 para "sem setor"/"não atribuído" para que a chave
+	única funcione também no MySQL (NULL não participa de UNIQUE).
+	"""
+	__tablename__ = 'resumo_status_periodos'
+	__table_args__ = (
+		db.UniqueConstraint('periodo_label', 'empresa_id', 'setor_id', 'responsavel_id', name='uq_resumo_status_chave'),
+		db.Index('idx_resumo_status_setor', 'periodo_label', 'setor_id'),
+	)
+	id = db.Column(db.Integer, primary_key=True)
+	periodo_label = db.Column(db.String(50), nullable=False)
+	empresa_id = db.Column(db.Integer, nullable=False)
+	setor_id = db.Column(db.Integer, nullable=False, default=0)
+	responsavel_id = db.Column(db.Integer, nullable=False, default=0)
+	pendentes = db.Column(db.Integer, nullable=False, default=0)
+	fazendo = db.Column(db.Integer, nullable=False, default=0)
+	concluidas = db.Column(db.Integer, nullable=False, default=0)
+	retificadas = db.Column(db.Integer, nullable=False, default=0)
+	atualizado_em = db.Column(db.TIMESTAMP)
+
+
 # Novos modelos para sistema de checklists
 class Checklist(db.Model):
 	__tablename__ = 'checklists'
@@ -390,6 +449,64 @@ class MudancaTributacaoPendente(db.Model):
         return f'<MudancaTributacaoPendente {self.empresa.nome} - {self.tributacao_anterior.nome if self.tributacao_anterior else "Nova"} -> {self.tributacao_nova.nome} ({self.status})>'
 
 
+class MigracaoTributacaoLote(db.Model):
+    """Migração de tributação em massa, processada em lotes com checkpoint"""
+    __tablename__ = 'migracoes_tributacao_lote'
+    id = db.Column(db.Integer, primary_key=True)
+    tributacao_nova_id = db.Column(db.Integer, db.ForeignKey('tributacoes.id'), nullable=False)
+    modo = db.Column(db.String(20), nullable=False, default='preservar')
+    motivo = db.Column(db.Text)
+    empresa_ids = db.Column(db.JSON, nullable=False)  # Lista congelada na criação
+    tamanho_lote = db.Column(db.Integer, nullable=False, default=100)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processadas = db.Column(db.Integer, nullable=False, default=0)  # Checkpoint do último lote confirmado
+    migradas = db.Column(db.Integer, nullable=False, default=0)
+    ignoradas = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.Enum('pendente', 'em_andamento', 'concluida', 'falhou'), default='pendente')
+    erro = db.Column(db.Text)
+    criado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    criado_em = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
+    atualizado_em = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+    
+    # Relacionamentos
+    tributacao_nova = db.relationship('Tributacao', backref='migracoes_lote', lazy=True)
+    criador = db.relationship('Usuario', backref='migracoes_tributacao_lote', lazy=True)
+    
+    def __repr__(self):
+        return f'<MigracaoTributacaoLote {self.id} {self.processadas}/{self.total} ({self.status})>'
+
+
+class Job(db.Model):
+    """Tarefa em segundo plano executada pelo worker (`flask jobs worker`)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('idx_jobs_fila', 'status', 'proxima_execucao'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    parametros = db.Column(db.JSON)
+    status = db.Column(db.Enum('pendente', 'em_andamento', 'concluida', 'falhou'), nullable=False, default='pendente')
+    progresso = db.Column(db.Integer, nullable=False, default=0)  # Percentual 0-100
+    mensagem = db.Column(db.String(255))
+    resultado = db.Column(db.JSON)
+    erro = db.Column(db.Text)
+    arquivo = db.Column(db.String(500))  # Artefato gerado (caminho em disco)
+    nome_arquivo = db.Column(db.String(255))
+    mimetype = db.Column(db.String(100))
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3)
+    proxima_execucao = db.Column(db.DateTime)  # Início do backoff entre tentativas
+    worker = db.Column(db.String(100))
+    criado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    criado_em = db.Column(db.TIMESTAMP, default=db.func.current_timestamp())
+    iniciado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+    atualizado_em = db.Column(db.TIMESTAMP, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.tipo} ({self.status} {self.progresso}%)>'
+
+
 class ChecklistEmpresa(db.Model):
     """Vincula checklists às empresas por período"""
     __tablename__ = 'checklists_empresa'
@@ -411,4 +528,13 @@ class ChecklistEmpresa(db.Model):
     responsavel = db.relationship('Usuario', backref='checklists_responsavel', lazy=True)
     
     def __repr__(self):
-        return f'<ChecklistEmpresa {self.empresa.nome} - {self.checklist.nome}>'
\ No newline at end of file
+        return f'<ChecklistEmpresa {self.empresa.nome} - {self.checklist.nome}>'
+
+
+def _sincronizar_nome_normalizado(target, value, oldvalue, initiator):
+	target.nome_normalizado = normalizar_texto(value)
+
+
+# Mantém nome_normalizado em dia a cada atribuição de `nome` (inclusive no construtor)
+for _modelo in (Empresa, Tarefa, Usuario):
+	event.listen(_modelo.nome, 'set', _sincronizar_nome_normalizado)
@@ -0,0 +1,372 @@
+"""
+Serviço de Autocomplete
+Índice de trigramas em memória (por processo) sobre empresas ativas, tarefas
+e usuários ativos. Responde a prefixos e a termos com erros de digitação ou
+sem acentos sem consultar o banco; o escopo por setor do gerente é aplicado
+no próprio índice
+"""
+
+import heapq
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.db import db
+from app.models import Empresa, Tarefa, Usuario, Setor, RelacionamentoTarefa
+from app.utils import normalizar_texto
+
+
+TIPOS = ('empresas', 'tarefas', 'usuarios')
+# Fração mínima dos trigramas do termo presentes no item para a busca aproximada
+SIMILARIDADE_MINIMA = 0.6
+# Recarga completa periódica (s): captura escritas de outros processos
+TTL_PADRAO_SEGUNDOS = 300
+# IDs por consulta na recarga parcial
+TAMANHO_LOTE_RECARGA = 500
+
+# Ordem dos resultados: código exato, prefixo do código, prefixo do nome,
+# prefixo de palavra, trecho do nome e, por fim, semelhança
+NIVEL_CODIGO_EXATO = 0
+NIVEL_CODIGO_PREFIXO = 1
+NIVEL_NOME_PREFIXO = 2
+NIVEL_PALAVRA_PREFIXO = 3
+NIVEL_TRECHO = 4
+NIVEL_APROXIMADO = 5
+
+
+def trigramas(chave, prefixo=False):
+    """
+    Trigramas das palavras de um texto normalizado
+
+    Cada palavra recebe dois espaços à esquerda e um à direita, de modo que
+    o início das palavras tenha trigramas próprios. Com `prefixo`, a última
+    palavra fica sem o espaço final (o usuário ainda está digitando).
+    """
+    palavras = chave.split()
+    resultado = set()
+    for posicao, palavra in enumerate(palavras):
+        final = '' if prefixo and posicao == len(palavras) - 1 else ' '
+        texto = f'  {palavra}{final}'
+        resultado.update(texto[i:i + 3] for i in range(len(texto) - 2))
+    return resultado
+
+
+class ItemIndice:
+    """Entrada do índice: dados devolvidos e chaves de busca"""
+
+    __slots__ = ('id', 'chave', 'codigo', 'setores', 'dados', 'trigramas')
+
+    def __init__(self, id, nome, dados, codigo=None, setores=()):
+        self.id = id
+        self.chave = normalizar_texto(nome)
+        self.codigo = normalizar_texto(codigo) if codigo else ''
+        self.setores = frozenset(setores)
+        self.dados = dados
+        self.trigramas = trigramas(f'{self.chave} {self.codigo}')
+
+
+class IndiceTrigramas:
+    """Índice invertido trigrama -> ids de um tipo de registro"""
+
+    def __init__(self):
+        self.itens = {}
+        self.postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def adicionar(self, item):
+        self.remover(item.id)
+        self.itens[item.id] = item
+        for trigrama in item.trigramas:
+            self.postings[trigrama].add(item.id)
+
+    def remover(self, item_id):
+        item = self.itens.pop(item_id, None)
+        if not item:
+            return
+        for trigrama in item.trigramas:
+            ids = self.postings.get(trigrama)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self.postings[trigrama]
+
+    def buscar(self, termo, limite=None, aceitar=None):
+        """
+        Itens que casam com o termo, do mais ao menos relevante
+
+        Args:
+            termo: texto digitado (qualquer caixa/acentuação)
+            limite: máximo de itens (None = todos)
+            aceitar: função ItemIndice -> bool aplicada aos candidatos
+
+        Returns:
+            list: ItemIndice ordenados
+        """
+        chave = normalizar_texto(termo)
+        if not chave:
+            candidatos = ((item.chave, item.id) for item in self.itens.values() if not aceitar or aceitar(item))
+            ordenados = sorted(candidatos) if limite is None else heapq.nsmallest(limite, candidatos)
+            return [self.itens[item_id] for _, item_id in ordenados]
+
+        consulta = trigramas(chave, prefixo=True)
+        comuns = Counter()
+        for trigrama in consulta:
+            comuns.update(self.postings.get(trigrama, ()))
+
+        minimo = math.ceil(len(consulta) * SIMILARIDADE_MINIMA)
+        ranking = []
+        for item_id, quantidade in comuns.items():
+            if quantidade < minimo:
+                continue
+            item = self.itens[item_id]
+            if aceitar and not aceitar(item):
+                continue
+            ranking.append((_nivel(item, chave), -quantidade / len(consulta), item.chave, item_id))
+
+        ordenados = sorted(ranking) if limite is None else heapq.nsmallest(limite, ranking)
+        return [self.itens[item_id] for *_, item_id in ordenados]
+
+
+def _nivel(item, chave):
+    if item.codigo:
+        if item.codigo == chave:
+            return NIVEL_CODIGO_EXATO
+        if item.codigo.startswith(chave):
+            return NIVEL_CODIGO_PREFIXO
+    if item.chave.startswith(chave):
+        return NIVEL_NOME_PREFIXO
+    if f' {chave}' in f' {item.chave}':
+        return NIVEL_PALAVRA_PREFIXO
+    if chave in item.chave:
+        return NIVEL_TRECHO
+    return NIVEL_APROXIMADO
+
+
+class IndiceAutocomplete:
+    """Índices dos três tipos com recarga parcial (registros alterados) ou completa"""
+
+    def __init__(self, ttl=TTL_PADRAO_SEGUNDOS):
+        self.ttl = ttl
+        self.indices = {tipo: IndiceTrigramas() for tipo in TIPOS}
+        self.carregado_em = {}
+        self.alterados = {tipo: set() for tipo in TIPOS}
+        self.recarregar = set(TIPOS)
+        self.lock = threading.RLock()
+
+    def invalidar(self, marcas):
+        """Marca (tipo, id) para recarga; id None recarrega o tipo inteiro"""
+        with self.lock:
+            for tipo, item_id in marcas:
+                if item_id is None:
+                    self.recarregar.add(tipo)
+                else:
+                    self.alterados[tipo].add(item_id)
+
+    def atualizar(self, tipo):
+        """Aplica as recargas pendentes do tipo (consulta o banco só se houver)"""
+        with self.lock:
+            expirado = time.monotonic() - self.carregado_em.get(tipo, 0) > self.ttl
+            if tipo in self.recarregar or expirado:
+                indice = IndiceTrigramas()
+                for item in CARREGADORES[tipo](None):
+                    indice.adicionar(item)
+                self.indices[tipo] = indice
+                self.carregado_em[tipo] = time.monotonic()
+                self.recarregar.discard(tipo)
+                self.alterados[tipo].clear()
+            elif self.alterados[tipo]:
+                ids = list(self.alterados[tipo])
+                indice = self.indices[tipo]
+                for posicao in range(0, len(ids), TAMANHO_LOTE_RECARGA):
+                    lote = ids[posicao:posicao + TAMANHO_LOTE_RECARGA]
+                    for item_id in lote:
+                        indice.remover(item_id)
+                    for item in CARREGADORES[tipo](lote):
+                        indice.adicionar(item)
+                self.alterados[tipo].clear()
+            return self.indices[tipo]
+
+    def buscar(self, tipo, termo, limite=None, setor_id=None, filtro=None):
+        indice = self.atualizar(tipo)
+
+        def aceitar(item):
+            if setor_id is not None and setor_id not in item.setores:
+                return False
+            return filtro is None or filtro(item.dados)
+
+        with self.lock:
+            return [item.dados for item in indice.buscar(termo, limite, aceitar)]
+
+
+def _carregar_empresas(ids):
+    """Empresas ativas; setores = setores das tarefas com relacionamento ativo"""
+    query = db.session.query(Empresa.id, Empresa.nome, Empresa.codigo).filter(Empresa.ativo == True)
+    setores_query = db.session.query(RelacionamentoTarefa.empresa_id, Tarefa.setor_id).join(
+        Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
+    ).filter(RelacionamentoTarefa.status == 'ativa').distinct()
+    if ids is not None:
+        query = query.filter(Empresa.id.in_(ids))
+        setores_query = setores_query.filter(RelacionamentoTarefa.empresa_id.in_(ids))
+
+    setores = defaultdict(set)
+    for empresa_id, setor_id in setores_query:
+        setores[empresa_id].add(setor_id)
+    return [
+        ItemIndice(id, nome, {
+            'id': id,
+            'nome': nome,
+            'codigo': codigo,
+            'tem_tarefas_ativas': id in setores
+        }, codigo=codigo, setores=setores.get(id, ()))
+        for id, nome, codigo in query
+    ]
+
+
+def _carregar_tarefas(ids):
+    query = db.session.query(Tarefa.id, Tarefa.nome, Tarefa.tipo, Tarefa.setor_id, Setor.nome).outerjoin(
+        Setor, Tarefa.setor_id == Setor.id
+    )
+    if ids is not None:
+        query = query.filter(Tarefa.id.in_(ids))
+    return [
+        ItemIndice(id, nome, {
+            'id': id,
+            'nome': nome,
+            'tipo': tipo,
+            'setor_id': setor_id,
+            'setor_nome': setor_nome or 'N/A'
+        }, setores=(setor_id,))
+        for id, nome, tipo, setor_id, setor_nome in query
+    ]
+
+
+def _carregar_usuarios(ids):
+    query = db.session.query(Usuario.id, Usuario.nome, Usuario.login, Usuario.tipo, Usuario.setor_id).filter(
+        Usuario.ativo == True
+    )
+    if ids is not None:
+        query = query.filter(Usuario.id.in_(ids))
+    return [
+        ItemIndice(id, nome, {
+            'id': id,
+            'nome': nome,
+            'login': login,
+            'tipo': tipo,
+            'setor_id': setor_id,
+            'ativo': True
+        }, setores=(setor_id,))
+        for id, nome, login, tipo, setor_id in query
+    ]
+
+
+CARREGADORES = {
+    'empresas': _carregar_empresas,
+    'tarefas': _carregar_tarefas,
+    'usuarios': _carregar_usuarios,
+}
+
+
+class AutocompleteService:
+    """Serviço de autocomplete sobre o índice em memória da aplicação"""
+
+    @staticmethod
+    def iniciar(app):
+        """Cria o índice da aplicação (carregado no primeiro uso ou em aquecer)"""
+        app.extensions['autocomplete'] = IndiceAutocomplete(
+            ttl=app.config.get('AUTOCOMPLETE_TTL', TTL_PADRAO_SEGUNDOS)
+        )
+
+    @staticmethod
+    def aquecer(app):
+        """Carrega os índices na subida do servidor"""
+        with app.app_context():
+            try:
+                for tipo in TIPOS:
+                    app.extensions['autocomplete'].atualizar(tipo)
+            except Exception as e:
+                app.logger.warning(f"Índice de autocomplete não carregado: {e}")
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def buscar(tipo, termo='', limite=10, setor_id=None, filtro=None):
+        """
+        Busca no índice de autocomplete
+
+        Args:
+            tipo: 'empresas', 'tarefas' ou 'usuarios'
+            termo: texto digitado; vazio lista por nome
+            limite: máximo de resultados (None = todos)
+            setor_id: restringe ao setor (gerente); em empresas, às que têm
+                tarefa ativa do setor
+            filtro: função opcional sobre os dados do item
+
+        Returns:
+            list: dicionários do item (não alterar)
+        """
+        return current_app.extensions['autocomplete'].buscar(tipo, termo, limite, setor_id, filtro)
+
+
+# Tabela alterada -> tipos do índice afetados
+TIPOS_POR_TABELA = {
+    Empresa.__tablename__: ('empresas',),
+    Tarefa.__tablename__: ('tarefas', 'empresas'),
+    Usuario.__tablename__: ('usuarios',),
+    RelacionamentoTarefa.__tablename__: ('empresas',),
+    Setor.__tablename__: ('tarefas',),
+}
+_PENDENTES = 'autocomplete_pendentes'
+
+
+def _marcas(obj):
+    if isinstance(obj, Empresa):
+        return [('empresas', obj.id)]
+    if isinstance(obj, Usuario):
+        return [('usuarios', obj.id)]
+    if isinstance(obj, Tarefa):
+        if inspect(obj).attrs.setor_id.history.has_changes():
+            return [('tarefas', obj.id), ('empresas', None)]
+        return [('tarefas', obj.id)]
+    if isinstance(obj, RelacionamentoTarefa):
+        return [('empresas', obj.empresa_id)]
+    if isinstance(obj, Setor):
+        return [('tarefas', None)]
+    return []
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_flush(session, flush_context):
+    pendentes = session.info.setdefault(_PENDENTES, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        pendentes.update(_marcas(obj))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_dml(estado):
+    # INSERT/UPDATE/DELETE em massa não passam pelo flush: recarrega o tipo
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    tabela = getattr(estado.statement, 'table', None)
+    for tipo in TIPOS_POR_TABELA.get(getattr(tabela, 'name', None), ()):
+        estado.session.info.setdefault(_PENDENTES, set()).add((tipo, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_commit(session):
+    pendentes = session.info.pop(_PENDENTES, None)
+    if pendentes and has_app_context():
+        indice = current_app.extensions.get('autocomplete')
+        if indice:
+            indice.invalidar(pendentes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_rollback(session):
+    session.info.pop(_PENDENTES, None)
@@ -0,0 +1,310 @@
+"""
+Serviço de Busca
+Busca textual com índice full-text e ranking por relevância. O backend é
+escolhido pelo dialeto do banco (MySQL FULLTEXT em produção, SQLite FTS5
+em testes/desenvolvimento) ou por BUSCA_BACKEND, com ILIKE como reserva.
+Buscas por prefixo do nome usam a coluna nome_normalizado (faixa no índice)
+"""
+
+import re
+import threading
+
+from flask import current_app
+from sqlalchemy import and_, or_, text, update, Integer, Float
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.exc import OperationalError
+
+from app.db import db
+from app.models import Empresa, Tarefa, Usuario
+from app.utils import normalizar_texto
+
+
+# Modelo -> colunas cobertas pelo índice full-text
+CAMPOS_BUSCA = {
+    Empresa: ('nome', 'codigo'),
+    Tarefa: ('nome', 'descricao'),
+    Usuario: ('nome', 'login'),
+}
+# Colunas curtas (além do nome) que também casam por prefixo
+CAMPOS_PREFIXO = {
+    Empresa: 'codigo',
+    Usuario: 'login',
+}
+# Tokens menores que isso são ignorados pelo FULLTEXT do InnoDB (innodb_ft_min_token_size)
+TAMANHO_MINIMO_TOKEN_MYSQL = 3
+# Linhas por UPDATE ao recalcular nome_normalizado
+TAMANHO_LOTE_NORMALIZACAO = 1000
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokens(termo):
+    """Palavras do termo digitado, sem operadores e pontuação"""
+    return _TOKEN.findall(termo or '')
+
+
+def filtro_prefixo(modelo, termo):
+    """
+    Condição "nome começa com o termo" sobre nome_normalizado
+
+    Usa faixa (>= termo e < termo + DEL) em vez de LIKE: os valores só têm
+    [a-z0-9 ] e a comparação é binária (BINARY no SQLite, utf8mb4_bin no
+    MySQL), então o índice da coluna é percorrido como range scan.
+
+    Returns:
+        Condição SQL, ou None se o termo não tiver letras/dígitos
+    """
+    chave = normalizar_texto(termo)
+    if not chave:
+        return None
+    return and_(modelo.nome_normalizado >= chave, modelo.nome_normalizado < chave + '\x7f')
+
+
+class BackendLike:
+    """Reserva sem índice full-text: trecho do nome (sem acentos) ou ILIKE nas demais colunas"""
+
+    nome = 'like'
+
+    def preparar(self, modelo):
+        pass
+
+    def reindexar(self, modelo):
+        pass
+
+    def consulta(self, modelo, termo):
+        padrao = f'%{termo}%'
+        condicoes = [getattr(modelo, campo).ilike(padrao) for campo in CAMPOS_BUSCA[modelo] if campo != 'nome']
+        chave = normalizar_texto(termo)
+        if chave:
+            condicoes.append(modelo.nome_normalizado.like(f'%{chave}%'))
+        return modelo.query.filter(or_(*condicoes))
+
+
+def consulta_prefixo(modelo, termo):
+    """Nome (e código/login) começando pelo termo, em ordem alfabética"""
+    condicoes = [getattr(modelo, CAMPOS_PREFIXO[modelo]).like(f'{termo}%')] if modelo in CAMPOS_PREFIXO else []
+    prefixo = filtro_prefixo(modelo, termo)
+    if prefixo is not None:
+        condicoes.append(prefixo)
+    return modelo.query.filter(or_(*condicoes)).order_by(modelo.nome_normalizado, modelo.id)
+
+
+class BackendMySQL:
+    """MATCH ... AGAINST em modo booleano sobre os índices FULLTEXT dos modelos
+
+    Os índices são declarados nos modelos (criados pelo create_all) e em
+    init_database.sql/database_indices.sql; o InnoDB os mantém a cada
+    INSERT/UPDATE.
+    """
+
+    nome = 'mysql'
+
+    def preparar(self, modelo):
+        pass
+
+    def reindexar(self, modelo):
+        db.session.execute(text(f'OPTIMIZE TABLE {modelo.__tablename__}'))
+
+    def consulta(self, modelo, termo):
+        palavras = [p for p in tokens(termo) if len(p) >= TAMANHO_MINIMO_TOKEN_MYSQL]
+        if not palavras:
+            # Termo curto demais para o índice (primeiras teclas): prefixo por faixa
+            return consulta_prefixo(modelo, termo)
+
+        # +palavra* exige todas as palavras e casa por prefixo (autocomplete)
+        expressao = ' '.join(f'+{palavra}*' for palavra in palavras)
+        colunas = [getattr(modelo, campo) for campo in CAMPOS_BUSCA[modelo]]
+        relevancia = match(*colunas, against=expressao).in_boolean_mode()
+        return modelo.query.filter(relevancia).order_by(relevancia.desc(), modelo.id)
+
+
+class BackendFTS5:
+    """Tabelas virtuais FTS5 com conteúdo externo (busca_<tabela>)
+
+    Triggers AFTER INSERT/UPDATE/DELETE na tabela do modelo mantêm o
+    índice. A tabela e os triggers são criados no primeiro uso; 'rebuild'
+    indexa o que já existia.
+    """
+
+    nome = 'fts5'
+
+    def __init__(self):
+        self._preparados = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tabela(modelo):
+        return f'busca_{modelo.__tablename__}'
+
+    def preparar(self, modelo):
+        chave = (id(db.engine), modelo)
+        if chave in self._preparados:
+            return
+        with self._lock:
+            if chave in self._preparados:
+                return
+            with db.engine.begin() as conexao:
+                existe = conexao.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nome"),
+                    {'nome': self.tabela(modelo)}
+                ).first()
+                if not existe:
+                    for comando in self._ddl(modelo):
+                        conexao.exec_driver_sql(comando)
+                    conexao.exec_driver_sql(
+                        f"INSERT INTO {self.tabela(modelo)}({self.tabela(modelo)}) VALUES ('rebuild')"
+                    )
+            self._preparados.add(chave)
+
+    def reindexar(self, modelo):
+        self.preparar(modelo)
+        db.session.execute(text(f"INSERT INTO {self.tabela(modelo)}({self.tabela(modelo)}) VALUES ('rebuild')"))
+
+    def _ddl(self, modelo):
+        fts = self.tabela(modelo)
+        origem = modelo.__tablename__
+        campos = CAMPOS_BUSCA[modelo]
+        colunas = ', '.join(campos)
+        novos = ', '.join(f'new.{campo}' for campo in campos)
+        antigos = ', '.join(f'old.{campo}' for campo in campos)
+        remover = f"INSERT INTO {fts}({fts}, rowid, {colunas}) VALUES ('delete', old.id, {antigos});"
+        inserir = f"INSERT INTO {fts}(rowid, {colunas}) VALUES (new.id, {novos});"
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({colunas}, content='{origem}', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {origem} BEGIN {inserir} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {origem} BEGIN {remover} END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {origem} BEGIN {remover} {inserir} END",
+        ]
+
+    def consulta(self, modelo, termo):
+        palavras = tokens(termo)
+        if not palavras:
+            return BackendLike().consulta(modelo, termo)
+
+        self.preparar(modelo)
+        # "palavra"* casa por prefixo; aspas evitam que o termo vire sintaxe FTS5
+        expressao = ' '.join(f'"{palavra}"*' for palavra in palavras)
+        fts = self.tabela(modelo)
+        ranking = text(
+            f'SELECT rowid AS id, bm25({fts}) AS rank FROM {fts} WHERE {fts} MATCH :expressao'
+        ).bindparams(expressao=expressao).columns(id=Integer, rank=Float).subquery('ranking')
+        return modelo.query.join(ranking, modelo.id == ranking.c.id).order_by(ranking.c.rank, modelo.id)
+
+
+BACKENDS = {
+    'like': BackendLike(),
+    'mysql': BackendMySQL(),
+    'fts5': BackendFTS5(),
+}
+# Dialeto do SQLAlchemy -> backend padrão
+BACKEND_POR_DIALETO = {
+    'mysql': 'mysql',
+    'mariadb': 'mysql',
+    'sqlite': 'fts5',
+}
+
+
+class BuscaService:
+    """Serviço de busca textual ranqueada"""
+
+    @staticmethod
+    def backend():
+        """Backend configurado (BUSCA_BACKEND) ou o padrão do dialeto do banco"""
+        nome = current_app.config.get('BUSCA_BACKEND') or BACKEND_POR_DIALETO.get(db.engine.dialect.name, 'like')
+        return BACKENDS[nome]
+
+    @staticmethod
+    def suportado(modelo):
+        """Indica se o modelo tem índice full-text"""
+        return modelo in CAMPOS_BUSCA
+
+    @staticmethod
+    def consulta(modelo, termo):
+        """
+        Query do modelo filtrada pelo termo e ordenada por relevância
+
+        Cada palavra do termo casa por prefixo ("apur" encontra "Apuração");
+        todas precisam aparecer em alguma das colunas indexadas.
+
+        Args:
+            modelo: Empresa, Tarefa ou Usuario
+            termo: texto digitado pelo usuário
+
+        Returns:
+            Query: pode receber filtros, count(), offset() e limit()
+        """
+        backend = BuscaService.backend()
+        try:
+            return backend.consulta(modelo, termo)
+        except OperationalError as e:
+            # Índice indisponível (ex.: SQLite sem FTS5): segue sem ranking
+            current_app.logger.warning(f"Busca full-text indisponível ({backend.nome}): {e}")
+            db.session.rollback()
+            return BackendLike().consulta(modelo, termo)
+
+    @staticmethod
+    def filtrar_nome(query, modelo, termo):
+        """
+        Filtra a query pelo trecho do nome, sem diferenciar acentos e maiúsculas
+
+        Mesmo critério do ilike('%termo%') anterior, aplicado sobre
+        nome_normalizado; o predicado é sempre o mesmo, então total e
+        páginas não dependem de outras linhas começarem com o termo.
+
+        Args:
+            query: query de Empresa, Tarefa ou Usuario (com os demais filtros)
+            modelo: modelo da query
+            termo: texto digitado
+
+        Returns:
+            Query: filtrada
+        """
+        chave = normalizar_texto(termo)
+        if not chave:
+            return query
+        # A chave só tem [a-z0-9 ]: não há curingas do LIKE para escapar
+        return query.filter(modelo.nome_normalizado.like(f'%{chave}%'))
+
+    @staticmethod
+    def normalizar_nomes(modelo):
+        """
+        Recalcula nome_normalizado de todas as linhas (bases anteriores à coluna)
+
+        Returns:
+            int: linhas atualizadas
+        """
+        atualizadas = 0
+        ultimo_id = 0
+        while True:
+            lote = db.session.query(modelo.id, modelo.nome).filter(
+                modelo.id > ultimo_id
+            ).order_by(modelo.id).limit(TAMANHO_LOTE_NORMALIZACAO).all()
+            if not lote:
+                return atualizadas
+            db.session.execute(update(modelo), [
+                {'id': id, 'nome_normalizado': normalizar_texto(nome)} for id, nome in lote
+            ])
+            atualizadas += len(lote)
+            ultimo_id = lote[-1].id
+
+    @staticmethod
+    def reindexar():
+        """
+        Recalcula os nomes normalizados e reconstrói os índices full-text
+
+        Returns:
+            list: modelos reindexados
+        """
+        backend = BuscaService.backend()
+        # Cria as tabelas do índice antes de abrir a transação de escrita da
+        # sessão: o preparo usa outra conexão (no SQLite em arquivo travaria)
+        for modelo in CAMPOS_BUSCA:
+            backend.preparar(modelo)
+        reindexados = []
+        for modelo in CAMPOS_BUSCA:
+            BuscaService.normalizar_nomes(modelo)
+            backend.reindexar(modelo)
+            reindexados.append(modelo.__tablename__)
+        db.session.commit()
+        return reindexados
@@ -0,0 +1,381 @@
+"""
+Serviço de Cache por Tags
+Respostas em cache marcadas com as tags de que dependem (empresa:<id>,
+tarefa:<id>, tarefas:setor:<id>, usuario:<id>...). Cada tag tem uma versão
+guardada no próprio cache (simple ou Redis); a entrada grava as versões
+vistas e só vale enquanto todas continuarem iguais. Escritas trocam apenas
+as versões das tags afetadas, no commit — nada de cache.clear()
+
+As mesmas versões geram ETags fracos para GET condicional: se nada mudou, a
+resposta é 304 sem executar a consulta nem serializar o corpo
+"""
+
+import hashlib
+import threading
+import uuid
+from collections import defaultdict
+from datetime import date
+from functools import wraps
+
+from flask import current_app, has_app_context, jsonify, make_response, request, session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.db import db
+from app.models import Empresa, Tarefa, RelacionamentoTarefa, Usuario, Periodo
+
+
+CHAVE_TAG = 'tag:versao:{}'
+
+# Tags de coleção: listagens sem escopo dependem de inclusões/exclusões e de
+# campos usados em filtro/ordenação, não só dos itens que devolveram
+TAG_EMPRESAS = 'empresas'
+TAG_TAREFAS = 'tarefas'
+
+
+def tag_empresa(empresa_id):
+    return f'empresa:{empresa_id}'
+
+
+def tag_tarefa(tarefa_id):
+    return f'tarefa:{tarefa_id}'
+
+
+def tag_setor_tarefas(setor_id):
+    return f'tarefas:setor:{setor_id}'
+
+
+def tag_usuario(usuario_id):
+    return f'usuario:{usuario_id}'
+
+
+def tag_tabela(tabela):
+    """Tag trocada por insert/update/delete em massa, em que não sabemos os ids"""
+    return f'tabela:{tabela}'
+
+
+def tag_dados(tabela):
+    """Tag trocada por qualquer escrita na tabela (ORM ou em massa)"""
+    return f'dados:{tabela}'
+
+
+def tag_periodos(periodo_label):
+    """Períodos do ano do label ('2025-08', '2025-T3' e '2025' caem em periodos:2025)"""
+    return f'periodos:{str(periodo_label)[:4]}'
+
+
+def tags_resumo_periodo(periodo_label):
+    """Tags dos resumos de status de um período (dashboard e painel do gerente)"""
+    return (
+        tag_periodos(periodo_label),
+        tag_tabela(Periodo.__tablename__),
+        tag_dados(RelacionamentoTarefa.__tablename__),
+        tag_dados(Empresa.__tablename__),
+        tag_dados(Tarefa.__tablename__),
+        tag_dados(Usuario.__tablename__),
+    )
+
+
+class EstatisticasCache:
+    """Acertos e falhas por prefixo (contadores deste processo)"""
+
+    def __init__(self):
+        self.contadores = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self.lock = threading.Lock()
+
+    def registrar(self, prefixo, acerto):
+        with self.lock:
+            self.contadores[prefixo]['hits' if acerto else 'misses'] += 1
+
+    def resumo(self):
+        with self.lock:
+            resumo = {}
+            for prefixo, contador in sorted(self.contadores.items()):
+                total = contador['hits'] + contador['misses']
+                resumo[prefixo] = dict(contador, taxa_acerto=round(contador['hits'] / total, 4) if total else 0.0)
+            return resumo
+
+    def zerar(self):
+        with self.lock:
+            self.contadores.clear()
+
+
+def _cache():
+    return getattr(current_app, 'cache', None)
+
+
+class CacheService:
+    """Leitura, gravação e invalidação das respostas em cache por tag"""
+
+    @staticmethod
+    def iniciar(app):
+        """Cria os contadores de acerto/falha da aplicação"""
+        app.extensions['cache_tags'] = EstatisticasCache()
+
+    @staticmethod
+    def obter(prefixo, chave):
+        """
+        Valor em cache, se todas as tags continuarem na versão gravada
+
+        Args:
+            prefixo: agrupamento das estatísticas ('empresas', 'tarefas'...)
+            chave: chave completa da entrada
+
+        Returns:
+            Valor gravado ou None (falha)
+        """
+        entrada = CacheService.obter_entrada(prefixo, chave)
+        return entrada['valor'] if entrada else None
+
+    @staticmethod
+    def obter_entrada(prefixo, chave):
+        """
+        Como obter, mas devolve também as versões das tags (para o ETag)
+
+        Returns:
+            dict {'tags': {tag: versão}, 'valor': ...} ou None (falha)
+        """
+        cache = _cache()
+        valida = None
+        if cache is not None:
+            try:
+                entrada = cache.get(chave)
+                if entrada is not None:
+                    tags = list(entrada['tags'])
+                    atuais = cache.get_many(*(CHAVE_TAG.format(tag) for tag in tags)) if tags else []
+                    if all(atual is not None and atual == entrada['tags'][tag] for tag, atual in zip(tags, atuais)):
+                        valida = entrada
+            except Exception as e:
+                current_app.logger.warning(f"Falha ao ler {chave} do cache: {e}")
+        current_app.extensions['cache_tags'].registrar(prefixo, valida is not None)
+        return valida
+
+    @staticmethod
+    def versoes(*tags):
+        """
+        Versões atuais das tags, criando as que ainda não existem
+
+        Leia as tags de escopo antes da consulta ao banco: uma escrita que
+        aconteça durante a consulta troca a versão e a entrada já nasce
+        inválida, em vez de guardar dados antigos com a versão nova.
+
+        Returns:
+            dict: tag -> versão (vazio se o cache estiver indisponível)
+        """
+        cache = _cache()
+        tags = list(dict.fromkeys(tags))
+        if cache is None or not tags:
+            return {}
+        chaves = [CHAVE_TAG.format(tag) for tag in tags]
+        try:
+            atuais = cache.get_many(*chaves)
+            faltando = [chave for chave, atual in zip(chaves, atuais) if atual is None]
+            if faltando:
+                for chave in faltando:
+                    # add não sobrescreve a versão criada por outro processo
+                    cache.add(chave, uuid.uuid4().hex, timeout=0)
+                atuais = cache.get_many(*chaves)
+        except Exception as e:
+            current_app.logger.warning(f"Versões de tags indisponíveis no cache: {e}")
+            return {}
+        if any(atual is None for atual in atuais):
+            return {}
+        return dict(zip(tags, atuais))
+
+    @staticmethod
+    def gravar(chave, valor, versoes, timeout=None):
+        """
+        Grava o valor com as versões das tags de que depende
+
+        Args:
+            chave: chave completa da entrada
+            valor: valor serializável
+            versoes: dict tag -> versão, de CacheService.versoes
+            timeout: segundos (None usa CACHE_DEFAULT_TIMEOUT)
+        """
+        cache = _cache()
+        if cache is None or not versoes:
+            return
+        try:
+            cache.set(chave, {'tags': dict(versoes), 'valor': valor}, timeout=timeout)
+        except Exception as e:
+            current_app.logger.warning(f"Falha ao gravar {chave} no cache: {e}")
+
+    @staticmethod
+    def invalidar(*tags):
+        """Troca a versão das tags; entradas que dependem delas deixam de valer"""
+        cache = _cache()
+        tags = set(tags)
+        if cache is None or not tags:
+            return
+        try:
+            cache.set_many({CHAVE_TAG.format(tag): uuid.uuid4().hex for tag in tags}, timeout=0)
+        except Exception as e:
+            current_app.logger.warning(f"Tags {sorted(tags)} não invalidadas no cache: {e}")
+
+    @staticmethod
+    def invalidar_no_commit(*tags):
+        """Troca a versão das tags quando a transação corrente for confirmada"""
+        if tags:
+            db.session.info.setdefault(_PENDENTES, set()).update(tags)
+
+    @staticmethod
+    def estatisticas():
+        """
+        Acertos e falhas por prefixo desde o início do processo
+
+        Returns:
+            dict: prefixo -> {'hits', 'misses', 'taxa_acerto'}
+        """
+        return current_app.extensions['cache_tags'].resumo()
+
+
+def politica_cache_control():
+    """Cache-Control do endpoint atual (CACHE_CONTROL_ENDPOINTS ou CACHE_CONTROL_PADRAO)"""
+    politicas = current_app.config.get('CACHE_CONTROL_ENDPOINTS') or {}
+    return politicas.get(request.endpoint, current_app.config.get('CACHE_CONTROL_PADRAO', 'private, no-cache'))
+
+
+def etag_requisicao(versoes):
+    """
+    ETag da requisição atual para as versões de tags informadas
+
+    Além das versões entram o endpoint, os parâmetros, o usuário da sessão e
+    a data (respostas que dependem de "hoje" mudam na virada do dia).
+    """
+    material = repr((
+        request.endpoint,
+        sorted(request.args.items(multi=True)),
+        session.get('user_id'),
+        date.today().isoformat(),
+        sorted(versoes.items()),
+    ))
+    return hashlib.blake2b(material.encode(), digest_size=16).hexdigest()
+
+
+def _finalizar(resposta, etag=None):
+    if etag and resposta.status_code in (200, 304):
+        resposta.set_etag(etag, weak=True)
+    if 'Cache-Control' not in resposta.headers:
+        resposta.headers['Cache-Control'] = politica_cache_control()
+    return resposta
+
+
+def _nao_modificado(etag):
+    if etag and request.if_none_match.contains_weak(etag):
+        return _finalizar(current_app.response_class(status=304), etag)
+    return None
+
+
+def resposta_json_condicional(valor, versoes):
+    """
+    jsonify com ETag fraco das versões; 304 se o cliente já tem essa versão
+
+    Args:
+        valor: corpo da resposta (serializado só se necessário)
+        versoes: dict tag -> versão de que o valor depende (vazio = sem ETag)
+    """
+    etag = etag_requisicao(versoes) if versoes else None
+    return _nao_modificado(etag) or _finalizar(jsonify(valor), etag)
+
+
+def resposta_condicional(tags):
+    """
+    GET condicional para views cuja resposta depende das tags informadas
+
+    As versões são lidas antes da view: uma escrita durante a execução gera
+    um ETag antigo e a próxima requisição baixa o corpo novamente. Sem
+    backend de cache (NullCache) a view responde normalmente, sem ETag.
+
+    Args:
+        tags: função com os mesmos argumentos da view que devolve as tags
+    """
+    def decorador(view):
+        @wraps(view)
+        def verificar(*args, **kwargs):
+            versoes = CacheService.versoes(*tags(*args, **kwargs))
+            etag = etag_requisicao(versoes) if versoes else None
+            nao_modificado = _nao_modificado(etag)
+            if nao_modificado is not None:
+                return nao_modificado
+            resposta = make_response(view(*args, **kwargs))
+            return _finalizar(resposta, etag if resposta.status_code == 200 else None)
+        return verificar
+    return decorador
+
+
+# Campos que mudam a composição, a ordem ou o escopo das listagens
+_CAMPOS_ESCOPO = {
+    Empresa: ('nome', 'ativo'),
+    Tarefa: ('nome', 'tipo', 'setor_id'),
+    RelacionamentoTarefa: ('responsavel_id', 'empresa_id', 'tarefa_id'),
+    Usuario: ('tipo', 'setor_id'),
+}
+_TABELAS = {modelo.__tablename__ for modelo in _CAMPOS_ESCOPO}
+_TABELAS_DML = _TABELAS | {Periodo.__tablename__}
+_PENDENTES = 'cache_tags_pendentes'
+
+
+def _valores(obj, campo):
+    """Valores atual e anterior (antes do flush) do campo"""
+    historico = inspect(obj).attrs[campo].history
+    return {*historico.added, *historico.deleted, *historico.unchanged} - {None}
+
+
+def _tags_do_objeto(obj, escopo_alterado):
+    if isinstance(obj, Empresa):
+        return {tag_empresa(obj.id)} | ({TAG_EMPRESAS} if escopo_alterado else set())
+    if isinstance(obj, Tarefa):
+        tags = {tag_tarefa(obj.id)}
+        if escopo_alterado:
+            tags.add(TAG_TAREFAS)
+            tags.update(tag_setor_tarefas(s) for s in _valores(obj, 'setor_id'))
+        return tags
+    if not escopo_alterado:
+        return set()
+    if isinstance(obj, RelacionamentoTarefa):
+        return {tag_usuario(u) for u in _valores(obj, 'responsavel_id')}
+    return {tag_usuario(obj.id)}
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_flush(session, flush_context):
+    tags = set()
+    for obj in (*session.new, *session.deleted, *session.dirty):
+        if isinstance(obj, Periodo):
+            labels = _valores(obj, 'periodo_label')
+            tags.update(tag_periodos(label) for label in labels)
+            if not labels:
+                tags.add(tag_tabela(Periodo.__tablename__))
+            continue
+        campos = _CAMPOS_ESCOPO.get(type(obj))
+        if campos is None:
+            continue
+        tags.add(tag_dados(obj.__tablename__))
+        escopo_alterado = obj in session.new or obj in session.deleted or any(
+            inspect(obj).attrs[campo].history.has_changes() for campo in campos
+        )
+        tags.update(_tags_do_objeto(obj, escopo_alterado))
+    if tags:
+        session.info.setdefault(_PENDENTES, set()).update(tags)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_dml(estado):
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    nome = getattr(getattr(estado.statement, 'table', None), 'name', None)
+    if nome in _TABELAS_DML:
+        estado.session.info.setdefault(_PENDENTES, set()).update((tag_tabela(nome), tag_dados(nome)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_commit(session):
+    pendentes = session.info.pop(_PENDENTES, None)
+    if pendentes and has_app_context() and 'cache_tags' in current_app.extensions:
+        CacheService.invalidar(*pendentes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_rollback(session):
+    session.info.pop(_PENDENTES, None)
@@ -0,0 +1,198 @@
+"""
+Serviço de Compressão
+Compressão gzip/brotli das respostas HTML/JSON acima de um tamanho mínimo,
+negociada pelo Accept-Encoding, e arquivos estáticos pré-comprimidos com
+nome versionado pelo conteúdo (static/dist), servidos com cache longo.
+O brotli é opcional: sem o pacote instalado, só gzip é oferecido
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+PASTA_DIST = 'dist'
+MANIFESTO = 'manifest.json'
+TIPOS_COMPRIMIVEIS = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'image/svg+xml',
+}
+EXTENSOES_COMPRIMIVEIS = {'.css', '.js', '.json', '.map', '.svg', '.html', '.txt'}
+# Arquivos com hash no nome nunca mudam: um ano de cache no navegador
+CACHE_VERSIONADOS = 'public, max-age=31536000, immutable'
+
+
+def _codificacoes_disponiveis():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negociar_codificacao(disponiveis=None):
+    """
+    Melhor codificação aceita pelo cliente
+
+    Args:
+        disponiveis: codificações em ordem de preferência (padrão: br, gzip)
+
+    Returns:
+        'br', 'gzip' ou None
+    """
+    aceitas = request.accept_encodings
+    for codificacao in disponiveis or _codificacoes_disponiveis():
+        if aceitas.quality(codificacao) > 0:
+            return codificacao
+    return None
+
+
+def comprimir(dados, codificacao, nivel=None):
+    """Comprime bytes em gzip (nível 1-9) ou brotli (qualidade 0-11)"""
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=11 if nivel is None else nivel)
+    return gzip.compress(dados, compresslevel=9 if nivel is None else nivel, mtime=0)
+
+
+class CompressaoService:
+    """Compressão de respostas e estáticos versionados"""
+
+    @staticmethod
+    def iniciar(app):
+        """Registra a compressão das respostas, o manifesto e a rota dos estáticos"""
+        app.extensions['estaticos'] = {}
+        if app.config.get('ESTATICOS_VERSIONADOS', True):
+            app.extensions['estaticos'] = CompressaoService.carregar_manifesto(app.static_folder)
+
+        @app.url_defaults
+        def _versionar_estaticos(endpoint, values):
+            if endpoint == 'static':
+                nome = app.extensions['estaticos'].get(values.get('filename'))
+                if nome:
+                    values['filename'] = nome
+
+        app.view_functions['static'] = _servir_estatico
+
+        if app.config.get('COMPRESSAO_ATIVA', True):
+            app.after_request(_comprimir_resposta)
+
+    @staticmethod
+    def carregar_manifesto(pasta_static):
+        """
+        Mapa nome original -> nome versionado gerado por compilar_estaticos
+
+        Returns:
+            dict vazio se os estáticos ainda não foram compilados
+        """
+        caminho = os.path.join(pasta_static, PASTA_DIST, MANIFESTO)
+        if not os.path.exists(caminho):
+            return {}
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+
+    @staticmethod
+    def compilar_estaticos(pasta_static, tamanho_minimo=1024):
+        """
+        Copia os estáticos para static/dist com o hash do conteúdo no nome e
+        grava as versões .gz (e .br, com brotli instalado) menores que o original
+
+        Args:
+            pasta_static: pasta static da aplicação
+            tamanho_minimo: arquivos menores não são comprimidos
+
+        Returns:
+            dict: manifesto (nome original -> caminho versionado, relativo a static)
+        """
+        destino = os.path.join(pasta_static, PASTA_DIST)
+        temporario = destino + '.tmp'
+        shutil.rmtree(temporario, ignore_errors=True)
+        os.makedirs(temporario)
+
+        manifesto = {}
+        for raiz, pastas, arquivos in os.walk(pasta_static):
+            if os.path.abspath(raiz) == os.path.abspath(pasta_static):
+                pastas[:] = [p for p in pastas if p not in (PASTA_DIST, PASTA_DIST + '.tmp')]
+            for nome in sorted(arquivos):
+                origem = os.path.join(raiz, nome)
+                relativo = os.path.relpath(origem, pasta_static).replace(os.sep, '/')
+                with open(origem, 'rb') as arquivo:
+                    dados = arquivo.read()
+
+                base, extensao = os.path.splitext(relativo)
+                versionado = f"{base}.{hashlib.sha256(dados).hexdigest()[:10]}{extensao}"
+                saida = os.path.join(temporario, versionado)
+                os.makedirs(os.path.dirname(saida), exist_ok=True)
+                with open(saida, 'wb') as arquivo:
+                    arquivo.write(dados)
+
+                if extensao.lower() in EXTENSOES_COMPRIMIVEIS and len(dados) >= tamanho_minimo:
+                    for codificacao, sufixo in (('gzip', '.gz'), ('br', '.br')):
+                        if codificacao not in _codificacoes_disponiveis():
+                            continue
+                        comprimido = comprimir(dados, codificacao)
+                        if len(comprimido) < len(dados):
+                            with open(saida + sufixo, 'wb') as arquivo:
+                                arquivo.write(comprimido)
+
+                manifesto[relativo] = f"{PASTA_DIST}/{versionado}"
+
+        with open(os.path.join(temporario, MANIFESTO), 'w', encoding='utf-8') as arquivo:
+            json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(temporario, destino)
+        return manifesto
+
+
+def _servir_estatico(filename):
+    """Rota /static: versionados vêm pré-comprimidos e com cache longo"""
+    app = current_app._get_current_object()
+    if not filename.startswith(PASTA_DIST + '/'):
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    sufixos = {'br': '.br', 'gzip': '.gz'}
+    existentes = [c for c in _codificacoes_disponiveis()
+                  if os.path.isfile(os.path.join(app.static_folder, filename + sufixos[c]))]
+    codificacao = negociar_codificacao(existentes) if existentes else None
+
+    if codificacao:
+        resposta = send_from_directory(app.static_folder, filename + sufixos[codificacao], mimetype=mimetype)
+        resposta.headers['Content-Encoding'] = codificacao
+    else:
+        resposta = send_from_directory(app.static_folder, filename, mimetype=mimetype)
+    if existentes:
+        resposta.vary.add('Accept-Encoding')
+    resposta.headers['Cache-Control'] = CACHE_VERSIONADOS
+    return resposta
+
+
+def _comprimir_resposta(resposta):
+    """after_request: comprime respostas de texto acima de COMPRESSAO_MINIMO"""
+    if (resposta.direct_passthrough or resposta.is_streamed
+            or resposta.status_code < 200 or resposta.status_code in (204, 304)
+            or 'Content-Encoding' in resposta.headers
+            or resposta.mimetype not in TIPOS_COMPRIMIVEIS):
+        return resposta
+
+    resposta.vary.add('Accept-Encoding')
+    codificacao = negociar_codificacao()
+    if codificacao is None:
+        return resposta
+    dados = resposta.get_data()
+    if len(dados) < current_app.config.get('COMPRESSAO_MINIMO', 1024):
+        return resposta
+
+    nivel = current_app.config.get('COMPRESSAO_NIVEL_BROTLI' if codificacao == 'br' else 'COMPRESSAO_NIVEL_GZIP')
+    resposta.set_data(comprimir(dados, codificacao, nivel))
+    resposta.headers['Content-Encoding'] = codificacao
+    etag, fraco = resposta.get_etag()
+    if etag and not fraco:
+        # ETag forte identifica os bytes: a versão comprimida precisa de outro
+        resposta.set_etag(f"{etag}-{codificacao}")
+    return resposta
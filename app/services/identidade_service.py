@@ -0,0 +1,181 @@
+"""
+Serviço de Identidade
+Usuário logado resolvido uma vez por requisição (flask.g) a partir de um
+cache por processo com TTL curto, e o decorator de verificação de perfil
+usado pelos blueprints. Alterações em usuários (ativar/desativar, senha,
+edição) descartam a entrada do cache no commit
+"""
+
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from flask import current_app, g, has_app_context, jsonify, redirect, session, url_for
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.local import LocalProxy
+
+from app.db import db
+from app.models import Usuario
+from app.services.referencia_service import ReferenciaService
+
+
+class UsuarioAtual(namedtuple('UsuarioAtual', 'id nome login tipo setor_id ativo')):
+    """Dados do usuário logado (somente leitura; para alterar, carregue o Usuario)"""
+
+    __slots__ = ()
+
+    @property
+    def setor(self):
+        return ReferenciaService.setor(self.setor_id)
+
+    @property
+    def setor_nome(self):
+        return ReferenciaService.nome_setor(self.setor_id, None)
+
+
+class CacheIdentidades:
+    """Usuários por id, cada entrada válida por `ttl` segundos"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entradas = {}
+        self.lock = threading.Lock()
+
+    def obter(self, user_id):
+        agora = time.monotonic()
+        with self.lock:
+            entrada = self.entradas.get(user_id)
+        if entrada and entrada[0] > agora:
+            return entrada[1]
+
+        linha = db.session.query(
+            Usuario.id, Usuario.nome, Usuario.login, Usuario.tipo, Usuario.setor_id, Usuario.ativo
+        ).filter(Usuario.id == user_id).first()
+        usuario = UsuarioAtual(*linha) if linha else None
+        with self.lock:
+            self.entradas[user_id] = (agora + self.ttl, usuario)
+        return usuario
+
+    def invalidar(self, ids=None):
+        with self.lock:
+            if ids is None:
+                self.entradas.clear()
+            else:
+                for user_id in ids:
+                    self.entradas.pop(user_id, None)
+
+
+class IdentidadeService:
+    """Resolução do usuário logado"""
+
+    @staticmethod
+    def iniciar(app):
+        """Cria o cache da aplicação e expõe current_user aos templates"""
+        app.extensions['identidade'] = CacheIdentidades(app.config.get('IDENTIDADE_TTL', 30))
+        app.add_template_global(current_user, 'current_user')
+
+        @app.teardown_request
+        def _descartar_usuario_atual(exc):
+            # O app context pode sobreviver à requisição (testes, CLI)
+            g.pop('current_user', None)
+
+    @staticmethod
+    def obter(user_id):
+        """
+        Usuário pelo id, do cache quando possível
+
+        Args:
+            user_id: ID do usuário (None devolve None)
+
+        Returns:
+            UsuarioAtual ou None se não existir
+        """
+        if not user_id:
+            return None
+        return current_app.extensions['identidade'].obter(user_id)
+
+    @staticmethod
+    def invalidar(*ids):
+        """Descarta os usuários informados do cache (todos, se nenhum for informado)"""
+        current_app.extensions['identidade'].invalidar(ids or None)
+
+
+def usuario_atual():
+    """
+    Usuário da sessão, carregado uma vez por requisição
+
+    Returns:
+        UsuarioAtual ou None se não houver login ou o usuário estiver inativo
+    """
+    if 'current_user' not in g:
+        usuario = IdentidadeService.obter(session.get('user_id'))
+        g.current_user = usuario if usuario and usuario.ativo else None
+    return g.current_user
+
+
+current_user = LocalProxy(usuario_atual)
+
+
+def requer_perfil(*tipos, api=False, destino='auth.login_page'):
+    """
+    Exige usuário logado e, se informados, um dos tipos de usuário
+
+    Args:
+        tipos: tipos aceitos ('admin', 'gerente', 'supervisor', 'normal');
+            nenhum aceita qualquer usuário logado
+        api: responde JSON 401/403 em vez de redirecionar
+        destino: endpoint para onde vai quem não tem o perfil (páginas)
+    """
+    def decorador(view):
+        @wraps(view)
+        def verificar(*args, **kwargs):
+            usuario = usuario_atual()
+            if usuario is None:
+                if api:
+                    return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
+                return redirect(url_for('auth.login_page'))
+            if tipos and usuario.tipo not in tipos:
+                if api:
+                    return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+                return redirect(url_for(destino))
+            return view(*args, **kwargs)
+        return verificar
+    return decorador
+
+
+_PENDENTES = 'identidades_pendentes'
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_flush(session, flush_context):
+    ids = {obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, Usuario)}
+    if not ids:
+        return
+    pendentes = session.info.setdefault(_PENDENTES, set())
+    if pendentes is not None:
+        pendentes.update(ids)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_dml(estado):
+    if not (estado.is_update or estado.is_delete):
+        return
+    if getattr(getattr(estado.statement, 'table', None), 'name', None) == Usuario.__tablename__:
+        # Update/delete em massa: não sabemos quais ids, descarta tudo
+        estado.session.info[_PENDENTES] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_commit(session):
+    if _PENDENTES not in session.info:
+        return
+    pendentes = session.info.pop(_PENDENTES)
+    if has_app_context() and 'identidade' in current_app.extensions:
+        IdentidadeService.invalidar(*(pendentes or ()))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_rollback(session):
+    session.info.pop(_PENDENTES, None)
@@ -0,0 +1,369 @@
+"""
+Serviço de Importação por Planilha
+Importação de usuários, empresas e tarefas a partir de arquivos .xlsx com
+validação prévia por linha, modo simulação e gravação em lote
+"""
+
+from openpyxl import load_workbook
+from sqlalchemy import insert, update
+from werkzeug.security import generate_password_hash
+
+from app.db import db
+from app.models import Usuario, Setor, Empresa, Tributacao, Tarefa
+from app.utils import normalizar_texto
+
+
+# Linhas por INSERT/UPDATE em lote
+TAMANHO_LOTE_ESCRITA = 500
+# Chaves por consulta de registros existentes (limita o tamanho das cláusulas IN)
+TAMANHO_LOTE_CONSULTA = 1000
+
+TIPOS_USUARIO = ('normal', 'gerente', 'supervisor', 'admin')
+TIPOS_TAREFA = ('Mensal', 'Trimestral', 'Anual')
+# Formato de hash reconhecido por AuthService.verificar_login
+METODO_HASH_SENHA = 'pbkdf2:sha256'
+
+
+class PlanilhaInvalida(ValueError):
+    """Arquivo ilegível ou sem as colunas obrigatórias"""
+
+
+class ImportacaoService:
+    """Serviço para as importações de admin.import_usuarios/empresas/tarefas"""
+
+    @staticmethod
+    def ler_planilha(arquivo, obrigatorias):
+        """
+        Lê a primeira aba em modo read-only, linha a linha
+
+        Args:
+            arquivo: Caminho ou arquivo binário .xlsx
+            obrigatorias: Colunas que o cabeçalho precisa conter
+
+        Yields:
+            tuple: (número da linha na planilha, dict coluna -> texto)
+
+        Raises:
+            PlanilhaInvalida: Se o arquivo não abrir ou faltar coluna obrigatória
+        """
+        try:
+            workbook = load_workbook(arquivo, read_only=True, data_only=True)
+        except Exception as e:
+            raise PlanilhaInvalida(f'Não foi possível ler a planilha: {e}') from e
+
+        try:
+            linhas = workbook.active.iter_rows(values_only=True)
+            cabecalho = [_texto(valor).lower() for valor in next(linhas, ())]
+            faltantes = [coluna for coluna in obrigatorias if coluna not in cabecalho]
+            if faltantes:
+                raise PlanilhaInvalida(f'Colunas obrigatórias ausentes: {", ".join(faltantes)}')
+
+            for numero, valores in enumerate(linhas, start=2):
+                registro = {coluna: _texto(valor) for coluna, valor in zip(cabecalho, valores) if coluna}
+                if any(registro.values()):
+                    yield numero, registro
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def importar_usuarios(arquivo, dry_run=False):
+        """
+        Importa usuários com upsert por login
+
+        Colunas: nome, login, senha, tipo, setor. Logins já cadastrados têm
+        nome, tipo e setor atualizados (e a senha, se informada).
+
+        Args:
+            arquivo: Caminho ou arquivo binário .xlsx
+            dry_run: Se True, só valida e conta, sem gravar
+
+        Returns:
+            dict: Relatório da importação (ver _relatorio)
+
+        Raises:
+            PlanilhaInvalida: Se o arquivo não puder ser processado
+        """
+        setores = _MapaNomes(Setor)
+        validos, erros, total = [], [], 0
+        logins = set()
+
+        for numero, linha in ImportacaoService.ler_planilha(arquivo, ('nome', 'login', 'tipo')):
+            total += 1
+            problemas = []
+            login = linha.get('login', '')
+            tipo = linha.get('tipo', '').lower()
+            if not linha.get('nome'):
+                problemas.append('nome obrigatório')
+            if not login:
+                problemas.append('login obrigatório')
+            elif login in logins:
+                problemas.append(f'login "{login}" repetido na planilha')
+            if tipo not in TIPOS_USUARIO:
+                problemas.append(f'tipo inválido "{linha.get("tipo", "")}" (use {"/".join(TIPOS_USUARIO)})')
+            if problemas:
+                erros.append({'linha': numero, 'erros': problemas})
+                continue
+            logins.add(login)
+            validos.append({
+                'nome': linha['nome'],
+                'login': login,
+                'senha': linha.get('senha', ''),
+                'tipo': tipo,
+                'setor': setores.registrar(linha.get('setor')),
+                'linha': numero
+            })
+
+        existentes = _ids_existentes(Usuario.login, [v['login'] for v in validos])
+        # Usuário novo sem senha não pode ser criado
+        sem_senha = [v for v in validos if v['login'] not in existentes and not v['senha']]
+        for registro in sem_senha:
+            erros.append({'linha': registro['linha'], 'erros': ['senha obrigatória para novo usuário']})
+        validos = [v for v in validos if v['login'] in existentes or v['senha']]
+
+        relatorio = _relatorio(total, validos, existentes, 'login', erros, dry_run, novos_setores=setores.novos())
+        if dry_run:
+            return relatorio
+
+        setores.criar_novos()
+        novos, alterados = [], []
+        for registro in validos:
+            dados = {
+                'nome': registro['nome'],
+                'tipo': registro['tipo'],
+                'setor_id': setores.id_de(registro['setor'])
+            }
+            if registro['senha']:
+                # Senha da planilha nunca é gravada em texto plano
+                dados['senha'] = generate_password_hash(registro['senha'], method=METODO_HASH_SENHA)
+            if registro['login'] in existentes:
+                alterados.append(dict(dados, id=existentes[registro['login']]))
+            else:
+                novos.append(dict(dados, login=registro['login'], ativo=True))
+        _gravar(Usuario, novos, alterados)
+        return relatorio
+
+    @staticmethod
+    def importar_empresas(arquivo, dry_run=False):
+        """
+        Importa empresas com upsert por código
+
+        Colunas: codigo, nome, tributacao. Códigos já cadastrados têm nome e
+        tributação (se informada) atualizados.
+
+        Args:
+            arquivo: Caminho ou arquivo binário .xlsx
+            dry_run: Se True, só valida e conta, sem gravar
+
+        Returns:
+            dict: Relatório da importação (ver _relatorio)
+
+        Raises:
+            PlanilhaInvalida: Se o arquivo não puder ser processado
+        """
+        tributacoes = _MapaNomes(Tributacao)
+        validos, erros, total = [], [], 0
+        codigos = set()
+
+        for numero, linha in ImportacaoService.ler_planilha(arquivo, ('codigo', 'nome')):
+            total += 1
+            problemas = []
+            codigo = linha.get('codigo', '')
+            if not codigo:
+                problemas.append('codigo obrigatório')
+            elif codigo in codigos:
+                problemas.append(f'código "{codigo}" repetido na planilha')
+            if not linha.get('nome'):
+                problemas.append('nome obrigatório')
+            if problemas:
+                erros.append({'linha': numero, 'erros': problemas})
+                continue
+            codigos.add(codigo)
+            validos.append({
+                'codigo': codigo,
+                'nome': linha['nome'],
+                'tributacao': tributacoes.registrar(linha.get('tributacao'))
+            })
+
+        existentes = _ids_existentes(Empresa.codigo, [v['codigo'] for v in validos])
+        relatorio = _relatorio(total, validos, existentes, 'codigo', erros, dry_run,
+                               novas_tributacoes=tributacoes.novos())
+        if dry_run:
+            return relatorio
+
+        tributacoes.criar_novos()
+        novos, alterados = [], []
+        for registro in validos:
+            dados = {'nome': registro['nome']}
+            if registro['tributacao']:
+                dados['tributacao_id'] = tributacoes.id_de(registro['tributacao'])
+            if registro['codigo'] in existentes:
+                alterados.append(dict(dados, id=existentes[registro['codigo']]))
+            else:
+                novos.append(dict(dados, codigo=registro['codigo'], ativo=True,
+                                  tributacao_id=dados.get('tributacao_id')))
+        _gravar(Empresa, novos, alterados)
+        return relatorio
+
+    @staticmethod
+    def importar_tarefas(arquivo, dry_run=False):
+        """
+        Importa tarefas (sempre como novas)
+
+        Colunas: nome, tipo (Mensal/Trimestral/Anual), descricao, tributacao, setor.
+
+        Args:
+            arquivo: Caminho ou arquivo binário .xlsx
+            dry_run: Se True, só valida e conta, sem gravar
+
+        Returns:
+            dict: Relatório da importação (ver _relatorio)
+
+        Raises:
+            PlanilhaInvalida: Se o arquivo não puder ser processado
+        """
+        setores = _MapaNomes(Setor)
+        tributacoes = _MapaNomes(Tributacao)
+        validos, erros, total = [], [], 0
+
+        for numero, linha in ImportacaoService.ler_planilha(arquivo, ('nome', 'tipo')):
+            total += 1
+            problemas = []
+            tipo = linha.get('tipo', '').capitalize()
+            if not linha.get('nome'):
+                problemas.append('nome obrigatório')
+            if tipo not in TIPOS_TAREFA:
+                problemas.append(f'tipo inválido "{linha.get("tipo", "")}" (use {"/".join(TIPOS_TAREFA)})')
+            if problemas:
+                erros.append({'linha': numero, 'erros': problemas})
+                continue
+            validos.append({
+                'nome': linha['nome'],
+                'tipo': tipo,
+                'descricao': linha.get('descricao') or None,
+                'setor': setores.registrar(linha.get('setor')),
+                'tributacao': tributacoes.registrar(linha.get('tributacao'))
+            })
+
+        relatorio = _relatorio(total, validos, {}, None, erros, dry_run,
+                               novos_setores=setores.novos(), novas_tributacoes=tributacoes.novos())
+        if dry_run:
+            return relatorio
+
+        setores.criar_novos()
+        tributacoes.criar_novos()
+        novos = [{
+            'nome': registro['nome'],
+            'tipo': registro['tipo'],
+            'descricao': registro['descricao'],
+            'setor_id': setores.id_de(registro['setor']),
+            'tributacao_id': tributacoes.id_de(registro['tributacao'])
+        } for registro in validos]
+        _gravar(Tarefa, novos, [])
+        return relatorio
+
+
+class _MapaNomes:
+    """
+    Mapa nome -> id de um cadastro auxiliar (Setor/Tributacao)
+
+    Carregado uma única vez; nomes desconhecidos são acumulados e criados
+    juntos em criar_novos. A comparação ignora maiúsculas e espaços nas pontas.
+    """
+
+    def __init__(self, modelo):
+        self.modelo = modelo
+        self.ids = {}
+        for registro_id, nome in db.session.query(modelo.id, modelo.nome).order_by(modelo.id):
+            self.ids.setdefault(_chave(nome), registro_id)
+        self.pendentes = {}
+
+    def registrar(self, nome):
+        """Registra o nome usado numa linha e devolve sua chave (None se vazio)"""
+        if not nome:
+            return None
+        chave = _chave(nome)
+        if chave not in self.ids:
+            self.pendentes.setdefault(chave, nome.strip())
+        return chave
+
+    def novos(self):
+        """Nomes que ainda não existem no cadastro"""
+        return list(self.pendentes.values())
+
+    def criar_novos(self):
+        """Cria os nomes pendentes (na transação corrente) e os adiciona ao mapa"""
+        if not self.pendentes:
+            return
+        db.session.execute(insert(self.modelo), [{'nome': nome} for nome in self.pendentes.values()])
+        for registro_id, nome in db.session.query(self.modelo.id, self.modelo.nome).filter(
+            self.modelo.nome.in_(list(self.pendentes.values()))
+        ).order_by(self.modelo.id):
+            self.ids.setdefault(_chave(nome), registro_id)
+        self.pendentes = {}
+
+    def id_de(self, chave):
+        return self.ids.get(chave) if chave else None
+
+
+def _texto(valor):
+    """Normaliza o valor de uma célula para texto (números inteiros sem '.0')"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _chave(nome):
+    return (nome or '').strip().casefold()
+
+
+def _ids_existentes(coluna_chave, chaves):
+    """Busca os ids já cadastrados para as chaves (login/código) em lotes"""
+    modelo = coluna_chave.class_
+    chaves = list(dict.fromkeys(chaves))
+    existentes = {}
+    for posicao in range(0, len(chaves), TAMANHO_LOTE_CONSULTA):
+        existentes.update(db.session.query(coluna_chave, modelo.id).filter(
+            coluna_chave.in_(chaves[posicao:posicao + TAMANHO_LOTE_CONSULTA])
+        ))
+    return existentes
+
+
+def _relatorio(total, validos, existentes, campo_chave, erros, dry_run, **extras):
+    """
+    Monta o relatório comum das importações
+
+    Returns:
+        dict: total (linhas lidas), validas, criados, atualizados, erros
+        (lista de {'linha', 'erros'} em ordem de linha), dry_run e os
+        cadastros auxiliares novos (novos_setores/novas_tributacoes)
+    """
+    atualizados = sum(1 for v in validos if campo_chave and v[campo_chave] in existentes)
+    relatorio = {
+        'total': total,
+        'validas': len(validos),
+        'criados': len(validos) - atualizados,
+        'atualizados': atualizados,
+        'erros': sorted(erros, key=lambda erro: erro['linha']),
+        'dry_run': dry_run
+    }
+    relatorio.update(extras)
+    return relatorio
+
+
+def _gravar(modelo, novos, alterados):
+    """Insere e atualiza (por id) em lotes e confirma a transação"""
+    # INSERT/UPDATE em massa não passam pelos eventos do modelo
+    if hasattr(modelo, 'nome_normalizado'):
+        for linha in (*novos, *alterados):
+            linha['nome_normalizado'] = normalizar_texto(linha['nome'])
+    try:
+        for posicao in range(0, len(novos), TAMANHO_LOTE_ESCRITA):
+            db.session.execute(insert(modelo), novos[posicao:posicao + TAMANHO_LOTE_ESCRITA])
+        for posicao in range(0, len(alterados), TAMANHO_LOTE_ESCRITA):
+            db.session.execute(update(modelo), alterados[posicao:posicao + TAMANHO_LOTE_ESCRITA])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,468 @@
+"""
+Serviço de Instrumentação SQL
+Conta, por requisição, as instruções executadas, o tempo gasto no banco e
+quantas vezes cada forma normalizada de instrução se repetiu (literais e
+listas de parâmetros trocados por ?). Quando a mesma forma passa de
+SQL_N1_LIMITE execuções numa requisição, registra um aviso de N+1 com o
+endpoint e o ponto do código que disparou a consulta. Os totais são
+agregados por endpoint (contadores deste processo) e, fora de produção,
+vão nos cabeçalhos X-SQL-* da resposta
+
+Instruções acima de SQL_LENTA_MS (em requisições, jobs ou CLI) vão para o
+log de consultas lentas com a forma normalizada, os tipos dos parâmetros,
+o endpoint e a duração; no MySQL e no SQLite o plano (EXPLAIN) é capturado
+uma vez por forma, numa conexão separada (nunca na que ainda pode ter um
+cursor no servidor aberto). As mais custosas ficam em /admin/consultas-lentas
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+
+_INICIOS = 'instrumentacao_inicios'
+
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMETRO = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_LISTA_PARAMETROS = re.compile(rf"\(\s*{_PARAMETRO}(?:\s*,\s*{_PARAMETRO})*\s*\)")
+_LISTA_TUPLAS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_ESPACOS = re.compile(r"\s+")
+
+# Quantas formas repetidas guardar por endpoint nas estatísticas
+MAX_REPETIDAS_POR_ENDPOINT = 20
+# Quantas formas de consulta lenta guardar (as novas além disso só vão ao log)
+MAX_CONSULTAS_LENTAS = 500
+
+_EXPLICAVEIS = ('select', 'with', 'update', 'delete')
+_CREATE_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(\w+)\s+ON\s+(\w+)\s*\(([^)]*)\)", re.IGNORECASE)
+
+# Pools que entregam sempre a mesma conexão (SQLite em memória)
+_POOLS_COMPARTILHADOS = (StaticPool, SingletonThreadPool)
+# Pool próprio dos EXPLAIN por pool da aplicação
+_POOLS_PLANO = weakref.WeakKeyDictionary()
+_LOCK_POOLS_PLANO = threading.Lock()
+
+_PASTA_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+_RAIZ = os.path.dirname(_PASTA_APP.rstrip(os.sep)) + os.sep
+
+
+@lru_cache(maxsize=4096)
+def normalizar_sql(instrucao):
+    """
+    Forma da instrução, sem os valores: literais viram ?, listas de
+    parâmetros (IN, VALUES de várias linhas) viram uma só e os espaços são
+    compactados, para que execuções com valores diferentes se agrupem
+
+    Args:
+        instrucao: SQL como enviado ao driver
+
+    Returns:
+        str: instrução normalizada
+    """
+    forma = _LITERAIS.sub('?', instrucao)
+    forma = _LISTA_PARAMETROS.sub('(?)', forma)
+    forma = _LISTA_TUPLAS.sub('(?)', forma)
+    return _ESPACOS.sub(' ', forma).strip()
+
+
+def origem_chamada():
+    """
+    Primeiro ponto do código da aplicação (fora deste módulo) na pilha atual
+
+    Returns:
+        str: 'app/blueprints/modulo.py:123 (funcao)' ou '?' se não houver
+    """
+    quadro = sys._getframe(1)
+    while quadro is not None:
+        arquivo = quadro.f_code.co_filename
+        if arquivo.startswith(_PASTA_APP) and arquivo != __file__:
+            relativo = os.path.relpath(arquivo, _RAIZ).replace(os.sep, '/')
+            return f"{relativo}:{quadro.f_lineno} ({quadro.f_code.co_name})"
+        quadro = quadro.f_back
+    return '?'
+
+
+class RegistroSQL:
+    """Instruções de uma requisição (vive em g, uma thread por vez)"""
+
+    __slots__ = ('consultas', 'tempo', 'formas', 'repetidas', 'limite')
+
+    def __init__(self, limite):
+        self.consultas = 0
+        self.tempo = 0.0
+        self.formas = Counter()
+        # forma -> origem da chamada, para as que passaram do limite
+        self.repetidas = {}
+        self.limite = limite
+
+    def registrar(self, instrucao, duracao):
+        """Conta a instrução; devolve a forma quando ela acaba de passar do limite"""
+        self.consultas += 1
+        self.tempo += duracao
+        forma = normalizar_sql(instrucao)
+        self.formas[forma] += 1
+        if self.limite and self.formas[forma] == self.limite + 1:
+            self.repetidas[forma] = origem_chamada()
+            return forma
+        return None
+
+
+class EstatisticasEndpoints:
+    """Totais de SQL por endpoint (contadores deste processo)"""
+
+    def __init__(self):
+        self.endpoints = defaultdict(lambda: {
+            'requisicoes': 0, 'consultas': 0, 'tempo_ms': 0.0, 'max_consultas': 0,
+            'alertas_n1': 0, 'repetidas': {},
+        })
+        self.lock = threading.Lock()
+
+    def registrar(self, endpoint, registro):
+        with self.lock:
+            total = self.endpoints[endpoint]
+            total['requisicoes'] += 1
+            total['consultas'] += registro.consultas
+            total['tempo_ms'] += registro.tempo * 1000
+            total['max_consultas'] = max(total['max_consultas'], registro.consultas)
+            for forma, origem in registro.repetidas.items():
+                total['alertas_n1'] += 1
+                repetida = total['repetidas'].get(forma)
+                if repetida is None:
+                    if len(total['repetidas']) >= MAX_REPETIDAS_POR_ENDPOINT:
+                        continue
+                    repetida = total['repetidas'][forma] = {'requisicoes': 0, 'max_execucoes': 0}
+                repetida['requisicoes'] += 1
+                repetida['max_execucoes'] = max(repetida['max_execucoes'], registro.formas[forma])
+                repetida['origem'] = origem
+
+    def resumo(self):
+        with self.lock:
+            resumo = {}
+            for endpoint, total in sorted(self.endpoints.items(), key=lambda item: -item[1]['tempo_ms']):
+                resumo[endpoint] = dict(
+                    total,
+                    tempo_ms=round(total['tempo_ms'], 3),
+                    media_consultas=round(total['consultas'] / total['requisicoes'], 2),
+                    repetidas=[dict(r, sql=forma) for forma, r in total['repetidas'].items()],
+                )
+            return resumo
+
+    def zerar(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+def formato_parametros(parametros, executemany=False):
+    """
+    Tipos dos parâmetros, sem os valores: '(int, str)', '{id: int}' ou
+    '3 x (int, str)' num executemany
+    """
+    if executemany:
+        if not parametros:
+            return '[]'
+        return f"{len(parametros)} x {formato_parametros(parametros[0])}"
+    if isinstance(parametros, dict):
+        return '{' + ', '.join(f"{nome}: {type(valor).__name__}" for nome, valor in parametros.items()) + '}'
+    if isinstance(parametros, (list, tuple)):
+        return '(' + ', '.join(type(valor).__name__ for valor in parametros) + ')'
+    return type(parametros).__name__
+
+
+def cursor_no_servidor(contexto):
+    """Se a instrução é lida aos poucos (yield_per/stream_results, SSCursor)"""
+    if contexto is None:
+        return False
+    return bool(contexto.execution_options.get('stream_results') or getattr(contexto, '_is_server_side', False))
+
+
+def plano_adiado(conexao, contexto):
+    """
+    O EXPLAIN teria de rodar na mesma conexão de um cursor no servidor
+    ainda aberto: fica para a próxima execução da forma
+    """
+    return isinstance(conexao.engine.pool, _POOLS_COMPARTILHADOS) and cursor_no_servidor(contexto)
+
+
+def _pool_plano(pool):
+    """Pool separado, com o mesmo criador e eventos, só para os EXPLAIN"""
+    with _LOCK_POOLS_PLANO:
+        proprio = _POOLS_PLANO.get(pool)
+        if proprio is None:
+            proprio = _POOLS_PLANO[pool] = pool.recreate()
+        return proprio
+
+
+def capturar_plano(conexao, cursor, instrucao, parametros, executemany=False):
+    """
+    Plano da instrução (EXPLAIN no MySQL, EXPLAIN QUERY PLAN no SQLite),
+    executado num cursor cru fora dos eventos do SQLAlchemy
+
+    O EXPLAIN vai numa conexão de um pool próprio: na mesma conexão, um
+    comando novo faria o PyMySQL descartar as linhas ainda não lidas de um
+    cursor no servidor (exportações com yield_per sairiam truncadas). Só
+    quando o pool entrega sempre a mesma conexão (SQLite em memória) ele
+    roda nela (ver plano_adiado).
+
+    Returns:
+        list[str]: linhas do plano, ou None para outros bancos e instruções
+    """
+    dialeto = conexao.dialect.name
+    if dialeto not in ('mysql', 'mariadb', 'sqlite'):
+        return None
+    if not instrucao.lstrip().lower().startswith(_EXPLICAVEIS):
+        return None
+    if executemany:
+        parametros = parametros[0] if parametros else ()
+    prefixo = 'EXPLAIN QUERY PLAN ' if dialeto == 'sqlite' else 'EXPLAIN '
+
+    pool = conexao.engine.pool
+    if isinstance(pool, _POOLS_COMPARTILHADOS):
+        conexao_plano, devolver = cursor.connection, False
+    else:
+        conexao_plano, devolver = _pool_plano(pool).connect(), True
+    try:
+        cursor_plano = conexao_plano.cursor()
+        try:
+            cursor_plano.execute(prefixo + instrucao, parametros if parametros is not None else ())
+            linhas = cursor_plano.fetchall()
+            colunas = [coluna[0] for coluna in cursor_plano.description or ()]
+        finally:
+            cursor_plano.close()
+    finally:
+        if devolver:
+            # Devolve ao pool próprio (o reset desfaz a transação aberta pelo EXPLAIN)
+            conexao_plano.close()
+    if dialeto == 'sqlite':
+        # (id, parent, notused, detail)
+        return [linha[-1] for linha in linhas]
+    return [' '.join(f"{coluna}={valor}" for coluna, valor in zip(colunas, linha) if valor is not None)
+            for linha in linhas]
+
+
+def varredura_completa(plano):
+    """Se o plano lê alguma tabela inteira (SCAN sem índice / type=ALL)"""
+    return any(
+        (linha.startswith('SCAN ') and ' USING ' not in linha) or ' type=ALL ' in f" {linha} "
+        for linha in plano or ()
+    )
+
+
+def indices_do_arquivo(caminho):
+    """
+    Índices declarados num script SQL (database_indices.sql)
+
+    Returns:
+        list[dict]: nome, tabela e colunas de cada CREATE INDEX
+    """
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            texto = arquivo.read()
+    except OSError:
+        return []
+    return [
+        {'nome': nome, 'tabela': tabela, 'colunas': ', '.join(c.strip() for c in colunas.split(','))}
+        for nome, tabela, colunas in _CREATE_INDEX.findall(texto)
+    ]
+
+
+class ConsultasLentas:
+    """Consultas acima do limite por forma normalizada (contadores deste processo)"""
+
+    def __init__(self, maximo=MAX_CONSULTAS_LENTAS):
+        self.maximo = maximo
+        self.consultas = {}
+        self.descartadas = 0
+        self.lock = threading.Lock()
+
+    def registrar(self, forma, duracao, endpoint, parametros):
+        """Soma a execução; devolve True enquanto o plano da forma não foi capturado"""
+        tempo_ms = duracao * 1000
+        with self.lock:
+            consulta = self.consultas.get(forma)
+            if consulta is None:
+                if len(self.consultas) >= self.maximo:
+                    self.descartadas += 1
+                    return False
+                consulta = self.consultas[forma] = {
+                    'sql': forma, 'execucoes': 0, 'tempo_total_ms': 0.0, 'tempo_max_ms': 0.0,
+                    'endpoints': Counter(), 'parametros': parametros, 'plano': None,
+                    'plano_capturado': False,
+                }
+            consulta['execucoes'] += 1
+            consulta['tempo_total_ms'] += tempo_ms
+            consulta['tempo_max_ms'] = max(consulta['tempo_max_ms'], tempo_ms)
+            consulta['endpoints'][endpoint] += 1
+            consulta['ultima_em'] = datetime.now()
+            return not consulta['plano_capturado']
+
+    def definir_plano(self, forma, plano):
+        with self.lock:
+            if forma in self.consultas:
+                self.consultas[forma].update(plano=plano, plano_capturado=True)
+
+    def resumo(self, limite=50):
+        """As `limite` formas com maior tempo total"""
+        with self.lock:
+            consultas = sorted(self.consultas.values(), key=lambda c: -c['tempo_total_ms'])[:limite]
+            return [dict(
+                consulta,
+                tempo_total_ms=round(consulta['tempo_total_ms'], 1),
+                tempo_max_ms=round(consulta['tempo_max_ms'], 1),
+                tempo_medio_ms=round(consulta['tempo_total_ms'] / consulta['execucoes'], 1),
+                endpoints=dict(consulta['endpoints'].most_common()),
+                varredura_completa=varredura_completa(consulta['plano']),
+            ) for consulta in consultas]
+
+    def zerar(self):
+        with self.lock:
+            self.consultas.clear()
+            self.descartadas = 0
+
+
+class InstrumentacaoService:
+    """Contagem de SQL por requisição e detecção de N+1"""
+
+    @staticmethod
+    def iniciar(app):
+        """Registra os hooks da requisição e cria as estatísticas por endpoint"""
+        app.extensions['instrumentacao_sql'] = EstatisticasEndpoints()
+        app.extensions['consultas_lentas'] = ConsultasLentas()
+        if not app.config.get('SQL_INSTRUMENTACAO', True):
+            return
+
+        @app.before_request
+        def _iniciar_registro():
+            g.registro_sql = RegistroSQL(current_app.config.get('SQL_N1_LIMITE', 10))
+
+        @app.after_request
+        def _fechar_registro(resposta):
+            registro = g.pop('registro_sql', None)
+            if registro is None:
+                return resposta
+            endpoint = request.endpoint or '<sem endpoint>'
+            current_app.extensions['instrumentacao_sql'].registrar(endpoint, registro)
+            if current_app.config.get('SQL_CABECALHOS', False):
+                tempo_ms = registro.tempo * 1000
+                resposta.headers['X-SQL-Consultas'] = str(registro.consultas)
+                resposta.headers['X-SQL-Tempo-Ms'] = f"{tempo_ms:.2f}"
+                resposta.headers['X-SQL-Repetidas'] = str(len(registro.repetidas))
+                resposta.headers.add('Server-Timing', f'sql;dur={tempo_ms:.2f};desc="{registro.consultas} consultas"')
+            return resposta
+
+        @app.teardown_request
+        def _descartar_registro(exc):
+            # O app context pode sobreviver à requisição (testes, CLI)
+            g.pop('registro_sql', None)
+
+    @staticmethod
+    def registro_atual():
+        """RegistroSQL da requisição em andamento, ou None"""
+        if not has_request_context():
+            return None
+        return g.get('registro_sql')
+
+    @staticmethod
+    def estatisticas():
+        """Totais por endpoint, do maior tempo de banco para o menor"""
+        return current_app.extensions['instrumentacao_sql'].resumo()
+
+    @staticmethod
+    def zerar():
+        current_app.extensions['instrumentacao_sql'].zerar()
+
+    @staticmethod
+    def consultas_lentas(limite=50):
+        """Consultas lentas com maior tempo total, com plano e endpoints"""
+        return current_app.extensions['consultas_lentas'].resumo(limite)
+
+    @staticmethod
+    def zerar_consultas_lentas():
+        current_app.extensions['consultas_lentas'].zerar()
+
+    @staticmethod
+    def uso_indices(consultas, caminho=None):
+        """
+        Índices de database_indices.sql e quantos planos capturados os citam
+
+        Args:
+            consultas: resultado de consultas_lentas()
+            caminho: script SQL (padrão: database_indices.sql na raiz do projeto)
+        """
+        caminho = caminho or os.path.join(os.path.dirname(current_app.root_path), 'database_indices.sql')
+        indices = indices_do_arquivo(caminho)
+        for indice in indices:
+            padrao = re.compile(rf"\b{re.escape(indice['nome'])}\b")
+            indice['consultas'] = sum(
+                1 for consulta in consultas if any(padrao.search(linha) for linha in consulta['plano'] or ())
+            )
+        return indices
+
+
+def _limite_lenta():
+    """SQL_LENTA_MS da aplicação atual (0/None: log de consultas lentas desligado)"""
+    if not has_app_context() or 'consultas_lentas' not in current_app.extensions:
+        return 0
+    return current_app.config.get('SQL_LENTA_MS') or 0
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_execucao(conexao, cursor, instrucao, parametros, contexto, executemany):
+    if InstrumentacaoService.registro_atual() is not None or _limite_lenta():
+        conexao.info.setdefault(_INICIOS, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_execucao(conexao, cursor, instrucao, parametros, contexto, executemany):
+    inicios = conexao.info.get(_INICIOS)
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+    registro = InstrumentacaoService.registro_atual()
+    if registro is not None:
+        forma = registro.registrar(instrucao, duracao)
+        if forma is not None:
+            current_app.logger.warning(
+                "Possível N+1 em %s: mesma instrução executada mais de %d vezes, a partir de %s: %s",
+                request.endpoint, registro.limite, registro.repetidas[forma], forma[:300],
+            )
+    limite = _limite_lenta()
+    if limite and duracao * 1000 >= limite:
+        _registrar_lenta(conexao, cursor, instrucao, parametros, contexto, executemany, duracao)
+
+
+def _registrar_lenta(conexao, cursor, instrucao, parametros, contexto, executemany, duracao):
+    forma = normalizar_sql(instrucao)
+    formato = formato_parametros(parametros, executemany)
+    endpoint = (request.endpoint if has_request_context() else None) or '<fora de requisição>'
+    consultas = current_app.extensions['consultas_lentas']
+    plano = None
+    if consultas.registrar(forma, duracao, endpoint, formato) and not plano_adiado(conexao, contexto):
+        try:
+            plano = capturar_plano(conexao, cursor, instrucao, parametros, executemany)
+        except Exception as e:
+            plano = [f'EXPLAIN falhou: {e}']
+        consultas.definir_plano(forma, plano)
+    current_app.logger.warning(
+        "Consulta lenta (%.1f ms) em %s: %s | parâmetros %s%s",
+        duracao * 1000, endpoint, forma, formato,
+        ''.join(f"\n    {linha}" for linha in plano) if plano else '',
+    )
+
+
+@event.listens_for(Engine, 'handle_error')
+def _descartar_inicio(contexto_excecao):
+    conexao = contexto_excecao.connection
+    inicios = conexao.info.get(_INICIOS) if conexao is not None else None
+    if inicios:
+        inicios.pop()
@@ -0,0 +1,506 @@
+"""
+Serviço de Jobs em Segundo Plano
+Fila persistida na tabela `jobs`, executada pelo worker `flask jobs worker`,
+com novas tentativas com backoff, progresso e artefatos em disco
+"""
+
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta, date
+
+from flask import current_app
+from sqlalchemy import and_, update
+
+from app.db import db
+from app.models import Job
+
+
+# Espera antes da 1ª nova tentativa; dobra a cada falha até o teto
+BACKOFF_BASE_SEGUNDOS = 30
+BACKOFF_MAXIMO_SEGUNDOS = 3600
+# Job em andamento sem atualização por mais que isso é considerado abandonado
+TIMEOUT_TRAVADO_SEGUNDOS = 1800
+# Intervalo do batimento que renova atualizado_em enquanto o executor roda
+INTERVALO_BATIMENTO_SEGUNDOS = 60
+# Intervalo mínimo entre gravações de progresso do mesmo job
+INTERVALO_PROGRESSO_SEGUNDOS = 1.0
+
+# Intervalo entre varreduras de jobs abandonados no worker
+INTERVALO_RECUPERACAO_SEGUNDOS = 60
+
+# tipo -> função executora (ver registrar_tipo)
+TIPOS_JOB = {}
+
+# Aplicação usada pelos threads/processos do pool do worker
+_app_worker = None
+
+
+class JobNaoEncontrado(LookupError):
+    """Tipo de job não registrado"""
+
+
+def registrar_tipo(tipo):
+    """
+    Registra a função que executa um tipo de job
+
+    A função recebe o ContextoJob e os parâmetros do job como argumentos
+    nomeados e devolve um dict JSON-serializável com o resultado.
+    """
+    def decorador(funcao):
+        TIPOS_JOB[tipo] = funcao
+        return funcao
+    return decorador
+
+
+class ContextoJob:
+    """Acesso do executor ao job corrente: progresso e pasta de artefatos"""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.pasta = pasta_job(job.id)
+        self._ultimo_progresso = 0.0
+
+    def progresso(self, percentual, mensagem=None):
+        """Grava o percentual (0-100) em conexão própria, sem afetar a transação do executor"""
+        agora = time.monotonic()
+        if percentual < 100 and agora - self._ultimo_progresso < INTERVALO_PROGRESSO_SEGUNDOS:
+            return
+        self._ultimo_progresso = agora
+        valores = {'progresso': max(0, min(100, int(percentual))), 'atualizado_em': datetime.now()}
+        if mensagem is not None:
+            valores['mensagem'] = mensagem[:255]
+        with db.engine.begin() as conexao:
+            conexao.execute(update(Job.__table__).where(Job.__table__.c.id == self.job_id).values(**valores))
+
+    def caminho(self, nome):
+        """Caminho de um arquivo na pasta do job (criada sob demanda)"""
+        os.makedirs(self.pasta, exist_ok=True)
+        return os.path.join(self.pasta, nome)
+
+    def artefato(self, caminho, nome_arquivo, mimetype):
+        """Registra o arquivo gerado para download em /api/jobs/<id>/arquivo"""
+        return {'arquivo': caminho, 'nome_arquivo': nome_arquivo, 'mimetype': mimetype}
+
+
+class BatimentoJob:
+    """
+    Renova atualizado_em do job em andamento, numa thread e conexão
+    próprias, para que recuperar_travados não devolva à fila um job saudável
+    que passa muito tempo sem chamar progresso (importações longas)
+    """
+
+    def __init__(self, app, job_id, intervalo=None):
+        self.app = app
+        self.job_id = job_id
+        self.intervalo = intervalo or INTERVALO_BATIMENTO_SEGUNDOS
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._rodar, name=f'job-{job_id}-batimento', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+
+    def _rodar(self):
+        tabela = Job.__table__
+        while not self._parar.wait(self.intervalo):
+            try:
+                with self.app.app_context(), db.engine.begin() as conexao:
+                    conexao.execute(
+                        update(tabela)
+                        .where(tabela.c.id == self.job_id, tabela.c.status == 'em_andamento')
+                        .values(atualizado_em=datetime.now())
+                    )
+            except Exception as e:
+                self.app.logger.warning(f'Batimento do job {self.job_id} falhou: {e}')
+
+
+class JobService:
+    """Serviço para enfileirar, executar e consultar jobs"""
+
+    @staticmethod
+    def enfileirar(tipo, parametros=None, usuario_id=None, entrada=None, nome_entrada='entrada',
+                   max_tentativas=3):
+        """
+        Cria um job pendente
+
+        Args:
+            tipo: Tipo registrado com registrar_tipo
+            parametros: dict JSON-serializável passado ao executor
+            usuario_id: Usuário que pediu (dono do job)
+            entrada: Arquivo binário opcional copiado para a pasta do job; o
+                caminho vai para parametros['arquivo']
+            nome_entrada: Nome do arquivo de entrada na pasta do job
+            max_tentativas: Execuções antes de marcar como falhou
+
+        Returns:
+            Job: Job criado (já confirmado no banco)
+
+        Raises:
+            JobNaoEncontrado: Se o tipo não estiver registrado
+        """
+        if tipo not in TIPOS_JOB:
+            raise JobNaoEncontrado(f'Tipo de job desconhecido: {tipo}')
+
+        job = Job(
+            tipo=tipo,
+            parametros=_serializavel(parametros or {}),
+            status='pendente',
+            progresso=0,
+            tentativas=0,
+            max_tentativas=max(1, int(max_tentativas)),
+            proxima_execucao=datetime.now(),
+            criado_por=usuario_id
+        )
+        db.session.add(job)
+        db.session.flush()
+
+        if entrada is not None:
+            os.makedirs(pasta_job(job.id), exist_ok=True)
+            caminho = os.path.join(pasta_job(job.id), nome_entrada)
+            with open(caminho, 'wb') as destino:
+                shutil.copyfileobj(entrada, destino)
+            job.parametros = dict(job.parametros, arquivo=caminho)
+
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def reservar(worker):
+        """
+        Reserva o próximo job pronto para execução
+
+        A reserva é um UPDATE condicional (status ainda 'pendente' e
+        tentativas abaixo do máximo), então vários workers podem disputar a
+        fila sem executar o mesmo job.
+
+        Args:
+            worker: Identificação do worker
+
+        Returns:
+            int | None: ID do job reservado
+        """
+        agora = datetime.now()
+        candidatos = [jid for (jid,) in db.session.query(Job.id).filter(
+            Job.status == 'pendente',
+            Job.proxima_execucao <= agora,
+            Job.tentativas < Job.max_tentativas
+        ).order_by(Job.proxima_execucao, Job.id).limit(10)]
+
+        for job_id in candidatos:
+            resultado = db.session.execute(
+                update(Job).where(
+                    Job.id == job_id, Job.status == 'pendente', Job.tentativas < Job.max_tentativas
+                ).values(
+                    status='em_andamento', worker=worker, iniciado_em=agora,
+                    atualizado_em=agora, tentativas=Job.tentativas + 1
+                ).execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            if resultado.rowcount == 1:
+                return job_id
+        return None
+
+    @staticmethod
+    def executar(job_id):
+        """
+        Executa um job reservado e grava o resultado
+
+        Em caso de erro desfaz a transação do executor e reagenda com
+        backoff exponencial enquanto houver tentativas; depois marca como
+        'falhou'. Enquanto o executor roda, um BatimentoJob mantém o job
+        com cara de vivo para recuperar_travados.
+
+        Args:
+            job_id: ID do job (já reservado)
+
+        Returns:
+            str: Status final do job
+        """
+        job = db.session.get(Job, job_id)
+        funcao = TIPOS_JOB.get(job.tipo)
+        contexto = ContextoJob(job)
+        parametros = dict(job.parametros or {})
+
+        try:
+            if funcao is None:
+                raise JobNaoEncontrado(f'Tipo de job desconhecido: {job.tipo}')
+            with BatimentoJob(current_app._get_current_object(), job_id):
+                resultado = funcao(contexto, **parametros) or {}
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.erro = f'{e}\n{traceback.format_exc(limit=5)}'
+            job.worker = None
+            if job.tentativas < job.max_tentativas and not isinstance(e, JobNaoEncontrado):
+                espera = min(BACKOFF_BASE_SEGUNDOS * 2 ** (job.tentativas - 1), BACKOFF_MAXIMO_SEGUNDOS)
+                job.status = 'pendente'
+                job.proxima_execucao = datetime.now() + timedelta(seconds=espera)
+                job.mensagem = f'Falha na tentativa {job.tentativas}; nova tentativa em {espera} s'
+            else:
+                job.status = 'falhou'
+                job.concluido_em = datetime.now()
+                job.mensagem = f'Falhou após {job.tentativas} tentativa(s)'
+            db.session.commit()
+            current_app.logger.error(f'Job {job_id} ({job.tipo}) falhou: {e}')
+            return job.status
+
+        job = db.session.get(Job, job_id)
+        db.session.refresh(job)
+        artefato = {chave: resultado.pop(chave) for chave in ('arquivo', 'nome_arquivo', 'mimetype') if chave in resultado}
+        job.resultado = _serializavel(resultado)
+        job.arquivo = artefato.get('arquivo')
+        job.nome_arquivo = artefato.get('nome_arquivo')
+        job.mimetype = artefato.get('mimetype')
+        job.status = 'concluida'
+        job.progresso = 100
+        job.erro = None
+        job.concluido_em = datetime.now()
+        db.session.commit()
+        return job.status
+
+    @staticmethod
+    def processar_pendentes(worker, limite=None):
+        """
+        Executa jobs no thread atual até a fila esvaziar
+
+        Args:
+            worker: Identificação do worker
+            limite: Máximo de jobs a executar (None = sem limite)
+
+        Returns:
+            int: Quantidade de jobs executados
+        """
+        executados = 0
+        while limite is None or executados < limite:
+            job_id = JobService.reservar(worker)
+            if job_id is None:
+                break
+            JobService.executar(job_id)
+            executados += 1
+        return executados
+
+    @staticmethod
+    def recuperar_travados(timeout=TIMEOUT_TRAVADO_SEGUNDOS):
+        """
+        Devolve à fila jobs em andamento abandonados (worker encerrado no meio)
+
+        Jobs vivos renovam atualizado_em pelo batimento; os abandonados que
+        já gastaram todas as tentativas são marcados como 'falhou'.
+
+        Returns:
+            int: Quantidade de jobs devolvidos à fila
+        """
+        agora = datetime.now()
+        abandonado = and_(Job.status == 'em_andamento', Job.atualizado_em < agora - timedelta(seconds=timeout))
+        db.session.execute(
+            update(Job).where(abandonado, Job.tentativas >= Job.max_tentativas).values(
+                status='falhou', worker=None, concluido_em=agora,
+                mensagem='Abandonado pelo worker após a última tentativa'
+            ).execution_options(synchronize_session=False)
+        )
+        resultado = db.session.execute(
+            update(Job).where(abandonado).values(
+                status='pendente', worker=None, proxima_execucao=agora,
+                mensagem='Retomado após interrupção do worker'
+            ).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return resultado.rowcount or 0
+
+    @staticmethod
+    def limpar(dias):
+        """
+        Remove jobs finalizados há mais de `dias` dias e seus arquivos
+
+        Returns:
+            int: Quantidade de jobs removidos
+        """
+        limite = datetime.now() - timedelta(days=dias)
+        antigos = [jid for (jid,) in db.session.query(Job.id).filter(
+            Job.status.in_(('concluida', 'falhou')),
+            Job.concluido_em < limite
+        )]
+        for job_id in antigos:
+            shutil.rmtree(pasta_job(job_id), ignore_errors=True)
+        if antigos:
+            Job.query.filter(Job.id.in_(antigos)).delete(synchronize_session=False)
+            db.session.commit()
+        return len(antigos)
+
+    @staticmethod
+    def status(job):
+        """
+        Representação do job para a API de acompanhamento
+
+        Returns:
+            dict: id, tipo, status, progresso, mensagem, tentativas, resultado,
+            erro (só a primeira linha), datas e se há arquivo para download
+        """
+        return {
+            'id': job.id,
+            'tipo': job.tipo,
+            'status': job.status,
+            'progresso': job.progresso,
+            'mensagem': job.mensagem,
+            'tentativas': job.tentativas,
+            'max_tentativas': job.max_tentativas,
+            'resultado': job.resultado,
+            'erro': job.erro.splitlines()[0] if job.erro else None,
+            'tem_arquivo': bool(job.arquivo),
+            'criado_em': job.criado_em.isoformat() if job.criado_em else None,
+            'iniciado_em': job.iniciado_em.isoformat() if job.iniciado_em else None,
+            'concluido_em': job.concluido_em.isoformat() if job.concluido_em else None
+        }
+
+
+def executar_worker(app, concorrencia=2, modo='thread', intervalo=2.0, parar=None):
+    """
+    Laço principal do worker: reserva jobs e os distribui a um pool
+
+    A reserva acontece no thread principal; a execução, em um pool de
+    threads (mesmo processo, mesma aplicação) ou de processos (cada um cria
+    a própria aplicação com create_app, indicado para jobs pesados em CPU
+    como PDFs grandes).
+
+    Args:
+        app: Aplicação Flask
+        concorrencia: Jobs simultâneos
+        modo: 'thread' ou 'processo'
+        intervalo: Espera em segundos quando a fila está vazia
+        parar: threading.Event opcional para encerrar o laço
+    """
+    global _app_worker
+    concorrencia = max(1, int(concorrencia))
+    if modo == 'processo':
+        executor = ProcessPoolExecutor(concorrencia, initializer=_inicializar_processo_worker)
+    else:
+        _app_worker = app
+        executor = ThreadPoolExecutor(concorrencia, thread_name_prefix='job-worker')
+
+    worker = nome_worker()
+    em_execucao = set()
+    ultima_recuperacao = 0.0
+    try:
+        while parar is None or not parar.is_set():
+            em_execucao = {futuro for futuro in em_execucao if not futuro.done()}
+            with app.app_context():
+                if time.monotonic() - ultima_recuperacao > INTERVALO_RECUPERACAO_SEGUNDOS:
+                    JobService.recuperar_travados()
+                    ultima_recuperacao = time.monotonic()
+                while len(em_execucao) < concorrencia:
+                    job_id = JobService.reservar(worker)
+                    if job_id is None:
+                        break
+                    app.logger.info(f'Job {job_id} reservado por {worker}')
+                    em_execucao.add(executor.submit(_executar_no_pool, job_id))
+                db.session.remove()
+            if parar is not None:
+                parar.wait(intervalo)
+            else:
+                time.sleep(intervalo)
+    finally:
+        executor.shutdown(wait=True)
+
+
+def _inicializar_processo_worker():
+    global _app_worker
+    from app import create_app
+    _app_worker = create_app()
+
+
+def _executar_no_pool(job_id):
+    with _app_worker.app_context():
+        try:
+            return JobService.executar(job_id)
+        finally:
+            db.session.remove()
+
+
+def pasta_job(job_id):
+    """Pasta de artefatos do job (JOBS_DIR ou <instance>/jobs)"""
+    base = current_app.config.get('JOBS_DIR') or os.path.join(current_app.instance_path, 'jobs')
+    return os.path.join(base, str(job_id))
+
+
+def nome_worker():
+    """Identificação padrão do worker: host, pid e thread"""
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def _serializavel(valor):
+    """Converte datas em ISO para gravar em colunas JSON"""
+    if isinstance(valor, dict):
+        return {chave: _serializavel(item) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_serializavel(item) for item in valor]
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+# =====================
+# Tipos de job
+# =====================
+
+@registrar_tipo('periodos.gerar')
+def _job_gerar_periodos(contexto, ano, mes):
+    from app.services.periodo_service import PeriodoService
+
+    contexto.progresso(0, f'Gerando períodos de {mes:02d}/{ano}')
+    resultado = PeriodoService.gerar_periodos(ano, mes)
+    return {
+        'periodo': resultado['periodo'],
+        'tarefas_criadas': resultado['tarefas_criadas'],
+        'tarefas_existentes': resultado['tarefas_existentes'],
+        'tempos': resultado['tempos']
+    }
+
+
+def _job_importacao(entidade):
+    def executar(contexto, arquivo, dry_run=False):
+        from app.services.importacao_service import ImportacaoService
+
+        contexto.progresso(0, f'Importando {entidade}')
+        importar = getattr(ImportacaoService, f'importar_{entidade}')
+        return importar(arquivo, dry_run=dry_run)
+    return executar
+
+
+for _entidade in ('usuarios', 'empresas', 'tarefas'):
+    registrar_tipo(f'importacao.{_entidade}')(_job_importacao(_entidade))
+
+
+@registrar_tipo('relatorios.pdf')
+def _job_relatorio_pdf(contexto, filtros, filtros_texto, nome_arquivo):
+    from app.services.relatorio_service import RelatorioService
+
+    filtros = dict(filtros)
+    for chave in ('data_inicio', 'data_fim'):
+        if filtros.get(chave):
+            filtros[chave] = date.fromisoformat(filtros[chave])
+
+    caminho = contexto.caminho('relatorio.pdf')
+    RelatorioService.escrever_pdf(
+        caminho, filtros, filtros_texto,
+        progresso=lambda percentual: contexto.progresso(percentual, 'Gerando PDF')
+    )
+    return contexto.artefato(caminho, nome_arquivo, 'application/pdf')
+
+
+@registrar_tipo('tributacao.migrar')
+def _job_migrar_tributacao(contexto, migracao_id):
+    from app.services.tributacao_service import TributacaoService
+
+    def progresso(status):
+        contexto.progresso(status['percentual'], f"{status['processadas']}/{status['total']} empresas")
+
+    return TributacaoService.executar_migracao(migracao_id, progresso=progresso)
@@ -0,0 +1,278 @@
+"""
+Serviço de Métricas
+Métricas no formato texto do Prometheus em /metrics: requisições e
+histogramas de latência por endpoint e status, tempo de SQL por requisição
+(da instrumentação SQL), pool de conexões do SQLAlchemy, acertos/falhas do
+cache da API v1 e a fila do waitress.
+
+Os contadores e histogramas ficam em memória neste processo (o waitress
+serve com várias threads num só processo); cada métrica tem seu lock e a
+observação é só um bisect e três somas. Pool, cache e fila são lidos na
+hora da coleta, sem custo nas requisições
+"""
+
+import bisect
+import hmac
+import ipaddress
+import threading
+import time
+from functools import lru_cache
+
+from flask import Response, current_app, g, request
+
+from app.db import db
+from app.services.instrumentacao_service import InstrumentacaoService
+
+
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+BUCKETS_REQUISICAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_SQL = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(nomes, valores, extra=''):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico por combinação de rótulos"""
+
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.valores = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *valores, quantidade=1):
+        with self.lock:
+            self.valores[valores] = self.valores.get(valores, 0) + quantidade
+
+    def amostras(self):
+        with self.lock:
+            itens = sorted(self.valores.items())
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}" for chave, valor in itens]
+
+    def zerar(self):
+        with self.lock:
+            self.valores.clear()
+
+
+class Histograma:
+    """Histograma com buckets fixos por combinação de rótulos"""
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_REQUISICAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self.lock:
+            serie = self.series.get(valores)
+            if serie is None:
+                # contagem por bucket (o último é +Inf), soma
+                serie = self.series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def amostras(self):
+        with self.lock:
+            itens = sorted((chave, (list(contagens), soma)) for chave, (contagens, soma) in self.series.items())
+        linhas = []
+        for chave, (contagens, soma) in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+                acumulado += contagem
+                le = f'le="{_numero(limite)}"'
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+    def zerar(self):
+        with self.lock:
+            self.series.clear()
+
+
+class RegistroMetricas:
+    """Métricas da aplicação e coletores lidos a cada /metrics"""
+
+    def __init__(self):
+        self.requisicoes = Contador(
+            'http_requests_total', 'Requisições por endpoint, método e status.',
+            ('endpoint', 'method', 'status'),
+        )
+        self.latencia = Histograma(
+            'http_request_duration_seconds', 'Tempo de resposta por endpoint e status.',
+            ('endpoint', 'status'),
+        )
+        self.tempo_sql = Histograma(
+            'sql_request_duration_seconds', 'Tempo de banco por requisição, por endpoint.',
+            ('endpoint',), BUCKETS_SQL,
+        )
+        self.consultas_sql = Contador(
+            'sql_statements_total', 'Instruções SQL executadas, por endpoint.', ('endpoint',),
+        )
+        self.alertas_n1 = Contador(
+            'sql_n_plus_one_alerts_total', 'Instruções repetidas acima de SQL_N1_LIMITE, por endpoint.',
+            ('endpoint',),
+        )
+        self.metricas = [self.requisicoes, self.latencia, self.tempo_sql, self.consultas_sql, self.alertas_n1]
+        self.despachante_waitress = None
+
+    def zerar(self):
+        for metrica in self.metricas:
+            metrica.zerar()
+
+    def texto(self, app):
+        """Exposição completa no formato texto do Prometheus"""
+        linhas = []
+        for metrica in self.metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.amostras())
+        for nome, tipo, ajuda, amostras in self._coletar(app):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            linhas.extend(f"{nome}{rotulos} {_numero(valor)}" for rotulos, valor in amostras)
+        return '\n'.join(linhas) + '\n'
+
+    def _coletar(self, app):
+        pool = db.engine.pool
+        # Pools sem limite (StaticPool/SingletonThreadPool do SQLite) não têm esses métodos
+        for nome, metodo, ajuda in (
+            ('db_pool_size', 'size', 'Tamanho configurado do pool de conexões.'),
+            ('db_pool_checked_out', 'checkedout', 'Conexões emprestadas do pool agora.'),
+            ('db_pool_overflow', 'overflow', 'Conexões além de pool_size (negativo: vagas no pool).'),
+            ('db_pool_checked_in', 'checkedin', 'Conexões ociosas no pool.'),
+        ):
+            if hasattr(pool, metodo):
+                yield nome, 'gauge', ajuda, [('', getattr(pool, metodo)())]
+
+        estatisticas = app.extensions.get('cache_tags')
+        if estatisticas is not None:
+            amostras = []
+            for prefixo, contador in estatisticas.resumo().items():
+                for resultado, chave in (('hit', 'hits'), ('miss', 'misses')):
+                    amostras.append((_rotulos(('prefix', 'result'), (prefixo, resultado)), contador[chave]))
+            yield 'cache_requests_total', 'counter', 'Leituras do cache da API v1 por prefixo e resultado.', amostras
+
+        despachante = self.despachante_waitress
+        if despachante is not None:
+            yield 'waitress_queue_depth', 'gauge', 'Requisições aguardando uma thread livre.', [('', len(despachante.queue))]
+            yield 'waitress_threads_active', 'gauge', 'Threads atendendo requisições.', [('', despachante.active_count)]
+            yield 'waitress_threads', 'gauge', 'Threads do waitress.', [('', len(despachante.threads))]
+
+
+class MetricasService:
+    """Coleta por requisição e endpoint /metrics"""
+
+    @staticmethod
+    def iniciar(app):
+        """
+        Registra os hooks da requisição e a rota /metrics
+
+        Deve vir depois de InstrumentacaoService.iniciar: o after_request daqui
+        roda antes e ainda encontra o registro SQL da requisição
+        """
+        registro = app.extensions['metricas'] = RegistroMetricas()
+        if not app.config.get('METRICAS_ATIVAS', True):
+            return
+
+        @app.before_request
+        def _marcar_inicio():
+            g.inicio_requisicao = time.perf_counter()
+
+        @app.after_request
+        def _registrar_requisicao(resposta):
+            inicio = g.pop('inicio_requisicao', None)
+            if inicio is None:
+                return resposta
+            duracao = time.perf_counter() - inicio
+            endpoint = request.endpoint or 'nao_encontrado'
+            status = str(resposta.status_code)
+            registro.requisicoes.inc(endpoint, request.method, status)
+            registro.latencia.observar(duracao, endpoint, status)
+            sql = InstrumentacaoService.registro_atual()
+            if sql is not None:
+                registro.tempo_sql.observar(sql.tempo, endpoint)
+                registro.consultas_sql.inc(endpoint, quantidade=sql.consultas)
+                if sql.repetidas:
+                    registro.alertas_n1.inc(endpoint, quantidade=len(sql.repetidas))
+            return resposta
+
+        @app.teardown_request
+        def _descartar_inicio(exc):
+            g.pop('inicio_requisicao', None)
+
+        app.add_url_rule('/metrics', 'metricas', _expor_metricas)
+        limiter = getattr(app, 'limiter', None)
+        if limiter is not None:
+            # O Prometheus coleta a cada poucos segundos
+            limiter.exempt(_expor_metricas)
+
+    @staticmethod
+    def registrar_waitress(app, servidor):
+        """Acompanha a fila do waitress (servidor de waitress.create_server)"""
+        app.extensions['metricas'].despachante_waitress = servidor.task_dispatcher
+
+
+@lru_cache(maxsize=32)
+def _redes(texto):
+    return tuple(ipaddress.ip_network(rede.strip(), strict=False) for rede in texto.split(',') if rede.strip())
+
+
+def endereco_permitido(endereco, redes):
+    """
+    Se o endereço do cliente está numa das redes (texto 'a.b.c.d/n, ::1')
+
+    Endereços inválidos ou ausentes nunca são permitidos.
+    """
+    try:
+        ip = ipaddress.ip_address(endereco or '')
+    except ValueError:
+        return False
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return any(ip in rede for rede in _redes(redes or ''))
+
+
+def _expor_metricas():
+    """
+    GET /metrics
+
+    Com METRICAS_TOKEN, exige Authorization: Bearer <token>. Sem token, fora
+    de debug/testes, só responde a clientes em METRICAS_REDES (padrão:
+    apenas a própria máquina)
+    """
+    config = current_app.config
+    token = config.get('METRICAS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Não autorizado\n', status=401, mimetype='text/plain')
+    elif not (config.get('DEBUG') or config.get('TESTING')) and \
+            not endereco_permitido(request.remote_addr, config.get('METRICAS_REDES')):
+        return Response('Acesso negado\n', status=403, mimetype='text/plain')
+    texto = current_app.extensions['metricas'].texto(current_app)
+    return Response(texto, content_type=TIPO_CONTEUDO)
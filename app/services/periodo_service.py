@@ -0,0 +1,143 @@
+"""
+Serviço de Geração de Períodos
+Geração em lote dos períodos (instâncias mensais/trimestrais) das tarefas
+"""
+
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.db import db
+from app.models import Tarefa, RelacionamentoTarefa, Periodo
+from app.services.resumo_service import ResumoService
+from app.utils import gerar_periodo_label, calcular_datas_periodo
+
+
+# Quantidade de linhas por INSERT multi-row
+TAMANHO_LOTE_PADRAO = 1000
+
+
+class PeriodoService:
+    """Serviço para geração de períodos a partir dos relacionamentos ativos"""
+
+    @staticmethod
+    def contar_periodos(periodo_label):
+        """
+        Conta quantos períodos já existem para um label
+
+        Args:
+            periodo_label: Label do período (YYYY-MM)
+
+        Returns:
+            int: Quantidade de períodos existentes
+        """
+        return Periodo.query.filter_by(periodo_label=periodo_label).count()
+
+    @staticmethod
+    def gerar_periodos(ano, mes, tamanho_lote=TAMANHO_LOTE_PADRAO, commit=True):
+        """
+        Gera os períodos de todos os relacionamentos ativos para o mês informado
+
+        Em vez de consultar tarefa e período relacionamento a relacionamento,
+        carrega os tipos das tarefas, os relacionamentos ativos e os labels já
+        existentes com uma consulta cada, calcula as datas uma vez por tipo e
+        insere os períodos faltantes em lotes.
+
+        Tarefas anuais são ignoradas (gerenciadas separadamente).
+
+        Args:
+            ano: Ano de referência
+            mes: Mês de referência
+            tamanho_lote: Quantidade de linhas por INSERT
+            commit: Se True, confirma a transação ao final
+
+        Returns:
+            dict: tarefas_criadas, tarefas_existentes, total_relacionamentos,
+                periodo e tempos (ms por etapa)
+        """
+        ano = int(ano)
+        mes = int(mes)
+        tempos = {}
+        inicio_total = time.perf_counter()
+
+        # 1. Tipos das tarefas (id -> tipo)
+        marca = time.perf_counter()
+        tipos = dict(db.session.query(Tarefa.id, Tarefa.tipo).all())
+
+        # 2. Relacionamentos ativos (versão atual e status ativa)
+        relacionamentos = db.session.query(
+            RelacionamentoTarefa.id,
+            RelacionamentoTarefa.tarefa_id
+        ).filter(
+            RelacionamentoTarefa.status == 'ativa',
+            RelacionamentoTarefa.versao_atual == True
+        ).all()
+        tempos['carregar_relacionamentos'] = _ms(marca)
+
+        # 3. Datas do período calculadas uma única vez por tipo
+        marca = time.perf_counter()
+        datas_por_tipo = {}
+        candidatos = []
+        for rel_id, tarefa_id in relacionamentos:
+            tipo = tipos.get(tarefa_id)
+            if tipo is None or tipo == 'Anual':
+                continue
+            if tipo not in datas_por_tipo:
+                datas_por_tipo[tipo] = calcular_datas_periodo(ano, mes, tipo)
+            candidatos.append((rel_id, tipo))
+
+        labels = {datas[2] for datas in datas_por_tipo.values()}
+        existentes = set()
+        if labels:
+            existentes = set(
+                db.session.query(
+                    Periodo.relacionamento_tarefa_id,
+                    Periodo.periodo_label
+                ).filter(Periodo.periodo_label.in_(labels)).all()
+            )
+        tempos['carregar_periodos'] = _ms(marca)
+
+        # 4. Montar as linhas faltantes
+        marca = time.perf_counter()
+        agora = datetime.now()
+        novos = []
+        tarefas_existentes = 0
+        for rel_id, tipo in candidatos:
+            inicio, fim, label = datas_por_tipo[tipo]
+            if (rel_id, label) in existentes:
+                tarefas_existentes += 1
+                continue
+            novos.append({
+                'relacionamento_tarefa_id': rel_id,
+                'inicio': inicio,
+                'fim': fim,
+                'periodo_label': label,
+                'status': 'pendente',
+                'contador_retificacoes': 0,
+                'atualizado_em': agora,
+            })
+
+        # 5. INSERT em lotes
+        tamanho_lote = max(1, int(tamanho_lote or TAMANHO_LOTE_PADRAO))
+        for posicao in range(0, len(novos), tamanho_lote):
+            db.session.execute(insert(Periodo), novos[posicao:posicao + tamanho_lote])
+        ResumoService.registrar_periodos(novos)
+
+        if commit and novos:
+            db.session.commit()
+        tempos['inserir_periodos'] = _ms(marca)
+        tempos['total'] = _ms(inicio_total)
+
+        return {
+            'tarefas_criadas': len(novos),
+            'tarefas_existentes': tarefas_existentes,
+            'total_relacionamentos': len(relacionamentos),
+            'periodo': gerar_periodo_label(ano, mes),
+            'tempos': tempos,
+        }
+
+
+def _ms(inicio):
+    """Retorna o tempo decorrido desde `inicio` em milissegundos"""
+    return round((time.perf_counter() - inicio) * 1000, 2)
@@ -0,0 +1,213 @@
+"""
+Serviço de Referências
+Cache em memória (por processo) das tabelas de referência pequenas — setores
+e tributações — com versão por tabela. Escritas nessas tabelas (ORM ou
+insert/update em massa, como a criação automática das importações do admin)
+trocam a versão no commit; com Redis a versão é compartilhada entre processos
+"""
+
+import threading
+import uuid
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+from app.db import db
+from app.models import Setor, Tributacao
+
+
+SetorRef = namedtuple('SetorRef', 'id nome')
+TributacaoRef = namedtuple('TributacaoRef', 'id nome')
+
+# Nome da tabela -> (modelo, tipo do registro imutável)
+TABELAS = {
+    Setor.__tablename__: (Setor, SetorRef),
+    Tributacao.__tablename__: (Tributacao, TributacaoRef),
+}
+CHAVE_VERSAO = 'referencias:versao:{}'
+
+
+class _Tabela:
+    """Registros carregados de uma tabela e a versão a que correspondem (não muda depois de criado)"""
+
+    def __init__(self, versao=None, itens=None):
+        self.versao = versao
+        self.itens = itens
+        self.por_id = MappingProxyType({item.id: item for item in itens or ()})
+
+
+class CacheReferencias:
+    """Cache versionado das tabelas de referência de uma aplicação"""
+
+    def __init__(self):
+        self.versoes = {nome: None for nome in TABELAS}
+        self.tabelas = {nome: None for nome in TABELAS}
+        self.lock = threading.Lock()
+
+    def _versao_compartilhada(self, nome):
+        cache = getattr(current_app, 'cache', None)
+        if cache is None:
+            return None
+        try:
+            return cache.get(CHAVE_VERSAO.format(nome))
+        except Exception:
+            return None
+
+    def obter(self, nome):
+        compartilhada = self._versao_compartilhada(nome)
+        with self.lock:
+            if compartilhada is not None and compartilhada != self.versoes[nome]:
+                # Outro processo alterou a tabela
+                self.versoes[nome] = compartilhada
+            versao = self.versoes[nome]
+            tabela = self.tabelas[nome]
+            if tabela is not None and tabela.versao == versao:
+                return tabela
+
+        # A versão é lida antes da carga e os dados ficam sob ela: se outra
+        # escrita trocar a versão no meio, a próxima leitura carrega de novo
+        tabela = _Tabela(versao, _carregar(nome))
+        with self.lock:
+            if self.versoes[nome] == versao:
+                self.tabelas[nome] = tabela
+        return tabela
+
+    def invalidar(self, nomes):
+        versao = uuid.uuid4().hex
+        with self.lock:
+            for nome in nomes:
+                self.versoes[nome] = versao
+        cache = getattr(current_app, 'cache', None)
+        if cache is not None:
+            for nome in nomes:
+                try:
+                    cache.set(CHAVE_VERSAO.format(nome), versao, timeout=0)
+                except Exception as e:
+                    current_app.logger.warning(f"Versão de {nome} não publicada no cache: {e}")
+
+
+def _carregar(nome):
+    """
+    Lê a tabela em uma transação nova
+
+    A transação da sessão pode ter snapshot anterior ao commit que trocou a
+    versão (REPEATABLE READ no MySQL) e ainda enxerga escritas não
+    confirmadas; por isso a leitura usa outra conexão do pool. Com pool de
+    conexão única (SQLite em memória) a outra conexão seria a mesma, e o
+    reset ao devolvê-la desfaria a transação da sessão.
+    """
+    modelo, tipo = TABELAS[nome]
+    consulta = select(modelo.id, modelo.nome).order_by(modelo.nome, modelo.id)
+    if isinstance(db.engine.pool, (StaticPool, SingletonThreadPool)):
+        linhas = db.session.execute(consulta).all()
+    else:
+        with db.engine.connect() as conexao:
+            linhas = conexao.execute(consulta).all()
+    return tuple(tipo(id, nome_item) for id, nome_item in linhas)
+
+
+def _cache():
+    return current_app.extensions['referencias']
+
+
+class ReferenciaService:
+    """Leitura das tabelas de referência a partir do cache (não alterar o retorno)"""
+
+    @staticmethod
+    def iniciar(app):
+        """Cria o cache da aplicação e registra os helpers de template"""
+        app.extensions['referencias'] = CacheReferencias()
+        app.add_template_global(ReferenciaService.setores, 'lista_setores')
+        app.add_template_global(ReferenciaService.tributacoes, 'lista_tributacoes')
+        app.add_template_filter(ReferenciaService.nome_setor, 'nome_setor')
+        app.add_template_filter(ReferenciaService.nome_tributacao, 'nome_tributacao')
+
+    @staticmethod
+    def setores():
+        """
+        Setores ordenados por nome
+
+        Returns:
+            tuple: SetorRef(id, nome)
+        """
+        return _cache().obter(Setor.__tablename__).itens
+
+    @staticmethod
+    def tributacoes():
+        """
+        Tributações ordenadas por nome
+
+        Returns:
+            tuple: TributacaoRef(id, nome)
+        """
+        return _cache().obter(Tributacao.__tablename__).itens
+
+    @staticmethod
+    def setor(setor_id):
+        """SetorRef pelo id (None se não existir)"""
+        return _cache().obter(Setor.__tablename__).por_id.get(setor_id)
+
+    @staticmethod
+    def tributacao(tributacao_id):
+        """TributacaoRef pelo id (None se não existir)"""
+        return _cache().obter(Tributacao.__tablename__).por_id.get(tributacao_id)
+
+    @staticmethod
+    def nome_setor(setor_id, padrao='-'):
+        setor = ReferenciaService.setor(setor_id)
+        return setor.nome if setor else padrao
+
+    @staticmethod
+    def nome_tributacao(tributacao_id, padrao='-'):
+        tributacao = ReferenciaService.tributacao(tributacao_id)
+        return tributacao.nome if tributacao else padrao
+
+    @staticmethod
+    def como_dicts(itens):
+        """Lista de dicionários {id, nome} para respostas JSON"""
+        return [item._asdict() for item in itens]
+
+    @staticmethod
+    def invalidar(*tabelas):
+        """
+        Descarta o cache das tabelas (todas, se nenhuma for informada)
+
+        Args:
+            tabelas: 'setores' e/ou 'tributacoes'
+        """
+        _cache().invalidar(tabelas or tuple(TABELAS))
+
+
+_PENDENTES = 'referencias_pendentes'
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Setor, Tributacao)):
+            session.info.setdefault(_PENDENTES, set()).add(obj.__tablename__)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _registrar_dml(estado):
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    nome = getattr(getattr(estado.statement, 'table', None), 'name', None)
+    if nome in TABELAS:
+        estado.session.info.setdefault(_PENDENTES, set()).add(nome)
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_commit(session):
+    pendentes = session.info.pop(_PENDENTES, None)
+    if pendentes and has_app_context() and 'referencias' in current_app.extensions:
+        ReferenciaService.invalidar(*pendentes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_rollback(session):
+    session.info.pop(_PENDENTES, None)
@@ -0,0 +1,468 @@
+"""
+Serviço de Relatórios
+Consulta dos períodos do relatório de tarefas com filtros, paginação por
+cursor (keyset) e estatísticas agregadas no banco
+"""
+
+import base64
+import binascii
+import csv
+import io
+import itertools
+import json
+from datetime import date, datetime
+
+from openpyxl import Workbook
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Frame, Paragraph, Spacer, LongTable, TableStyle
+from reportlab.platypus.doctemplate import LayoutError
+from sqlalchemy import and_, func, or_
+
+from app.db import db
+from app.models import Empresa, Tarefa, RelacionamentoTarefa, Periodo, Usuario
+
+
+# Tamanho de página padrão e máximo da paginação por cursor
+TAMANHO_PAGINA_PADRAO = 100
+TAMANHO_PAGINA_MAXIMO = 1000
+# Linhas por consulta na leitura completa (PDF)
+TAMANHO_LOTE_LEITURA = 500
+# Linhas por segmento de tabela do PDF (cerca de uma página A4)
+LINHAS_POR_SEGMENTO = 40
+# Margens do PDF em pontos: esquerda, direita, topo, base
+MARGENS_PDF = (72, 72, 72, 18)
+
+# Colunas das exportações CSV/XLSX: (chave de formatar_linha, título)
+COLUNAS_EXPORTACAO = [
+    ('id', 'ID'),
+    ('empresa_nome', 'Empresa'),
+    ('tarefa_nome', 'Tarefa'),
+    ('tarefa_tipo', 'Tipo'),
+    ('periodo', 'Período'),
+    ('status_texto', 'Status'),
+    ('responsavel_nome', 'Responsável'),
+    ('prazo_especifico', 'Prazo'),
+    ('data_conclusao', 'Data'),
+    ('label_data', 'Tipo da Data'),
+]
+# Linhas acumuladas antes de cada bloco enviado no CSV
+LINHAS_POR_BLOCO_CSV = 500
+
+CABECALHO_PDF = ['Empresa', 'Tarefa', 'Tipo', 'Período', 'Status', 'Responsável', 'Conclusão']
+ESTILO_TABELA_PDF = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+])
+
+STATUS_TEXTO = {
+    'pendente': 'Pendente',
+    'em_andamento': 'Em Andamento',
+    'concluida': 'Concluída',
+    'atrasada': 'Atrasada'
+}
+
+
+class CursorInvalido(ValueError):
+    """Token de cursor malformado ou adulterado"""
+
+
+class RelatorioService:
+    """Serviço para os dados do relatório de tarefas (relatorios.api_dados_relatorio)"""
+
+    @staticmethod
+    def consulta(filtros):
+        """
+        Monta a consulta de colunas do relatório com os filtros aplicados
+
+        Args:
+            filtros: dict com empresa_id, funcionario_id, tarefa_id, setor_id,
+                data_inicio, data_fim (date) e status ('todos' = sem filtro)
+
+        Returns:
+            Query: colunas do período, empresa, tarefa e responsável (sem ordenação)
+        """
+        query = db.session.query(
+            Periodo.id,
+            Periodo.inicio,
+            Empresa.nome.label('empresa_nome'),
+            Tarefa.nome.label('tarefa_nome'),
+            Tarefa.tipo.label('tarefa_tipo'),
+            Periodo.periodo_label,
+            Periodo.status,
+            Periodo.data_conclusao,
+            Periodo.data_retificacao,
+            RelacionamentoTarefa.prazo_especifico,
+            Usuario.nome.label('responsavel_nome')
+        ).join(RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id)\
+         .join(Empresa, RelacionamentoTarefa.empresa_id == Empresa.id)\
+         .join(Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id)\
+         .outerjoin(Usuario, RelacionamentoTarefa.responsavel_id == Usuario.id)
+        return _aplicar_filtros(query, filtros)
+
+    @staticmethod
+    def ordenada(filtros):
+        """Consulta do relatório na ordem (empresa, início desc, id)"""
+        return RelatorioService.consulta(filtros).order_by(Empresa.nome, Periodo.inicio.desc(), Periodo.id)
+
+    @staticmethod
+    def pagina(filtros, cursor=None, limite=TAMANHO_PAGINA_PADRAO):
+        """
+        Busca uma página do relatório a partir de um cursor
+
+        A ordenação (empresa nome, início desc, id) é total, então a página
+        seguinte começa exatamente após a última linha da anterior, sem
+        OFFSET e sem repetir ou pular registros.
+
+        Args:
+            filtros: Filtros do relatório (ver consulta)
+            cursor: Token devolvido como proximo_cursor na página anterior
+            limite: Linhas por página (limitado a TAMANHO_PAGINA_MAXIMO)
+
+        Returns:
+            dict: dados (linhas formatadas), proximo_cursor (None na última
+            página) e tem_mais
+
+        Raises:
+            CursorInvalido: Se o token não puder ser decodificado
+        """
+        limite = max(1, min(int(limite or TAMANHO_PAGINA_PADRAO), TAMANHO_PAGINA_MAXIMO))
+        chave = decodificar_cursor(cursor) if cursor else None
+
+        linhas = _apos(RelatorioService.ordenada(filtros), chave).limit(limite + 1).all()
+        tem_mais = len(linhas) > limite
+        linhas = linhas[:limite]
+
+        proximo_cursor = None
+        if tem_mais:
+            ultima = linhas[-1]
+            proximo_cursor = codificar_cursor(ultima.empresa_nome, ultima.inicio, ultima.id)
+
+        return {
+            'dados': [formatar_linha(r) for r in linhas],
+            'proximo_cursor': proximo_cursor,
+            'tem_mais': tem_mais
+        }
+
+    @staticmethod
+    def lotes(filtros, tamanho_lote=TAMANHO_LOTE_LEITURA):
+        """
+        Percorre o relatório inteiro em lotes lidos por cursor
+
+        Cada lote é uma consulta curta (sem OFFSET nem cursor aberto no
+        servidor), então a leitura pode ser intercalada com trabalho lento,
+        como a renderização do PDF, sem manter o resultado todo em memória.
+
+        Args:
+            filtros: Filtros do relatório (ver consulta)
+            tamanho_lote: Linhas por consulta
+
+        Yields:
+            list: Linhas formatadas (ver formatar_linha) de cada lote
+        """
+        chave = None
+        query = RelatorioService.ordenada(filtros)
+        while True:
+            linhas = _apos(query, chave).limit(tamanho_lote).all()
+            if not linhas:
+                return
+            yield [formatar_linha(r) for r in linhas]
+            if len(linhas) < tamanho_lote:
+                return
+            ultima = linhas[-1]
+            chave = (ultima.empresa_nome, ultima.inicio, ultima.id)
+
+    @staticmethod
+    def iterar(filtros, tamanho_lote=TAMANHO_LOTE_LEITURA):
+        """
+        Percorre o relatório com cursor no servidor (yield_per)
+
+        Indicado para exportações que consomem as linhas sem pausas longas;
+        o resultado chega do banco em blocos de tamanho_lote.
+
+        Args:
+            filtros: Filtros do relatório (ver consulta)
+            tamanho_lote: Linhas buscadas por vez
+
+        Yields:
+            dict: Linha formatada (ver formatar_linha)
+        """
+        for r in RelatorioService.ordenada(filtros).yield_per(tamanho_lote):
+            yield formatar_linha(r)
+
+    @staticmethod
+    def linhas_csv(filtros):
+        """
+        Gera o relatório em CSV em blocos de texto
+
+        Args:
+            filtros: Filtros do relatório (ver consulta)
+
+        Yields:
+            str: Blocos de até LINHAS_POR_BLOCO_CSV linhas (o primeiro com BOM e cabeçalho)
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write('\ufeff')
+        writer.writerow([titulo for _, titulo in COLUNAS_EXPORTACAO])
+
+        pendentes = 0
+        for item in RelatorioService.iterar(filtros):
+            writer.writerow([item[chave] for chave, _ in COLUNAS_EXPORTACAO])
+            pendentes += 1
+            if pendentes >= LINHAS_POR_BLOCO_CSV:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pendentes = 0
+        yield buffer.getvalue()
+
+    @staticmethod
+    def escrever_xlsx(destino, filtros):
+        """
+        Grava o relatório em XLSX com o modo write-only do openpyxl
+
+        Args:
+            destino: Caminho ou arquivo binário (com seek) onde gravar
+            filtros: Filtros do relatório (ver consulta)
+        """
+        workbook = Workbook(write_only=True)
+        planilha = workbook.create_sheet('Relatório')
+        planilha.append([titulo for _, titulo in COLUNAS_EXPORTACAO])
+        for item in RelatorioService.iterar(filtros):
+            planilha.append([item[chave] for chave, _ in COLUNAS_EXPORTACAO])
+        workbook.save(destino)
+
+    @staticmethod
+    def escrever_pdf(destino, filtros, filtros_texto, tamanho_lote=TAMANHO_LOTE_LEITURA, progresso=None):
+        """
+        Renderiza o relatório em PDF lendo os dados em lotes
+
+        As linhas viram segmentos de LINHAS_POR_SEGMENTO com cabeçalho
+        repetido, desenhados página a página no canvas (showPage) à medida
+        que os lotes são lidos: só o lote corrente fica em memória como
+        flowables; das páginas prontas resta o conteúdo comprimido.
+
+        Args:
+            destino: Caminho ou arquivo binário aberto onde gravar o PDF
+            filtros: Filtros do relatório (ver consulta)
+            filtros_texto: Descrição dos filtros para o cabeçalho
+            tamanho_lote: Linhas por consulta ao banco
+            progresso: Callback opcional chamado com o percentual de linhas lidas
+        """
+        # Estilos
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.darkblue
+        )
+
+        stats = RelatorioService.estatisticas(filtros)
+        story = [
+            Paragraph("Relatório de Tarefas", title_style),
+            Spacer(1, 12),
+            Paragraph(f"<b>Filtros aplicados:</b> {filtros_texto}", styles['Normal']),
+            Spacer(1, 12),
+            Paragraph("<b>Resumo:</b>", styles['Heading2']),
+            Paragraph(f"""
+            • Total de registros: {stats['total']}<br/>
+            • Pendentes: {stats['pendentes']}<br/>
+            • Em andamento: {stats['em_andamento']}<br/>
+            • Concluídas: {stats['concluidas']}<br/>
+            • Taxa de conclusão: {stats['taxa_conclusao']:.1f}%
+            """, styles['Normal']),
+            Spacer(1, 20),
+        ]
+
+        def corpo():
+            if stats['total']:
+                yield Paragraph("<b>Detalhamento:</b>", styles['Heading2'])
+                yield Spacer(1, 12)
+                lidas = 0
+                for lote in RelatorioService.lotes(filtros, tamanho_lote):
+                    for posicao in range(0, len(lote), LINHAS_POR_SEGMENTO):
+                        yield _segmento_tabela(lote[posicao:posicao + LINHAS_POR_SEGMENTO])
+                    lidas += len(lote)
+                    if progresso:
+                        progresso(min(99, lidas * 100 // stats['total']))
+            else:
+                yield Paragraph("Nenhum registro encontrado com os filtros aplicados.", styles['Normal'])
+
+            # Rodapé
+            yield Spacer(1, 20)
+            yield Paragraph(f"Relatório gerado em: {datetime.now().strftime('%d/%m/%Y às %H:%M')}", styles['Normal'])
+
+        canvas = Canvas(destino, pagesize=A4, pageCompression=1)
+        _desenhar_paginas(canvas, itertools.chain(story, corpo()))
+        canvas.save()
+
+    @staticmethod
+    def estatisticas(filtros):
+        """
+        Conta os períodos por status com GROUP BY no banco
+
+        Args:
+            filtros: Filtros do relatório (ver consulta)
+
+        Returns:
+            dict: total, pendentes, em_andamento, concluidas e taxa_conclusao
+        """
+        query = db.session.query(Periodo.status, func.count(Periodo.id))\
+            .join(RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id)\
+            .join(Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id)
+        contagem = dict(_aplicar_filtros(query, filtros).group_by(Periodo.status).all())
+
+        total = sum(contagem.values())
+        concluidas = contagem.get('concluida', 0)
+        return {
+            'total': total,
+            'pendentes': contagem.get('pendente', 0),
+            'em_andamento': contagem.get('em_andamento', 0),
+            'concluidas': concluidas,
+            'taxa_conclusao': (concluidas / total * 100) if total > 0 else 0
+        }
+
+
+def formatar_linha(r):
+    """Converte uma linha da consulta no dict usado pela tela e pelo PDF"""
+    # Usar data de retificação se houver, senão usar data de conclusão
+    data_final = r.data_retificacao if r.data_retificacao else r.data_conclusao
+    return {
+        'id': r.id,
+        'empresa_nome': r.empresa_nome,
+        'tarefa_nome': r.tarefa_nome,
+        'tarefa_tipo': r.tarefa_tipo,
+        'periodo': r.periodo_label,
+        'periodo_formatado': r.periodo_label,
+        'status': r.status,
+        'status_texto': STATUS_TEXTO.get(r.status, r.status),
+        'data_conclusao': data_final.strftime('%d/%m/%Y') if data_final else '',
+        'label_data': 'Retificação' if r.data_retificacao else 'Conclusão',
+        'prazo_especifico': r.prazo_especifico.strftime('%d/%m/%Y') if r.prazo_especifico else '',
+        'responsavel_nome': r.responsavel_nome or 'Não atribuído'
+    }
+
+
+def _segmento_tabela(itens):
+    """Tabela de um segmento do PDF com o cabeçalho repetido em quebras de página"""
+    linhas = [CABECALHO_PDF]
+    for item in itens:
+        linhas.append([
+            item['empresa_nome'],
+            item['tarefa_nome'],
+            item['tarefa_tipo'],
+            item['periodo_formatado'],
+            item['status_texto'],
+            item['responsavel_nome'],
+            item['data_conclusao']
+        ])
+    tabela = LongTable(linhas, repeatRows=1)
+    tabela.setStyle(ESTILO_TABELA_PDF)
+    return tabela
+
+
+def _desenhar_paginas(canvas, flowables):
+    """
+    Desenha os flowables em sequência, abrindo páginas com showPage
+
+    Cada flowable entra no frame da página corrente; o que não cabe é
+    dividido (LongTable repete o cabeçalho) ou vai para a página seguinte.
+    """
+    largura, altura = A4
+    esquerda, direita, topo, base = MARGENS_PDF
+
+    def nova_pagina():
+        return Frame(esquerda, base, largura - esquerda - direita, altura - topo - base,
+                     leftPadding=6, rightPadding=6, topPadding=6, bottomPadding=6)
+
+    frame = nova_pagina()
+    pagina_vazia = True
+    for flowable in flowables:
+        pendentes = [flowable]
+        while pendentes:
+            atual = pendentes.pop(0)
+            if frame.add(atual, canvas):
+                pagina_vazia = False
+                continue
+            partes = frame.split(atual, canvas)
+            if partes and frame.add(partes[0], canvas):
+                pagina_vazia = False
+                pendentes[:0] = partes[1:]
+                continue
+            if pagina_vazia:
+                raise LayoutError(f'{atual.__class__.__name__} não cabe em uma página')
+            canvas.showPage()
+            frame = nova_pagina()
+            pagina_vazia = True
+            pendentes.insert(0, atual)
+
+
+def codificar_cursor(empresa_nome, inicio, periodo_id):
+    """Gera o token opaco (base64 urlsafe) da chave de ordenação de uma linha"""
+    chave = json.dumps([empresa_nome, inicio.isoformat(), periodo_id], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(chave.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    """
+    Lê um token gerado por codificar_cursor
+
+    Returns:
+        tuple: (empresa_nome, inicio, periodo_id)
+
+    Raises:
+        CursorInvalido: Se o token não tiver o formato esperado
+    """
+    try:
+        bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        nome, inicio, periodo_id = json.loads(bruto.decode('utf-8'))
+        if not isinstance(nome, str) or not isinstance(periodo_id, int):
+            raise ValueError(token)
+        return nome, date.fromisoformat(inicio), periodo_id
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise CursorInvalido('Cursor inválido') from e
+
+
+def _apos(query, chave):
+    """Restringe a consulta ordenada às linhas posteriores à chave (empresa_nome, inicio, id)"""
+    if chave is None:
+        return query
+    nome, inicio, periodo_id = chave
+    return query.filter(or_(
+        Empresa.nome > nome,
+        and_(Empresa.nome == nome, or_(
+            Periodo.inicio < inicio,
+            and_(Periodo.inicio == inicio, Periodo.id > periodo_id)
+        ))
+    ))
+
+
+def _aplicar_filtros(query, filtros):
+    """Aplica os filtros do relatório a uma consulta que já junta Periodo, RelacionamentoTarefa e Tarefa"""
+    if filtros.get('setor_id'):
+        query = query.filter(Tarefa.setor_id == filtros['setor_id'])
+    if filtros.get('empresa_id'):
+        query = query.filter(RelacionamentoTarefa.empresa_id == filtros['empresa_id'])
+    if filtros.get('funcionario_id'):
+        query = query.filter(RelacionamentoTarefa.responsavel_id == filtros['funcionario_id'])
+    if filtros.get('tarefa_id'):
+        query = query.filter(RelacionamentoTarefa.tarefa_id == filtros['tarefa_id'])
+    if filtros.get('status', 'todos') != 'todos':
+        query = query.filter(Periodo.status == filtros['status'])
+    if filtros.get('data_inicio') and filtros.get('data_fim'):
+        query = query.filter(Periodo.inicio.between(filtros['data_inicio'], filtros['data_fim']))
+    return query
@@ -0,0 +1,413 @@
+"""
+Serviço de Resumo de Status
+Mantém os contadores de status por (período, empresa, setor, responsável)
+usados pelos cards e pela tabela por empresa do painel do gerente
+"""
+
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import case, delete, func, insert, literal, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.db import db
+from app.models import Empresa, Tarefa, Usuario, RelacionamentoTarefa, Periodo, ResumoStatusPeriodo
+from app.services.cache_service import CacheService, tag_periodos, tag_tabela
+from app.utils import task_visibility_filter
+
+
+# IDs por consulta (limita o tamanho das cláusulas IN)
+TAMANHO_LOTE_CONSULTA = 1000
+
+# Coluna do contador de cada status; os demais contam como "fazendo"
+COLUNA_POR_STATUS = {
+    'pendente': 'pendentes',
+    'concluida': 'concluidas',
+    'retificada': 'retificadas',
+}
+CONTADORES = ('pendentes', 'fazendo', 'concluidas', 'retificadas')
+# Colunas de uq_resumo_status_chave
+CHAVE_RESUMO = ('periodo_label', 'empresa_id', 'setor_id', 'responsavel_id')
+
+
+def coluna_status(status):
+    """Retorna o contador correspondente ao status de um período"""
+    return COLUNA_POR_STATUS.get(status or 'pendente', 'fazendo')
+
+
+class ResumoService:
+    """Serviço para manutenção e consulta da tabela resumo_status_periodos"""
+
+    @staticmethod
+    def registrar_periodos(periodos):
+        """
+        Soma novos períodos aos contadores (na transação corrente)
+
+        Args:
+            periodos: Iterável de dicts com relacionamento_tarefa_id,
+                periodo_label e status
+        """
+        periodos = list(periodos)
+        if not periodos:
+            return
+        chaves = _chaves_relacionamentos({p['relacionamento_tarefa_id'] for p in periodos})
+
+        deltas = {}
+        for periodo in periodos:
+            chave = chaves.get(periodo['relacionamento_tarefa_id'])
+            if chave is None:
+                continue
+            contadores = deltas.setdefault((periodo['periodo_label'],) + chave, {})
+            coluna = coluna_status(periodo.get('status'))
+            contadores[coluna] = contadores.get(coluna, 0) + 1
+        _aplicar_deltas(deltas)
+
+    @staticmethod
+    def mudar_status(periodo, status_anterior):
+        """
+        Move um período entre contadores após mudança de status (na transação corrente)
+
+        Args:
+            periodo: Periodo já com o novo status
+            status_anterior: Status antes da alteração
+        """
+        anterior = coluna_status(status_anterior)
+        novo = coluna_status(periodo.status)
+        if anterior == novo:
+            return
+        chave = _chaves_relacionamentos({periodo.relacionamento_tarefa_id}).get(periodo.relacionamento_tarefa_id)
+        if chave is None:
+            return
+        _aplicar_deltas({(periodo.periodo_label,) + chave: {anterior: -1, novo: 1}})
+
+    @staticmethod
+    def reconstruir(periodo_labels=None, empresa_ids=None, commit=True):
+        """
+        Recalcula os contadores a partir dos períodos
+
+        Usado pelo comando `flask resumo reconstruir` e após alterações em
+        relacionamentos (responsável, status, remoção) que mudam a chave de
+        períodos já contados.
+
+        Args:
+            periodo_labels: Restringe aos labels informados (None = todos)
+            empresa_ids: Restringe às empresas informadas (None = todas)
+            commit: Se True, confirma a transação ao final
+
+        Returns:
+            int: Quantidade de linhas de resumo gravadas
+        """
+        db.session.flush()
+        if empresa_ids is not None:
+            empresa_ids = list(dict.fromkeys(empresa_ids))
+            if not empresa_ids:
+                return 0
+            lotes = [empresa_ids[i:i + TAMANHO_LOTE_CONSULTA] for i in range(0, len(empresa_ids), TAMANHO_LOTE_CONSULTA)]
+        else:
+            lotes = [None]
+
+        status = func.coalesce(Periodo.status, 'pendente')
+        setor = func.coalesce(Tarefa.setor_id, 0)
+        responsavel = func.coalesce(RelacionamentoTarefa.responsavel_id, 0)
+
+        gravadas = 0
+        for lote in lotes:
+            limpar = delete(ResumoStatusPeriodo)
+            consulta = select(
+                Periodo.periodo_label,
+                RelacionamentoTarefa.empresa_id,
+                setor,
+                responsavel,
+                func.sum(case((status == 'pendente', 1), else_=0)),
+                func.sum(case((status.in_(['pendente', 'concluida', 'retificada']), 0), else_=1)),
+                func.sum(case((status == 'concluida', 1), else_=0)),
+                func.sum(case((status == 'retificada', 1), else_=0)),
+                literal(datetime.now(), ResumoStatusPeriodo.atualizado_em.type),
+            ).join(
+                RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id
+            ).join(
+                Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
+            ).where(
+                RelacionamentoTarefa.status == 'ativa',
+                Tarefa.tipo != 'Anual'
+            ).group_by(
+                Periodo.periodo_label, RelacionamentoTarefa.empresa_id, setor, responsavel
+            )
+            if periodo_labels is not None:
+                limpar = limpar.where(ResumoStatusPeriodo.periodo_label.in_(periodo_labels))
+                consulta = consulta.where(Periodo.periodo_label.in_(periodo_labels))
+            if lote is not None:
+                limpar = limpar.where(ResumoStatusPeriodo.empresa_id.in_(lote))
+                consulta = consulta.where(RelacionamentoTarefa.empresa_id.in_(lote))
+
+            db.session.execute(limpar.execution_options(synchronize_session=False))
+            resultado = db.session.execute(
+                insert(ResumoStatusPeriodo.__table__).from_select(
+                    ['periodo_label', 'empresa_id', 'setor_id', 'responsavel_id',
+                     'pendentes', 'fazendo', 'concluidas', 'retificadas', 'atualizado_em'],
+                    consulta
+                )
+            )
+            gravadas += max(resultado.rowcount or 0, 0)
+
+        # Contadores refeitos: ETags dos resumos desses períodos deixam de valer
+        if periodo_labels is not None:
+            CacheService.invalidar_no_commit(*(tag_periodos(label) for label in periodo_labels))
+        else:
+            CacheService.invalidar_no_commit(tag_tabela(Periodo.__tablename__))
+
+        if commit:
+            db.session.commit()
+        return gravadas
+
+    @staticmethod
+    def resumo(periodo_label, setor_id=None, empresa_ids=None, responsavel_id=None):
+        """
+        Cards e tabela por empresa do painel, em uma consulta agregada
+
+        Args:
+            periodo_label: Período filtrado (YYYY-MM)
+            setor_id: Restringe ao setor (gerente)
+            empresa_ids: Restringe às empresas informadas
+            responsavel_id: Restringe ao colaborador informado
+
+        Returns:
+            dict: resumo, empresas_resumo, taxa_conclusao e total
+        """
+        concluidas = func.sum(ResumoStatusPeriodo.concluidas + ResumoStatusPeriodo.retificadas)
+        query = db.session.query(
+            Empresa.id,
+            Empresa.nome,
+            func.sum(ResumoStatusPeriodo.pendentes),
+            func.sum(ResumoStatusPeriodo.fazendo),
+            concluidas
+        ).join(
+            Empresa, ResumoStatusPeriodo.empresa_id == Empresa.id
+        ).filter(
+            task_visibility_filter(periodo_label, ResumoStatusPeriodo.periodo_label),
+            Empresa.ativo == True
+        )
+        if setor_id:
+            query = query.filter(ResumoStatusPeriodo.setor_id == setor_id)
+        if empresa_ids:
+            query = query.filter(ResumoStatusPeriodo.empresa_id.in_(empresa_ids))
+        if responsavel_id:
+            query = query.filter(ResumoStatusPeriodo.responsavel_id == responsavel_id)
+
+        linhas = query.group_by(Empresa.id, Empresa.nome).order_by(Empresa.nome).all()
+        return _montar_resumo(
+            (nome, pendentes or 0, fazendo or 0, concluidas or 0)
+            for _, nome, pendentes, fazendo, concluidas in linhas
+        )
+
+    @staticmethod
+    def resumo_de_tarefas(tarefas):
+        """
+        Mesmo formato de `resumo`, calculado a partir da lista detalhada
+
+        Usado quando o filtro (ex.: tarefa específica) não existe no resumo.
+
+        Args:
+            tarefas: Linhas retornadas por listar_tarefas
+
+        Returns:
+            dict: resumo, empresas_resumo, taxa_conclusao e total
+        """
+        por_empresa = {}
+        for tarefa in tarefas:
+            contadores = por_empresa.setdefault(tarefa.empresa_id, {
+                'nome': tarefa.empresa_nome, 'pendentes': 0, 'fazendo': 0, 'concluidas': 0
+            })
+            coluna = coluna_status(tarefa.status)
+            contadores['concluidas' if coluna == 'retificadas' else coluna] += 1
+        return _montar_resumo(
+            (c['nome'], c['pendentes'], c['fazendo'], c['concluidas'])
+            for c in sorted(por_empresa.values(), key=lambda c: c['nome'])
+        )
+
+    @staticmethod
+    def listar_tarefas(periodo_label, setor_id=None, empresa_ids=None, responsavel_id=None, tarefa_id=None):
+        """
+        Lista detalhada (responsável, empresa, tarefa, status) do painel
+
+        Seleciona apenas as colunas exibidas, já filtradas por label no banco.
+
+        Returns:
+            list: Linhas com usuario_nome, empresa_id, empresa_nome, tarefa_nome,
+                status, periodo_label e contador_retificacoes
+        """
+        query = db.session.query(
+            func.coalesce(Usuario.nome, 'Não atribuído').label('usuario_nome'),
+            Empresa.id.label('empresa_id'),
+            Empresa.nome.label('empresa_nome'),
+            Tarefa.nome.label('tarefa_nome'),
+            func.coalesce(Periodo.status, 'pendente').label('status'),
+            Periodo.periodo_label,
+            func.coalesce(Periodo.contador_retificacoes, 0).label('contador_retificacoes')
+        ).join(
+            RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id
+        ).join(
+            Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
+        ).join(
+            Empresa, RelacionamentoTarefa.empresa_id == Empresa.id
+        ).outerjoin(
+            Usuario, RelacionamentoTarefa.responsavel_id == Usuario.id
+        ).filter(
+            task_visibility_filter(periodo_label, Periodo.periodo_label, Tarefa.tipo),
+            Empresa.ativo == True,
+            RelacionamentoTarefa.status == 'ativa'
+        )
+        if setor_id:
+            query = query.filter(Tarefa.setor_id == setor_id)
+        if empresa_ids:
+            query = query.filter(Empresa.id.in_(empresa_ids))
+        if responsavel_id:
+            query = query.filter(RelacionamentoTarefa.responsavel_id == responsavel_id)
+        if tarefa_id:
+            query = query.filter(Tarefa.id == tarefa_id)
+        return query.order_by(Empresa.nome, Tarefa.nome).all()
+
+
+def _chaves_relacionamentos(relacionamento_ids):
+    """Mapeia relacionamento -> (empresa_id, setor_id, responsavel_id) dos que entram no resumo"""
+    ids = list(relacionamento_ids)
+    chaves = {}
+    for posicao in range(0, len(ids), TAMANHO_LOTE_CONSULTA):
+        linhas = db.session.query(
+            RelacionamentoTarefa.id,
+            RelacionamentoTarefa.empresa_id,
+            Tarefa.setor_id,
+            RelacionamentoTarefa.responsavel_id
+        ).join(
+            Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
+        ).filter(
+            RelacionamentoTarefa.id.in_(ids[posicao:posicao + TAMANHO_LOTE_CONSULTA]),
+            RelacionamentoTarefa.status == 'ativa',
+            Tarefa.tipo != 'Anual'
+        )
+        for rel_id, empresa_id, setor_id, responsavel_id in linhas:
+            chaves[rel_id] = (empresa_id, setor_id or 0, responsavel_id or 0)
+    return chaves
+
+
+def _aplicar_deltas(deltas):
+    """
+    Aplica incrementos aos contadores com upsert do dialeto (uma instrução
+    executemany): a chave nova é inserida e a existente recebe col = col + n
+    atomicamente, sem corrida entre requisições simultâneas
+
+    Contador que fica negativo indica resumo fora de sincronia com os
+    períodos: é registrado no log e a (período, empresa) é reconstruída.
+    """
+    if not deltas:
+        return
+    agora = datetime.now()
+    linhas = []
+    for (periodo_label, empresa_id, setor_id, responsavel_id), contadores in deltas.items():
+        linha = {
+            'periodo_label': periodo_label,
+            'empresa_id': empresa_id,
+            # 0 = sem setor/não atribuído (NULL não participa da chave única)
+            'setor_id': setor_id or 0,
+            'responsavel_id': responsavel_id or 0,
+            'atualizado_em': agora,
+        }
+        linha.update({coluna: contadores.get(coluna, 0) for coluna in CONTADORES})
+        linhas.append(linha)
+
+    tabela = ResumoStatusPeriodo.__table__
+    instrucao = _upsert_contadores(tabela, db.session.get_bind().dialect.name)
+    if instrucao is not None:
+        db.session.execute(instrucao, linhas)
+    else:
+        _upsert_por_linha(tabela, linhas)
+
+    if any(linha[coluna] < 0 for linha in linhas for coluna in CONTADORES):
+        _corrigir_negativos(tabela, linhas)
+
+
+def _upsert_contadores(tabela, dialeto):
+    """INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE (SQLite, PostgreSQL)"""
+    if dialeto in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as insert_dialeto
+        instrucao = insert_dialeto(tabela)
+        return instrucao.on_duplicate_key_update(
+            atualizado_em=instrucao.inserted.atualizado_em,
+            **{coluna: tabela.c[coluna] + instrucao.inserted[coluna] for coluna in CONTADORES}
+        )
+    if dialeto in ('sqlite', 'postgresql'):
+        if dialeto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+        else:
+            from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+        instrucao = insert_dialeto(tabela)
+        return instrucao.on_conflict_do_update(
+            index_elements=list(CHAVE_RESUMO),
+            set_=dict(
+                atualizado_em=instrucao.excluded.atualizado_em,
+                **{coluna: tabela.c[coluna] + instrucao.excluded[coluna] for coluna in CONTADORES}
+            )
+        )
+    return None
+
+
+def _upsert_por_linha(tabela, linhas):
+    """Reserva para outros dialetos: UPDATE e, se a chave não existir, INSERT em savepoint"""
+    for linha in linhas:
+        somar = update(tabela).where(
+            *(tabela.c[coluna] == linha[coluna] for coluna in CHAVE_RESUMO)
+        ).values(
+            atualizado_em=linha['atualizado_em'],
+            **{coluna: tabela.c[coluna] + linha[coluna] for coluna in CONTADORES}
+        )
+        if db.session.execute(somar).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(tabela), [linha])
+        except IntegrityError:
+            # Outra transação inseriu a chave entre o UPDATE e o INSERT
+            db.session.execute(somar)
+
+
+def _corrigir_negativos(tabela, linhas):
+    """Reconstrói as (período, empresa) cujos contadores ficaram negativos"""
+    alvos = {(linha['periodo_label'], linha['empresa_id']) for linha in linhas}
+    negativos = db.session.execute(
+        select(tabela.c.periodo_label, tabela.c.empresa_id).where(
+            tuple_(tabela.c.periodo_label, tabela.c.empresa_id).in_(alvos),
+            or_(*(tabela.c[coluna] < 0 for coluna in CONTADORES))
+        ).distinct()
+    ).all()
+    for periodo_label, empresa_id in negativos:
+        current_app.logger.warning(
+            f"Resumo de status fora de sincronia (período {periodo_label}, empresa {empresa_id}): reconstruindo"
+        )
+        ResumoService.reconstruir(periodo_labels=[periodo_label], empresa_ids=[empresa_id], commit=False)
+
+
+def _montar_resumo(linhas):
+    """Monta cards, tabela por empresa e taxa de conclusão a partir de (nome, pendentes, fazendo, concluidas)"""
+    resumo = {'pendentes': 0, 'fazendo': 0, 'concluidas': 0}
+    empresas_resumo = []
+    for nome, pendentes, fazendo, concluidas in linhas:
+        total = pendentes + fazendo + concluidas
+        if not total:
+            continue
+        resumo['pendentes'] += pendentes
+        resumo['fazendo'] += fazendo
+        resumo['concluidas'] += concluidas
+        empresas_resumo.append({
+            'nome': nome,
+            'pendentes': pendentes,
+            'fazendo': fazendo,
+            'concluidas': concluidas,
+            'taxa_conclusao': concluidas / total * 100
+        })
+    total = resumo['pendentes'] + resumo['fazendo'] + resumo['concluidas']
+    return {
+        'resumo': resumo,
+        'empresas_resumo': empresas_resumo,
+        'taxa_conclusao': (resumo['concluidas'] / total * 100) if total > 0 else 0,
+        'total': total
+    }
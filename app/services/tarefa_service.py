@@ -5,6 +5,7 @@ Lógica de negócio para gerenciamento de tarefas
 
 from app.db import db
 from app.models import Tarefa, RelacionamentoTarefa, Periodo, Empresa, Usuario
+from app.services.resumo_service import ResumoService
 from app.utils import gerar_periodo_label, calcular_datas_periodo
 from sqlalchemy.orm import joinedload
 from datetime import date
@@ -112,8 +113,10 @@ class TarefaService:
         if not periodo:
             raise ValueError("Período não encontrado")
         
+        status_anterior = periodo.status
         periodo.status = 'concluida'
         periodo.data_conclusao = date.today()
+        ResumoService.mudar_status(periodo, status_anterior)
         
         db.session.commit()
         return True
@@ -142,6 +145,7 @@ class TarefaService:
         if not periodo:
             raise ValueError("Período não encontrado")
         
+        status_anterior = periodo.status
         periodo.status = 'retificada'
         periodo.data_retificacao = date.today()
         periodo.contador_retificacoes = (periodo.contador_retificacoes or 0) + 1
@@ -154,6 +158,7 @@ class TarefaService:
             criado_em=datetime.now()
         )
         db.session.add(retificacao)
+        ResumoService.mudar_status(periodo, status_anterior)
         db.session.commit()
         
         return True
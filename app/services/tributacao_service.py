@@ -0,0 +1,637 @@
+"""
+Serviço de Mudança de Tributação
+Planeja e aplica, em lote, a troca de tributação de empresas
+"""
+
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, insert, update, or_
+
+from app.db import db
+from app.models import (
+    Empresa, Tributacao, Tarefa, TarefaTributacao, RelacionamentoTarefa,
+    Periodo, VinculacaoEmpresaTributacao, MudancaTributacaoPendente,
+    MigracaoTributacaoLote
+)
+from app.services.resumo_service import ResumoService
+from app.utils import calcular_datas_periodo
+
+
+# Supervisor: preserva tarefas comuns e tarefas com período atual em aberto,
+# desativando apenas as tarefas da tributação anterior
+MODO_PRESERVAR = 'preservar'
+# Admin: desativa todos os relacionamentos atuais da empresa
+MODO_SUBSTITUIR = 'substituir'
+
+MODOS = (MODO_PRESERVAR, MODO_SUBSTITUIR)
+
+STATUS_PERIODO_FECHADO = ('concluida', 'cancelada')
+
+# Empresas por transação na migração em massa
+TAMANHO_LOTE_MIGRACAO = 100
+# Migração em andamento sem lote confirmado por mais que isso é considerada abandonada
+TIMEOUT_MIGRACAO_SEGUNDOS = 1800
+
+
+class MigracaoEmAndamento(Exception):
+    """A migração já está sendo executada por outro processo"""
+
+
+def normalizar_tributacao_id(valor):
+    """
+    Converte o ID de tributação recebido (formulário/JSON envia texto) para int
+
+    Returns:
+        int ou None: None quando vazio (remove a tributação)
+
+    Raises:
+        ValueError: Se o valor não for um ID válido
+    """
+    if valor is None or valor == '':
+        return None
+    try:
+        tributacao_id = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError("Tributação inválida") from None
+    if tributacao_id < 0:
+        raise ValueError("Tributação inválida")
+    return tributacao_id or None
+
+
+class TributacaoService:
+    """Serviço para mudança de tributação de empresas"""
+
+    @staticmethod
+    def planejar_mudancas(empresa_ids, tributacao_nova_id, modo=MODO_PRESERVAR, hoje=None):
+        """
+        Calcula, sem gravar nada, o plano de mudança de tributação
+
+        Carrega empresas, relacionamentos, tarefas, vínculos tarefa-tributação
+        e os períodos atuais com uma consulta por tabela (para todas as
+        empresas de uma vez) e monta o plano em memória.
+
+        Args:
+            empresa_ids: IDs das empresas
+            tributacao_nova_id: ID da nova tributação (None remove a tributação)
+            modo: MODO_PRESERVAR (supervisor) ou MODO_SUBSTITUIR (admin)
+            hoje: Data de referência (padrão: hoje)
+
+        Returns:
+            list[dict]: Um plano por empresa encontrada (ordem de empresa_ids)
+
+        Raises:
+            ValueError: Se o modo ou a tributação forem inválidos
+        """
+        if modo not in MODOS:
+            raise ValueError(f"Modo de mudança inválido: {modo}")
+
+        tributacao_nova_id = normalizar_tributacao_id(tributacao_nova_id)
+        hoje = hoje or date.today()
+        empresa_ids = list(dict.fromkeys(int(eid) for eid in empresa_ids))
+        if not empresa_ids:
+            return []
+
+        # 1. Empresas
+        empresas = {
+            row.id: row for row in db.session.query(
+                Empresa.id, Empresa.nome, Empresa.tributacao_id
+            ).filter(Empresa.id.in_(empresa_ids)).all()
+        }
+
+        # 2. Relacionamentos (todas as versões) das empresas
+        relacionamentos = db.session.query(
+            RelacionamentoTarefa.id,
+            RelacionamentoTarefa.empresa_id,
+            RelacionamentoTarefa.tarefa_id,
+            RelacionamentoTarefa.status,
+            RelacionamentoTarefa.versao_atual,
+            RelacionamentoTarefa.criado_em
+        ).filter(RelacionamentoTarefa.empresa_id.in_(list(empresas))).all()
+        tarefa_ids_rel = {rel.tarefa_id for rel in relacionamentos}
+
+        # 3. Tarefas dos relacionamentos + tarefas diretas da nova tributação
+        filtro_tarefas = [Tarefa.id.in_(tarefa_ids_rel)] if tarefa_ids_rel else []
+        if tributacao_nova_id:
+            filtro_tarefas.append(Tarefa.tributacao_id == tributacao_nova_id)
+        tarefas = {}
+        if filtro_tarefas:
+            tarefas = {
+                row.id: row for row in db.session.query(
+                    Tarefa.id, Tarefa.tipo, Tarefa.tributacao_id, Tarefa.tarefa_comum
+                ).filter(or_(*filtro_tarefas)).all()
+            }
+
+        # 4. Vínculos tarefa-tributação relevantes
+        filtro_tt = [TarefaTributacao.tarefa_id.in_(tarefa_ids_rel)] if tarefa_ids_rel else []
+        if tributacao_nova_id:
+            filtro_tt.append(TarefaTributacao.tributacao_id == tributacao_nova_id)
+        vinculos_tt = []
+        if filtro_tt:
+            vinculos_tt = db.session.query(
+                TarefaTributacao.tarefa_id,
+                TarefaTributacao.tributacao_id,
+                TarefaTributacao.ativo
+            ).filter(or_(*filtro_tt)).order_by(TarefaTributacao.id).all()
+
+        tarefas_com_tributacao = set()
+        tributacoes_por_tarefa = {}
+        tarefas_nova_tributacao = []
+        for tt in vinculos_tt:
+            tarefas_com_tributacao.add(tt.tarefa_id)
+            tributacoes_por_tarefa.setdefault(tt.tarefa_id, set()).add(tt.tributacao_id)
+            if tributacao_nova_id and tt.tributacao_id == tributacao_nova_id and tt.ativo:
+                tarefas_nova_tributacao.append(tt.tarefa_id)
+        if tributacao_nova_id:
+            tarefas_nova_tributacao.extend(
+                tarefa.id for tarefa in tarefas.values() if tarefa.tributacao_id == tributacao_nova_id
+            )
+        tarefas_nova_tributacao = list(dict.fromkeys(tarefas_nova_tributacao))
+
+        # 5. Períodos atuais (label calculado por tipo da tarefa)
+        ativos = [rel for rel in relacionamentos if rel.versao_atual and rel.status == 'ativa']
+        periodos_abertos = set()
+        if modo == MODO_PRESERVAR and ativos:
+            labels = {
+                calcular_datas_periodo(hoje.year, hoje.month, tarefas[rel.tarefa_id].tipo)[2]
+                for rel in ativos if rel.tarefa_id in tarefas
+            }
+            if labels:
+                periodos = db.session.query(
+                    Periodo.relacionamento_tarefa_id,
+                    Periodo.periodo_label,
+                    Periodo.status
+                ).filter(
+                    Periodo.relacionamento_tarefa_id.in_([rel.id for rel in ativos]),
+                    Periodo.periodo_label.in_(labels)
+                ).all()
+                periodos_abertos = {
+                    (p.relacionamento_tarefa_id, p.periodo_label)
+                    for p in periodos if p.status not in STATUS_PERIODO_FECHADO
+                }
+
+        rels_por_empresa = {}
+        for rel in relacionamentos:
+            rels_por_empresa.setdefault(rel.empresa_id, []).append(rel)
+
+        planos = []
+        for empresa_id in empresa_ids:
+            empresa = empresas.get(empresa_id)
+            if not empresa:
+                continue
+            planos.append(_planejar_empresa(
+                empresa, rels_por_empresa.get(empresa_id, []), tributacao_nova_id, modo, hoje,
+                tarefas, tarefas_com_tributacao, tributacoes_por_tarefa,
+                tarefas_nova_tributacao, periodos_abertos
+            ))
+        return planos
+
+    @staticmethod
+    def planejar_mudanca(empresa_id, tributacao_nova_id, modo=MODO_PRESERVAR, hoje=None):
+        """
+        Calcula o plano de mudança de uma única empresa (dry-run)
+
+        Returns:
+            dict: Plano da empresa ou None se não encontrada
+        """
+        planos = TributacaoService.planejar_mudancas([empresa_id], tributacao_nova_id, modo, hoje)
+        return planos[0] if planos else None
+
+    @staticmethod
+    def aplicar_mudancas(planos, usuario_id, motivo=None, hoje=None, commit=True):
+        """
+        Aplica planos de mudança com UPDATE/INSERT em lote
+
+        Args:
+            planos: Planos retornados por planejar_mudancas
+            usuario_id: ID do usuário responsável pela mudança
+            motivo: Motivo registrado na mudança pendente
+            hoje: Data de referência (padrão: hoje)
+            commit: Se True, confirma a transação ao final
+
+        Returns:
+            dict: Totais aplicados e IDs das mudanças pendentes por empresa
+        """
+        hoje = hoje or date.today()
+        agora = datetime.now()
+        planos = [plano for plano in planos if plano]
+        if not planos:
+            return _totais_vazios()
+
+        nomes = dict(db.session.query(Tributacao.id, Tributacao.nome).filter(
+            Tributacao.id.in_({
+                tid for plano in planos
+                for tid in (plano['tributacao_anterior_id'], plano['tributacao_nova_id']) if tid
+            })
+        ).all())
+
+        # 1. Desativar relacionamentos da tributação anterior
+        desativacoes = []
+        for plano in planos:
+            if plano['modo'] == MODO_SUBSTITUIR:
+                motivo_desativacao = (
+                    f"Mudança de tributação: {nomes.get(plano['tributacao_anterior_id'], 'N/A')}"
+                    f" -> {nomes.get(plano['tributacao_nova_id'], 'N/A')}"
+                )
+            else:
+                motivo_desativacao = "Mudança de tributação: próximos períodos desativados (período atual preservado)"
+            desativacoes.extend({
+                'id': item['relacionamento_id'],
+                'versao_atual': False,
+                'data_fim': hoje,
+                'motivo_desativacao': motivo_desativacao,
+                'atualizado_em': agora,
+            } for item in plano['desativar'])
+        if desativacoes:
+            db.session.execute(update(RelacionamentoTarefa), desativacoes)
+
+        com_nova = [plano for plano in planos if plano['tributacao_nova_id']]
+        vinculacoes = {}
+        mudancas = {}
+        if com_nova:
+            ids_com_nova = [plano['empresa_id'] for plano in com_nova]
+
+            # 2. Encerrar vinculações ativas e criar as novas
+            db.session.execute(
+                update(VinculacaoEmpresaTributacao)
+                .where(
+                    VinculacaoEmpresaTributacao.empresa_id.in_(ids_com_nova),
+                    VinculacaoEmpresaTributacao.ativo == True
+                )
+                .values(ativo=False, data_fim=hoje)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(insert(VinculacaoEmpresaTributacao), [{
+                'empresa_id': plano['empresa_id'],
+                'tributacao_id': plano['tributacao_nova_id'],
+                'data_inicio': hoje,
+                'ativo': True,
+            } for plano in com_nova])
+            vinculacoes = dict(db.session.query(
+                VinculacaoEmpresaTributacao.empresa_id,
+                VinculacaoEmpresaTributacao.id
+            ).filter(
+                VinculacaoEmpresaTributacao.empresa_id.in_(ids_com_nova),
+                VinculacaoEmpresaTributacao.ativo == True
+            ).all())
+
+            # 3. Reativar relacionamentos existentes (responsável definido pelo gerente)
+            reativacoes = [{
+                'id': item['relacionamento_id'],
+                'versao_atual': True,
+                'status': 'ativa',
+                'vinculacao_id': vinculacoes.get(plano['empresa_id']),
+                'data_inicio': hoje,
+                'data_fim': None,
+                'motivo_desativacao': None,
+                'responsavel_id': None,
+                'atualizado_em': agora,
+            } for plano in com_nova for item in plano['reativar']]
+            if reativacoes:
+                db.session.execute(update(RelacionamentoTarefa), reativacoes)
+
+            # 4. Criar relacionamentos novos (sem responsável)
+            novos = [{
+                'empresa_id': plano['empresa_id'],
+                'tarefa_id': tarefa_id,
+                'responsavel_id': None,
+                'vinculacao_id': vinculacoes.get(plano['empresa_id']),
+                'status': 'ativa',
+                'data_inicio': hoje,
+                'versao_atual': True,
+                'criado_em': agora,
+            } for plano in com_nova for tarefa_id in plano['criar']]
+            if novos:
+                db.session.execute(insert(RelacionamentoTarefa), novos)
+
+            # 5. Mudanças pendentes para revisão dos gerentes
+            db.session.execute(insert(MudancaTributacaoPendente), [{
+                'empresa_id': plano['empresa_id'],
+                'tributacao_anterior_id': plano['tributacao_anterior_id'],
+                'tributacao_nova_id': plano['tributacao_nova_id'],
+                'data_mudanca': hoje,
+                'motivo': motivo,
+                'status': 'pendente',
+                'criado_por': usuario_id,
+            } for plano in com_nova])
+            mudancas = dict(db.session.query(
+                MudancaTributacaoPendente.empresa_id,
+                db.func.max(MudancaTributacaoPendente.id)
+            ).filter(
+                MudancaTributacaoPendente.empresa_id.in_(ids_com_nova)
+            ).group_by(MudancaTributacaoPendente.empresa_id).all())
+
+        # 6. Atualizar as empresas
+        db.session.execute(update(Empresa), [{
+            'id': plano['empresa_id'],
+            'tributacao_id': plano['tributacao_nova_id'] or None,
+            'atualizado_em': agora,
+        } for plano in planos])
+
+        # 7. Relacionamentos desativados/reativados mudam o resumo do painel
+        ResumoService.reconstruir(empresa_ids=[plano['empresa_id'] for plano in planos], commit=False)
+
+        if commit:
+            db.session.commit()
+        else:
+            db.session.expire_all()
+
+        return {
+            'empresas': len(planos),
+            'desativados': len(desativacoes),
+            'reativados': sum(len(plano['reativar']) for plano in com_nova),
+            'criados': sum(len(plano['criar']) for plano in com_nova),
+            'mudancas': mudancas,
+        }
+
+    @staticmethod
+    def alterar_tributacao(empresa_id, tributacao_nova_id, usuario_id, motivo=None,
+                           modo=MODO_PRESERVAR, dry_run=False, commit=True):
+        """
+        Planeja e (opcionalmente) aplica a mudança de tributação de uma empresa
+
+        Args:
+            empresa_id: ID da empresa
+            tributacao_nova_id: ID da nova tributação
+            usuario_id: ID do usuário responsável
+            motivo: Motivo da mudança
+            modo: MODO_PRESERVAR (supervisor) ou MODO_SUBSTITUIR (admin)
+            dry_run: Se True, apenas retorna o plano
+            commit: Se True, confirma a transação ao final
+
+        Returns:
+            dict: {'plano': ..., 'resultado': ... ou None em dry-run}
+
+        Raises:
+            ValueError: Se a empresa não existir ou já possuir a tributação
+        """
+        tributacao_nova_id = normalizar_tributacao_id(tributacao_nova_id)
+        plano = TributacaoService.planejar_mudanca(empresa_id, tributacao_nova_id, modo)
+        if not plano:
+            raise ValueError("Empresa não encontrada")
+        if plano['tributacao_anterior_id'] == tributacao_nova_id:
+            raise ValueError("A empresa já possui esta tributação")
+
+        if dry_run:
+            return {'plano': plano, 'resultado': None}
+
+        resultado = TributacaoService.aplicar_mudancas([plano], usuario_id, motivo, commit=commit)
+        return {'plano': plano, 'resultado': resultado}
+
+
+    @staticmethod
+    def selecionar_empresas(empresa_ids=None, filtro=None):
+        """
+        Resolve a lista de empresas de uma migração em massa
+
+        Args:
+            empresa_ids: IDs explícitos das empresas
+            filtro: dict opcional com tributacao_id, ativo e/ou codigos
+
+        Returns:
+            list[int]: IDs das empresas, ordenados
+        """
+        query = db.session.query(Empresa.id)
+        if empresa_ids:
+            query = query.filter(Empresa.id.in_([int(eid) for eid in empresa_ids]))
+        filtro = filtro or {}
+        if filtro.get('tributacao_id'):
+            query = query.filter(Empresa.tributacao_id == int(filtro['tributacao_id']))
+        if 'ativo' in filtro and filtro['ativo'] is not None:
+            query = query.filter(Empresa.ativo == bool(filtro['ativo']))
+        if filtro.get('codigos'):
+            query = query.filter(Empresa.codigo.in_(list(filtro['codigos'])))
+        if not empresa_ids and not filtro:
+            raise ValueError("Informe empresa_ids ou um filtro")
+        return [row.id for row in query.order_by(Empresa.id).all()]
+
+    @staticmethod
+    def criar_migracao(empresa_ids, tributacao_nova_id, usuario_id, motivo=None,
+                       modo=MODO_PRESERVAR, tamanho_lote=TAMANHO_LOTE_MIGRACAO):
+        """
+        Registra uma migração em massa (ainda não executada)
+
+        Returns:
+            MigracaoTributacaoLote: Registro criado
+
+        Raises:
+            ValueError: Se a tributação não existir ou não houver empresas
+        """
+        if modo not in MODOS:
+            raise ValueError(f"Modo de mudança inválido: {modo}")
+        tributacao_nova_id = normalizar_tributacao_id(tributacao_nova_id)
+        if not tributacao_nova_id or not db.session.get(Tributacao, tributacao_nova_id):
+            raise ValueError("Tributação não encontrada")
+        if not empresa_ids:
+            raise ValueError("Nenhuma empresa selecionada")
+
+        migracao = MigracaoTributacaoLote(
+            tributacao_nova_id=tributacao_nova_id,
+            modo=modo,
+            motivo=motivo,
+            empresa_ids=list(empresa_ids),
+            tamanho_lote=max(1, int(tamanho_lote or TAMANHO_LOTE_MIGRACAO)),
+            total=len(empresa_ids),
+            processadas=0,
+            migradas=0,
+            ignoradas=0,
+            status='pendente',
+            criado_por=usuario_id
+        )
+        db.session.add(migracao)
+        db.session.commit()
+        return migracao
+
+    @staticmethod
+    def executar_migracao(migracao_id, progresso=None):
+        """
+        Executa (ou retoma) uma migração em massa a partir do último lote confirmado
+
+        Cada lote de empresas é planejado e aplicado em uma transação própria,
+        junto com o avanço do checkpoint; uma falha desfaz apenas o lote
+        corrente e a migração pode ser retomada depois.
+
+        Args:
+            migracao_id: ID da MigracaoTributacaoLote
+            progresso: Callback opcional chamado com o dict de status após cada lote
+
+        Returns:
+            dict: Status final da migração
+
+        Raises:
+            ValueError: Se a migração não existir ou já estiver concluída
+            MigracaoEmAndamento: Se outro processo já a estiver executando
+        """
+        TributacaoService.reservar_migracao(migracao_id)
+        migracao = db.session.get(MigracaoTributacaoLote, migracao_id)
+
+        empresa_ids = list(migracao.empresa_ids or [])
+        tributacao_nova_id = migracao.tributacao_nova_id
+        inicio = time.perf_counter()
+
+        while migracao.processadas < migracao.total:
+            lote = empresa_ids[migracao.processadas:migracao.processadas + migracao.tamanho_lote]
+            try:
+                planos = TributacaoService.planejar_mudancas(lote, tributacao_nova_id, migracao.modo)
+                aplicaveis = [p for p in planos if p['tributacao_anterior_id'] != tributacao_nova_id]
+                if aplicaveis:
+                    TributacaoService.aplicar_mudancas(
+                        aplicaveis, migracao.criado_por, migracao.motivo, commit=False
+                    )
+                migracao.processadas += len(lote)
+                migracao.migradas += len(aplicaveis)
+                migracao.ignoradas += len(lote) - len(aplicaveis)
+                migracao.atualizado_em = datetime.now()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                migracao = db.session.get(MigracaoTributacaoLote, migracao_id)
+                migracao.status = 'falhou'
+                migracao.erro = str(e)
+                db.session.commit()
+                raise
+
+            if progresso:
+                progresso(TributacaoService.status_migracao(migracao, time.perf_counter() - inicio))
+
+        migracao.status = 'concluida'
+        db.session.commit()
+        return TributacaoService.status_migracao(migracao, time.perf_counter() - inicio)
+
+    @staticmethod
+    def reservar_migracao(migracao_id, timeout=TIMEOUT_MIGRACAO_SEGUNDOS):
+        """
+        Marca a migração como em andamento para este processo
+
+        UPDATE condicional: só passa de pendente/falhou (ou de em andamento
+        abandonada, sem lote confirmado há mais de `timeout` segundos), então
+        duas retomadas simultâneas não aplicam os mesmos lotes.
+
+        Raises:
+            ValueError: Se a migração não existir ou já estiver concluída
+            MigracaoEmAndamento: Se outro processo já a estiver executando
+        """
+        agora = datetime.now()
+        resultado = db.session.execute(
+            update(MigracaoTributacaoLote).where(
+                MigracaoTributacaoLote.id == migracao_id,
+                or_(
+                    MigracaoTributacaoLote.status.in_(('pendente', 'falhou')),
+                    and_(
+                        MigracaoTributacaoLote.status == 'em_andamento',
+                        MigracaoTributacaoLote.atualizado_em < agora - timedelta(seconds=timeout)
+                    )
+                )
+            ).values(status='em_andamento', erro=None, atualizado_em=agora)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if resultado.rowcount == 1:
+            return
+
+        migracao = db.session.get(MigracaoTributacaoLote, migracao_id)
+        if not migracao:
+            raise ValueError("Migração não encontrada")
+        if migracao.status == 'concluida':
+            raise ValueError("Migração já concluída")
+        raise MigracaoEmAndamento("Migração já está em andamento")
+
+    @staticmethod
+    def status_migracao(migracao, segundos=None):
+        """Serializa o andamento de uma migração em massa"""
+        status = {
+            'id': migracao.id,
+            'status': migracao.status,
+            'tributacao_nova_id': migracao.tributacao_nova_id,
+            'modo': migracao.modo,
+            'total': migracao.total,
+            'processadas': migracao.processadas,
+            'migradas': migracao.migradas,
+            'ignoradas': migracao.ignoradas,
+            'percentual': round(100.0 * migracao.processadas / migracao.total, 1) if migracao.total else 100.0,
+            'erro': migracao.erro,
+        }
+        if segundos is not None:
+            status['segundos'] = round(segundos, 2)
+        return status
+
+
+def _planejar_empresa(empresa, relacionamentos, tributacao_nova_id, modo, hoje,
+                      tarefas, tarefas_com_tributacao, tributacoes_por_tarefa,
+                      tarefas_nova_tributacao, periodos_abertos):
+    """Monta o plano de uma empresa a partir dos dados pré-carregados"""
+    tributacao_anterior_id = empresa.tributacao_id
+    desativar = []
+    preservados = []
+    comuns = []
+
+    for rel in relacionamentos:
+        if modo == MODO_SUBSTITUIR:
+            if rel.versao_atual:
+                desativar.append(rel)
+            continue
+
+        if not (rel.versao_atual and rel.status == 'ativa'):
+            continue
+        tarefa = tarefas.get(rel.tarefa_id)
+        if not tarefa:
+            continue
+
+        # Tarefa comum (sem tributação específica) não é desativada
+        if tarefa.tarefa_comum or (tarefa.tributacao_id is None and tarefa.id not in tarefas_com_tributacao):
+            comuns.append(rel)
+            continue
+
+        label_atual = calcular_datas_periodo(hoje.year, hoje.month, tarefa.tipo)[2]
+        if (rel.id, label_atual) in periodos_abertos:
+            preservados.append(rel)
+            continue
+
+        if tributacao_anterior_id and (
+            tributacao_anterior_id in tributacoes_por_tarefa.get(tarefa.id, ())
+            or tarefa.tributacao_id == tributacao_anterior_id
+        ):
+            desativar.append(rel)
+
+    reativar = []
+    criar = []
+    if tributacao_nova_id:
+        desativados = {rel.id for rel in desativar}
+        ativos_por_tarefa = set()
+        inativos_por_tarefa = {}
+        for rel in relacionamentos:
+            if rel.versao_atual and rel.status == 'ativa' and rel.id not in desativados:
+                ativos_por_tarefa.add(rel.tarefa_id)
+            else:
+                inativos_por_tarefa.setdefault(rel.tarefa_id, []).append(rel)
+
+        for tarefa_id in tarefas_nova_tributacao:
+            if tarefa_id in ativos_por_tarefa:
+                continue
+            candidatos = inativos_por_tarefa.get(tarefa_id)
+            if candidatos:
+                # Relacionamento desativado mais recente é reaproveitado
+                candidatos.sort(key=lambda rel: (rel.criado_em or datetime.min, rel.id), reverse=True)
+                reativar.append(candidatos[0])
+            else:
+                criar.append(tarefa_id)
+
+    def _itens(rels):
+        return [{'relacionamento_id': rel.id, 'tarefa_id': rel.tarefa_id} for rel in rels]
+
+    return {
+        'empresa_id': empresa.id,
+        'empresa_nome': empresa.nome,
+        'tributacao_anterior_id': tributacao_anterior_id,
+        'tributacao_nova_id': tributacao_nova_id,
+        'modo': modo,
+        'desativar': _itens(desativar),
+        'reativar': _itens(reativar),
+        'criar': criar,
+        'preservados': _itens(preservados),
+        'comuns': _itens(comuns),
+    }
+
+
+def _totais_vazios():
+    return {'empresas': 0, 'desativados': 0, 'reativados': 0, 'criados': 0, 'mudancas': {}}
@@ -0,0 +1,230 @@
+"""
+Serviço de Vinculação em Massa
+Criação e remoção de relacionamentos empresa x tarefa por operações de conjunto
+"""
+
+from datetime import datetime
+
+from sqlalchemy import insert, delete, select
+
+from app.db import db
+from app.models import Empresa, Usuario, RelacionamentoTarefa, Periodo, Retificacao
+from app.services.resumo_service import ResumoService
+
+
+# Linhas por INSERT multi-row
+TAMANHO_LOTE_PADRAO = 1000
+# IDs de empresa por consulta (limita o tamanho das cláusulas IN)
+TAMANHO_LOTE_CONSULTA = 1000
+
+
+class VinculoService:
+    """Serviço para vinculação de tarefas a empresas em lote"""
+
+    @staticmethod
+    def pares_existentes(empresa_ids, tarefa_ids, apenas_ativos=False, criterios=None):
+        """
+        Busca os relacionamentos já existentes para o produto empresas x tarefas
+
+        Args:
+            empresa_ids: IDs das empresas candidatas
+            tarefa_ids: IDs das tarefas candidatas
+            apenas_ativos: Se True, considera só versão atual com status 'ativa'
+            criterios: Filtros SQLAlchemy adicionais sobre RelacionamentoTarefa
+
+        Returns:
+            dict: (empresa_id, tarefa_id) -> (relacionamento_id, responsavel_id)
+        """
+        empresa_ids = list(dict.fromkeys(empresa_ids))
+        tarefa_ids = list(dict.fromkeys(tarefa_ids))
+        if not empresa_ids or not tarefa_ids:
+            return {}
+
+        existentes = {}
+        for posicao in range(0, len(empresa_ids), TAMANHO_LOTE_CONSULTA):
+            query = db.session.query(
+                RelacionamentoTarefa.empresa_id,
+                RelacionamentoTarefa.tarefa_id,
+                RelacionamentoTarefa.id,
+                RelacionamentoTarefa.responsavel_id
+            ).filter(
+                RelacionamentoTarefa.empresa_id.in_(empresa_ids[posicao:posicao + TAMANHO_LOTE_CONSULTA]),
+                RelacionamentoTarefa.tarefa_id.in_(tarefa_ids)
+            )
+            if apenas_ativos:
+                query = query.filter(
+                    RelacionamentoTarefa.versao_atual == True,
+                    RelacionamentoTarefa.status == 'ativa'
+                )
+            for criterio in criterios or ():
+                query = query.filter(criterio)
+            for empresa_id, tarefa_id, rel_id, responsavel_id in query.order_by(RelacionamentoTarefa.id):
+                existentes.setdefault((empresa_id, tarefa_id), (rel_id, responsavel_id))
+        return existentes
+
+    @staticmethod
+    def vincular(empresa_ids, tarefa_ids, valores=None, apenas_ativos=False, criterios=None,
+                 tamanho_lote=TAMANHO_LOTE_PADRAO, commit=True):
+        """
+        Cria os relacionamentos faltantes entre empresas e tarefas
+
+        Busca os pares existentes em uma consulta, calcula os faltantes por
+        diferença de conjuntos e insere em INSERTs multi-row.
+
+        Args:
+            empresa_ids: IDs das empresas
+            tarefa_ids: IDs das tarefas
+            valores: Colunas dos novos relacionamentos (responsavel_id, dia_vencimento, ...)
+            apenas_ativos: Passado para pares_existentes
+            criterios: Passado para pares_existentes
+            tamanho_lote: Linhas por INSERT
+            commit: Se True, confirma a transação ao final
+
+        Returns:
+            dict: criados (lista de pares) e existentes (dict de pares_existentes)
+        """
+        empresa_ids = list(dict.fromkeys(int(eid) for eid in empresa_ids))
+        tarefa_ids = list(dict.fromkeys(int(tid) for tid in tarefa_ids))
+        existentes = VinculoService.pares_existentes(empresa_ids, tarefa_ids, apenas_ativos, criterios)
+
+        faltantes = [
+            (empresa_id, tarefa_id)
+            for empresa_id in empresa_ids
+            for tarefa_id in tarefa_ids
+            if (empresa_id, tarefa_id) not in existentes
+        ]
+
+        base = {'status': 'ativa', 'versao_atual': True, 'criado_em': datetime.now()}
+        base.update(valores or {})
+        linhas = [dict(base, empresa_id=empresa_id, tarefa_id=tarefa_id) for empresa_id, tarefa_id in faltantes]
+
+        tamanho_lote = max(1, int(tamanho_lote or TAMANHO_LOTE_PADRAO))
+        for posicao in range(0, len(linhas), tamanho_lote):
+            db.session.execute(insert(RelacionamentoTarefa), linhas[posicao:posicao + tamanho_lote])
+
+        if commit and linhas:
+            db.session.commit()
+
+        return {'criados': faltantes, 'existentes': existentes}
+
+    @staticmethod
+    def vincular_tarefa(tarefa, empresa_ids, responsavel_id, valores=None, criterios=None, commit=False):
+        """
+        Vincula uma tarefa a várias empresas validando situação e tributação
+
+        Empresas inexistentes/inativas e de tributação incompatível são
+        separadas antes da inserção; vínculos ativos já existentes contam
+        como duplicados.
+
+        Args:
+            tarefa: Tarefa a vincular
+            empresa_ids: IDs das empresas selecionadas
+            responsavel_id: ID do funcionário responsável
+            valores: Colunas adicionais dos novos relacionamentos
+            criterios: Filtros adicionais para a detecção de duplicados
+            commit: Se True, confirma a transação ao final
+
+        Returns:
+            dict: criados (empresa_ids), duplicados (lista de dicts com empresa,
+            responsavel_id e responsavel_nome), invalidas (IDs) e
+            incompativeis (empresas)
+        """
+        ids = []
+        invalidas = []
+        for empresa_id in empresa_ids:
+            try:
+                ids.append(int(empresa_id))
+            except (TypeError, ValueError):
+                invalidas.append(empresa_id)
+        ids = list(dict.fromkeys(ids))
+
+        empresas = {
+            empresa.id: empresa
+            for empresa in db.session.query(
+                Empresa.id, Empresa.nome, Empresa.ativo, Empresa.tributacao_id
+            ).filter(Empresa.id.in_(ids))
+        } if ids else {}
+
+        elegiveis = []
+        incompativeis = []
+        for empresa_id in ids:
+            empresa = empresas.get(empresa_id)
+            if not empresa or not empresa.ativo:
+                invalidas.append(empresa_id)
+            elif not tarefa.tarefa_comum and tarefa.tributacao_id and empresa.tributacao_id != tarefa.tributacao_id:
+                incompativeis.append(empresa)
+            else:
+                elegiveis.append(empresa_id)
+
+        novos = {'responsavel_id': responsavel_id}
+        novos.update(valores or {})
+        resultado = VinculoService.vincular(
+            elegiveis, [tarefa.id], valores=novos, apenas_ativos=True, criterios=criterios, commit=commit
+        )
+
+        existentes = resultado['existentes']
+        responsaveis_ids = {resp_id for _, resp_id in existentes.values() if resp_id and resp_id != responsavel_id}
+        nomes = dict(
+            db.session.query(Usuario.id, Usuario.nome).filter(Usuario.id.in_(responsaveis_ids))
+        ) if responsaveis_ids else {}
+
+        duplicados = []
+        for (empresa_id, _), (_, resp_id) in existentes.items():
+            duplicados.append({
+                'empresa': empresas[empresa_id],
+                'responsavel_id': resp_id,
+                'responsavel_nome': nomes.get(resp_id, 'Desconhecido')
+            })
+
+        return {
+            'criados': [empresa_id for empresa_id, _ in resultado['criados']],
+            'duplicados': duplicados,
+            'invalidas': invalidas,
+            'incompativeis': incompativeis
+        }
+
+    @staticmethod
+    def remover(relacionamento_ids, commit=True):
+        """
+        Remove relacionamentos com seus períodos e retificações
+
+        O resumo de status das empresas afetadas é recalculado na mesma transação.
+
+        Args:
+            relacionamento_ids: IDs dos relacionamentos
+            commit: Se True, confirma a transação ao final
+
+        Returns:
+            int: Quantidade de relacionamentos removidos
+        """
+        ids = list(dict.fromkeys(int(rid) for rid in relacionamento_ids))
+        if not ids:
+            return 0
+
+        removidos = 0
+        empresas = set()
+        for posicao in range(0, len(ids), TAMANHO_LOTE_CONSULTA):
+            lote = ids[posicao:posicao + TAMANHO_LOTE_CONSULTA]
+            empresas.update(eid for (eid,) in db.session.query(
+                RelacionamentoTarefa.empresa_id
+            ).filter(RelacionamentoTarefa.id.in_(lote)).distinct())
+            periodos = select(Periodo.id).where(Periodo.relacionamento_tarefa_id.in_(lote))
+            db.session.execute(
+                delete(Retificacao).where(Retificacao.periodo_id.in_(periodos))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                delete(Periodo).where(Periodo.relacionamento_tarefa_id.in_(lote))
+                .execution_options(synchronize_session=False)
+            )
+            resultado = db.session.execute(
+                delete(RelacionamentoTarefa).where(RelacionamentoTarefa.id.in_(lote))
+                .execution_options(synchronize_session=False)
+            )
+            removidos += resultado.rowcount or 0
+
+        ResumoService.reconstruir(empresa_ids=empresas, commit=False)
+
+        if commit:
+            db.session.commit()
+        return removidos
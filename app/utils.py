@@ -1,5 +1,8 @@
+import re
+import unicodedata
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, or_, false, true
 
 
 def get_previous_period():
@@ -139,6 +142,46 @@ def should_show_task_by_type(tarefa_tipo, periodo_label, tarefa_periodo_label=No
     return True  # Por padrão, mostrar a tarefa
 
 
+def task_visibility_filter(periodo_label, label_column, tipo_column=None):
+    """
+    Regra de exibição das telas como predicado SQL
+
+    Equivale ao filtro aplicado linha a linha nas telas: tarefas anuais ficam
+    de fora, trimestrais seguem should_show_task_by_type e as demais exigem
+    label igual ao período filtrado (quando informado).
+
+    Args:
+        periodo_label (str): Período filtrado pelo usuário (YYYY-MM)
+        label_column: Coluna com o label do período (YYYY-MM ou YYYY-TQ)
+        tipo_column: Coluna com o tipo da tarefa; se None, decide só pelo label
+            (para tabelas que já excluem as anuais, como o resumo de status)
+
+    Returns:
+        Expressão SQLAlchemy para usar em filter()
+    """
+    if should_show_task_by_type('Trimestral', periodo_label, '-'):
+        # Filtro fora do formato YYYY-MM: a regra em Python aceita qualquer label
+        trimestral = label_column != ''
+    else:
+        trimestres = [
+            trimestre for trimestre in ('T1', 'T2', 'T3', 'T4')
+            if should_show_task_by_type('Trimestral', periodo_label, f'-{trimestre}')
+        ]
+        trimestral = or_(
+            false(),
+            *[or_(label_column.like(f'%-{trimestre}'), label_column == trimestre) for trimestre in trimestres]
+        )
+    demais = (label_column == periodo_label) if periodo_label else true()
+
+    if tipo_column is None:
+        eh_trimestre = label_column.like('%T%')
+        return or_(and_(~eh_trimestre, demais), and_(eh_trimestre, trimestral))
+    return or_(
+        and_(tipo_column == 'Trimestral', trimestral),
+        and_(or_(tipo_column.is_(None), tipo_column.notin_(['Anual', 'Trimestral'])), demais)
+    )
+
+
 def gerar_periodo_label(ano, mes):
     """Gera o label do período no formato YYYY-MM"""
     return f"{ano}-{mes:02d}"
@@ -170,4 +213,16 @@ def calcular_datas_periodo(ano, mes, tipo_tarefa):
     # Fallback
     inicio = date(ano, mes, 1)
     fim = date(ano, mes, calendar.monthrange(ano, mes)[1])
-    return inicio, fim, gerar_periodo_label(ano, mes)
\ No newline at end of file
+    return inicio, fim, gerar_periodo_label(ano, mes)
+
+
+def normalizar_texto(texto):
+    """
+    Normaliza texto para busca: minúsculo, sem acentos e com palavras
+    separadas por um espaço
+    Exemplo: 'Apuração  ICMS-ST' -> 'apuracao icms st'
+    """
+    if not texto:
+        return ''
+    sem_acentos = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', sem_acentos.lower()))
@@ -0,0 +1,9 @@
+"""
+Benchmarks de desempenho (fora da suíte de testes)
+
+Uso:
+    python -m benchmarks.serializacao_json [--linhas 20000] [--json saida.json]
+    python -m benchmarks.dados_sinteticos --escala media [--banco URL]
+    python -m benchmarks.caminhos_quentes --escala media [--reusar] [--comparar anterior.json]
+    python -m benchmarks.carga --escala media --usuarios 10 --duracao 60 [--threads 8]
+"""
@@ -0,0 +1,67 @@
+"""
+Aplicação e banco usados pelos benchmarks e pelo teste de carga
+"""
+
+import json
+import os
+import subprocess
+
+from app import create_app
+
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA = os.path.join(RAIZ, 'instance', 'benchmarks')
+
+
+def url_padrao(escala):
+    return f"sqlite:///{os.path.join(PASTA, f'{escala}.sqlite')}"
+
+
+def criar_app(banco=None, escala='pequena', **config):
+    """
+    App de testing (sem rate limit, cache nulo) apontando para o banco informado
+
+    Args:
+        banco: URL SQLAlchemy (padrão: SQLite em instance/benchmarks/<escala>.sqlite)
+        config: sobrescritas adicionais da configuração
+    """
+    os.makedirs(PASTA, exist_ok=True)
+    extra = {
+        'SQLALCHEMY_DATABASE_URI': banco or url_padrao(escala),
+        'SQL_CABECALHOS': True,
+        'SQL_LENTA_MS': 0,
+        'SQL_N1_LIMITE': 0,
+    }
+    extra.update(config)
+    return create_app('testing', config_extra=extra)
+
+
+def caminho_dados(escala):
+    """Metadados da última geração da escala (logins, período mais recente)"""
+    return os.path.join(PASTA, f'{escala}.dados.json')
+
+
+def salvar_dados(escala, dados):
+    with open(caminho_dados(escala), 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, indent=2, ensure_ascii=False)
+
+
+def carregar_dados(escala):
+    try:
+        with open(caminho_dados(escala), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+def commit_atual():
+    """Hash curto do commit (e '+' se houver alterações não commitadas), ou None"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        sujo = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip()
+        return commit + ('+' if sujo else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
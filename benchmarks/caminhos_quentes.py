@@ -0,0 +1,246 @@
+"""
+Benchmark dos caminhos mais pesados sobre dados sintéticos
+
+Cada cenário é uma requisição real (test client, com sessão do perfil
+adequado) contra um banco gerado por benchmarks.dados_sinteticos. Mede o
+tempo de parede (mediana/mín/máx), as instruções SQL e o tempo de banco da
+requisição (instrumentação SQL) e o pico de memória Python (tracemalloc,
+numa execução à parte para não distorcer o tempo). O resultado vai para um
+JSON que pode ser comparado com o de outro commit.
+
+Uso:
+    python -m benchmarks.caminhos_quentes --escala media --repeticoes 5
+    python -m benchmarks.caminhos_quentes --reusar --comparar instance/benchmarks/resultados/anterior.json
+    python -m benchmarks.caminhos_quentes --escala producao --apenas dashboard.api_resumo,gerenciamento.api_resumo
+"""
+
+import argparse
+import calendar
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import date, datetime
+
+from benchmarks import dados_sinteticos
+from benchmarks.ambiente import PASTA, carregar_dados, commit_atual, criar_app, salvar_dados
+
+
+Cenario = namedtuple('Cenario', 'nome metodo url perfil corpo mutavel', defaults=(None, False))
+
+CENARIOS = [
+    Cenario('gerenciamento.return_page', 'GET', '/gerenciamento/?periodo={periodo}', 'gerente'),
+    Cenario('gerenciamento.api_resumo', 'GET', '/gerenciamento/api/resumo?periodo={periodo}', 'gerente'),
+    Cenario('dashboard.api_resumo', 'GET', '/api/dashboard/resumo?periodo={periodo}', 'normal'),
+    Cenario('relatorios.api_dados_relatorio', 'GET',
+            '/relatorios/api/dados?data_inicial={trimestre_inicio}&data_final={fim}', 'admin'),
+    Cenario('relatorios.api_dados_relatorio[pagina]', 'GET',
+            '/relatorios/api/dados?data_inicial={trimestre_inicio}&data_final={fim}&limite=100', 'gerente'),
+    Cenario('relatorios.gerar_pdf', 'GET', '/relatorios/pdf?data_inicial={inicio}&data_final={fim}&async=0', 'gerente'),
+    Cenario('search.search_empresas', 'GET', '/api/search/empresas?q=comercio', 'normal'),
+    Cenario('search.search_tarefas', 'GET', '/api/search/tarefas?q=apuracao', 'normal'),
+    Cenario('search_simple.search_empresas', 'GET', '/api/search-simple/empresas?q=exemplo 01', 'normal'),
+    Cenario('api_v1.list_empresas', 'GET', '/api/v1/empresas?q=servicos&limit=50', 'gerente'),
+    Cenario('tarefas_auto.gerar_tarefas_mes', 'POST', '/api/tarefas-auto/gerar-mes', 'admin',
+            corpo={'ano': '{ano_novo}', 'mes': '{mes_novo}'}, mutavel=True),
+]
+
+
+def _variaveis(dados):
+    """Valores usados nas URLs: período mais recente e datas dele"""
+    ano, mes = (int(parte) for parte in dados['periodo_label'].split('-'))
+    trimestre = (mes - 1) // 3 * 3 + 1
+    return {
+        'periodo': dados['periodo'],
+        'inicio': date(ano, mes, 1).isoformat(),
+        'trimestre_inicio': date(ano, trimestre, 1).isoformat(),
+        'fim': date(ano, mes, calendar.monthrange(ano, mes)[1]).isoformat(),
+    }
+
+
+def _meses_novos(dados, quantidade):
+    """Meses seguintes ao histórico, um por execução de gerar_tarefas_mes"""
+    ano, mes = (int(parte) for parte in dados['periodo_label'].split('-'))
+    meses = []
+    for _ in range(quantidade):
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+        meses.append((ano, mes))
+    return meses
+
+
+def _login(client, app, login):
+    from app.models import Usuario
+
+    with app.app_context():
+        usuario = Usuario.query.filter_by(login=login).one()
+    with client.session_transaction() as sessao:
+        sessao['user_id'] = usuario.id
+        sessao['user_tipo'] = usuario.tipo
+        sessao['user_nome'] = usuario.nome
+
+
+def _executar(client, cenario, variaveis):
+    url = cenario.url.format(**variaveis)
+    corpo = None
+    if cenario.corpo:
+        corpo = {chave: int(valor.format(**variaveis)) if isinstance(valor, str) else valor
+                 for chave, valor in cenario.corpo.items()}
+    inicio = time.perf_counter()
+    resposta = client.open(url, method=cenario.metodo, json=corpo)
+    tamanho = len(resposta.get_data())
+    duracao = time.perf_counter() - inicio
+    resposta.close()
+    return {
+        'tempo': duracao,
+        'status': resposta.status_code,
+        'consultas': int(resposta.headers.get('X-SQL-Consultas', 0)),
+        'tempo_sql_ms': float(resposta.headers.get('X-SQL-Tempo-Ms', 0)),
+        'bytes': tamanho,
+    }
+
+
+def medir(app, cenario, dados, repeticoes):
+    """Aquecimento, `repeticoes` execuções cronometradas e uma com tracemalloc"""
+    client = app.test_client()
+    _login(client, app, dados['logins'][cenario.perfil][0])
+    variaveis = _variaveis(dados)
+
+    execucoes = repeticoes + (1 if cenario.mutavel else 2)
+    meses = iter(_meses_novos(dados, execucoes))
+
+    def rodar():
+        if cenario.mutavel:
+            variaveis['ano_novo'], variaveis['mes_novo'] = next(meses)
+        return _executar(client, cenario, variaveis)
+
+    try:
+        if not cenario.mutavel:
+            rodar()  # aquecimento (caches de processo, FTS, templates)
+        amostras = [rodar() for _ in range(repeticoes)]
+
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            rodar()
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        if cenario.mutavel:
+            _desfazer_meses(app, _meses_novos(dados, execucoes))
+
+    tempos = [amostra['tempo'] * 1000 for amostra in amostras]
+    ultima = amostras[-1]
+    return {
+        'url': cenario.url.format(**variaveis),
+        'perfil': cenario.perfil,
+        'status': sorted({amostra['status'] for amostra in amostras}),
+        'mediana_ms': round(statistics.median(tempos), 2),
+        'min_ms': round(min(tempos), 2),
+        'max_ms': round(max(tempos), 2),
+        'consultas': ultima['consultas'],
+        'tempo_sql_ms': round(statistics.median(amostra['tempo_sql_ms'] for amostra in amostras), 2),
+        'pico_memoria_kb': round(pico / 1024, 1),
+        'bytes': ultima['bytes'],
+    }
+
+
+def _desfazer_meses(app, meses):
+    """Remove os períodos criados por gerar_tarefas_mes e os contadores deles"""
+    from app.db import db
+    from app.models import Periodo
+    from app.services.resumo_service import ResumoService
+
+    labels = [f"{ano}-{mes:02d}" for ano, mes in meses]
+    with app.app_context():
+        Periodo.query.filter(Periodo.periodo_label.in_(labels)).delete(synchronize_session=False)
+        ResumoService.reconstruir(periodo_labels=labels)
+        db.session.commit()
+
+
+def executar(app, dados, repeticoes, apenas=None):
+    resultados = {}
+    for cenario in CENARIOS:
+        if apenas and cenario.nome not in apenas:
+            continue
+        resultados[cenario.nome] = medir(app, cenario, dados, repeticoes)
+    return resultados
+
+
+def comparar(atual, anterior):
+    """Linhas 'cenário: antes -> depois (variação)' para mediana e consultas"""
+    linhas = []
+    for nome, medida in atual.items():
+        base = anterior.get(nome)
+        if not base:
+            continue
+        variacao = (medida['mediana_ms'] / base['mediana_ms'] - 1) * 100 if base['mediana_ms'] else 0.0
+        linhas.append(
+            f"{nome:<42}{base['mediana_ms']:>10.1f} -> {medida['mediana_ms']:>9.1f} ms ({variacao:+6.1f}%)"
+            f"   consultas {base['consultas']} -> {medida['consultas']}"
+        )
+    return linhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    dados_sinteticos.argumentos_escala(parser)
+    parser.add_argument('--banco', help='URL do banco (padrão: SQLite em instance/benchmarks/<escala>.sqlite)')
+    parser.add_argument('--reusar', action='store_true', help='Usa o banco já gerado para a escala')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Execuções cronometradas por cenário (padrão: 5)')
+    parser.add_argument('--apenas', help='Cenários separados por vírgula')
+    parser.add_argument('--json', dest='saida', help='Arquivo do resultado (padrão: instance/benchmarks/resultados/)')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+    args = parser.parse_args(argv)
+
+    app = criar_app(args.banco, args.escala)
+    dados = carregar_dados(args.escala) if args.reusar else None
+    if dados is None:
+        with app.app_context():
+            dados = dados_sinteticos.popular(args.escala, args.semente, **dados_sinteticos.ajustes_escala(args))
+        salvar_dados(args.escala, dados)
+        print(f"Dados gerados em {sum(dados['tempos_s'].values()):.1f}s: {dados['contagens']}")
+
+    apenas = set(args.apenas.split(',')) if args.apenas else None
+    with app.app_context():
+        banco = app.extensions['sqlalchemy'].engine.dialect.name
+    resultado = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'banco': banco,
+        'escala': {'nome': dados['escala'], 'parametros': dados['parametros'], 'contagens': dados['contagens']},
+        'repeticoes': args.repeticoes,
+        'cenarios': executar(app, dados, args.repeticoes, apenas),
+    }
+
+    print(f"{'cenário':<42}{'mediana':>10}{'mín':>10}{'consultas':>11}{'sql (ms)':>10}{'memória (KB)':>14}  status")
+    for nome, medida in resultado['cenarios'].items():
+        print(f"{nome:<42}{medida['mediana_ms']:>10.1f}{medida['min_ms']:>10.1f}{medida['consultas']:>11}"
+              f"{medida['tempo_sql_ms']:>10.1f}{medida['pico_memoria_kb']:>14.1f}  {medida['status']}")
+
+    saida = args.saida
+    if not saida:
+        pasta = os.path.join(PASTA, 'resultados')
+        os.makedirs(pasta, exist_ok=True)
+        saida = os.path.join(pasta, f"{datetime.now():%Y%m%d-%H%M%S}-{resultado['commit'] or 'sem-git'}-{args.escala}.json")
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    print(f"Resultado: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anterior = json.load(arquivo)
+        print(f"\nComparação com {anterior.get('commit')} ({anterior.get('gerado_em')}):")
+        for linha in comparar(resultado['cenarios'], anterior['cenarios']):
+            print(linha)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
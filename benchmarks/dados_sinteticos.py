@@ -0,0 +1,287 @@
+"""
+Gerador determinístico de dados sintéticos em escala de produção
+
+Mesma semente e mesma escala produzem exatamente as mesmas linhas (ids
+explícitos, datas relativas a uma referência fixa), para que resultados de
+commits diferentes sejam comparáveis. Insere com insert() em lotes, sem ORM,
+e no fim reconstrói o resumo do painel e os índices da busca.
+
+ATENÇÃO: popular() apaga e recria todas as tabelas do banco da aplicação.
+
+Uso (só gerar o banco):
+    python -m benchmarks.dados_sinteticos --escala media --banco sqlite:///instance/benchmarks/media.sqlite
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime
+
+from sqlalchemy import func, insert
+
+from app.db import db
+from app.models import Empresa, Periodo, RelacionamentoTarefa, Setor, Tarefa, Tributacao, Usuario
+from app.services.busca_service import BACKENDS
+from app.utils import calcular_datas_periodo
+
+
+# empresas x tarefas por empresa x anos de histórico
+ESCALAS = {
+    'pequena': {'setores': 3, 'empresas': 50, 'tarefas': 20, 'tarefas_por_empresa': 20, 'anos': 1,
+                'colaboradores_por_setor': 3},
+    'media': {'setores': 5, 'empresas': 500, 'tarefas': 40, 'tarefas_por_empresa': 30, 'anos': 2,
+              'colaboradores_por_setor': 8},
+    'producao': {'setores': 6, 'empresas': 2000, 'tarefas': 60, 'tarefas_por_empresa': 60, 'anos': 3,
+                 'colaboradores_por_setor': 15},
+}
+
+# Último mês completo do histórico é o anterior à referência
+REFERENCIA = date(2025, 9, 1)
+SENHA = '123'
+TAMANHO_LOTE = 5000
+
+NOMES_SETORES = ['Fiscal', 'Contábil', 'Pessoal', 'Societário', 'Financeiro', 'Auditoria', 'Tributário', 'Legal']
+NOMES_TAREFAS = ['Apuração', 'Declaração', 'Conciliação', 'Folha', 'Guia', 'Escrituração', 'Envio', 'Revisão']
+TRIBUTOS = ['ICMS', 'ISS', 'PIS', 'COFINS', 'IRPJ', 'CSLL', 'INSS', 'FGTS', 'DCTF', 'SPED', 'DIRF', 'RAIS']
+RAMOS = ['Comércio', 'Indústria', 'Serviços', 'Transportes', 'Construtora', 'Alimentos', 'Tecnologia', 'Saúde']
+# (tipo, peso)
+TIPOS = [('Mensal', 80), ('Trimestral', 10), ('Anual', 10)]
+
+
+def _meses(anos, referencia=REFERENCIA):
+    """(ano, mes) dos `anos` anos anteriores à referência, do mais antigo ao mais recente"""
+    meses = []
+    ano, mes = referencia.year, referencia.month
+    for _ in range(anos * 12):
+        mes -= 1
+        if mes == 0:
+            ano, mes = ano - 1, 12
+        meses.append((ano, mes))
+    return meses[::-1]
+
+
+def _inserir(modelo, linhas):
+    for posicao in range(0, len(linhas), TAMANHO_LOTE):
+        db.session.execute(insert(modelo), linhas[posicao:posicao + TAMANHO_LOTE])
+
+
+def _remover_indices_busca():
+    """Tabelas FTS5 da busca ficam fora do metadata; sem as de origem, os triggers já caíram"""
+    if db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as conexao:
+        tabelas = conexao.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'busca\\_%' ESCAPE '\\' "
+            "AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+        ).scalars().all()
+        for tabela in tabelas:
+            conexao.exec_driver_sql(f'DROP TABLE IF EXISTS {tabela}')
+    BACKENDS['fts5']._preparados.clear()
+
+
+def _status(aleatorio, idade_meses):
+    """Histórico antigo quase todo concluído; o último mês ainda em andamento"""
+    sorteio = aleatorio.random()
+    if idade_meses == 0:
+        return 'pendente' if sorteio < 0.5 else 'fazendo' if sorteio < 0.65 else 'concluida'
+    if sorteio < 0.92:
+        return 'concluida'
+    return 'retificada' if sorteio < 0.96 else 'pendente'
+
+
+def popular(escala='pequena', semente=42, referencia=REFERENCIA, **ajustes):
+    """
+    Recria as tabelas e insere os dados sintéticos (dentro de um app context)
+
+    Args:
+        escala: nome em ESCALAS (ajustes sobrescrevem campos dela)
+        semente: semente do gerador aleatório
+        referencia: o histórico termina no mês anterior a esta data
+
+    Returns:
+        dict: parâmetros usados, contagens por tabela, logins por perfil e
+            o período mais recente (MM/AAAA e label)
+    """
+    parametros = dict(ESCALAS[escala], **{k: v for k, v in ajustes.items() if v is not None})
+    aleatorio = random.Random(semente)
+    agora = datetime(referencia.year, referencia.month, referencia.day)
+    tempos = {}
+
+    marca = time.perf_counter()
+    db.session.remove()
+    db.drop_all()
+    _remover_indices_busca()
+    db.create_all()
+    tempos['recriar_tabelas'] = round(time.perf_counter() - marca, 2)
+    marca = time.perf_counter()
+
+    # Setores, tributações e usuários (1 gerente e 1 supervisor por setor)
+    setores = [{'id': i + 1, 'nome': NOMES_SETORES[i % len(NOMES_SETORES)] + ('' if i < len(NOMES_SETORES) else f' {i + 1}')}
+               for i in range(parametros['setores'])]
+    _inserir(Setor, setores)
+    _inserir(Tributacao, [{'id': 1, 'nome': 'Simples Nacional'}, {'id': 2, 'nome': 'Regime Normal'}])
+
+    usuarios = [{'id': 1, 'nome': 'Admin Benchmark', 'login': 'admin', 'senha': SENHA, 'tipo': 'admin', 'ativo': True}]
+    logins = {'admin': ['admin'], 'gerente': [], 'supervisor': [], 'normal': []}
+    colaboradores = {}
+    for setor in setores:
+        sid = setor['id']
+        for tipo, quantidade in (('gerente', 1), ('supervisor', 1), ('normal', parametros['colaboradores_por_setor'])):
+            for n in range(quantidade):
+                login = f"{tipo}{sid}" if quantidade == 1 else f"{tipo}{sid}_{n + 1}"
+                usuario = {
+                    'id': len(usuarios) + 1, 'nome': f"{tipo.capitalize()} {setor['nome']} {n + 1}",
+                    'login': login, 'senha': SENHA, 'tipo': tipo, 'setor_id': sid, 'ativo': True,
+                }
+                usuarios.append(usuario)
+                logins[tipo].append(login)
+                if tipo == 'normal':
+                    colaboradores.setdefault(sid, []).append(usuario['id'])
+    _inserir(Usuario, usuarios)
+
+    # Catálogo de tarefas
+    tipos, pesos = zip(*TIPOS)
+    tarefas = []
+    for i in range(parametros['tarefas']):
+        tarefas.append({
+            'id': i + 1,
+            'nome': f"{NOMES_TAREFAS[i % len(NOMES_TAREFAS)]} {TRIBUTOS[i % len(TRIBUTOS)]} {i + 1:03d}",
+            'tipo': aleatorio.choices(tipos, pesos)[0],
+            'descricao': 'Tarefa sintética de benchmark',
+            'setor_id': setores[i % len(setores)]['id'],
+            'tributacao_id': 1 + i % 2,
+        })
+    _inserir(Tarefa, tarefas)
+
+    empresas = [{
+        'id': i + 1,
+        'codigo': f"B{i + 1:06d}",
+        'nome': f"{RAMOS[i % len(RAMOS)]} Exemplo {i + 1:05d} Ltda",
+        'tributacao_id': 1 + aleatorio.randrange(2),
+        'ativo': aleatorio.random() > 0.02,
+    } for i in range(parametros['empresas'])]
+    _inserir(Empresa, empresas)
+    tempos['cadastros'] = round(time.perf_counter() - marca, 2)
+    marca = time.perf_counter()
+
+    # Vínculos empresa x tarefa com responsável do setor da tarefa
+    por_empresa = min(parametros['tarefas_por_empresa'], len(tarefas))
+    relacionamentos = []
+    for empresa in empresas:
+        for tarefa in aleatorio.sample(tarefas, por_empresa):
+            equipe = colaboradores.get(tarefa['setor_id']) or [None]
+            relacionamentos.append({
+                'id': len(relacionamentos) + 1,
+                'empresa_id': empresa['id'],
+                'tarefa_id': tarefa['id'],
+                'responsavel_id': aleatorio.choice(equipe) if aleatorio.random() > 0.05 else None,
+                'status': 'ativa' if aleatorio.random() > 0.03 else 'inativa',
+                'dia_vencimento': aleatorio.randint(5, 25),
+                'versao_atual': True,
+            })
+    _inserir(RelacionamentoTarefa, relacionamentos)
+    tempos['relacionamentos'] = round(time.perf_counter() - marca, 2)
+    marca = time.perf_counter()
+
+    # Histórico de períodos: um por vínculo e label (mensal, trimestral, anual)
+    tipo_tarefa = {t['id']: t['tipo'] for t in tarefas}
+    meses = _meses(parametros['anos'], referencia)
+    total_periodos = 0
+    proximo_id = 1
+    for idade, (ano, mes) in enumerate(reversed(meses)):
+        datas = {}
+        for tipo in tipos:
+            inicio, fim, label = calcular_datas_periodo(ano, mes, tipo)
+            # Trimestral/anual: um período por trimestre/ano, no último mês dele
+            if fim.month == mes:
+                datas[tipo] = (inicio, fim, label)
+        lote = []
+        for relacionamento in relacionamentos:
+            periodo = datas.get(tipo_tarefa[relacionamento['tarefa_id']])
+            if periodo is None:
+                continue
+            inicio, fim, label = periodo
+            status = _status(aleatorio, idade)
+            lote.append({
+                'id': proximo_id,
+                'relacionamento_tarefa_id': relacionamento['id'],
+                'inicio': inicio,
+                'fim': fim,
+                'periodo_label': label,
+                'status': status,
+                'data_conclusao': date(fim.year, fim.month, aleatorio.randint(1, fim.day))
+                if status in ('concluida', 'retificada') else None,
+                'contador_retificacoes': 1 if status == 'retificada' else 0,
+                'atualizado_em': agora,
+            })
+            proximo_id += 1
+        _inserir(Periodo, lote)
+        total_periodos += len(lote)
+    db.session.commit()
+    tempos['periodos'] = round(time.perf_counter() - marca, 2)
+    marca = time.perf_counter()
+
+    from app.services.busca_service import BuscaService
+    from app.services.resumo_service import ResumoService
+    ResumoService.reconstruir()
+    BuscaService.reindexar()
+    db.session.commit()
+    tempos['resumo_e_busca'] = round(time.perf_counter() - marca, 2)
+
+    ano, mes = meses[-1]
+    return {
+        'escala': escala,
+        'semente': semente,
+        'parametros': parametros,
+        'contagens': contagens(),
+        'logins': logins,
+        'senha': SENHA,
+        'periodo': f"{mes:02d}/{ano}",
+        'periodo_label': f"{ano}-{mes:02d}",
+        'tempos_s': tempos,
+    }
+
+
+def contagens():
+    """Linhas por tabela principal do banco atual"""
+    return {
+        modelo.__tablename__: db.session.query(func.count(modelo.id)).scalar()
+        for modelo in (Setor, Usuario, Empresa, Tarefa, RelacionamentoTarefa, Periodo)
+    }
+
+
+def argumentos_escala(parser):
+    """Opções de escala compartilhadas pelos comandos de benchmark e carga"""
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='pequena', help='Escala base (padrão: pequena)')
+    parser.add_argument('--semente', type=int, default=42)
+    for campo in ('setores', 'empresas', 'tarefas', 'tarefas_por_empresa', 'anos', 'colaboradores_por_setor'):
+        parser.add_argument(f"--{campo.replace('_', '-')}", dest=campo, type=int, help='Sobrescreve a escala')
+
+
+def ajustes_escala(args):
+    return {campo: getattr(args, campo) for campo in
+            ('setores', 'empresas', 'tarefas', 'tarefas_por_empresa', 'anos', 'colaboradores_por_setor')}
+
+
+def main(argv=None):
+    from benchmarks.ambiente import criar_app, salvar_dados
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    argumentos_escala(parser)
+    parser.add_argument('--banco', help='URL do banco (padrão: SQLite em instance/benchmarks/<escala>.sqlite)')
+    args = parser.parse_args(argv)
+
+    app = criar_app(args.banco, args.escala)
+    with app.app_context():
+        resultado = popular(args.escala, args.semente, **ajustes_escala(args))
+    salvar_dados(args.escala, resultado)
+    print(f"Banco: {app.config['SQLALCHEMY_DATABASE_URI']}")
+    for tabela, total in resultado['contagens'].items():
+        print(f"  {tabela:<24}{total:>12}")
+    print(f"Tempos (s): {resultado['tempos_s']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
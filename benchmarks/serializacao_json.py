@@ -0,0 +1,180 @@
+"""
+Benchmark de serialização JSON: stdlib x orjson
+
+Payloads sintéticos (determinísticos) no formato das respostas mais pesadas:
+- relatorio: `dados` de /relatorios/api/dados (linhas de formatar_linha)
+- relatorio_datas: o mesmo com date nativo em vez de strftime por linha
+- gerente: /gerenciamento/api/resumo (responsaveis_tarefas + empresas_resumo)
+- gerente_rows: responsaveis_tarefas como Row do SQLAlchemy, sem montar dicts
+
+Uso:
+    python -m benchmarks.serializacao_json --linhas 20000 --json resultado.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from app.json_provider import JSONProviderRapido, orjson
+
+
+STATUS = ('pendente', 'fazendo', 'concluida', 'retificada')
+
+
+def _datas(aleatorio):
+    inicio = date(2023, 1, 1)
+    conclusao = inicio + timedelta(days=aleatorio.randrange(900)) if aleatorio.random() < 0.7 else None
+    prazo = inicio + timedelta(days=aleatorio.randrange(900)) if aleatorio.random() < 0.3 else None
+    return conclusao, prazo
+
+
+def payload_relatorio(linhas, datas_nativas=False):
+    aleatorio = random.Random(42)
+    dados = []
+    for i in range(linhas):
+        conclusao, prazo = _datas(aleatorio)
+        status = STATUS[i % len(STATUS)]
+        if not datas_nativas:
+            conclusao = conclusao.strftime('%d/%m/%Y') if conclusao else ''
+            prazo = prazo.strftime('%d/%m/%Y') if prazo else ''
+        dados.append({
+            'id': i + 1,
+            'empresa_nome': f'Empresa Exemplo {i % 2000:04d} Ltda',
+            'tarefa_nome': f'Apuração de Tributo {i % 60:02d}',
+            'tarefa_tipo': 'Mensal',
+            'periodo': f'2025-{i % 12 + 1:02d}',
+            'periodo_formatado': f'2025-{i % 12 + 1:02d}',
+            'status': status,
+            'status_texto': status.capitalize(),
+            'data_conclusao': conclusao,
+            'label_data': 'Conclusão',
+            'prazo_especifico': prazo,
+            'responsavel_nome': f'Colaborador Ção {i % 40:02d}',
+        })
+    return {'success': True, 'dados': dados, 'total_registros': linhas}
+
+
+def _responsaveis(linhas):
+    return [{
+        'usuario_nome': f'Colaborador Ção {i % 40:02d}',
+        'empresa_nome': f'Empresa Exemplo {i % 2000:04d} Ltda',
+        'tarefa_nome': f'Apuração de Tributo {i % 60:02d}',
+        'status': STATUS[i % len(STATUS)],
+        'periodo_label': '08/2025',
+        'contador_retificacoes': i % 3,
+    } for i in range(linhas)]
+
+
+def _empresas_resumo(linhas):
+    return [{
+        'nome': f'Empresa Exemplo {i:04d} Ltda',
+        'pendentes': i % 7, 'fazendo': i % 3, 'concluidas': i % 11, 'total': i % 7 + i % 3 + i % 11,
+    } for i in range(min(linhas, 2000))]
+
+
+def payload_gerente(linhas):
+    return {
+        'success': True,
+        'resumo': {'pendentes': 1, 'fazendo': 2, 'concluidas': 3},
+        'taxa_conclusao': 50.0,
+        'empresas_resumo': _empresas_resumo(linhas),
+        'responsaveis_tarefas': _responsaveis(linhas),
+        'periodo': '2025-08',
+        'total_encontrados': linhas,
+    }
+
+
+def payload_gerente_rows(linhas):
+    """Mesmo conteúdo, com as linhas vindas de uma consulta (Row)"""
+    engine = create_engine('sqlite://')
+    with engine.connect() as conexao:
+        rows = conexao.execute(text("""
+            WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < :linhas)
+            SELECT 'Colaborador Ção ' || printf('%02d', i % 40) AS usuario_nome,
+                   'Empresa Exemplo ' || printf('%04d', i % 2000) || ' Ltda' AS empresa_nome,
+                   'Apuração de Tributo ' || printf('%02d', i % 60) AS tarefa_nome,
+                   CASE i % 4 WHEN 0 THEN 'pendente' WHEN 1 THEN 'fazendo'
+                              WHEN 2 THEN 'concluida' ELSE 'retificada' END AS status,
+                   '08/2025' AS periodo_label,
+                   i % 3 AS contador_retificacoes
+            FROM n
+        """), {'linhas': linhas}).all()
+    payload = payload_gerente(linhas)
+    payload['responsaveis_tarefas'] = rows
+    return payload
+
+
+def _app(backend):
+    app = Flask(__name__)
+    app.config['JSON_BACKEND'] = backend
+    app.json = JSONProviderRapido(app)
+    return app
+
+
+def medir(app, payload, repeticoes):
+    """jsonify completo (serialização + Response), como nas views"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = app.json.response(payload)
+        tempos.append(time.perf_counter() - inicio)
+    return {
+        'mediana_ms': round(statistics.median(tempos) * 1000, 3),
+        'min_ms': round(min(tempos) * 1000, 3),
+        'bytes': len(resposta.get_data()),
+    }
+
+
+def executar(linhas, repeticoes):
+    payloads = {
+        'relatorio': payload_relatorio(linhas),
+        'relatorio_datas': payload_relatorio(linhas, datas_nativas=True),
+        'gerente': payload_gerente(linhas),
+        'gerente_rows': payload_gerente_rows(linhas),
+    }
+    apps = {backend: _app(backend) for backend in ['stdlib'] + (['orjson'] if orjson is not None else [])}
+    resultados = {}
+    for nome, payload in payloads.items():
+        resultados[nome] = {backend: medir(app, payload, repeticoes) for backend, app in apps.items()}
+        if 'orjson' in resultados[nome]:
+            resultados[nome]['aceleracao'] = round(
+                resultados[nome]['stdlib']['mediana_ms'] / resultados[nome]['orjson']['mediana_ms'], 2
+            )
+    return {
+        'linhas': linhas,
+        'repeticoes': repeticoes,
+        'python': platform.python_version(),
+        'orjson': getattr(orjson, '__version__', None),
+        'resultados': resultados,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--linhas', type=int, default=20000, help='Linhas por payload (padrão: 20000)')
+    parser.add_argument('--repeticoes', type=int, default=7, help='Execuções por medição (padrão: 7)')
+    parser.add_argument('--json', dest='saida', help='Grava o resultado neste arquivo')
+    args = parser.parse_args(argv)
+
+    resultado = executar(args.linhas, args.repeticoes)
+    print(f"{'payload':<16}{'stdlib (ms)':>14}{'orjson (ms)':>14}{'aceleração':>12}{'bytes':>12}")
+    for nome, medidas in resultado['resultados'].items():
+        orj = medidas.get('orjson', {})
+        print(f"{nome:<16}{medidas['stdlib']['mediana_ms']:>14.1f}{orj.get('mediana_ms', float('nan')):>14.1f}"
+              f"{medidas.get('aceleracao', float('nan')):>11.1f}x{medidas['stdlib']['bytes']:>12}")
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -41,6 +41,10 @@ ON empresas(ativo, tributacao_id);
 CREATE INDEX idx_empresa_codigo 
 ON empresas(codigo);
 
+-- Otimiza a ordenação/paginação do relatório por nome
+CREATE INDEX idx_empresa_nome 
+ON empresas(nome, id);
+
 -- ÍNDICES PARA USUARIOS
 -- Otimiza login
 CREATE INDEX idx_usuario_login 
@@ -90,6 +94,34 @@ ON atribuicoes_tarefas(periodo_execucao_id, status);
 CREATE INDEX idx_atribuicao_empresa_tarefa 
 ON atribuicoes_tarefas(empresa_id, tarefa_id, status);
 
+-- ÍNDICES FULL-TEXT (BUSCA)
+-- Busca ranqueada por relevância e prefixo (MATCH ... AGAINST) usada
+-- pelo BuscaService nas rotas /api/search e /api/search-simple
+CREATE FULLTEXT INDEX ft_empresas_busca 
+ON empresas(nome, codigo);
+
+CREATE FULLTEXT INDEX ft_tarefas_busca 
+ON tarefas(nome, descricao);
+
+CREATE FULLTEXT INDEX ft_usuarios_busca 
+ON usuarios(nome, login);
+
+-- COLUNAS NORMALIZADAS (BUSCA POR PREFIXO)
+-- nome_normalizado: nome minúsculo e sem acentos, mantido pela aplicação.
+-- Collation binária para a busca por faixa (prefixo) usar o índice.
+-- Depois de criar as colunas, preencha com: flask --app run busca reindexar
+ALTER TABLE empresas ADD COLUMN nome_normalizado VARCHAR(255) COLLATE utf8mb4_bin;
+CREATE INDEX idx_empresa_nome_normalizado 
+ON empresas(nome_normalizado);
+
+ALTER TABLE tarefas ADD COLUMN nome_normalizado VARCHAR(255) COLLATE utf8mb4_bin;
+CREATE INDEX idx_tarefa_nome_normalizado 
+ON tarefas(nome_normalizado);
+
+ALTER TABLE usuarios ADD COLUMN nome_normalizado VARCHAR(255) COLLATE utf8mb4_bin;
+CREATE INDEX idx_usuario_nome_normalizado 
+ON usuarios(nome_normalizado);
+
 -- =====================================================
 -- ESTATÍSTICAS
 -- =====================================================
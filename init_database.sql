@@ -20,6 +20,7 @@ DROP TABLE IF EXISTS usuarios;
 CREATE TABLE usuarios (
     id INT AUTO_INCREMENT PRIMARY KEY,
     nome VARCHAR(255) NOT NULL,
+    nome_normalizado VARCHAR(255) COLLATE utf8mb4_bin,
     login VARCHAR(150) UNIQUE NOT NULL,
     senha VARCHAR(255) NOT NULL,
     tipo VARCHAR(50) NOT NULL,
@@ -27,6 +28,8 @@ CREATE TABLE usuarios (
     criado_em TIMESTAMP NULL DEFAULT NULL,
     atualizado_em TIMESTAMP NULL DEFAULT NULL,
     ativo BOOLEAN DEFAULT TRUE,
+    FULLTEXT KEY ft_usuarios_busca (nome, login),
+    INDEX idx_usuario_nome_normalizado (nome_normalizado),
     FOREIGN KEY (setor_id) REFERENCES setores(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -35,10 +38,13 @@ CREATE TABLE empresas (
     id INT AUTO_INCREMENT PRIMARY KEY,
     codigo VARCHAR(100) UNIQUE NOT NULL,
     nome VARCHAR(255) NOT NULL,
+    nome_normalizado VARCHAR(255) COLLATE utf8mb4_bin,
     tributacao_id INT,
     criado_em TIMESTAMP NULL DEFAULT NULL,
     atualizado_em TIMESTAMP NULL DEFAULT NULL,
     ativo BOOLEAN DEFAULT TRUE,
+    FULLTEXT KEY ft_empresas_busca (nome, codigo),
+    INDEX idx_empresa_nome_normalizado (nome_normalizado),
     FOREIGN KEY (tributacao_id) REFERENCES tributacoes(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -46,6 +52,7 @@ DROP TABLE IF EXISTS tarefas;
 CREATE TABLE tarefas (
     id INT AUTO_INCREMENT PRIMARY KEY,
     nome VARCHAR(255) NOT NULL,
+    nome_normalizado VARCHAR(255) COLLATE utf8mb4_bin,
     tipo VARCHAR(50) NOT NULL,
     descricao TEXT,
     tributacao_id INT,
@@ -54,6 +61,8 @@ CREATE TABLE tarefas (
     condicoes_especiais TEXT,
     criado_em TIMESTAMP NULL DEFAULT NULL,
     atualizado_em TIMESTAMP NULL DEFAULT NULL,
+    FULLTEXT KEY ft_tarefas_busca (nome, descricao),
+    INDEX idx_tarefa_nome_normalizado (nome_normalizado),
     FOREIGN KEY (tributacao_id) REFERENCES tributacoes(id) ON DELETE SET NULL,
     FOREIGN KEY (setor_id) REFERENCES setores(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -120,6 +129,23 @@ CREATE TABLE retificacoes (
     FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Contadores de status por período (painel do gerente); 0 = sem setor / não atribuído
+DROP TABLE IF EXISTS resumo_status_periodos;
+CREATE TABLE resumo_status_periodos (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    periodo_label VARCHAR(50) NOT NULL,
+    empresa_id INT NOT NULL,
+    setor_id INT NOT NULL DEFAULT 0,
+    responsavel_id INT NOT NULL DEFAULT 0,
+    pendentes INT NOT NULL DEFAULT 0,
+    fazendo INT NOT NULL DEFAULT 0,
+    concluidas INT NOT NULL DEFAULT 0,
+    retificadas INT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP NULL DEFAULT NULL,
+    UNIQUE KEY uq_resumo_status_chave (periodo_label, empresa_id, setor_id, responsavel_id),
+    KEY idx_resumo_status_setor (periodo_label, setor_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 DROP TABLE IF EXISTS checklists;
 CREATE TABLE checklists (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -327,6 +353,53 @@ CREATE TABLE mudancas_tributacao_pendentes (
     FOREIGN KEY (revisado_por) REFERENCES usuarios(id) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+DROP TABLE IF EXISTS migracoes_tributacao_lote;
+CREATE TABLE migracoes_tributacao_lote (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tributacao_nova_id INT NOT NULL,
+    modo VARCHAR(20) NOT NULL DEFAULT 'preservar',
+    motivo TEXT,
+    empresa_ids JSON NOT NULL,
+    tamanho_lote INT NOT NULL DEFAULT 100,
+    total INT NOT NULL DEFAULT 0,
+    processadas INT NOT NULL DEFAULT 0,
+    migradas INT NOT NULL DEFAULT 0,
+    ignoradas INT NOT NULL DEFAULT 0,
+    status VARCHAR(20) DEFAULT 'pendente',
+    erro TEXT,
+    criado_por INT NOT NULL,
+    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (tributacao_nova_id) REFERENCES tributacoes(id) ON DELETE CASCADE,
+    FOREIGN KEY (criado_por) REFERENCES usuarios(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+DROP TABLE IF EXISTS jobs;
+CREATE TABLE jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    parametros JSON,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente',
+    progresso INT NOT NULL DEFAULT 0,
+    mensagem VARCHAR(255),
+    resultado JSON,
+    erro TEXT,
+    arquivo VARCHAR(500),
+    nome_arquivo VARCHAR(255),
+    mimetype VARCHAR(100),
+    tentativas INT NOT NULL DEFAULT 0,
+    max_tentativas INT NOT NULL DEFAULT 3,
+    proxima_execucao DATETIME,
+    worker VARCHAR(100),
+    criado_por INT,
+    criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    iniciado_em DATETIME,
+    concluido_em DATETIME,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_jobs_fila (status, proxima_execucao),
+    FOREIGN KEY (criado_por) REFERENCES usuarios(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 DROP TABLE IF EXISTS checklists_empresa;
 CREATE TABLE checklists_empresa (
     id INT AUTO_INCREMENT PRIMARY KEY,
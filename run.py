@@ -1,6 +1,7 @@
 import os
 
 from app import create_app
+from app.services.autocomplete_service import AutocompleteService
 
 
 def _resolve_env() -> str | None:
@@ -14,4 +15,5 @@ if __name__ == '__main__':
 	host = os.getenv('HOST', '0.0.0.0')
 	port = int(os.getenv('PORT', '5600'))
 	debug = bool(app.config.get('DEBUG', True))
+	AutocompleteService.aquecer(app)
 	app.run(host=host, port=port, debug=debug)
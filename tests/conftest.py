@@ -4,6 +4,7 @@ Configuração global para pytest
 
 import os
 import pytest
+from flask_caching import Cache
 from app import create_app
 from app.db import db
 from app.models import Usuario, Setor, Empresa, Tarefa, Tributacao
@@ -40,6 +41,17 @@ def runner(app):
     return app.test_cli_runner()
 
 
+@pytest.fixture
+def cache_simples(app, monkeypatch):
+    """Troca o NullCache dos testes por um SimpleCache e zera os contadores"""
+    cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300})
+    monkeypatch.setattr(app, 'cache', cache)
+    app.extensions['cache_tags'].zerar()
+    yield cache
+    with app.app_context():
+        cache.clear()
+
+
 def setup_test_data():
     """Configura dados de teste no banco"""
     # Criar setores
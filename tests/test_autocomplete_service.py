@@ -0,0 +1,147 @@
+"""
+Testes para o índice de autocomplete em memória
+"""
+
+import pytest
+from sqlalchemy import insert
+from app.db import db
+from app.models import Empresa, Tarefa, Usuario, Setor, RelacionamentoTarefa
+from app.services.autocomplete_service import AutocompleteService, IndiceTrigramas, ItemIndice
+
+
+@pytest.fixture
+def base_autocomplete(app):
+    """Empresas AUT* com tarefa ativa do setor Contábil em uma delas"""
+    with app.app_context():
+        contabil = Setor.query.filter_by(nome='Contábil').one()
+        tarefa = Tarefa(nome='AUT Apuração do Imposto', tipo='Mensal', setor_id=contabil.id)
+        empresas = [
+            Empresa(codigo='AUT10', nome='Comércio Aurora', ativo=True),
+            Empresa(codigo='AUT1', nome='Indústria Boreal', ativo=True),
+        ]
+        db.session.add_all([tarefa, *empresas])
+        db.session.flush()
+        db.session.add(RelacionamentoTarefa(tarefa_id=tarefa.id, empresa_id=empresas[0].id, status='ativa'))
+        db.session.commit()
+    yield
+    with app.app_context():
+        ids = [id for (id,) in db.session.query(Empresa.id).filter(Empresa.codigo.like('AUT%'))]
+        RelacionamentoTarefa.query.filter(RelacionamentoTarefa.empresa_id.in_(ids)).delete(synchronize_session=False)
+        Empresa.query.filter(Empresa.id.in_(ids)).delete(synchronize_session=False)
+        Tarefa.query.filter(Tarefa.nome.like('AUT %')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+class TestIndiceTrigramas:
+    """Testes do índice isolado"""
+
+    def test_prefixo_acentos_e_erros(self):
+        """Prefixo sem acento e termo com erro de digitação encontram o item"""
+        indice = IndiceTrigramas()
+        for id, nome in enumerate(['Apuração ICMS', 'Folha de Pagamento', 'Apoio Jurídico'], start=1):
+            indice.adicionar(ItemIndice(id, nome, {'id': id}))
+
+        assert [i.id for i in indice.buscar('apur')] == [1]
+        assert [i.id for i in indice.buscar('apurasao')] == [1]
+        assert [i.id for i in indice.buscar('pagam')] == [2]
+        assert [i.id for i in indice.buscar('ap')] == [3, 1]
+        assert [i.id for i in indice.buscar('', limite=2)] == [3, 1]
+
+        indice.remover(1)
+        assert indice.buscar('apur') == []
+        assert len(indice) == 2
+
+
+class TestAutocompleteService:
+    """Testes para AutocompleteService"""
+
+    def test_codigo_exato_primeiro(self, app, base_autocomplete):
+        """Código exato vem antes dos prefixos de código"""
+        with app.app_context():
+            empresas = AutocompleteService.buscar('empresas', 'aut1')
+            assert [e['codigo'] for e in empresas] == ['AUT1', 'AUT10']
+
+    def test_escritas_atualizam_indice(self, app, base_autocomplete):
+        """Commit de alterações (ORM e em massa) chega ao índice; rollback não"""
+        with app.app_context():
+            assert AutocompleteService.buscar('empresas', 'boreal')
+
+            empresa = Empresa.query.filter_by(codigo='AUT1').one()
+            empresa.ativo = False
+            db.session.commit()
+            assert AutocompleteService.buscar('empresas', 'boreal') == []
+
+            db.session.add(Empresa(codigo='AUT2', nome='Padaria Zênite', ativo=True))
+            db.session.flush()
+            db.session.rollback()
+            assert AutocompleteService.buscar('empresas', 'zenite') == []
+
+            db.session.execute(insert(Empresa), [{'codigo': 'AUT3', 'nome': 'Oficina Zênite', 'ativo': True}])
+            db.session.commit()
+            assert [e['codigo'] for e in AutocompleteService.buscar('empresas', 'zenite')] == ['AUT3']
+
+    def test_escopo_do_setor(self, app, base_autocomplete):
+        """Filtro por setor usa os setores das tarefas ativas da empresa"""
+        with app.app_context():
+            contabil = Setor.query.filter_by(nome='Contábil').one().id
+            fiscal = Setor.query.filter_by(nome='Fiscal').one().id
+            assert [e['codigo'] for e in AutocompleteService.buscar('empresas', 'aut', setor_id=contabil)] == ['AUT10']
+            assert AutocompleteService.buscar('empresas', 'aut', setor_id=fiscal) == []
+            assert [u['nome'] for u in AutocompleteService.buscar('usuarios', 'test', setor_id=fiscal)] == [
+                'Colaborador Test', 'Gerente Test'
+            ]
+
+
+class TestEndpointsAutocomplete:
+    """Endpoints de autocomplete servidos pelo índice"""
+
+    def _login(self, client, login):
+        with client.application.app_context():
+            usuario = Usuario.query.filter_by(login=login).one()
+            user_id, tipo = usuario.id, usuario.tipo
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['user_tipo'] = tipo
+
+    def test_suggestions_e_empresas_do_gerente(self, client, base_autocomplete):
+        """Gerente do Fiscal não vê empresa que só tem tarefa do Contábil"""
+        self._login(client, 'admin')
+        dados = client.get('/api/search/suggestions?type=empresa&q=aurora').get_json()
+        assert [s['nome'] for s in dados['suggestions']] == ['Comércio Aurora']
+        dados = client.get('/gerenciamento/api/empresas?search=AUT').get_json()
+        assert [e['codigo'] for e in dados['empresas']] == ['AUT10']
+
+        self._login(client, 'gerente')
+        assert client.get('/gerenciamento/api/empresas?search=AUT').get_json()['empresas'] == []
+        dados = client.get('/api/search/suggestions?type=tarefa&q=declaracao').get_json()
+        assert [s['nome'] for s in dados['suggestions']] == ['Declaração Mensal']
+
+    def test_tarefas_e_usuarios(self, client, base_autocomplete):
+        """Busca de tarefas exclui as já vinculadas; supervisor vê só usuários normais"""
+        self._login(client, 'admin')
+        with client.application.app_context():
+            empresa_id = Empresa.query.filter_by(codigo='AUT10').one().id
+
+        dados = client.get('/tarefas-melhoradas/api/tarefas/buscar?q=apurasao').get_json()
+        assert [t['nome'] for t in dados['tarefas']] == ['AUT Apuração do Imposto']
+        assert dados['tarefas'][0]['setor_nome'] == 'Contábil'
+        dados = client.get(f'/tarefas-melhoradas/api/tarefas/buscar?q=apurasao&empresa_id={empresa_id}').get_json()
+        assert dados['tarefas'] == []
+
+        dados = client.get('/api/usuarios?q=gerente').get_json()
+        assert [u['login'] for u in dados['usuarios']] == ['gerente']
+
+    def test_gerente_sem_setor(self, client, base_autocomplete):
+        """Gerente sem setor não vê usuários nem tarefas de setor algum"""
+        with client.application.app_context():
+            gerente = Usuario.query.filter_by(login='gerente').one()
+            setor_original, gerente.setor_id = gerente.setor_id, None
+            db.session.commit()
+        try:
+            self._login(client, 'gerente')
+            assert client.get('/api/usuarios?q=test').get_json()['usuarios'] == []
+            assert client.get('/tarefas-melhoradas/api/tarefas/buscar?q=apurasao').get_json()['tarefas'] == []
+        finally:
+            with client.application.app_context():
+                Usuario.query.filter_by(login='gerente').one().setor_id = setor_original
+                db.session.commit()
@@ -0,0 +1,139 @@
+"""
+Testes para a busca full-text (FTS5 no SQLite dos testes)
+"""
+
+import pytest
+from sqlalchemy import insert, select
+from app.db import db
+from app.models import Empresa, Tarefa, Usuario
+from app.services.busca_service import BuscaService, filtro_prefixo
+
+
+@pytest.fixture
+def base_busca(app):
+    """Empresas e tarefas com prefixo BUS"""
+    with app.app_context():
+        db.session.add_all([
+            Empresa(codigo='BUS1', nome='Padaria Apuração Central', ativo=True),
+            Empresa(codigo='BUS2', nome='Mercado Apuração', ativo=True),
+            Empresa(codigo='BUS3', nome='Oficina Aurora', ativo=True),
+            Tarefa(nome='BUS Fechamento', tipo='Mensal', descricao='Conciliação bancária do mês'),
+        ])
+        db.session.commit()
+    yield
+    with app.app_context():
+        Empresa.query.filter(Empresa.codigo.like('BUS%')).delete(synchronize_session=False)
+        Tarefa.query.filter(Tarefa.nome.like('BUS %')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+class TestBuscaService:
+    """Testes para BuscaService"""
+
+    def test_prefixo_sem_acento_e_ranking(self, app, base_busca):
+        """Prefixo casa sem acento; nome mais curto com o termo vem primeiro"""
+        with app.app_context():
+            assert BuscaService.backend().nome == 'fts5'
+            nomes = [e.nome for e in BuscaService.consulta(Empresa, 'apura')]
+            assert nomes == ['Mercado Apuração', 'Padaria Apuração Central']
+            assert [e.codigo for e in BuscaService.consulta(Empresa, 'bus3')] == ['BUS3']
+            assert BuscaService.consulta(Empresa, 'padaria mercado').count() == 0
+            # Sintaxe do FTS5 no termo é tratada como texto
+            assert BuscaService.consulta(Empresa, '"apura* (').count() == 2
+
+    def test_indice_acompanha_escritas(self, app, base_busca):
+        """Insert, update e delete refletem na busca sem reindexar"""
+        with app.app_context():
+            tarefa = Tarefa.query.filter_by(nome='BUS Fechamento').one()
+            assert BuscaService.consulta(Tarefa, 'concilia').all() == [tarefa]
+
+            tarefa.descricao = 'Apuração de tributos retidos'
+            db.session.add(Empresa(codigo='BUS4', nome='Livraria Nova', ativo=True))
+            db.session.commit()
+            assert BuscaService.consulta(Tarefa, 'concilia').count() == 0
+            assert BuscaService.consulta(Tarefa, 'retid').all() == [tarefa]
+            assert BuscaService.consulta(Empresa, 'livr').count() == 1
+
+            Empresa.query.filter_by(codigo='BUS4').delete()
+            db.session.commit()
+            assert BuscaService.consulta(Empresa, 'livr').count() == 0
+
+    def test_backend_like(self, app, base_busca, monkeypatch):
+        """BUSCA_BACKEND=like mantém a busca por substring, sem diferenciar acentos"""
+        monkeypatch.setitem(app.config, 'BUSCA_BACKEND', 'like')
+        with app.app_context():
+            assert BuscaService.consulta(Usuario, 'erente').count() == 1
+            assert BuscaService.consulta(Empresa, 'APURACAO').count() == 2
+
+
+class TestNomeNormalizado:
+    """Coluna nome_normalizado e busca por prefixo"""
+
+    def test_sincronizado_com_nome(self, app, base_busca):
+        """Construtor, atribuição e insert() em massa preenchem a coluna"""
+        with app.app_context():
+            empresa = Empresa.query.filter_by(codigo='BUS1').one()
+            assert empresa.nome_normalizado == 'padaria apuracao central'
+            empresa.nome = 'Padaria São João'
+            db.session.commit()
+            assert db.session.scalar(select(Empresa.nome_normalizado).filter_by(codigo='BUS1')) == 'padaria sao joao'
+
+            db.session.execute(insert(Empresa), [{'codigo': 'BUS5', 'nome': 'Ótica Ágil', 'ativo': True}])
+            db.session.commit()
+            assert db.session.scalar(select(Empresa.nome_normalizado).filter_by(codigo='BUS5')) == 'otica agil'
+
+    def test_prefixo_usa_indice(self, app, base_busca):
+        """Prefixo sem acento casa por faixa no índice da coluna"""
+        with app.app_context():
+            query = Empresa.query.filter(filtro_prefixo(Empresa, 'MERCADO apura'))
+            assert [e.codigo for e in query] == ['BUS2']
+            plano = db.session.execute(db.text(
+                'EXPLAIN QUERY PLAN ' + str(query.statement.compile(compile_kwargs={'literal_binds': True}))
+            )).all()
+            assert 'idx_empresa_nome_normalizado' in str(plano)
+
+    def test_filtrar_nome(self, app, base_busca):
+        """Trecho do nome sem acento, mesmo quando outra linha começa com o termo"""
+        with app.app_context():
+            assert [e.codigo for e in BuscaService.filtrar_nome(Empresa.query, Empresa, 'padaria')] == ['BUS1']
+            encontrados = BuscaService.filtrar_nome(Empresa.query, Empresa, 'apuracao').order_by(Empresa.codigo)
+            assert [e.codigo for e in encontrados] == ['BUS1', 'BUS2']
+
+            db.session.add(Empresa(codigo='BUS6', nome='Nova Padaria', ativo=True))
+            db.session.commit()
+            encontrados = BuscaService.filtrar_nome(Empresa.query, Empresa, 'PADARIA').order_by(Empresa.codigo)
+            assert [e.codigo for e in encontrados] == ['BUS1', 'BUS6']
+
+
+class TestEndpointsBusca:
+    """/api/search e /api/search-simple sobre o índice"""
+
+    def test_search_mantem_formato(self, client, base_busca):
+        """Resposta paginada no mesmo formato, ordenada por relevância"""
+        dados = client.get('/api/search/empresas?q=apura&limit=1').get_json()
+        assert dados['success'] is True
+        assert dados['total'] == 2
+        assert dados['total_pages'] == 2
+        assert dados['has_next'] is True
+        assert dados['results'][0]['nome'] == 'Mercado Apuração'
+        assert dados['results'][0]['descricao'] == 'Código: BUS2'
+
+        dados = client.get('/api/search/tarefas?q=bancaria').get_json()
+        assert [r['nome'] for r in dados['results']] == ['BUS Fechamento']
+
+    def test_api_v1_sem_acento(self, client, base_busca):
+        """Listagem da API v1 casa 'apuracao' com 'Apuração'"""
+        with client.application.app_context():
+            admin_id = Usuario.query.filter_by(login='admin').one().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+        dados = client.get('/api/v1/empresas?q=mercado apuracao').get_json()
+        assert [e['nome'] for e in dados['data']] == ['Mercado Apuração']
+
+    def test_search_simple(self, client, base_busca):
+        """Versão simples usa o mesmo índice"""
+        dados = client.get('/api/search-simple/empresas?q=auro').get_json()
+        assert dados['success'] is True
+        assert [r['codigo'] for r in dados['results']] == ['BUS3']
+        dados = client.get('/api/search-simple/colaboradores?q=gere').get_json()
+        assert [r['nome'] for r in dados['results']] == ['Gerente Test']
@@ -0,0 +1,214 @@
+"""
+Testes para o cache da API v1 com invalidação por tags e o GET condicional
+"""
+
+from datetime import date
+
+import pytest
+from sqlalchemy import update
+from app.db import db
+from app.models import Empresa, Tarefa, Periodo, RelacionamentoTarefa, ResumoStatusPeriodo, Setor, Usuario
+from app.services.cache_service import CacheService, tag_empresa
+
+
+@pytest.fixture
+def base_cache(app):
+    """Empresas e tarefa com prefixo CAC, vinculadas ao gerente"""
+    with app.app_context():
+        gerente = Usuario.query.filter_by(login='gerente').one()
+        empresas = [Empresa(codigo=f'CAC{i}', nome=f'CAC Empresa {i}', ativo=True) for i in (1, 2)]
+        tarefa = Tarefa(nome='CAC Apuração', tipo='Mensal', setor_id=gerente.setor_id)
+        db.session.add_all([*empresas, tarefa])
+        db.session.flush()
+        db.session.add(RelacionamentoTarefa(
+            empresa_id=empresas[0].id, tarefa_id=tarefa.id, responsavel_id=gerente.id
+        ))
+        db.session.commit()
+    yield
+    with app.app_context():
+        ids = [e.id for e in Empresa.query.filter(Empresa.codigo.like('CAC%'))]
+        relacionamentos = db.session.query(RelacionamentoTarefa.id).filter(RelacionamentoTarefa.empresa_id.in_(ids))
+        Periodo.query.filter(Periodo.relacionamento_tarefa_id.in_(relacionamentos)).delete(synchronize_session=False)
+        ResumoStatusPeriodo.query.filter(ResumoStatusPeriodo.empresa_id.in_(ids)).delete(synchronize_session=False)
+        RelacionamentoTarefa.query.filter(RelacionamentoTarefa.empresa_id.in_(ids)).delete(synchronize_session=False)
+        Empresa.query.filter(Empresa.id.in_(ids)).delete(synchronize_session=False)
+        Tarefa.query.filter(Tarefa.nome.like('CAC %')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _login(client, login):
+    with client.application.app_context():
+        user_id = Usuario.query.filter_by(login=login).one().id
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+
+
+def _nomes(client, url):
+    return [item['nome'] for item in client.get(url).get_json()['data']]
+
+
+class TestCacheService:
+    """Testes para CacheService"""
+
+    def test_tags_e_estatisticas(self, app, cache_simples):
+        """Entrada vale até uma das tags mudar; tag removida do cache também invalida"""
+        with app.app_context():
+            versoes = CacheService.versoes('a', 'b')
+            CacheService.gravar('chave', {'x': 1}, versoes)
+            assert CacheService.obter('teste', 'chave') == {'x': 1}
+
+            CacheService.invalidar('c')
+            assert CacheService.obter('teste', 'chave') == {'x': 1}
+            CacheService.invalidar('b')
+            assert CacheService.obter('teste', 'chave') is None
+
+            CacheService.gravar('chave', {'x': 2}, CacheService.versoes('a'))
+            cache_simples.delete('tag:versao:a')
+            assert CacheService.obter('teste', 'chave') is None
+
+            assert CacheService.estatisticas() == {'teste': {'hits': 2, 'misses': 2, 'taxa_acerto': 0.5}}
+
+    def test_sem_cache_configurado(self, app):
+        """Com o NullCache dos testes nada é gravado e tudo conta como falha"""
+        with app.app_context():
+            app.extensions['cache_tags'].zerar()
+            assert CacheService.versoes('a') == {}
+            CacheService.gravar('chave', 1, {'a': 'x'})
+            assert CacheService.obter('teste', 'chave') is None
+            assert CacheService.estatisticas()['teste']['misses'] == 1
+
+
+class TestInvalidacaoApiV1:
+    """Escritas trocam só as tags afetadas"""
+
+    def test_concluir_tarefa_nao_limpa_cache(self, client, cache_simples, base_cache):
+        """Mudança de status do período não invalida as listagens"""
+        _login(client, 'admin')
+        with client.application.app_context():
+            relacionamento = RelacionamentoTarefa.query.join(Empresa).filter(Empresa.codigo == 'CAC1').one()
+            periodo = Periodo(
+                relacionamento_tarefa_id=relacionamento.id, inicio=date(2024, 1, 1), fim=date(2024, 1, 31),
+                periodo_label='2024-01', status='pendente'
+            )
+            db.session.add(periodo)
+            db.session.commit()
+            periodo_id = periodo.id
+
+        client.get('/api/v1/empresas?q=CAC')
+        client.get('/api/v1/tarefas')
+        client.post('/api/dashboard/concluir-tarefa', json={'periodo_id': periodo_id})
+        client.get('/api/v1/empresas?q=CAC')
+        client.get('/api/v1/tarefas')
+
+        estatisticas = client.get('/api/v1/cache/estatisticas').get_json()['data']
+        assert estatisticas['empresas']['hits'] == 1
+        assert estatisticas['tarefas']['hits'] == 1
+
+    def test_escrita_invalida_so_o_afetado(self, app, client, cache_simples, base_cache):
+        """Renomear empresa invalida as listagens de empresas, não as de tarefas"""
+        _login(client, 'admin')
+        assert _nomes(client, '/api/v1/empresas?q=CAC') == ['CAC Empresa 1', 'CAC Empresa 2']
+        client.get('/api/v1/tarefas')
+
+        with app.app_context():
+            empresa = Empresa.query.filter_by(codigo='CAC2').one()
+            empresa.nome = 'CAC Empresa 0'
+            db.session.commit()
+            empresa_id = empresa.id
+
+        assert _nomes(client, '/api/v1/empresas?q=CAC') == ['CAC Empresa 0', 'CAC Empresa 1']
+        client.get('/api/v1/tarefas')
+        estatisticas = app.extensions['cache_tags'].resumo()
+        assert estatisticas['empresas'] == {'hits': 0, 'misses': 2, 'taxa_acerto': 0.0}
+        assert estatisticas['tarefas']['hits'] == 1
+
+        with app.app_context():
+            versao = CacheService.versoes(tag_empresa(empresa_id))
+            db.session.execute(update(Empresa).where(Empresa.codigo == 'CAC1').values(ativo=False))
+            db.session.commit()
+            assert CacheService.versoes(tag_empresa(empresa_id)) == versao
+        assert _nomes(client, '/api/v1/empresas?q=CAC&ativo=1') == ['CAC Empresa 0']
+
+    def test_escopo_do_gerente(self, app, client, cache_simples, base_cache):
+        """Novo vínculo do gerente aparece; tarefa de outro setor não afeta a lista dele"""
+        _login(client, 'gerente')
+        assert _nomes(client, '/api/v1/empresas') == ['CAC Empresa 1']
+        assert _nomes(client, '/api/v1/tarefas') == ['CAC Apuração']
+
+        with app.app_context():
+            contabil = Setor.query.filter_by(nome='Contábil').one()
+            db.session.add(Tarefa(nome='CAC Balanço', tipo='Anual', setor_id=contabil.id))
+            db.session.commit()
+        assert _nomes(client, '/api/v1/tarefas') == ['CAC Apuração']
+        assert app.extensions['cache_tags'].resumo()['tarefas']['hits'] == 1
+
+        with app.app_context():
+            gerente = Usuario.query.filter_by(login='gerente').one()
+            empresa = Empresa.query.filter_by(codigo='CAC2').one()
+            tarefa = Tarefa.query.filter_by(nome='CAC Apuração').one()
+            db.session.add(RelacionamentoTarefa(
+                empresa_id=empresa.id, tarefa_id=tarefa.id, responsavel_id=gerente.id
+            ))
+            db.session.commit()
+        assert _nomes(client, '/api/v1/empresas') == ['CAC Empresa 1', 'CAC Empresa 2']
+
+
+class TestGetCondicional:
+    """ETag fraco e 304 nas listagens e resumos"""
+
+    def test_api_v1_responde_304(self, app, client, cache_simples, base_cache):
+        """Mesma versão devolve 304 sem corpo; escrita no item gera novo ETag"""
+        _login(client, 'admin')
+        resposta = client.get('/api/v1/empresas?q=CAC')
+        etag = resposta.headers['ETag']
+        assert etag.startswith('W/"')
+        assert resposta.headers['Cache-Control'] == 'private, no-cache'
+
+        resposta = client.get('/api/v1/empresas?q=CAC', headers={'If-None-Match': etag})
+        assert resposta.status_code == 304
+        assert resposta.data == b''
+        assert resposta.headers['ETag'] == etag
+
+        with app.app_context():
+            Empresa.query.filter_by(codigo='CAC1').one().codigo = 'CAC1A'
+            db.session.commit()
+        resposta = client.get('/api/v1/empresas?q=CAC', headers={'If-None-Match': etag})
+        assert resposta.status_code == 200
+        assert resposta.headers['ETag'] != etag
+
+    def test_resumo_por_periodo(self, app, client, cache_simples, base_cache):
+        """Conclusão no ano do período troca o ETag; escrita em outro ano não"""
+        with app.app_context():
+            relacionamento = RelacionamentoTarefa.query.join(Empresa).filter(Empresa.codigo == 'CAC1').one()
+            periodos = [
+                Periodo(relacionamento_tarefa_id=relacionamento.id, inicio=date(ano, 1, 1), fim=date(ano, 1, 31),
+                        periodo_label=f'{ano}-01', status='pendente')
+                for ano in (2023, 2024)
+            ]
+            db.session.add_all(periodos)
+            db.session.commit()
+            antigo_id, periodo_id = (p.id for p in periodos)
+
+        _login(client, 'gerente')
+        url = '/gerenciamento/api/resumo?periodo=01/2024'
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+        with app.app_context():
+            db.session.get(Periodo, antigo_id).status = 'concluida'
+            db.session.commit()
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+        client.post('/api/dashboard/concluir-tarefa', json={'periodo_id': periodo_id})
+        resposta = client.get(url, headers={'If-None-Match': etag})
+        assert resposta.status_code == 200
+        assert resposta.get_json()['resumo']['concluidas'] == 1
+
+    def test_politica_por_endpoint_e_sem_cache(self, app, client, monkeypatch):
+        """Cache-Control configurável por endpoint; sem backend de cache não há ETag"""
+        monkeypatch.setitem(app.config, 'CACHE_CONTROL_ENDPOINTS', {'api_v1.list_tarefas': 'private, max-age=30'})
+        _login(client, 'admin')
+        resposta = client.get('/api/v1/tarefas')
+        assert resposta.headers['Cache-Control'] == 'private, max-age=30'
+        assert 'ETag' not in resposta.headers
+        assert client.get('/api/dashboard/resumo?periodo=01/2024').headers['Cache-Control'] == 'private, no-cache'
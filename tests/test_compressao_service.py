@@ -0,0 +1,82 @@
+"""
+Testes para a compressão das respostas e os estáticos versionados
+"""
+
+import gzip
+import shutil
+
+import pytest
+from flask import url_for
+from app.services import compressao_service
+from app.services.compressao_service import CompressaoService
+
+
+@pytest.fixture
+def static_compilado(app, tmp_path, monkeypatch):
+    """Cópia do static compilada em um diretório temporário"""
+    pasta = tmp_path / 'static'
+    shutil.copytree(app.static_folder, pasta, ignore=shutil.ignore_patterns('dist', 'dist.tmp'))
+    manifesto = CompressaoService.compilar_estaticos(str(pasta))
+    monkeypatch.setattr(app, 'static_folder', str(pasta))
+    monkeypatch.setitem(app.extensions, 'estaticos', manifesto)
+    return pasta
+
+
+class TestCompressaoRespostas:
+    """Compressão negociada pelo Accept-Encoding"""
+
+    def test_json_comprimido(self, client, monkeypatch):
+        """JSON acima do mínimo vai em gzip; sem Accept-Encoding vai puro"""
+        monkeypatch.setitem(client.application.config, 'COMPRESSAO_MINIMO', 50)
+        puro = client.get('/api/search-simple/setores?q=')
+        assert 'Content-Encoding' not in puro.headers
+        assert 'Accept-Encoding' in puro.headers['Vary']
+
+        resposta = client.get('/api/search-simple/setores?q=', headers={'Accept-Encoding': 'gzip, deflate'})
+        assert resposta.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(resposta.data) == puro.data
+        assert int(resposta.headers['Content-Length']) == len(resposta.data)
+
+    def test_minimo_e_brotli_indisponivel(self, client, monkeypatch):
+        """Resposta pequena não é comprimida; sem o pacote brotli, 'br' cai para gzip"""
+        assert 'Content-Encoding' not in client.get('/health', headers={'Accept-Encoding': 'gzip'}).headers
+
+        monkeypatch.setattr(compressao_service, 'brotli', None)
+        monkeypatch.setitem(client.application.config, 'COMPRESSAO_MINIMO', 50)
+        resposta = client.get('/api/search-simple/setores?q=', headers={'Accept-Encoding': 'br, gzip;q=0.5'})
+        assert resposta.headers['Content-Encoding'] == 'gzip'
+        resposta = client.get('/api/search-simple/setores?q=', headers={'Accept-Encoding': 'br'})
+        assert 'Content-Encoding' not in resposta.headers
+
+
+class TestEstaticosVersionados:
+    """static/dist com hash no nome e versões pré-comprimidas"""
+
+    def test_compilar(self, static_compilado):
+        """Manifesto aponta para cópias com hash; texto grande ganha .gz"""
+        manifesto = CompressaoService.carregar_manifesto(str(static_compilado))
+        versionado = manifesto['script.js']
+        assert versionado.startswith('dist/script.') and versionado.endswith('.js')
+        original = (static_compilado / 'script.js').read_bytes()
+        assert (static_compilado / versionado).read_bytes() == original
+        assert gzip.decompress((static_compilado / (versionado + '.gz')).read_bytes()) == original
+        assert not (static_compilado / (manifesto['logo.png'] + '.gz')).exists()
+
+    def test_url_e_servico(self, app, client, static_compilado):
+        """url_for usa o nome versionado, servido pré-comprimido e com cache longo"""
+        with app.test_request_context():
+            url = url_for('static', filename='script.js')
+        assert url.startswith('/static/dist/script.')
+
+        resposta = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert resposta.status_code == 200
+        assert resposta.headers['Content-Encoding'] == 'gzip'
+        assert resposta.mimetype == 'text/javascript'
+        assert 'immutable' in resposta.headers['Cache-Control']
+        assert gzip.decompress(resposta.data) == (static_compilado / 'script.js').read_bytes()
+        resposta.close()
+
+        resposta = client.get(url)
+        assert 'Content-Encoding' not in resposta.headers
+        assert resposta.data == (static_compilado / 'script.js').read_bytes()
+        resposta.close()
@@ -0,0 +1,103 @@
+"""
+Testes para o usuário logado em cache e o decorator de perfil
+"""
+
+import pytest
+from sqlalchemy import event, update
+from app.db import db
+from app.models import Usuario
+from app.services.identidade_service import IdentidadeService
+
+
+def _login(client, login):
+    with client.application.app_context():
+        usuario = Usuario.query.filter_by(login=login).one()
+        user_id, tipo = usuario.id, usuario.tipo
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_tipo'] = tipo
+    return user_id
+
+
+@pytest.fixture
+def consultas_usuarios(app):
+    """SELECTs na tabela de usuários durante o teste"""
+    consultas = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'FROM usuarios' in statement:
+            consultas.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', registrar)
+    yield consultas
+    event.remove(engine, 'before_cursor_execute', registrar)
+
+
+@pytest.fixture
+def colaborador_restaurado(app):
+    """Devolve o colaborador ao estado original ao final"""
+    yield
+    with app.app_context():
+        db.session.execute(
+            update(Usuario).where(Usuario.login == 'colaborador').values(ativo=True, nome='Colaborador Test')
+        )
+        db.session.commit()
+
+
+class TestIdentidadeService:
+    """Testes para IdentidadeService"""
+
+    def test_usuario_em_cache_entre_requisicoes(self, client, consultas_usuarios):
+        """Depois da primeira requisição o usuário vem do cache"""
+        _login(client, 'gerente')
+        client.get('/api/v1/empresas')
+        consultas_usuarios.clear()
+        assert client.get('/api/v1/empresas').status_code == 200
+        assert client.get('/gerenciamento/api/setores').status_code == 200
+        assert consultas_usuarios == []
+
+    def test_alteracao_descarta_cache(self, app, colaborador_restaurado):
+        """Commit de alteração no usuário (ORM ou em massa) descarta a entrada"""
+        with app.app_context():
+            usuario = Usuario.query.filter_by(login='colaborador').one()
+            assert IdentidadeService.obter(usuario.id).nome == 'Colaborador Test'
+
+            usuario.nome = 'Colaborador Renomeado'
+            db.session.commit()
+            assert IdentidadeService.obter(usuario.id).nome == 'Colaborador Renomeado'
+
+            db.session.execute(update(Usuario).where(Usuario.id == usuario.id).values(ativo=False))
+            db.session.commit()
+            assert IdentidadeService.obter(usuario.id).ativo is False
+
+    def test_toggle_user_bloqueia_sessao(self, client, colaborador_restaurado):
+        """Usuário desativado pelo admin perde o acesso na requisição seguinte"""
+        colaborador_id = _login(client, 'colaborador')
+        assert client.get('/api/v1/empresas').status_code == 200
+
+        _login(client, 'admin')
+        client.post(f'/admin/usuarios/{colaborador_id}/toggle')
+
+        _login(client, 'colaborador')
+        assert client.get('/api/v1/empresas').status_code == 401
+
+
+class TestRequerPerfil:
+    """Decorator de perfil nos blueprints"""
+
+    def test_perfis(self, client):
+        """API responde 401/403; páginas redirecionam"""
+        assert client.get('/supervisor/api/empresas').status_code == 401
+
+        _login(client, 'gerente')
+        resposta = client.get('/supervisor/api/empresas')
+        assert resposta.status_code == 403
+        assert resposta.get_json() == {'success': False, 'message': 'Acesso negado'}
+        assert client.get('/supervisor/').headers['Location'].endswith('/login')
+        assert client.get('/admin/').headers['Location'].endswith('/dashboard')
+        assert client.get('/gerenciamento/api/usuarios-busca').status_code == 200
+
+        _login(client, 'admin')
+        assert client.get('/admin/').status_code == 200
@@ -0,0 +1,150 @@
+"""
+Testes para a importação de planilhas do admin
+"""
+
+import io
+
+import pytest
+from openpyxl import Workbook
+from app.db import db
+from app.models import Usuario, Setor, Empresa, Tributacao, Tarefa
+from app.services.importacao_service import ImportacaoService, PlanilhaInvalida
+
+
+def _planilha(*linhas):
+    workbook = Workbook()
+    for linha in linhas:
+        workbook.active.append(list(linha))
+    arquivo = io.BytesIO()
+    workbook.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+@pytest.fixture
+def limpeza(app):
+    """Remove o que os testes importarem (prefixo IMP)"""
+    yield
+    with app.app_context():
+        Usuario.query.filter(Usuario.login.like('imp.%')).delete(synchronize_session=False)
+        Empresa.query.filter(Empresa.codigo.like('IMP%')).delete(synchronize_session=False)
+        Tarefa.query.filter(Tarefa.nome.like('Imp %')).delete(synchronize_session=False)
+        Setor.query.filter(Setor.nome.like('Imp %')).delete(synchronize_session=False)
+        Tributacao.query.filter(Tributacao.nome.like('Imp %')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+class TestImportacaoService:
+    """Testes para ImportacaoService"""
+
+    def test_empresas_upsert_e_erros_por_linha(self, app, limpeza):
+        """Linhas válidas são gravadas; inválidas ficam no relatório"""
+        with app.app_context():
+            db.session.add(Empresa(codigo='IMP1', nome='Antiga', ativo=True))
+            db.session.commit()
+
+            arquivo = _planilha(
+                ('codigo', 'nome', 'tributacao'),
+                ('IMP1', 'Imp Renomeada', 'simples nacional'),
+                ('IMP2', 'Imp Nova', 'Imp Presumido'),
+                ('', 'Sem Código', None),
+                ('IMP2', 'Imp Repetida', None),
+                (3, 'Imp Numérica', None),
+            )
+            relatorio = ImportacaoService.importar_empresas(arquivo)
+
+            assert relatorio['total'] == 5
+            assert relatorio['criados'] == 2
+            assert relatorio['atualizados'] == 1
+            assert [erro['linha'] for erro in relatorio['erros']] == [4, 5]
+            assert relatorio['novas_tributacoes'] == ['Imp Presumido']
+
+            simples = Tributacao.query.filter_by(nome='Simples Nacional').one()
+            renomeada = Empresa.query.filter_by(codigo='IMP1').one()
+            assert renomeada.nome == 'Imp Renomeada'
+            assert renomeada.tributacao_id == simples.id
+            assert Empresa.query.filter_by(codigo='IMP2').one().tributacao.nome == 'Imp Presumido'
+            assert Empresa.query.filter_by(codigo='3').count() == 1
+
+    def test_usuarios_com_senha_em_hash(self, app, limpeza):
+        """Senhas de usuários novos e atualizados são gravadas em hash e o login funciona"""
+        from app.services.auth_service import AuthService
+        with app.app_context():
+            db.session.add(Usuario(nome='Imp Antigo', login='imp.antigo', senha='velha', tipo='normal', ativo=True))
+            db.session.commit()
+
+            arquivo = _planilha(
+                ('nome', 'login', 'senha', 'tipo', 'setor'),
+                ('Imp Novo', 'imp.novo', 'segredo1', 'normal', None),
+                ('Imp Antigo', 'imp.antigo', 'segredo2', 'gerente', None),
+            )
+            relatorio = ImportacaoService.importar_usuarios(arquivo)
+            assert (relatorio['criados'], relatorio['atualizados']) == (1, 1)
+
+            for login, senha in (('imp.novo', 'segredo1'), ('imp.antigo', 'segredo2')):
+                usuario = Usuario.query.filter_by(login=login).one()
+                assert usuario.senha.startswith('pbkdf2:')
+                assert AuthService.verificar_login(login, senha).id == usuario.id
+            assert AuthService.verificar_login('imp.antigo', 'velha') is None
+
+    def test_dry_run_nao_grava(self, app, limpeza):
+        """Simulação valida e conta, sem criar registros nem cadastros auxiliares"""
+        with app.app_context():
+            arquivo = _planilha(
+                ('nome', 'login', 'senha', 'tipo', 'setor'),
+                ('Imp Um', 'imp.um', '123', 'Gerente', 'Imp Setor'),
+                ('Imp Dois', 'imp.dois', '', 'normal', 'Fiscal'),
+                ('Imp Três', 'imp.tres', '123', 'chefe', None),
+            )
+            relatorio = ImportacaoService.importar_usuarios(arquivo, dry_run=True)
+
+            assert relatorio['dry_run'] is True
+            assert relatorio['criados'] == 1
+            assert {erro['linha'] for erro in relatorio['erros']} == {3, 4}
+            assert relatorio['novos_setores'] == ['Imp Setor']
+            assert Usuario.query.filter(Usuario.login.like('imp.%')).count() == 0
+            assert Setor.query.filter_by(nome='Imp Setor').count() == 0
+
+            arquivo.seek(0)
+            ImportacaoService.importar_usuarios(arquivo)
+            usuario = Usuario.query.filter_by(login='imp.um').one()
+            assert usuario.tipo == 'gerente'
+            assert usuario.setor_id == Setor.query.filter_by(nome='Imp Setor').one().id
+
+    def test_tarefas_e_colunas_obrigatorias(self, app, limpeza):
+        """Tipo é normalizado; planilha sem colunas obrigatórias é rejeitada"""
+        with app.app_context():
+            relatorio = ImportacaoService.importar_tarefas(_planilha(
+                ('nome', 'tipo', 'descricao', 'tributacao', 'setor'),
+                ('Imp Declaração', 'mensal', 'Desc', 'Regime Normal', 'fiscal'),
+                ('Imp Semanal', 'semanal', None, None, None),
+            ))
+            assert relatorio['criados'] == 1
+            tarefa = Tarefa.query.filter_by(nome='Imp Declaração').one()
+            assert tarefa.tipo == 'Mensal'
+            assert tarefa.setor_id == Setor.query.filter_by(nome='Fiscal').one().id
+
+            with pytest.raises(PlanilhaInvalida):
+                ImportacaoService.importar_tarefas(_planilha(('nome',), ('Imp X',)))
+
+
+class TestEndpointImportacao:
+    """POST /admin/import/*"""
+
+    def test_import_empresas_json(self, client, limpeza):
+        """Com Accept JSON o endpoint devolve o relatório"""
+        with client.application.app_context():
+            admin_id = Usuario.query.filter_by(login='admin').one().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+            sess['user_tipo'] = 'admin'
+        response = client.post(
+            '/admin/import/empresas',
+            data={'arquivo': (_planilha(('codigo', 'nome'), ('IMP9', 'Imp Nove')), 'empresas.xlsx'), 'dry_run': '1'},
+            headers={'Accept': 'application/json'},
+            content_type='multipart/form-data'
+        )
+        dados = response.get_json()
+        assert dados['success'] is True
+        assert dados['dry_run'] is True
+        assert dados['criados'] == 1
@@ -0,0 +1,211 @@
+"""
+Testes para a instrumentação SQL por requisição e a detecção de N+1
+"""
+
+import logging
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from app.db import db
+from app.models import Empresa, Tarefa, Periodo, RelacionamentoTarefa, Retificacao, Usuario
+from app.services import instrumentacao_service
+from app.services.instrumentacao_service import (
+    InstrumentacaoService, capturar_plano, formato_parametros, normalizar_sql
+)
+
+
+@pytest.fixture
+def periodo_retificado(app):
+    """Período com uma retificação de cada usuário de teste"""
+    with app.app_context():
+        empresa = Empresa(codigo='SQL1', nome='SQL Empresa', ativo=True)
+        tarefa = Tarefa(nome='SQL Apuração', tipo='Mensal')
+        db.session.add_all([empresa, tarefa])
+        db.session.flush()
+        relacionamento = RelacionamentoTarefa(empresa_id=empresa.id, tarefa_id=tarefa.id)
+        db.session.add(relacionamento)
+        db.session.flush()
+        periodo = Periodo(
+            relacionamento_tarefa_id=relacionamento.id, inicio=date(2025, 8, 1),
+            fim=date(2025, 8, 31), periodo_label='2025-08', contador_retificacoes=3,
+        )
+        db.session.add(periodo)
+        db.session.flush()
+        db.session.add_all([
+            Retificacao(periodo_id=periodo.id, usuario_id=usuario.id, motivo='SQL teste')
+            for usuario in Usuario.query.filter(Usuario.login.in_(['admin', 'gerente', 'colaborador']))
+        ])
+        db.session.commit()
+        periodo_id, tarefa_id = periodo.id, tarefa.id
+        db.session.expunge_all()
+        InstrumentacaoService.zerar()
+    yield periodo_id
+    with app.app_context():
+        Retificacao.query.filter_by(periodo_id=periodo_id).delete()
+        Periodo.query.filter_by(id=periodo_id).delete()
+        RelacionamentoTarefa.query.filter_by(tarefa_id=tarefa_id).delete()
+        Empresa.query.filter_by(codigo='SQL1').delete()
+        Tarefa.query.filter_by(id=tarefa_id).delete()
+        db.session.commit()
+
+
+def test_normalizar_sql():
+    """Valores e listas de parâmetros não mudam a forma da instrução"""
+    assert normalizar_sql("SELECT * FROM t1 WHERE id IN (?, ?, ?) AND nome = 'Ana'  LIMIT 10") == \
+        normalizar_sql("SELECT * FROM t1 WHERE id IN (?)\n AND nome = 'O''Brien' LIMIT 5") == \
+        'SELECT * FROM t1 WHERE id IN (?) AND nome = ? LIMIT ?'
+    assert normalizar_sql('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)') == 'INSERT INTO t (a, b) VALUES (?)'
+
+
+def test_formato_parametros():
+    """Só os tipos vão para o log, nunca os valores"""
+    assert formato_parametros((1, 'segredo', None)) == '(int, str, NoneType)'
+    assert formato_parametros({'id': 1}) == '{id: int}'
+    assert formato_parametros([(1, 'a'), (2, 'b')], executemany=True) == '2 x (int, str)'
+
+
+class TestInstrumentacaoRequisicao:
+    """Contagem por requisição, cabeçalhos e aviso de N+1"""
+
+    def test_cabecalhos_e_estatisticas(self, app, client, periodo_retificado):
+        resposta = client.get(f'/api/tarefas-auto/historico-retificacoes/{periodo_retificado}')
+        assert len(resposta.get_json()['historico']) == 3
+        assert int(resposta.headers['X-SQL-Consultas']) >= 5
+        assert float(resposta.headers['X-SQL-Tempo-Ms']) > 0
+        assert resposta.headers['X-SQL-Repetidas'] == '0'
+        assert resposta.headers['Server-Timing'].startswith('sql;dur=')
+
+        with app.app_context():
+            estatisticas = InstrumentacaoService.estatisticas()['tarefas_auto.historico_retificacoes']
+        assert estatisticas['requisicoes'] == 1
+        assert estatisticas['consultas'] == int(resposta.headers['X-SQL-Consultas'])
+        assert estatisticas['alertas_n1'] == 0
+
+    def test_aviso_n1(self, app, client, periodo_retificado, monkeypatch, caplog):
+        """Usuario.query.get no laço passa do limite: aviso com endpoint e linha"""
+        monkeypatch.setitem(app.config, 'SQL_N1_LIMITE', 2)
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            resposta = client.get(f'/api/tarefas-auto/historico-retificacoes/{periodo_retificado}')
+        assert resposta.headers['X-SQL-Repetidas'] == '1'
+
+        avisos = [r.getMessage() for r in caplog.records if 'N+1' in r.getMessage()]
+        assert len(avisos) == 1
+        assert 'tarefas_auto.historico_retificacoes' in avisos[0]
+        assert 'app/blueprints/tarefas_auto.py' in avisos[0]
+        assert 'FROM usuarios' in avisos[0]
+
+        with app.app_context():
+            estatisticas = InstrumentacaoService.estatisticas()['tarefas_auto.historico_retificacoes']
+        assert estatisticas['alertas_n1'] == 1
+        repetida = estatisticas['repetidas'][0]
+        assert repetida['max_execucoes'] == 3
+        assert repetida['origem'].startswith('app/blueprints/tarefas_auto.py:')
+
+    def test_endpoint_admin(self, app, client):
+        with app.app_context():
+            admin_id = Usuario.query.filter_by(login='admin').one().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+        client.get('/health')
+        dados = client.get('/api/v1/sql/estatisticas').get_json()
+        assert dados['success'] is True
+        assert dados['data']['health_check']['consultas'] >= 1
+
+
+class TestConsultasLentas:
+    """Log de consultas lentas com plano capturado"""
+
+    @pytest.fixture
+    def indice_retificacoes(self, app):
+        with app.app_context():
+            db.session.execute(text('CREATE INDEX idx_teste_retificacao_periodo ON retificacoes(periodo_id)'))
+            db.session.commit()
+            InstrumentacaoService.zerar_consultas_lentas()
+        yield
+        with app.app_context():
+            db.session.execute(text('DROP INDEX idx_teste_retificacao_periodo'))
+            db.session.commit()
+
+    def test_log_plano_e_indices(self, app, client, periodo_retificado, indice_retificacoes,
+                                 monkeypatch, caplog, tmp_path):
+        """Toda instrução acima do limite: forma, tipos, endpoint e EXPLAIN uma vez por forma"""
+        monkeypatch.setitem(app.config, 'SQL_LENTA_MS', 0.000001)
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            client.get(f'/api/tarefas-auto/historico-retificacoes/{periodo_retificado}')
+            client.get(f'/api/tarefas-auto/historico-retificacoes/{periodo_retificado}')
+
+        with app.app_context():
+            consultas = InstrumentacaoService.consultas_lentas()
+        retificacoes = [c for c in consultas if 'FROM retificacoes' in c['sql']]
+        assert len(retificacoes) == 1
+        consulta = retificacoes[0]
+        assert consulta['execucoes'] == 2
+        assert consulta['endpoints'] == {'tarefas_auto.historico_retificacoes': 2}
+        assert consulta['parametros'] == '(int)'
+        assert any('idx_teste_retificacao_periodo' in linha for linha in consulta['plano'])
+
+        avisos = [r.getMessage() for r in caplog.records if r.getMessage().startswith('Consulta lenta')]
+        com_plano = [a for a in avisos if 'FROM retificacoes' in a and 'idx_teste_retificacao_periodo' in a]
+        assert len(com_plano) == 1
+        assert str(periodo_retificado) not in avisos[0].split('|')[1]
+
+        script = tmp_path / 'indices.sql'
+        script.write_text(
+            'CREATE INDEX idx_teste_retificacao_periodo\nON retificacoes(periodo_id);\n'
+            'CREATE INDEX idx_nao_usado ON empresas(nome, id);\n', encoding='utf-8'
+        )
+        with app.app_context():
+            indices = InstrumentacaoService.uso_indices(consultas, str(script))
+        assert [(i['nome'], i['colunas'], i['consultas']) for i in indices] == [
+            ('idx_teste_retificacao_periodo', 'periodo_id', 1), ('idx_nao_usado', 'nome, id', 0),
+        ]
+
+    def test_streaming_nao_perde_linhas(self, app, periodo_retificado, indice_retificacoes, monkeypatch):
+        """Com yield_per o EXPLAIN não roda na conexão do cursor aberto; fica para a próxima execução"""
+        monkeypatch.setitem(app.config, 'SQL_LENTA_MS', 0.000001)
+        consulta = select(Retificacao).where(Retificacao.periodo_id == periodo_retificado).order_by(Retificacao.id)
+        with app.app_context():
+            lidas = [r.motivo for r in db.session.scalars(consulta.execution_options(yield_per=1))]
+            assert lidas == ['SQL teste'] * 3
+            lentas = [c for c in InstrumentacaoService.consultas_lentas() if 'FROM retificacoes' in c['sql']]
+            assert lentas[0]['plano'] is None and lentas[0]['plano_capturado'] is False
+
+            assert len(db.session.scalars(consulta).all()) == 3
+            lentas = [c for c in InstrumentacaoService.consultas_lentas() if 'FROM retificacoes' in c['sql']]
+            assert lentas[0]['execucoes'] == 2
+            assert any('idx_teste_retificacao_periodo' in linha for linha in lentas[0]['plano'])
+
+    def test_plano_em_conexao_separada(self, tmp_path):
+        """Com pool de verdade o EXPLAIN usa um pool próprio e o resultado em leitura segue intacto"""
+        motor = create_engine(f"sqlite:///{tmp_path / 'plano.db'}")
+        with motor.begin() as conexao:
+            conexao.exec_driver_sql('CREATE TABLE t (id INTEGER PRIMARY KEY, nome TEXT)')
+            conexao.exec_driver_sql("INSERT INTO t (nome) VALUES ('a'), ('b'), ('c')")
+        with motor.connect() as conexao:
+            resultado = conexao.execution_options(stream_results=True).exec_driver_sql('SELECT id FROM t')
+            primeira = resultado.fetchone()
+            plano = capturar_plano(conexao, resultado.cursor, 'SELECT nome FROM t WHERE id = ?', (1,))
+            restantes = resultado.fetchall()
+        assert [primeira[0]] + [linha[0] for linha in restantes] == [1, 2, 3]
+        assert plano and 'USING INTEGER PRIMARY KEY' in plano[0]
+        assert instrumentacao_service._POOLS_PLANO[motor.pool].checkedin() == 1
+        motor.dispose()
+
+    def test_pagina_admin(self, app, client, monkeypatch):
+        with app.app_context():
+            admin_id = Usuario.query.filter_by(login='admin').one().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+        monkeypatch.setitem(app.config, 'SQL_LENTA_MS', 0.000001)
+        client.get('/health')
+        resposta = client.get('/admin/consultas-lentas')
+        assert resposta.status_code == 200
+        html = resposta.get_data(as_text=True)
+        assert 'Consultas Lentas' in html
+        assert 'idx_periodo_label_status' in html
+
+        resposta = client.post('/admin/consultas-lentas/zerar')
+        assert resposta.status_code == 302
+        with app.app_context():
+            assert InstrumentacaoService.consultas_lentas() == []
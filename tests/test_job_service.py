@@ -0,0 +1,212 @@
+"""
+Testes para a fila de jobs em segundo plano
+"""
+
+import io
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from openpyxl import Workbook
+from app.db import db
+from app.models import Job, Empresa, Usuario
+from app.services import job_service
+from app.services.job_service import JobService, registrar_tipo, TIPOS_JOB
+
+
+@pytest.fixture
+def fila(app, tmp_path, monkeypatch):
+    """Pasta de artefatos temporária e fila limpa ao final"""
+    monkeypatch.setitem(app.config, 'JOBS_DIR', str(tmp_path))
+    yield tmp_path
+    with app.app_context():
+        Job.query.delete()
+        Empresa.query.filter(Empresa.codigo.like('JOB%')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@registrar_tipo('teste.instavel')
+def _job_instavel(contexto, falhas):
+    """Falha nas primeiras `falhas` tentativas"""
+    job = db.session.get(Job, contexto.job_id)
+    if job.tentativas <= falhas:
+        raise RuntimeError(f'falha {job.tentativas}')
+    contexto.progresso(50, 'metade')
+    caminho = contexto.caminho('saida.txt')
+    with open(caminho, 'w') as arquivo:
+        arquivo.write('ok')
+    return dict(contexto.artefato(caminho, 'saida.txt', 'text/plain'), tentativas=job.tentativas)
+
+
+@registrar_tipo('teste.demorado')
+def _job_demorado(contexto, segundos, timeout):
+    """Fica `segundos` sem chamar progresso e tenta recuperar jobs travados no fim"""
+    time.sleep(segundos)
+    return {'recuperados': JobService.recuperar_travados(timeout=timeout)}
+
+
+class TestJobService:
+    """Testes para JobService"""
+
+    def test_reserva_e_conclusao_com_artefato(self, app, fila):
+        """Job concluído guarda resultado, progresso e arquivo"""
+        with app.app_context():
+            job_id = JobService.enfileirar('teste.instavel', {'falhas': 0}).id
+            assert JobService.processar_pendentes('teste') == 1
+            assert JobService.reservar('teste') is None
+
+            job = db.session.get(Job, job_id)
+            assert job.status == 'concluida'
+            assert job.progresso == 100
+            assert job.resultado == {'tentativas': 1}
+            assert job.nome_arquivo == 'saida.txt'
+            assert open(job.arquivo).read() == 'ok'
+
+    def test_retry_com_backoff(self, app, fila):
+        """Falhas reagendam com espera crescente até esgotar as tentativas"""
+        with app.app_context():
+            job_id = JobService.enfileirar('teste.instavel', {'falhas': 5}, max_tentativas=2).id
+
+            assert JobService.processar_pendentes('teste') == 1
+            job = db.session.get(Job, job_id)
+            assert job.status == 'pendente'
+            assert job.proxima_execucao > datetime.now()
+            # Ainda em backoff: nada a executar
+            assert JobService.processar_pendentes('teste') == 0
+
+            job.proxima_execucao = datetime.now() - timedelta(seconds=1)
+            db.session.commit()
+            JobService.processar_pendentes('teste')
+            job = db.session.get(Job, job_id)
+            assert job.status == 'falhou'
+            assert job.tentativas == 2
+            assert 'falha 2' in job.erro
+
+    def test_recuperar_travados(self, app, fila):
+        """Job em andamento sem atualização volta para a fila"""
+        with app.app_context():
+            job = JobService.enfileirar('teste.instavel', {'falhas': 0})
+            JobService.reservar('morto')
+            db.session.refresh(job)
+            job.atualizado_em = datetime.now() - timedelta(hours=2)
+            db.session.commit()
+
+            assert JobService.recuperar_travados(timeout=60) == 1
+            assert db.session.get(Job, job.id).status == 'pendente'
+
+    def test_travado_sem_tentativas_falha(self, app, fila):
+        """Abandonado na última tentativa não volta para a fila"""
+        with app.app_context():
+            job = JobService.enfileirar('teste.instavel', {'falhas': 0}, max_tentativas=1)
+            JobService.reservar('morto')
+            db.session.refresh(job)
+            job.atualizado_em = datetime.now() - timedelta(hours=2)
+            db.session.commit()
+
+            assert JobService.recuperar_travados(timeout=60) == 0
+            job = db.session.get(Job, job.id)
+            assert job.status == 'falhou'
+            assert job.worker is None
+            assert JobService.reservar('teste') is None
+
+    def test_batimento_mantem_job_longo(self, app, fila, monkeypatch):
+        """Job saudável sem progresso por mais que o timeout não é retomado por outro worker"""
+        monkeypatch.setattr(job_service, 'INTERVALO_BATIMENTO_SEGUNDOS', 0.05)
+        with app.app_context():
+            job_id = JobService.enfileirar('teste.demorado', {'segundos': 0.5, 'timeout': 0.25}).id
+            assert JobService.processar_pendentes('teste') == 1
+            job = db.session.get(Job, job_id)
+            assert job.status == 'concluida'
+            assert job.resultado == {'recuperados': 0}
+            assert job.tentativas == 1
+
+    def test_tipos_registrados(self):
+        """Os fluxos assíncronos têm executores registrados"""
+        for tipo in ('periodos.gerar', 'importacao.empresas', 'relatorios.pdf', 'tributacao.migrar'):
+            assert tipo in TIPOS_JOB
+
+
+class TestEndpointsAssincronos:
+    """Modo async dos endpoints e /api/jobs/<id>"""
+
+    def test_importacao_assincrona(self, app, client, runner, fila):
+        """Importação agendada roda no worker e o status é consultável"""
+        workbook = Workbook()
+        workbook.active.append(['codigo', 'nome'])
+        workbook.active.append(['JOB1', 'Empresa do Job'])
+        planilha = io.BytesIO()
+        workbook.save(planilha)
+        planilha.seek(0)
+
+        with app.app_context():
+            admin_id = Usuario.query.filter_by(login='admin').one().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+            sess['user_tipo'] = 'admin'
+        response = client.post(
+            '/admin/import/empresas',
+            data={'arquivo': (planilha, 'empresas.xlsx'), 'async': '1'},
+            headers={'Accept': 'application/json'},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+        assert client.get(f'/api/jobs/{job_id}').get_json()['job']['status'] == 'pendente'
+
+        result = runner.invoke(args=['jobs', 'worker', '--uma-vez'])
+        assert '1 jobs executados' in result.output
+
+        dados = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        assert dados['status'] == 'concluida'
+        assert dados['resultado']['criados'] == 1
+        with app.app_context():
+            assert Empresa.query.filter_by(codigo='JOB1').count() == 1
+
+    def test_pdf_assincrono(self, app, client, fila):
+        """PDF gerado pelo job fica disponível para download"""
+        with app.app_context():
+            gerente_id = Usuario.query.filter_by(login='gerente').one().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = gerente_id
+        response = client.get('/relatorios/pdf?async=1')
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        with app.app_context():
+            JobService.processar_pendentes('teste')
+
+        dados = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        assert dados['status'] == 'concluida'
+        arquivo = client.get(dados['arquivo_url'])
+        assert arquivo.status_code == 200
+        assert arquivo.get_data().startswith(b'%PDF')
+        arquivo.close()
+
+    def test_job_de_outro_usuario(self, app, client, fila):
+        """Só o dono (ou admin) acompanha o job"""
+        with app.app_context():
+            dono = Usuario.query.filter_by(login='gerente').first().id
+            outro = Usuario.query.filter_by(login='colaborador').first().id
+            job_id = JobService.enfileirar('teste.instavel', {'falhas': 0}, usuario_id=dono).id
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = outro
+            sess['user_tipo'] = 'normal'
+        assert client.get(f'/api/jobs/{job_id}').status_code == 403
+        assert client.get('/api/jobs/999999').status_code == 404
+
+    def test_job_sem_dono(self, app, client, fila):
+        """Job sem criado_por (CLI, sistema) só é visível para admin"""
+        with app.app_context():
+            colaborador = Usuario.query.filter_by(login='colaborador').first().id
+            admin = Usuario.query.filter_by(login='admin').first().id
+            job_id = JobService.enfileirar('teste.instavel', {'falhas': 0}).id
+
+        assert client.get(f'/api/jobs/{job_id}').status_code == 401
+        with client.session_transaction() as sess:
+            sess['user_id'] = colaborador
+        assert client.get(f'/api/jobs/{job_id}').status_code == 403
+        assert client.get(f'/api/jobs/{job_id}/arquivo').status_code == 403
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin
+        assert client.get(f'/api/jobs/{job_id}').status_code == 200
@@ -0,0 +1,68 @@
+"""
+Testes para o provider JSON (orjson com fallback para a stdlib)
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import select
+from app.db import db
+from app.json_provider import JSONProviderRapido
+from app.models import Usuario
+from app.services.referencia_service import SetorRef
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def provider(request):
+    aplicacao = Flask(__name__)
+    aplicacao.config['JSON_BACKEND'] = request.param
+    aplicacao.json = JSONProviderRapido(aplicacao)
+    yield aplicacao.json
+
+
+class TestJSONProviderRapido:
+    """Testes para JSONProviderRapido"""
+
+    def test_tipos_extras(self, provider):
+        """Datas em ISO 8601, Decimal como string, namedtuple como lista"""
+        dados = {
+            'data': date(2025, 8, 31),
+            'momento': datetime(2025, 8, 31, 14, 5),
+            'valor': Decimal('10.50'),
+            'setor': SetorRef(1, 'Fiscal'),
+            'nome': 'Apuração',
+        }
+        assert json.loads(provider.dumps(dados)) == {
+            'data': '2025-08-31',
+            'momento': '2025-08-31T14:05:00',
+            'valor': '10.50',
+            'setor': [1, 'Fiscal'],
+            'nome': 'Apuração',
+        }
+
+    def test_response_compacta(self, provider):
+        """Resposta compacta, ordenada e com a mesma saída nos dois backends"""
+        resposta = provider.response({'b': 1, 'a': [date(2025, 1, 2)]})
+        assert resposta.mimetype == 'application/json'
+        assert resposta.get_data() == b'{"a":["2025-01-02"],"b":1}\n'
+
+    def test_backend_invalido(self):
+        aplicacao = Flask(__name__)
+        aplicacao.config['JSON_BACKEND'] = 'ujson'
+        with pytest.raises(ValueError):
+            JSONProviderRapido(aplicacao)
+
+
+def test_jsonify_row_do_sqlalchemy(app):
+    """Linhas de consulta vão direto para o jsonify como objetos"""
+    with app.test_request_context():
+        linhas = db.session.execute(
+            select(Usuario.login, Usuario.tipo).where(Usuario.login.in_(['admin', 'gerente'])).order_by(Usuario.login)
+        ).all()
+        assert jsonify(usuarios=linhas).get_json() == {
+            'usuarios': [{'login': 'admin', 'tipo': 'admin'}, {'login': 'gerente', 'tipo': 'gerente'}]
+        }
+        assert jsonify(linhas[0]._mapping).get_json() == {'login': 'admin', 'tipo': 'admin'}
@@ -0,0 +1,107 @@
+"""
+Testes para as métricas no formato do Prometheus (/metrics)
+"""
+
+import threading
+
+import pytest
+from waitress import create_server
+from app.services.metricas_service import Contador, Histograma, MetricasService, endereco_permitido
+
+
+@pytest.fixture
+def metricas(app):
+    """Registro de métricas limpo para o teste"""
+    registro = app.extensions['metricas']
+    registro.zerar()
+    app.extensions['cache_tags'].zerar()
+    yield registro
+    registro.despachante_waitress = None
+
+
+def _linhas(client, **kwargs):
+    resposta = client.get('/metrics', **kwargs)
+    assert resposta.status_code == 200
+    assert resposta.content_type == 'text/plain; version=0.0.4; charset=utf-8'
+    return resposta.get_data(as_text=True).splitlines()
+
+
+class TestMetricas:
+    """Coleta por requisição e exposição"""
+
+    def test_requisicoes_latencia_e_sql(self, client, metricas):
+        client.get('/health')
+        client.get('/health')
+        client.get('/nao-existe')
+        linhas = _linhas(client)
+
+        assert 'http_requests_total{endpoint="health_check",method="GET",status="200"} 2' in linhas
+        assert 'http_requests_total{endpoint="nao_encontrado",method="GET",status="404"} 1' in linhas
+        assert '# TYPE http_request_duration_seconds histogram' in linhas
+        assert 'http_request_duration_seconds_bucket{endpoint="health_check",status="200",le="+Inf"} 2' in linhas
+        assert 'http_request_duration_seconds_count{endpoint="health_check",status="200"} 2' in linhas
+        assert 'sql_request_duration_seconds_count{endpoint="health_check"} 2' in linhas
+        assert any(linha.startswith('sql_statements_total{endpoint="health_check"} ') for linha in linhas)
+
+    def test_waitress_e_cache(self, app, client, metricas):
+        """Fila do waitress e contadores do cache lidos na coleta"""
+        servidor = create_server(app, host='127.0.0.1', port=0)
+        try:
+            MetricasService.registrar_waitress(app, servidor)
+            app.extensions['cache_tags'].registrar('empresas', True)
+            linhas = _linhas(client)
+        finally:
+            servidor.close()
+        assert 'waitress_queue_depth 0' in linhas
+        assert any(linha.startswith('waitress_threads ') for linha in linhas)
+        assert any(linha.startswith('cache_requests_total{prefix="empresas",result="hit"} ') for linha in linhas)
+
+    def test_token(self, app, client, metricas, monkeypatch):
+        monkeypatch.setitem(app.config, 'METRICAS_TOKEN', 'segredo')
+        assert client.get('/metrics').status_code == 401
+        assert _linhas(client, headers={'Authorization': 'Bearer segredo'})
+
+
+    def test_sem_token_so_rede_local(self, app, client, metricas, monkeypatch):
+        """Fora de debug/testes e sem token, só os endereços de METRICAS_REDES"""
+        monkeypatch.setitem(app.config, 'TESTING', False)
+        assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.9'}).status_code == 403
+        assert _linhas(client, environ_base={'REMOTE_ADDR': '127.0.0.1'})
+
+        monkeypatch.setitem(app.config, 'METRICAS_REDES', '10.0.0.0/8')
+        assert _linhas(client, environ_base={'REMOTE_ADDR': '10.2.3.4'})
+        assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+
+
+def test_endereco_permitido():
+    assert endereco_permitido('::1', '127.0.0.1/32,::1/128')
+    assert endereco_permitido('::ffff:127.0.0.1', '127.0.0.1/32')
+    assert not endereco_permitido('192.168.0.5', '127.0.0.1/32,::1/128')
+    assert not endereco_permitido(None, '127.0.0.1/32')
+    assert not endereco_permitido('127.0.0.1', '')
+
+
+def test_histograma_e_contador_entre_threads():
+    """Buckets acumulados e nenhuma observação perdida com várias threads"""
+    histograma = Histograma('t_seconds', 'Teste.', ('rota',), buckets=(0.1, 1.0))
+    contador = Contador('t_total', 'Teste.', ('rota',))
+
+    def observar():
+        for i in range(1000):
+            histograma.observar((0.05, 0.5, 5.0)[i % 3], 'a')
+            contador.inc('a')
+
+    threads = [threading.Thread(target=observar) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert contador.amostras() == ['t_total{rota="a"} 8000']
+    amostras = histograma.amostras()
+    assert amostras[:3] == [
+        't_seconds_bucket{rota="a",le="0.1"} 2672',
+        't_seconds_bucket{rota="a",le="1.0"} 5336',
+        't_seconds_bucket{rota="a",le="+Inf"} 8000',
+    ]
+    assert amostras[-1] == 't_seconds_count{rota="a"} 8000'
@@ -0,0 +1,83 @@
+"""
+Testes para o serviço de geração de períodos
+"""
+
+import pytest
+from app.db import db
+from app.models import Empresa, Tarefa, RelacionamentoTarefa, Periodo
+from app.services.periodo_service import PeriodoService
+from app.services.resumo_service import ResumoService
+
+
+@pytest.fixture
+def relacionamentos(app):
+    """Cria relacionamentos Mensal, Trimestral, Anual e um inativo"""
+    with app.app_context():
+        empresa = Empresa.query.filter_by(codigo='ETA').first()
+        mensal = Tarefa.query.filter_by(nome='Declaração Mensal').first()
+        anual = Tarefa.query.filter_by(nome='SPED Contábil').first()
+        trimestral = Tarefa(nome='DCTF Teste', tipo='Trimestral', descricao='Trimestral')
+        db.session.add(trimestral)
+        db.session.flush()
+
+        rels = [
+            RelacionamentoTarefa(tarefa_id=mensal.id, empresa_id=empresa.id, status='ativa', versao_atual=True),
+            RelacionamentoTarefa(tarefa_id=trimestral.id, empresa_id=empresa.id, status='ativa', versao_atual=True),
+            RelacionamentoTarefa(tarefa_id=anual.id, empresa_id=empresa.id, status='ativa', versao_atual=True),
+            RelacionamentoTarefa(tarefa_id=mensal.id, empresa_id=empresa.id, status='inativa', versao_atual=False),
+        ]
+        db.session.add_all(rels)
+        db.session.commit()
+        ids = [rel.id for rel in rels]
+
+        yield ids
+
+        Periodo.query.filter(Periodo.relacionamento_tarefa_id.in_(ids)).delete(synchronize_session=False)
+        RelacionamentoTarefa.query.filter(RelacionamentoTarefa.id.in_(ids)).delete(synchronize_session=False)
+        db.session.delete(db.session.get(Tarefa, trimestral.id))
+        ResumoService.reconstruir(empresa_ids=[empresa.id])
+
+
+class TestPeriodoService:
+    """Testes para PeriodoService.gerar_periodos"""
+
+    def test_gera_mensal_e_trimestral_ignorando_anual(self, app, relacionamentos):
+        """Gera períodos apenas para tarefas mensais e trimestrais ativas"""
+        with app.app_context():
+            resultado = PeriodoService.gerar_periodos(2031, 5, tamanho_lote=1)
+
+            assert resultado['tarefas_criadas'] == 2
+            assert resultado['tarefas_existentes'] == 0
+            assert resultado['total_relacionamentos'] == 3
+            assert resultado['periodo'] == '2031-05'
+            assert 'total' in resultado['tempos']
+
+            labels = {
+                p.periodo_label: p for p in Periodo.query.filter(
+                    Periodo.relacionamento_tarefa_id.in_(relacionamentos)
+                ).all()
+            }
+            assert set(labels) == {'2031-05', '2031-T2'}
+            assert labels['2031-T2'].inicio.month == 4
+            assert labels['2031-T2'].fim.month == 6
+            assert labels['2031-05'].status == 'pendente'
+
+    def test_segunda_execucao_nao_duplica(self, app, relacionamentos):
+        """Executar novamente conta os períodos como existentes"""
+        with app.app_context():
+            PeriodoService.gerar_periodos(2031, 5)
+            # Junho pertence ao mesmo trimestre: só o mensal é novo
+            resultado = PeriodoService.gerar_periodos(2031, 6)
+            assert resultado['tarefas_criadas'] == 1
+            assert resultado['tarefas_existentes'] == 1
+
+            resultado = PeriodoService.gerar_periodos(2031, 6)
+            assert resultado['tarefas_criadas'] == 0
+            assert resultado['tarefas_existentes'] == 2
+
+    def test_comando_cli(self, app, runner, relacionamentos):
+        """O comando `periodos gerar` reporta contagens e tempos"""
+        result = runner.invoke(args=['periodos', 'gerar', '--ano', '2031', '--mes', '7'])
+        assert result.exit_code == 0
+        assert '2031-07: 2 criadas' in result.output
+        assert 'total:' in result.output
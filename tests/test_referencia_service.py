@@ -0,0 +1,125 @@
+"""
+Testes para o cache de setores e tributações
+"""
+
+import io
+
+import pytest
+from flask import render_template_string
+from openpyxl import Workbook
+from sqlalchemy import event
+from app.db import db
+from app.models import Setor, Tributacao, Empresa
+from app.services.importacao_service import ImportacaoService
+from app.services.referencia_service import ReferenciaService
+
+
+@pytest.fixture
+def limpeza(app):
+    """Remove setores, tributações e empresas com prefixo REF"""
+    yield
+    with app.app_context():
+        Empresa.query.filter(Empresa.codigo.like('REF%')).delete(synchronize_session=False)
+        Setor.query.filter(Setor.nome.like('REF %')).delete(synchronize_session=False)
+        Tributacao.query.filter(Tributacao.nome.like('REF %')).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _contar_selects(app):
+    consultas = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            consultas.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', registrar)
+    return consultas, lambda: event.remove(engine, 'before_cursor_execute', registrar)
+
+
+class TestReferenciaService:
+    """Testes para ReferenciaService"""
+
+    def test_leitura_em_cache_e_imutavel(self, app):
+        """Segunda leitura não consulta o banco; o retorno não pode ser alterado"""
+        with app.app_context():
+            setores = ReferenciaService.setores()
+            consultas, parar = _contar_selects(app)
+            try:
+                assert ReferenciaService.setores() is setores
+                fiscal = next(s for s in setores if s.nome == 'Fiscal')
+                assert ReferenciaService.setor(fiscal.id) == fiscal
+                assert ReferenciaService.nome_setor(-1) == '-'
+            finally:
+                parar()
+            assert consultas == []
+
+            assert isinstance(setores, tuple)
+            with pytest.raises(AttributeError):
+                fiscal.nome = 'Outro'
+            assert ReferenciaService.como_dicts([fiscal]) == [{'id': fiscal.id, 'nome': 'Fiscal'}]
+
+    def test_escrita_invalida_no_commit(self, app, limpeza):
+        """Inclusão e renomeação aparecem após o commit; rollback não altera"""
+        with app.app_context():
+            nomes = [s.nome for s in ReferenciaService.setores()]
+            db.session.add(Setor(nome='REF Jurídico'))
+            db.session.flush()
+            db.session.rollback()
+            assert [s.nome for s in ReferenciaService.setores()] == nomes
+
+            setor = Setor(nome='REF Jurídico')
+            db.session.add(setor)
+            db.session.commit()
+            assert ReferenciaService.nome_setor(setor.id) == 'REF Jurídico'
+
+            setor.nome = 'REF Legal'
+            db.session.commit()
+            assert ReferenciaService.nome_setor(setor.id) == 'REF Legal'
+
+    def test_escrita_durante_a_carga(self, app, limpeza, monkeypatch):
+        """Carga que começou antes de um commit não fica em cache sob a versão nova"""
+        from app.services import referencia_service
+        carregar = referencia_service._carregar
+
+        with app.app_context():
+            ReferenciaService.invalidar('setores')
+            antigos = carregar('setores')
+
+            def carga_atrasada(nome):
+                # Outra requisição confirma um setor enquanto esta lê o snapshot antigo
+                db.session.add(Setor(nome='REF Concorrente'))
+                db.session.commit()
+                return antigos
+
+            monkeypatch.setattr(referencia_service, '_carregar', carga_atrasada)
+            assert 'REF Concorrente' not in [s.nome for s in ReferenciaService.setores()]
+
+            monkeypatch.setattr(referencia_service, '_carregar', carregar)
+            assert 'REF Concorrente' in [s.nome for s in ReferenciaService.setores()]
+
+    def test_importacao_cria_tributacao(self, app, limpeza):
+        """Tributação criada automaticamente pela importação entra no cache"""
+        workbook = Workbook()
+        for linha in (('codigo', 'nome', 'tributacao'), ('REF1', 'Empresa Ref', 'REF Lucro Arbitrado')):
+            workbook.active.append(list(linha))
+        arquivo = io.BytesIO()
+        workbook.save(arquivo)
+        arquivo.seek(0)
+
+        with app.app_context():
+            ReferenciaService.tributacoes()
+            ImportacaoService.importar_empresas(arquivo)
+            empresa = Empresa.query.filter_by(codigo='REF1').one()
+            assert ReferenciaService.nome_tributacao(empresa.tributacao_id) == 'REF Lucro Arbitrado'
+
+    def test_helpers_de_template(self, app):
+        """Filtros e listas disponíveis nos templates"""
+        with app.test_request_context():
+            fiscal = next(s for s in ReferenciaService.setores() if s.nome == 'Fiscal')
+            html = render_template_string(
+                '{{ setor_id|nome_setor }}|{{ none|nome_tributacao("N/A") }}|{{ lista_setores()|length }}',
+                setor_id=fiscal.id
+            )
+            assert html == f'Fiscal|N/A|{len(ReferenciaService.setores())}'
@@ -0,0 +1,238 @@
+"""
+Testes para os dados do relatório de tarefas
+"""
+
+import csv
+import io
+from datetime import date
+
+import pytest
+from openpyxl import load_workbook
+from app.db import db
+from app.models import Empresa, Tarefa, Setor, Usuario, RelacionamentoTarefa, Periodo
+from app.services.relatorio_service import (
+    RelatorioService, CursorInvalido, codificar_cursor, decodificar_cursor
+)
+
+
+@pytest.fixture
+def relatorio(app):
+    """Duas empresas com três meses de períodos em 2033 e status variados"""
+    with app.app_context():
+        fiscal = Setor.query.filter_by(nome='Fiscal').first()
+        colaborador = Usuario.query.filter_by(login='colaborador').first()
+        empresas = [
+            Empresa(codigo='REL1', nome='Relatorio Alfa', ativo=True),
+            Empresa(codigo='REL2', nome='Relatorio Beta', ativo=True),
+        ]
+        tarefas = [
+            Tarefa(nome='Relatorio Mensal', tipo='Mensal', setor_id=fiscal.id),
+            Tarefa(nome='Relatorio Outra', tipo='Mensal', setor_id=fiscal.id),
+        ]
+        db.session.add_all(empresas + tarefas)
+        db.session.flush()
+
+        status = ['pendente', 'concluida', 'em_andamento']
+        for empresa in empresas:
+            for tarefa in tarefas:
+                rel = RelacionamentoTarefa(
+                    empresa_id=empresa.id, tarefa_id=tarefa.id, responsavel_id=colaborador.id,
+                    status='ativa', versao_atual=True
+                )
+                db.session.add(rel)
+                db.session.flush()
+                for mes in (1, 2, 3):
+                    db.session.add(Periodo(
+                        relacionamento_tarefa_id=rel.id, inicio=date(2033, mes, 1), fim=date(2033, mes, 28),
+                        periodo_label=f'2033-{mes:02d}', status=status[mes - 1]
+                    ))
+        db.session.commit()
+
+        dados = {
+            'empresas': [empresa.id for empresa in empresas],
+            'tarefas': [tarefa.id for tarefa in tarefas],
+        }
+
+        yield dados
+
+        rel_ids = [rid for (rid,) in db.session.query(RelacionamentoTarefa.id).filter(
+            RelacionamentoTarefa.empresa_id.in_(dados['empresas'])
+        )]
+        Periodo.query.filter(Periodo.relacionamento_tarefa_id.in_(rel_ids)).delete(synchronize_session=False)
+        RelacionamentoTarefa.query.filter(RelacionamentoTarefa.id.in_(rel_ids)).delete(synchronize_session=False)
+        Tarefa.query.filter(Tarefa.id.in_(dados['tarefas'])).delete(synchronize_session=False)
+        Empresa.query.filter(Empresa.id.in_(dados['empresas'])).delete(synchronize_session=False)
+        db.session.commit()
+
+
+FILTROS_2033 = {'data_inicio': date(2033, 1, 1), 'data_fim': date(2033, 12, 31), 'status': 'todos'}
+
+
+class TestRelatorioService:
+    """Testes para RelatorioService"""
+
+    def test_paginas_cobrem_ordem_completa(self, app, relatorio):
+        """Percorrer as páginas devolve a mesma sequência da consulta completa"""
+        with app.app_context():
+            esperado = [r.id for r in RelatorioService.ordenada(FILTROS_2033)]
+            assert len(esperado) == 12
+
+            vistos = []
+            cursor = None
+            while True:
+                pagina = RelatorioService.pagina(FILTROS_2033, cursor=cursor, limite=5)
+                vistos.extend(item['id'] for item in pagina['dados'])
+                if not pagina['tem_mais']:
+                    assert pagina['proximo_cursor'] is None
+                    break
+                cursor = pagina['proximo_cursor']
+
+            assert vistos == esperado
+            primeira = RelatorioService.pagina(FILTROS_2033, limite=5)['dados'][0]
+            assert primeira['empresa_nome'] == 'Relatorio Alfa'
+            assert primeira['periodo'] == '2033-03'
+
+    def test_estatisticas_por_group_by(self, app, relatorio):
+        """Contagem por status no banco respeita os filtros"""
+        with app.app_context():
+            stats = RelatorioService.estatisticas(FILTROS_2033)
+            assert stats['total'] == 12
+            assert stats['pendentes'] == 4
+            assert stats['em_andamento'] == 4
+            assert stats['concluidas'] == 4
+            assert round(stats['taxa_conclusao'], 1) == 33.3
+
+            filtros = dict(FILTROS_2033, empresa_id=relatorio['empresas'][0], status='concluida')
+            assert RelatorioService.estatisticas(filtros)['total'] == 2
+
+    def test_lotes_percorrem_tudo(self, app, relatorio):
+        """Leitura em lotes devolve todas as linhas na ordem do relatório"""
+        with app.app_context():
+            lotes = list(RelatorioService.lotes(FILTROS_2033, tamanho_lote=5))
+            assert [len(lote) for lote in lotes] == [5, 5, 2]
+            assert [item['id'] for lote in lotes for item in lote] == [
+                r.id for r in RelatorioService.ordenada(FILTROS_2033)
+            ]
+
+    def test_escrever_pdf_em_lotes(self, app, relatorio):
+        """O PDF é gerado consumindo os lotes sob demanda"""
+        with app.app_context():
+            destino = io.BytesIO()
+            RelatorioService.escrever_pdf(destino, FILTROS_2033, 'Todos os registros', tamanho_lote=5)
+            assert destino.getvalue().startswith(b'%PDF')
+
+    def test_pdf_pagina_a_pagina(self):
+        """Tabelas maiores que a página são divididas e desenhadas em várias páginas"""
+        from reportlab.pdfgen.canvas import Canvas
+        from app.services.relatorio_service import _desenhar_paginas, _segmento_tabela
+
+        item = {
+            'empresa_nome': 'Empresa', 'tarefa_nome': 'Tarefa', 'tarefa_tipo': 'Mensal',
+            'periodo_formatado': '2033-01', 'status_texto': 'Pendente',
+            'responsavel_nome': 'Fulano', 'data_conclusao': ''
+        }
+        destino = io.BytesIO()
+        canvas = Canvas(destino)
+        _desenhar_paginas(canvas, (_segmento_tabela([item] * 100) for _ in range(3)))
+        paginas = canvas.getPageNumber()
+        canvas.save()
+        assert paginas >= 6
+        assert destino.getvalue().startswith(b'%PDF')
+
+    def test_cursor_ida_e_volta(self):
+        """O token é estável e rejeita valores adulterados"""
+        token = codificar_cursor('Ação Ltda', date(2033, 1, 1), 42)
+        assert token == codificar_cursor('Ação Ltda', date(2033, 1, 1), 42)
+        assert decodificar_cursor(token) == ('Ação Ltda', date(2033, 1, 1), 42)
+        with pytest.raises(CursorInvalido):
+            decodificar_cursor('nao-e-um-cursor')
+
+
+class TestApiDados:
+    """GET /relatorios/api/dados"""
+
+    def test_paginado(self, client, relatorio):
+        """Primeira página traz estatísticas; as seguintes só dados e cursor"""
+        base = '/relatorios/api/dados?data_inicial=2033-01-01&data_final=2033-12-31&limite=8'
+        dados = client.get(base).get_json()
+        assert dados['success'] is True
+        assert len(dados['dados']) == 8
+        assert dados['tem_mais'] is True
+        assert dados['total_registros'] == 12
+        assert dados['stats']['concluidas'] == 4
+
+        seguinte = client.get(f"{base}&cursor={dados['proximo_cursor']}").get_json()
+        assert len(seguinte['dados']) == 4
+        assert seguinte['tem_mais'] is False
+        assert 'stats' not in seguinte
+
+        response = client.get(f'{base}&cursor=xyz')
+        assert response.status_code == 400
+
+    def test_sem_paginacao(self, client, relatorio):
+        """Sem limite/cursor mantém a resposta completa"""
+        dados = client.get('/relatorios/api/dados?data_inicial=2033-01-01&data_final=2033-12-31').get_json()
+        assert dados['total_registros'] == 12
+        assert dados['stats']['total'] == 12
+
+    def test_pdf(self, client, relatorio):
+        """GET /relatorios/pdf envia o arquivo temporário como anexo"""
+        response = client.get('/relatorios/pdf?data_inicial=2033-01-01&data_final=2033-12-31')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/pdf'
+        assert 'attachment' in response.headers['Content-Disposition']
+        assert response.get_data().startswith(b'%PDF')
+        response.close()
+
+    def test_pdf_grande_vai_para_job(self, app, client, relatorio, monkeypatch):
+        """Acima de RELATORIO_PDF_SINCRONO_MAX linhas o PDF é enfileirado; async=0 força a geração direta"""
+        from app.models import Job
+        with app.app_context():
+            colaborador = Usuario.query.filter_by(login='colaborador').one().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = colaborador
+        monkeypatch.setitem(app.config, 'RELATORIO_PDF_SINCRONO_MAX', 5)
+        url = '/relatorios/pdf?data_inicial=2033-01-01&data_final=2033-12-31'
+
+        response = client.get(url)
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            assert job.tipo == 'relatorios.pdf'
+            db.session.delete(job)
+            db.session.commit()
+
+        response = client.get(f'{url}&async=0')
+        assert response.status_code == 200
+        assert response.get_data().startswith(b'%PDF')
+        response.close()
+
+    def test_csv(self, client, relatorio):
+        """GET /relatorios/csv envia cabeçalho e uma linha por período"""
+        response = client.get('/relatorios/csv?data_inicial=2033-01-01&data_final=2033-12-31')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert response.is_streamed
+        linhas = list(csv.reader(io.StringIO(response.get_data(as_text=True).lstrip('\ufeff'))))
+        assert linhas[0][:3] == ['ID', 'Empresa', 'Tarefa']
+        assert len(linhas) == 13
+        assert linhas[1][1] == 'Relatorio Alfa'
+
+    def test_xlsx(self, client, relatorio):
+        """GET /relatorios/xlsx gera planilha com as mesmas linhas"""
+        response = client.get('/relatorios/xlsx?data_inicial=2033-01-01&data_final=2033-12-31&status=concluida')
+        assert response.status_code == 200
+        planilha = load_workbook(io.BytesIO(response.get_data()), read_only=True).active
+        linhas = list(planilha.iter_rows(values_only=True))
+        response.close()
+        assert linhas[0][1] == 'Empresa'
+        assert len(linhas) == 5
+        assert {linha[5] for linha in linhas[1:]} == {'Concluída'}
+
+    def test_exportacoes_data_invalida(self, client, relatorio):
+        """Data inválida é erro do cliente (400) no CSV e no XLSX"""
+        for formato in ('csv', 'xlsx'):
+            response = client.get(f'/relatorios/{formato}?data_inicial=2033-13-01&data_final=2033-12-31')
+            assert response.status_code == 400
+            assert 'error' in response.get_json()
@@ -0,0 +1,219 @@
+"""
+Testes para o resumo de status do painel do gerente
+"""
+
+import pytest
+from app.db import db
+from app.models import (
+    Empresa, Tarefa, Setor, Usuario, RelacionamentoTarefa, Periodo, Retificacao, ResumoStatusPeriodo
+)
+from app.services.periodo_service import PeriodoService
+from app.services.resumo_service import ResumoService
+
+
+@pytest.fixture
+def painel(app):
+    """Empresas com tarefas mensal e trimestral e períodos de junho/2032"""
+    with app.app_context():
+        fiscal = Setor.query.filter_by(nome='Fiscal').first()
+        contabil = Setor.query.filter_by(nome='Contábil').first()
+        colaborador = Usuario.query.filter_by(login='colaborador').first()
+        empresas = [
+            Empresa(codigo='RES1', nome='Resumo Alfa', ativo=True),
+            Empresa(codigo='RES2', nome='Resumo Beta', ativo=True),
+        ]
+        tarefas = [
+            Tarefa(nome='Resumo Mensal', tipo='Mensal', setor_id=fiscal.id),
+            Tarefa(nome='Resumo Trimestral', tipo='Trimestral', setor_id=contabil.id),
+        ]
+        db.session.add_all(empresas + tarefas)
+        db.session.flush()
+        for empresa in empresas:
+            for tarefa in tarefas:
+                db.session.add(RelacionamentoTarefa(
+                    empresa_id=empresa.id, tarefa_id=tarefa.id, responsavel_id=colaborador.id,
+                    status='ativa', versao_atual=True
+                ))
+        db.session.commit()
+        PeriodoService.gerar_periodos(2032, 6)
+
+        dados = {
+            'empresas': [empresa.id for empresa in empresas],
+            'tarefas': [tarefa.id for tarefa in tarefas],
+            'fiscal': fiscal.id,
+            'colaborador': colaborador.id,
+        }
+
+        yield dados
+
+        rel_ids = [rid for (rid,) in db.session.query(RelacionamentoTarefa.id).filter(
+            RelacionamentoTarefa.empresa_id.in_(dados['empresas'])
+        )]
+        periodo_ids = [pid for (pid,) in db.session.query(Periodo.id).filter(
+            Periodo.relacionamento_tarefa_id.in_(rel_ids)
+        )]
+        Retificacao.query.filter(Retificacao.periodo_id.in_(periodo_ids)).delete(synchronize_session=False)
+        Periodo.query.filter(Periodo.id.in_(periodo_ids)).delete(synchronize_session=False)
+        RelacionamentoTarefa.query.filter(RelacionamentoTarefa.id.in_(rel_ids)).delete(synchronize_session=False)
+        ResumoStatusPeriodo.query.filter(
+            ResumoStatusPeriodo.empresa_id.in_(dados['empresas'])
+        ).delete(synchronize_session=False)
+        Tarefa.query.filter(Tarefa.id.in_(dados['tarefas'])).delete(synchronize_session=False)
+        Empresa.query.filter(Empresa.id.in_(dados['empresas'])).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _linhas(empresa_ids):
+    return sorted(
+        (r.periodo_label, r.empresa_id, r.setor_id, r.responsavel_id,
+         r.pendentes, r.fazendo, r.concluidas, r.retificadas)
+        for r in ResumoStatusPeriodo.query.filter(ResumoStatusPeriodo.empresa_id.in_(empresa_ids))
+        if r.pendentes or r.fazendo or r.concluidas or r.retificadas
+    )
+
+
+def _periodo(empresa_id, tarefa_id):
+    return Periodo.query.join(RelacionamentoTarefa).filter(
+        RelacionamentoTarefa.empresa_id == empresa_id,
+        RelacionamentoTarefa.tarefa_id == tarefa_id
+    ).one()
+
+
+class TestResumoService:
+    """Testes para ResumoService"""
+
+    def test_geracao_registra_contadores(self, app, painel):
+        """Períodos gerados entram como pendentes, com setor e responsável"""
+        with app.app_context():
+            e1, e2 = painel['empresas']
+            linhas = _linhas(painel['empresas'])
+            assert ('2032-06', e1, painel['fiscal'], painel['colaborador'], 1, 0, 0, 0) in linhas
+            assert len(linhas) == 4
+
+            resultado = ResumoService.resumo('2032-06', empresa_ids=painel['empresas'])
+            assert resultado['resumo'] == {'pendentes': 4, 'fazendo': 0, 'concluidas': 0}
+            assert [e['nome'] for e in resultado['empresas_resumo']] == ['Resumo Alfa', 'Resumo Beta']
+
+            # Fora do mês final do trimestre só as mensais aparecem
+            assert ResumoService.resumo('2032-05', empresa_ids=painel['empresas'])['total'] == 0
+
+    def test_mudancas_de_status_igualam_reconstrucao(self, app, client, painel):
+        """Endpoints de conclusão/retificação/reabertura mantêm os contadores corretos"""
+        e1, e2 = painel['empresas']
+        mensal, trimestral = painel['tarefas']
+        with app.app_context():
+            p1 = _periodo(e1, mensal).id
+            p2 = _periodo(e2, trimestral).id
+            p3 = _periodo(e2, mensal).id
+        with client.session_transaction() as sess:
+            sess['user_id'] = painel['colaborador']
+
+        assert client.post('/api/dashboard/concluir-tarefa', json={'periodo_id': p1}).status_code == 200
+        assert client.post('/api/dashboard/retificar-tarefa', json={'periodo_id': p1, 'motivo': 'x'}).status_code == 200
+        assert client.post('/api/tarefas-auto/concluir-tarefa',
+                           json={'periodo_id': p2, 'usuario_id': painel['colaborador']}).status_code == 200
+        assert client.post('/api/tarefas-auto/concluir-tarefa',
+                           json={'periodo_id': p3, 'usuario_id': painel['colaborador']}).status_code == 200
+        assert client.post('/api/tarefas-auto/reabrir-tarefa', json={'periodo_id': p3}).status_code == 200
+
+        with app.app_context():
+            incremental = _linhas(painel['empresas'])
+            resultado = ResumoService.resumo('2032-06', empresa_ids=painel['empresas'])
+            assert resultado['resumo'] == {'pendentes': 2, 'fazendo': 0, 'concluidas': 2}
+
+            ResumoService.reconstruir(empresa_ids=painel['empresas'])
+            assert _linhas(painel['empresas']) == incremental
+
+    def test_upsert_soma_na_mesma_chave(self, app, painel, monkeypatch):
+        """Chave nova aplicada duas vezes soma em uma única linha (upsert e reserva por linha)"""
+        from app.services import resumo_service
+        e1 = painel['empresas'][0]
+        with app.app_context():
+            chave = ('2032-07', e1, None, None)
+            resumo_service._aplicar_deltas({chave: {'pendentes': 1}})
+            resumo_service._aplicar_deltas({chave: {'pendentes': 2, 'fazendo': 1}})
+            monkeypatch.setattr(resumo_service, '_upsert_contadores', lambda tabela, dialeto: None)
+            resumo_service._aplicar_deltas({chave: {'concluidas': 1}})
+            db.session.commit()
+
+            linhas = [linha for linha in _linhas([e1]) if linha[0] == '2032-07']
+            assert linhas == [('2032-07', e1, 0, 0, 3, 1, 1, 0)]
+
+    def test_contador_negativo_reconstroi(self, app, client, painel, caplog):
+        """Resumo fora de sincronia não é corrigido por clamp: registra no log e reconstrói"""
+        e1 = painel['empresas'][0]
+        mensal = painel['tarefas'][0]
+        with app.app_context():
+            p1 = _periodo(e1, mensal).id
+            ResumoStatusPeriodo.query.filter_by(empresa_id=e1).delete()
+            db.session.commit()
+        with client.session_transaction() as sess:
+            sess['user_id'] = painel['colaborador']
+
+        assert client.post('/api/dashboard/concluir-tarefa', json={'periodo_id': p1}).status_code == 200
+        assert 'fora de sincronia' in caplog.text
+
+        with app.app_context():
+            incremental = _linhas([e1])
+            assert incremental == [('2032-06', e1, painel['fiscal'], painel['colaborador'], 0, 0, 1, 0)]
+            ResumoService.reconstruir(periodo_labels=['2032-06'], empresa_ids=[e1])
+            assert _linhas([e1]) == incremental
+
+    def test_remocao_de_vinculo_recalcula(self, app, client, painel):
+        """Remover um vínculo recalcula o resumo da empresa"""
+        e1 = painel['empresas'][0]
+        with app.app_context():
+            rel = RelacionamentoTarefa.query.filter_by(empresa_id=e1, tarefa_id=painel['tarefas'][0]).one()
+            rel_id = rel.id
+
+        client.post('/tarefas/delete-link', data={'id': rel_id})
+
+        with app.app_context():
+            resultado = ResumoService.resumo('2032-06', empresa_ids=[e1])
+            assert resultado['resumo']['pendentes'] == 1
+
+    def test_edicao_de_tarefa_recalcula(self, app, client, painel):
+        """Trocar o setor da tarefa move os contadores para o setor novo"""
+        mensal = painel['tarefas'][0]
+        with app.app_context():
+            contabil = Setor.query.filter_by(nome='Contábil').first().id
+
+        client.post('/tarefas/edit', data={'id': mensal, 'nome': 'Resumo Mensal', 'tipo': 'Mensal', 'setor_id': contabil})
+
+        with app.app_context():
+            assert not [linha for linha in _linhas(painel['empresas']) if linha[2] == painel['fiscal']]
+            assert ResumoService.resumo('2032-06', setor_id=contabil, empresa_ids=painel['empresas'])['total'] == 4
+            incremental = _linhas(painel['empresas'])
+            ResumoService.reconstruir(empresa_ids=painel['empresas'])
+            assert _linhas(painel['empresas']) == incremental
+
+    def test_api_resumo_usa_resumo(self, app, client, painel):
+        """GET /gerenciamento/api/resumo inclui o trimestre e o filtro por tarefa"""
+        ids = ','.join(str(eid) for eid in painel['empresas'])
+        dados = client.get(f'/gerenciamento/api/resumo?periodo=06/2032&empresa_ids={ids}').get_json()
+        assert dados['success'] is True
+        assert dados['resumo'] == {'pendentes': 4, 'fazendo': 0, 'concluidas': 0}
+        assert dados['total_encontrados'] == 4
+        assert len(dados['responsaveis_tarefas']) == 4
+        assert dados['empresas_resumo'][0]['taxa_conclusao'] == 0
+
+        tarefa_id = painel['tarefas'][1]
+        dados = client.get(f'/gerenciamento/api/resumo?periodo=06/2032&empresa_ids={ids}&tarefa_id={tarefa_id}').get_json()
+        assert dados['resumo']['pendentes'] == 2
+        assert {t['periodo_label'] for t in dados['responsaveis_tarefas']} == {'T2/2032'}
+
+    def test_comando_reconstruir(self, app, runner, painel):
+        """`flask resumo reconstruir` regrava os contadores"""
+        with app.app_context():
+            antes = _linhas(painel['empresas'])
+            ResumoStatusPeriodo.query.filter(
+                ResumoStatusPeriodo.empresa_id.in_(painel['empresas'])
+            ).delete(synchronize_session=False)
+            db.session.commit()
+
+        result = runner.invoke(args=['resumo', 'reconstruir', '--periodo', '2032-06', '--periodo', '2032-T2'])
+        assert result.exit_code == 0
+        assert 'Resumo reconstruído' in result.output
+
+        with app.app_context():
+            assert _linhas(painel['empresas']) == antes
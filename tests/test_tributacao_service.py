@@ -0,0 +1,351 @@
+"""
+Testes para o serviço de mudança de tributação
+"""
+
+import pytest
+from datetime import date, datetime, timedelta
+from app.db import db
+from app.models import (
+    Empresa, Tarefa, Tributacao, TarefaTributacao, RelacionamentoTarefa, Periodo,
+    VinculacaoEmpresaTributacao, MudancaTributacaoPendente, Usuario
+)
+from app.services.tributacao_service import (
+    TributacaoService, MigracaoEmAndamento, MODO_PRESERVAR, MODO_SUBSTITUIR
+)
+from app.utils import calcular_datas_periodo
+
+
+@pytest.fixture
+def cenario(app):
+    """Empresa no Simples com tarefas específicas, comuns e da nova tributação"""
+    with app.app_context():
+        simples = Tributacao.query.filter_by(nome='Simples Nacional').first()
+        normal = Tributacao.query.filter_by(nome='Regime Normal').first()
+        empresa = Empresa(codigo='TRB', nome='Empresa Tributação', tributacao_id=simples.id, ativo=True)
+        tarefas = {
+            'simples': Tarefa(nome='DAS', tipo='Mensal'),
+            'simples_aberta': Tarefa(nome='PGDAS', tipo='Mensal'),
+            'comum': Tarefa(nome='Folha Comum', tipo='Mensal', tarefa_comum=True),
+            'normal_direta': Tarefa(nome='EFD ICMS', tipo='Mensal', tributacao_id=normal.id),
+            'normal_tt': Tarefa(nome='DCTF', tipo='Trimestral'),
+        }
+        db.session.add(empresa)
+        db.session.add_all(tarefas.values())
+        db.session.flush()
+        db.session.add_all([
+            TarefaTributacao(tarefa_id=tarefas['simples'].id, tributacao_id=simples.id),
+            TarefaTributacao(tarefa_id=tarefas['simples_aberta'].id, tributacao_id=simples.id),
+            TarefaTributacao(tarefa_id=tarefas['normal_tt'].id, tributacao_id=normal.id),
+        ])
+        rels = {
+            'simples': RelacionamentoTarefa(empresa_id=empresa.id, tarefa_id=tarefas['simples'].id, status='ativa', versao_atual=True),
+            'simples_aberta': RelacionamentoTarefa(empresa_id=empresa.id, tarefa_id=tarefas['simples_aberta'].id, status='ativa', versao_atual=True),
+            'comum': RelacionamentoTarefa(empresa_id=empresa.id, tarefa_id=tarefas['comum'].id, status='ativa', versao_atual=True),
+            'normal_antiga': RelacionamentoTarefa(empresa_id=empresa.id, tarefa_id=tarefas['normal_direta'].id, status='ativa', versao_atual=False),
+        }
+        db.session.add_all(rels.values())
+        db.session.flush()
+        hoje = date.today()
+        inicio, fim, label = calcular_datas_periodo(hoje.year, hoje.month, 'Mensal')
+        db.session.add(Periodo(relacionamento_tarefa_id=rels['simples_aberta'].id, inicio=inicio, fim=fim,
+                               periodo_label=label, status='pendente'))
+        db.session.commit()
+
+        yield {
+            'empresa_id': empresa.id,
+            'simples_id': simples.id,
+            'normal_id': normal.id,
+            'tarefas': {chave: tarefa.id for chave, tarefa in tarefas.items()},
+            'rels': {chave: rel.id for chave, rel in rels.items()},
+        }
+
+        rel_ids = [r.id for r in RelacionamentoTarefa.query.filter_by(empresa_id=empresa.id).all()]
+        Periodo.query.filter(Periodo.relacionamento_tarefa_id.in_(rel_ids)).delete(synchronize_session=False)
+        RelacionamentoTarefa.query.filter_by(empresa_id=empresa.id).delete()
+        VinculacaoEmpresaTributacao.query.filter_by(empresa_id=empresa.id).delete()
+        MudancaTributacaoPendente.query.filter_by(empresa_id=empresa.id).delete()
+        TarefaTributacao.query.filter(TarefaTributacao.tarefa_id.in_(
+            [tarefa.id for tarefa in tarefas.values()]
+        )).delete(synchronize_session=False)
+        Tarefa.query.filter(Tarefa.id.in_([tarefa.id for tarefa in tarefas.values()])).delete(synchronize_session=False)
+        Empresa.query.filter_by(id=empresa.id).delete()
+        db.session.commit()
+
+
+class TestTributacaoService:
+    """Testes para TributacaoService"""
+
+    def test_plano_preservar(self, app, cenario):
+        """Supervisor: preserva comuns e período aberto, reativa e cria as novas"""
+        with app.app_context():
+            plano = TributacaoService.planejar_mudanca(cenario['empresa_id'], cenario['normal_id'], MODO_PRESERVAR)
+
+            assert [i['relacionamento_id'] for i in plano['desativar']] == [cenario['rels']['simples']]
+            assert [i['relacionamento_id'] for i in plano['preservados']] == [cenario['rels']['simples_aberta']]
+            assert [i['relacionamento_id'] for i in plano['comuns']] == [cenario['rels']['comum']]
+            assert [i['relacionamento_id'] for i in plano['reativar']] == [cenario['rels']['normal_antiga']]
+            assert plano['criar'] == [cenario['tarefas']['normal_tt']]
+
+    def test_dry_run_nao_grava(self, app, cenario):
+        """Dry-run retorna o plano sem alterar o banco"""
+        with app.app_context():
+            usuario = Usuario.query.filter_by(login='admin').first()
+            mudanca = TributacaoService.alterar_tributacao(
+                cenario['empresa_id'], cenario['normal_id'], usuario.id, dry_run=True
+            )
+            assert mudanca['resultado'] is None
+            assert db.session.get(Empresa, cenario['empresa_id']).tributacao_id == cenario['simples_id']
+            assert RelacionamentoTarefa.query.filter_by(empresa_id=cenario['empresa_id']).count() == 4
+
+    def test_aplicar_preservar(self, app, cenario):
+        """Aplicação em lote atualiza relacionamentos, vinculação e mudança pendente"""
+        with app.app_context():
+            usuario = Usuario.query.filter_by(login='admin').first()
+            mudanca = TributacaoService.alterar_tributacao(
+                cenario['empresa_id'], cenario['normal_id'], usuario.id, motivo='Teste'
+            )
+            resultado = mudanca['resultado']
+            assert (resultado['desativados'], resultado['reativados'], resultado['criados']) == (1, 1, 1)
+
+            empresa = db.session.get(Empresa, cenario['empresa_id'])
+            assert empresa.tributacao_id == cenario['normal_id']
+
+            vinculacao = VinculacaoEmpresaTributacao.query.filter_by(empresa_id=empresa.id, ativo=True).one()
+            assert vinculacao.tributacao_id == cenario['normal_id']
+
+            desativado = db.session.get(RelacionamentoTarefa, cenario['rels']['simples'])
+            assert desativado.versao_atual is False
+            assert desativado.data_fim == date.today()
+
+            reativado = db.session.get(RelacionamentoTarefa, cenario['rels']['normal_antiga'])
+            assert reativado.versao_atual is True
+            assert reativado.vinculacao_id == vinculacao.id
+
+            novo = RelacionamentoTarefa.query.filter_by(
+                empresa_id=empresa.id, tarefa_id=cenario['tarefas']['normal_tt']
+            ).one()
+            assert novo.responsavel_id is None
+            assert novo.vinculacao_id == vinculacao.id
+
+            pendente = db.session.get(MudancaTributacaoPendente, resultado['mudancas'][empresa.id])
+            assert pendente.tributacao_anterior_id == cenario['simples_id']
+            assert pendente.motivo == 'Teste'
+
+    def test_plano_substituir(self, app, cenario):
+        """Admin: todos os relacionamentos atuais são desativados"""
+        with app.app_context():
+            plano = TributacaoService.planejar_mudanca(cenario['empresa_id'], cenario['normal_id'], MODO_SUBSTITUIR)
+            desativados = {i['relacionamento_id'] for i in plano['desativar']}
+            assert desativados == {cenario['rels']['simples'], cenario['rels']['simples_aberta'], cenario['rels']['comum']}
+            assert plano['criar'] == [cenario['tarefas']['normal_tt']]
+
+    def test_mesma_tributacao(self, app, cenario):
+        """Não permite mudar para a tributação atual"""
+        with app.app_context():
+            with pytest.raises(ValueError):
+                TributacaoService.alterar_tributacao(cenario['empresa_id'], cenario['simples_id'], 1)
+
+    def test_id_como_texto(self, app, client, cenario, supervisor):
+        """ID da tributação enviado como texto pela interface é convertido para int"""
+        with app.app_context():
+            plano = TributacaoService.planejar_mudanca(cenario['empresa_id'], str(cenario['normal_id']))
+            assert plano['criar'] == [cenario['tarefas']['normal_tt']]
+            assert plano['tributacao_nova_id'] == cenario['normal_id']
+            with pytest.raises(ValueError):
+                TributacaoService.alterar_tributacao(cenario['empresa_id'], str(cenario['simples_id']), 1)
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = supervisor
+        url = f"/supervisor/empresas/{cenario['empresa_id']}/tributacao"
+        assert client.post(url, json={'tributacao_id': 'abc'}).status_code == 400
+        assert client.post(url, json={'tributacao_id': str(cenario['simples_id'])}).status_code == 400
+
+        resposta = client.post(url, json={'tributacao_id': str(cenario['normal_id']), 'dry_run': True})
+        plano = resposta.get_json()['plano']
+        assert plano['criar'] == [cenario['tarefas']['normal_tt']]
+        assert plano['tributacao_nova_id'] == cenario['normal_id']
+
+        assert client.post(url, json={'tributacao_id': str(cenario['normal_id'])}).status_code == 200
+        with app.app_context():
+            assert db.session.get(Empresa, cenario['empresa_id']).tributacao_id == cenario['normal_id']
+            assert RelacionamentoTarefa.query.filter_by(
+                empresa_id=cenario['empresa_id'], tarefa_id=cenario['tarefas']['normal_tt'], versao_atual=True
+            ).count() == 1
+
+
+
+@pytest.fixture
+def empresas_simples(app):
+    """Cinco empresas no Simples Nacional com uma tarefa do Simples cada"""
+    with app.app_context():
+        simples = Tributacao.query.filter_by(nome='Simples Nacional').first()
+        normal = Tributacao.query.filter_by(nome='Regime Normal').first()
+        tarefa = Tarefa(nome='DAS Lote', tipo='Mensal', tributacao_id=simples.id)
+        empresas = [
+            Empresa(codigo=f'LOTE{i}', nome=f'Empresa Lote {i}', tributacao_id=simples.id, ativo=True)
+            for i in range(5)
+        ]
+        db.session.add(tarefa)
+        db.session.add_all(empresas)
+        db.session.flush()
+        db.session.add_all([
+            RelacionamentoTarefa(empresa_id=e.id, tarefa_id=tarefa.id, status='ativa', versao_atual=True)
+            for e in empresas
+        ])
+        db.session.commit()
+        ids = [e.id for e in empresas]
+
+        yield {'empresa_ids': ids, 'simples_id': simples.id, 'normal_id': normal.id}
+
+        from app.models import MigracaoTributacaoLote
+        MigracaoTributacaoLote.query.delete()
+        RelacionamentoTarefa.query.filter(RelacionamentoTarefa.empresa_id.in_(ids)).delete(synchronize_session=False)
+        VinculacaoEmpresaTributacao.query.filter(VinculacaoEmpresaTributacao.empresa_id.in_(ids)).delete(synchronize_session=False)
+        MudancaTributacaoPendente.query.filter(MudancaTributacaoPendente.empresa_id.in_(ids)).delete(synchronize_session=False)
+        Empresa.query.filter(Empresa.id.in_(ids)).delete(synchronize_session=False)
+        Tarefa.query.filter_by(id=tarefa.id).delete()
+        db.session.commit()
+
+
+@pytest.fixture
+def supervisor(app):
+    """Usuário supervisor temporário"""
+    with app.app_context():
+        usuario = Usuario(nome='Supervisor Lote', login='supervisor_lote', senha='123', tipo='supervisor', ativo=True)
+        db.session.add(usuario)
+        db.session.commit()
+        usuario_id = usuario.id
+    yield usuario_id
+    with app.app_context():
+        Usuario.query.filter_by(id=usuario_id).delete()
+        db.session.commit()
+
+
+class TestMigracaoTributacao:
+    """Testes para a migração de tributação em massa"""
+
+    def test_migracao_em_lotes(self, app, empresas_simples):
+        """Processa todas as empresas em lotes e reporta o progresso"""
+        with app.app_context():
+            usuario = Usuario.query.filter_by(login='admin').first()
+            ids = TributacaoService.selecionar_empresas(
+                empresas_simples['empresa_ids'], {'tributacao_id': empresas_simples['simples_id']}
+            )
+            migracao = TributacaoService.criar_migracao(ids, empresas_simples['normal_id'], usuario.id, tamanho_lote=2)
+
+            progresso = []
+            status = TributacaoService.executar_migracao(migracao.id, progresso=progresso.append)
+
+            assert status['status'] == 'concluida'
+            assert status['migradas'] == 5
+            assert [p['processadas'] for p in progresso] == [2, 4, 5]
+            assert Empresa.query.filter(
+                Empresa.id.in_(ids), Empresa.tributacao_id == empresas_simples['normal_id']
+            ).count() == 5
+            assert RelacionamentoTarefa.query.filter(
+                RelacionamentoTarefa.empresa_id.in_(ids), RelacionamentoTarefa.versao_atual == True
+            ).count() == 0
+
+    def test_retomar_apos_falha(self, app, empresas_simples, monkeypatch):
+        """Uma falha desfaz apenas o lote corrente e a migração é retomada do checkpoint"""
+        with app.app_context():
+            usuario = Usuario.query.filter_by(login='admin').first()
+            ids = empresas_simples['empresa_ids']
+            migracao = TributacaoService.criar_migracao(ids, empresas_simples['normal_id'], usuario.id, tamanho_lote=2)
+
+            original = TributacaoService.aplicar_mudancas
+            chamadas = []
+
+            def falha_no_segundo_lote(*args, **kwargs):
+                chamadas.append(1)
+                if len(chamadas) == 2:
+                    raise RuntimeError('conexão perdida')
+                return original(*args, **kwargs)
+
+            monkeypatch.setattr(TributacaoService, 'aplicar_mudancas', staticmethod(falha_no_segundo_lote))
+            with pytest.raises(RuntimeError):
+                TributacaoService.executar_migracao(migracao.id)
+
+            status = TributacaoService.status_migracao(db.session.get(type(migracao), migracao.id))
+            assert status['status'] == 'falhou'
+            assert status['processadas'] == 2
+            assert 'conexão perdida' in status['erro']
+            assert Empresa.query.filter(
+                Empresa.id.in_(ids), Empresa.tributacao_id == empresas_simples['normal_id']
+            ).count() == 2
+
+            monkeypatch.setattr(TributacaoService, 'aplicar_mudancas', original)
+            status = TributacaoService.executar_migracao(migracao.id)
+            assert status['status'] == 'concluida'
+            assert status['processadas'] == 5
+            assert status['migradas'] == 5
+
+    def test_retomada_concorrente(self, app, client, empresas_simples, supervisor):
+        """Migração já em andamento não é reservada por uma segunda execução (409 na retomada)"""
+        with app.app_context():
+            usuario = Usuario.query.filter_by(login='admin').first()
+            migracao = TributacaoService.criar_migracao(
+                empresas_simples['empresa_ids'], empresas_simples['normal_id'], usuario.id, tamanho_lote=2
+            )
+            migracao_id = migracao.id
+            TributacaoService.reservar_migracao(migracao_id)
+            with pytest.raises(MigracaoEmAndamento):
+                TributacaoService.executar_migracao(migracao_id)
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = supervisor
+        resposta = client.post(f'/supervisor/empresas/tributacao/lote/{migracao_id}/retomar')
+        assert resposta.status_code == 409
+        assert resposta.get_json()['success'] is False
+
+        with app.app_context():
+            migracao = db.session.get(type(migracao), migracao_id)
+            assert migracao.processadas == 0
+            # Execução abandonada (sem lote confirmado há muito tempo) pode ser retomada
+            migracao.atualizado_em = datetime.now() - timedelta(hours=2)
+            db.session.commit()
+
+        resposta = client.post(f'/supervisor/empresas/tributacao/lote/{migracao_id}/retomar')
+        assert resposta.status_code == 200
+        assert resposta.get_json()['migracao']['processadas'] == 5
+        resposta = client.post(f'/supervisor/empresas/tributacao/lote/{migracao_id}/retomar')
+        assert resposta.status_code == 400
+
+    def test_lote_com_id_como_texto(self, app, client, empresas_simples, supervisor):
+        """Migração em massa converte o ID da tributação enviado como texto"""
+        with client.session_transaction() as sess:
+            sess['user_id'] = supervisor
+        url = '/supervisor/empresas/tributacao/lote'
+        ids = empresas_simples['empresa_ids']
+        assert client.post(url, json={'tributacao_id': 'abc', 'empresa_ids': ids}).status_code == 400
+
+        dados = client.post(url, json={
+            'tributacao_id': str(empresas_simples['simples_id']), 'empresa_ids': ids, 'dry_run': True
+        }).get_json()
+        assert all(plano['ignorada'] for plano in dados['planos'])
+
+        resposta = client.post(url, json={'tributacao_id': str(empresas_simples['normal_id']), 'empresa_ids': ids})
+        assert resposta.status_code < 300
+        with app.app_context():
+            from app.models import MigracaoTributacaoLote
+            assert MigracaoTributacaoLote.query.one().tributacao_nova_id == empresas_simples['normal_id']
+
+    def test_status_exige_supervisor(self, app, client, empresas_simples, supervisor):
+        """Só supervisor acompanha a migração em massa"""
+        with app.app_context():
+            usuario = Usuario.query.filter_by(login='admin').first()
+            colaborador = Usuario.query.filter_by(login='colaborador').first().id
+            migracao_id = TributacaoService.criar_migracao(
+                empresas_simples['empresa_ids'], empresas_simples['normal_id'], usuario.id
+            ).id
+
+        url = f'/supervisor/empresas/tributacao/lote/{migracao_id}'
+        with client.session_transaction() as sess:
+            sess['user_id'] = colaborador
+        assert client.get(url).status_code == 403
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = supervisor
+        resposta = client.get(url)
+        assert resposta.status_code == 200
+        assert resposta.get_json()['migracao']['status'] == 'pendente'
@@ -101,3 +101,102 @@ class TestTaskUtils:
         assert should_show_task_by_type('Trimestral', '2025-01', '2025-T1') == False  # Janeiro (T1)
         assert should_show_task_by_type('Trimestral', '2025-05', '2025-T2') == False  # Maio (T2)
 
+
+
+def _regra_das_telas(tipo, periodo_label, tarefa_periodo_label):
+    """Filtro linha a linha usado pelas telas antes do predicado SQL"""
+    if tipo == 'Anual':
+        return False
+    if tipo == 'Trimestral':
+        return should_show_task_by_type(tipo, periodo_label, tarefa_periodo_label)
+    return not periodo_label or tarefa_periodo_label == periodo_label
+
+
+class TestTaskVisibilityFilter:
+    """task_visibility_filter deve selecionar as mesmas linhas da regra em Python"""
+
+    TIPOS = ['Mensal', 'Trimestral', 'Anual']
+    LABELS = (
+        [f'2025-{mes:02d}' for mes in range(1, 13)]
+        + [f'{ano}-T{trimestre}' for ano in (2024, 2025) for trimestre in range(1, 5)]
+        + ['2024-06', '2025', 'T2']
+    )
+    FILTROS = [f'2025-{mes:02d}' for mes in range(1, 13)] + ['2024-12', '', None, 'invalido']
+
+    @pytest.fixture
+    def periodos(self, app):
+        """Um período para cada combinação de tipo e label"""
+        from datetime import date
+        from app.db import db
+        from app.models import Empresa, Tarefa, RelacionamentoTarefa, Periodo
+
+        with app.app_context():
+            empresa = Empresa(codigo='VISIB', nome='Visibilidade', ativo=True)
+            tarefas = [Tarefa(nome=f'Visibilidade {tipo}', tipo=tipo) for tipo in self.TIPOS]
+            db.session.add_all([empresa] + tarefas)
+            db.session.flush()
+
+            esperados = {}
+            for tarefa in tarefas:
+                rel = RelacionamentoTarefa(empresa_id=empresa.id, tarefa_id=tarefa.id)
+                db.session.add(rel)
+                db.session.flush()
+                for label in self.LABELS:
+                    periodo = Periodo(relacionamento_tarefa_id=rel.id, inicio=date(2025, 1, 1),
+                                      fim=date(2025, 1, 31), periodo_label=label)
+                    db.session.add(periodo)
+                    db.session.flush()
+                    esperados[periodo.id] = (tarefa.tipo, label)
+            db.session.commit()
+
+            yield empresa.id, esperados
+
+            rel_ids = [rid for (rid,) in db.session.query(RelacionamentoTarefa.id).filter_by(empresa_id=empresa.id)]
+            Periodo.query.filter(Periodo.relacionamento_tarefa_id.in_(rel_ids)).delete(synchronize_session=False)
+            RelacionamentoTarefa.query.filter(RelacionamentoTarefa.id.in_(rel_ids)).delete(synchronize_session=False)
+            Tarefa.query.filter(Tarefa.id.in_([t.id for t in tarefas])).delete(synchronize_session=False)
+            db.session.delete(empresa)
+            db.session.commit()
+
+    @pytest.mark.parametrize('periodo_label', FILTROS)
+    def test_equivalente_a_regra_python(self, app, periodos, periodo_label):
+        """Para cada mês filtrado, SQL e Python escolhem os mesmos períodos"""
+        from app.db import db
+        from app.models import Tarefa, RelacionamentoTarefa, Periodo
+        from app.utils import task_visibility_filter
+
+        empresa_id, esperados = periodos
+        with app.app_context():
+            selecionados = {pid for (pid,) in db.session.query(Periodo.id).join(
+                RelacionamentoTarefa, Periodo.relacionamento_tarefa_id == RelacionamentoTarefa.id
+            ).join(
+                Tarefa, RelacionamentoTarefa.tarefa_id == Tarefa.id
+            ).filter(
+                RelacionamentoTarefa.empresa_id == empresa_id,
+                task_visibility_filter(periodo_label, Periodo.periodo_label, Tarefa.tipo)
+            )}
+
+        python = {
+            pid for pid, (tipo, label) in esperados.items()
+            if _regra_das_telas(tipo, periodo_label, label)
+        }
+        assert selecionados == python
+
+    @pytest.mark.parametrize('periodo_label', FILTROS)
+    def test_somente_label(self, app, periodos, periodo_label):
+        """Sem coluna de tipo, labels de trimestre seguem a regra trimestral"""
+        from app.db import db
+        from app.models import Periodo
+        from app.utils import task_visibility_filter
+
+        with app.app_context():
+            labels = {label for (label,) in db.session.query(Periodo.periodo_label).filter(
+                Periodo.periodo_label.in_(self.LABELS),
+                task_visibility_filter(periodo_label, Periodo.periodo_label)
+            ).distinct()}
+
+        python = {
+            label for label in self.LABELS
+            if _regra_das_telas('Trimestral' if 'T' in label else 'Mensal', periodo_label, label)
+        }
+        assert labels == python
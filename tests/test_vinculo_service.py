@@ -0,0 +1,168 @@
+"""
+Testes para o serviço de vinculação em massa
+"""
+
+from datetime import date
+
+import pytest
+from app.db import db
+from app.models import (
+    Empresa, Tarefa, Tributacao, Usuario, RelacionamentoTarefa, Periodo, Retificacao
+)
+from app.services.vinculo_service import VinculoService
+
+
+@pytest.fixture
+def cenario(app):
+    """Cria empresas (ativas, inativa, outra tributação) e tarefas próprias"""
+    with app.app_context():
+        simples = Tributacao.query.filter_by(nome='Simples Nacional').first()
+        normal = Tributacao.query.filter_by(nome='Regime Normal').first()
+        empresas = [
+            Empresa(codigo='VIN1', nome='Vinculo Um', tributacao_id=simples.id, ativo=True),
+            Empresa(codigo='VIN2', nome='Vinculo Dois', tributacao_id=simples.id, ativo=True),
+            Empresa(codigo='VIN3', nome='Vinculo Inativa', tributacao_id=simples.id, ativo=False),
+            Empresa(codigo='VIN4', nome='Vinculo Normal', tributacao_id=normal.id, ativo=True),
+        ]
+        tarefas = [
+            Tarefa(nome='Vinculo Mensal', tipo='Mensal', tributacao_id=simples.id),
+            Tarefa(nome='Vinculo Anual', tipo='Anual', tributacao_id=simples.id),
+        ]
+        db.session.add_all(empresas + tarefas)
+        db.session.commit()
+
+        dados = {
+            'empresas': [empresa.id for empresa in empresas],
+            'tarefas': [tarefa.id for tarefa in tarefas],
+            'gerente': Usuario.query.filter_by(login='gerente').first().id,
+            'colaborador': Usuario.query.filter_by(login='colaborador').first().id,
+        }
+
+        yield dados
+
+        rel_ids = [rid for (rid,) in db.session.query(RelacionamentoTarefa.id).filter(
+            RelacionamentoTarefa.empresa_id.in_(dados['empresas'])
+        )]
+        VinculoService.remover(rel_ids)
+        Tarefa.query.filter(Tarefa.id.in_(dados['tarefas'])).delete(synchronize_session=False)
+        Empresa.query.filter(Empresa.id.in_(dados['empresas'])).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _pares(empresa_ids):
+    return {
+        (rel.empresa_id, rel.tarefa_id)
+        for rel in RelacionamentoTarefa.query.filter(RelacionamentoTarefa.empresa_id.in_(empresa_ids))
+    }
+
+
+class TestVinculoService:
+    """Testes para VinculoService"""
+
+    def test_vincular_cria_apenas_faltantes(self, app, cenario):
+        """Pares existentes (em qualquer status) não são recriados"""
+        with app.app_context():
+            e1, e2 = cenario['empresas'][:2]
+            t1, t2 = cenario['tarefas']
+            db.session.add(RelacionamentoTarefa(empresa_id=e1, tarefa_id=t1, status='inativa'))
+            db.session.commit()
+
+            resultado = VinculoService.vincular([e1, e2], [t1, t2], valores={'dia_vencimento': 15}, tamanho_lote=2)
+
+            assert sorted(resultado['criados']) == sorted([(e1, t2), (e2, t1), (e2, t2)])
+            assert set(resultado['existentes']) == {(e1, t1)}
+            assert _pares([e1, e2]) == {(e1, t1), (e1, t2), (e2, t1), (e2, t2)}
+            novo = RelacionamentoTarefa.query.filter_by(empresa_id=e2, tarefa_id=t2).one()
+            assert novo.status == 'ativa'
+            assert novo.versao_atual is True
+            assert novo.dia_vencimento == 15
+
+            assert VinculoService.vincular([e1, e2], [t1, t2])['criados'] == []
+
+    def test_vincular_tarefa_classifica_empresas(self, app, cenario):
+        """Separa inativas, incompatíveis e duplicadas com o nome do responsável"""
+        with app.app_context():
+            e1, e2, inativa, normal = cenario['empresas']
+            t1 = cenario['tarefas'][0]
+            db.session.add(RelacionamentoTarefa(
+                empresa_id=e1, tarefa_id=t1, responsavel_id=cenario['gerente'], status='ativa', versao_atual=True
+            ))
+            db.session.commit()
+
+            tarefa = db.session.get(Tarefa, t1)
+            resultado = VinculoService.vincular_tarefa(
+                tarefa, [e1, str(e2), inativa, normal, 999999], cenario['colaborador'], commit=True
+            )
+
+            assert resultado['criados'] == [e2]
+            assert resultado['invalidas'] == [inativa, 999999]
+            assert [empresa.id for empresa in resultado['incompativeis']] == [normal]
+            assert len(resultado['duplicados']) == 1
+            assert resultado['duplicados'][0]['responsavel_nome'] == 'Gerente Test'
+            rel = RelacionamentoTarefa.query.filter_by(empresa_id=e2, tarefa_id=t1).one()
+            assert rel.responsavel_id == cenario['colaborador']
+
+    def test_remover_apaga_periodos_e_retificacoes(self, app, cenario):
+        """Remoção em lote leva junto períodos e retificações"""
+        with app.app_context():
+            e1 = cenario['empresas'][0]
+            t1 = cenario['tarefas'][0]
+            rel = RelacionamentoTarefa(empresa_id=e1, tarefa_id=t1)
+            db.session.add(rel)
+            db.session.flush()
+            periodo = Periodo(relacionamento_tarefa_id=rel.id, inicio=date(2031, 1, 1),
+                              fim=date(2031, 1, 31), periodo_label='2031-01')
+            db.session.add(periodo)
+            db.session.flush()
+            db.session.add(Retificacao(periodo_id=periodo.id, usuario_id=cenario['gerente'], motivo='teste'))
+            db.session.commit()
+            periodo_id = periodo.id
+
+            assert VinculoService.remover([rel.id]) == 1
+            assert Periodo.query.filter_by(id=periodo_id).count() == 0
+            assert Retificacao.query.filter_by(periodo_id=periodo_id).count() == 0
+
+
+class TestEndpointsVinculacao:
+    """Endpoints que usam o VinculoService"""
+
+    def test_bulk_link(self, app, client, cenario):
+        """POST /tarefas/bulk-link aceita IDs separados por vírgula"""
+        e1, e2 = cenario['empresas'][:2]
+        t1, t2 = cenario['tarefas']
+        response = client.post('/tarefas/bulk-link', data={
+            'empresa_ids': [f'{e1},{e2}'],
+            'tarefa_ids': [str(t1), str(t2)],
+            'dia_vencimento': '10',
+        })
+        assert response.status_code == 302
+        with app.app_context():
+            assert len(_pares([e1, e2])) == 4
+
+    def test_vincular_tarefa_anual_detecta_ano(self, app, client, cenario):
+        """Vinculação anual grava a vigência do ano e não duplica no mesmo ano"""
+        e1 = cenario['empresas'][0]
+        t_anual = cenario['tarefas'][1]
+        with app.app_context():
+            admin_id = Usuario.query.filter_by(login='admin').first().id
+        with client.session_transaction() as sess:
+            sess['user_id'] = admin_id
+
+        payload = {'tarefa_id': t_anual, 'funcionario_id': cenario['colaborador'], 'empresas_ids': [e1], 'ano': 2031}
+        dados = client.post('/gerenciamento/api/vincular-tarefa-anual', json=payload).get_json()
+        assert dados['success'] is True
+        assert dados['criados'] == 1
+
+        dados = client.post('/gerenciamento/api/vincular-tarefa-anual', json=payload).get_json()
+        assert dados['criados'] == 0
+        assert dados['duplicados'] == 1
+
+        dados = client.post('/gerenciamento/api/vincular-tarefa-anual', json=dict(payload, ano=2032)).get_json()
+        assert dados['criados'] == 1
+
+        with app.app_context():
+            rel = RelacionamentoTarefa.query.filter_by(empresa_id=e1, tarefa_id=t_anual).order_by(
+                RelacionamentoTarefa.id
+            ).first()
+            assert rel.data_inicio == date(2031, 1, 1)
+            assert rel.data_fim == date(2031, 12, 31)
@@ -5,10 +5,12 @@ import sys
 import webbrowser
 
 from flask import request
-from waitress import serve
+from waitress import create_server
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 from app import create_app
+from app.services.autocomplete_service import AutocompleteService
+from app.services.metricas_service import MetricasService
 
 sys.dont_write_bytecode = True
 
@@ -39,6 +41,7 @@ if __name__ == "__main__":
 	port = int(os.getenv('PORT', '5600'))
 	host = os.getenv('HOST', '0.0.0.0')
 	logging.basicConfig(level=logging.INFO)
+	AutocompleteService.aquecer(app)
 	hostname = socket.gethostname()
 	local_ip = socket.gethostbyname(hostname)
 	if os.name == 'nt':
@@ -48,4 +51,7 @@ if __name__ == "__main__":
 	print(f"Rede:  http://{local_ip}:{port}")
 	if os.getenv('AUTO_OPEN_BROWSER', '1') == '1':
 		webbrowser.open(f"http://{local_ip}:{port}")
-	serve(app, host=host, port=port)
\ No newline at end of file
+	server = create_server(app, host=host, port=port)
+	MetricasService.registrar_waitress(app, server)
+	server.print_listen("Serving on http://{}:{}")
+	server.run()
\ No newline at end of file